@@ -0,0 +1,47 @@
+"""Add posts.trending_score + index cho feed trending
+
+Revision ID: 006_add_posts_trending_score
+Revises: 005_create_password_reset_tokens
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '006_add_posts_trending_score'
+down_revision = '005_create_password_reset_tokens'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'posts',
+        sa.Column(
+            'trending_score', sa.Float(), nullable=False, server_default='0',
+            comment='Điểm trending có decay theo thời gian (app/utils/trending.py)'
+        )
+    )
+
+    # Backfill - cùng công thức với app/utils/trending.py (BLOG_TRENDING_DECAY_HOURS = 24)
+    op.execute(
+        """
+        UPDATE posts
+        SET trending_score = log(1 + GREATEST(like_count, 0) + GREATEST(save_count, 0))
+            + EXTRACT(EPOCH FROM (created_at - TIMESTAMPTZ '2025-01-01 00:00:00+00')) / (24 * 3600)
+        """
+    )
+
+    op.create_index(
+        'ix_posts_trending_score_created_at_id',
+        'posts',
+        ['trending_score', 'created_at', 'id'],
+        postgresql_where=sa.text('deleted_at IS NULL')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_posts_trending_score_created_at_id', table_name='posts')
+    op.drop_column('posts', 'trending_score')
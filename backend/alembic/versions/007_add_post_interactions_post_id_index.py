@@ -0,0 +1,26 @@
+"""Index post_likes.post_id, post_saves.post_id cho reconcile counter
+
+Revision ID: 007_add_post_interactions_post_id_index
+Revises: 006_add_posts_trending_score
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '007_add_post_interactions_post_id_index'
+down_revision = '006_add_posts_trending_score'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # PK (user_id, post_id) không dùng được khi đếm theo post_id
+    op.create_index('ix_post_likes_post_id', 'post_likes', ['post_id'])
+    op.create_index('ix_post_saves_post_id', 'post_saves', ['post_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_post_saves_post_id', table_name='post_saves')
+    op.drop_index('ix_post_likes_post_id', table_name='post_likes')
@@ -0,0 +1,46 @@
+"""Add posts.search_vector (generated tsvector) + GIN index cho full-text search
+
+Revision ID: 008_add_posts_search_vector
+Revises: 007_add_post_interactions_post_id_index
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '008_add_posts_search_vector'
+down_revision = '007_add_post_interactions_post_id_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Cột STORED generated: PG tự tính lại mỗi khi INSERT/UPDATE title hoặc content_text,
+    # không cần trigger hay code ứng dụng. Config 'simple' (PG không có stemmer tiếng Việt).
+    # Lưu ý: ADD COLUMN ... STORED viết lại toàn bộ bảng posts (khóa bảng trong lúc chạy).
+    op.execute(
+        """
+        ALTER TABLE posts ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(title, '')), 'A')
+            || setweight(to_tsvector('simple', coalesce(content_text, '')), 'B')
+        ) STORED
+        """
+    )
+    op.execute(
+        "COMMENT ON COLUMN posts.search_vector IS "
+        "'tsvector cua title (weight A) + content_text (weight B) cho full-text search'"
+    )
+
+    op.create_index(
+        'ix_posts_search_vector',
+        'posts',
+        ['search_vector'],
+        postgresql_using='gin'
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_posts_search_vector', table_name='posts')
+    op.drop_column('posts', 'search_vector')
@@ -0,0 +1,48 @@
+"""Create media_blobs table (khử trùng lặp upload theo SHA-256 + đếm tham chiếu)
+
+Revision ID: 009_create_media_blobs_table
+Revises: 008_add_posts_search_vector
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '009_create_media_blobs_table'
+down_revision = '008_add_posts_search_vector'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # File upload trước migration không có dòng ở đây → không bao giờ bị job dọn xóa
+    op.create_table(
+        'media_blobs',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('url', sa.Text(), nullable=False),
+        sa.Column('file_id', sa.Text(), nullable=False),
+        sa.Column('file_name', sa.Text(), nullable=False),
+        sa.Column('media_type', sa.String(length=20), nullable=False),
+        sa.Column('mime_type', sa.Text(), nullable=True),
+        sa.Column('width', sa.Integer(), nullable=True),
+        sa.Column('height', sa.Integer(), nullable=True),
+        sa.Column('size_bytes', sa.BigInteger(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('last_used_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('sha256'),
+        sa.UniqueConstraint('url')
+    )
+    op.create_index(
+        'ix_media_blobs_unused',
+        'media_blobs',
+        ['last_used_at'],
+        postgresql_where=sa.text('ref_count = 0')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_media_blobs_unused', table_name='media_blobs')
+    op.drop_table('media_blobs')
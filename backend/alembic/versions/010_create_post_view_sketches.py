@@ -0,0 +1,41 @@
+"""Add posts.view_count + post_view_sketches (đếm người xem khác nhau bằng HyperLogLog)
+
+Revision ID: 010_create_post_view_sketches
+Revises: 009_create_media_blobs_table
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '010_create_post_view_sketches'
+down_revision = '009_create_media_blobs_table'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Có server_default → PG 11+ thêm cột không viết lại bảng posts
+    op.add_column(
+        'posts',
+        sa.Column(
+            'view_count', sa.Integer(), nullable=False, server_default='0',
+            comment='Số người xem khác nhau (ước lượng HyperLogLog, xem post_view_sketches)'
+        )
+    )
+
+    op.create_table(
+        'post_view_sketches',
+        sa.Column('post_id', sa.BigInteger(), nullable=False),
+        sa.Column('registers', sa.LargeBinary(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('post_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('post_view_sketches')
+    op.drop_column('posts', 'view_count')
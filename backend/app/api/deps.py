@@ -18,6 +18,7 @@ from jwt import ExpiredSignatureError, InvalidTokenError
 from passlib.context import CryptContext
 
 from app.core.database import get_db
+from app.core.db_executor import run_blog_db
 from app.models.auth import User, RefreshSession
 
 
@@ -279,23 +280,8 @@ def update_user_password_and_revoke_sessions(
 
 
 # ==================== User Dependencies ====================
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    """
-    Extract current user from JWT access token in Authorization header
-    
-    Usage:
-        @app.get("/users/me")
-        async def get_me(current_user: User = Depends(get_current_user)):
-            return current_user
-    
-    Requires: Authorization: Bearer <token>
-    
-    Raises:
-        HTTPException: If token is missing, invalid, or user not found
-    """
+def _user_id_from_credentials(credentials: HTTPAuthorizationCredentials) -> uuid.UUID:
+    """Lấy user_id từ access token (không đụng DB)"""
     # HTTPBearer automatically extracts token from "Authorization: Bearer <token>"
     token = credentials.credentials
     
@@ -321,14 +307,16 @@ async def get_current_user(
         )
     
     try:
-        user_id = uuid.UUID(user_id_str)
+        return uuid.UUID(user_id_str)
     except (ValueError, TypeError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid user ID in token"
         )
-    
-    # Query user from database
+
+
+def _load_user(db: Session, user_id: uuid.UUID) -> User:
+    """Query user theo id (blocking)"""
     stmt = select(User).where(User.id == user_id)
     user = db.execute(stmt).scalar_one_or_none()
     
@@ -341,6 +329,39 @@ async def get_current_user(
     return user
 
 
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> User:
+    """
+    Extract current user from JWT access token in Authorization header
+    
+    Usage:
+        @app.get("/users/me")
+        async def get_me(current_user: User = Depends(get_current_user)):
+            return current_user
+    
+    Requires: Authorization: Bearer <token>
+    
+    Raises:
+        HTTPException: If token is missing, invalid, or user not found
+    """
+    user_id = _user_id_from_credentials(credentials)
+    return _load_user(db, user_id)
+
+
+async def get_current_user_offloaded(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> User:
+    """
+    Như get_current_user nhưng query user chạy trên blog DB executor,
+    dùng cho route không được chặn event loop (blog)
+    """
+    user_id = _user_id_from_credentials(credentials)
+    return await run_blog_db(_load_user, db, user_id)
+
+
 async def get_current_admin_user(
     current_user: User = Depends(get_current_user)
 ) -> User:
@@ -7,6 +7,7 @@ from .admin_dashboard import router as dashboard_router
 from .admin_users import router as users_router
 from .admin_blog import router as blog_router
 from .admin_contributions import router as contributions_router
+from .admin_chatbot import router as chatbot_router
 
 router = APIRouter()
 
@@ -23,4 +24,7 @@ router.include_router(blog_router, tags=["Admin Blog"])
 router.include_router(support_router, prefix="/support", tags=["Admin Support"])
 
 # Contributions endpoints
-router.include_router(contributions_router, tags=["Admin Contributions"])
\ No newline at end of file
+router.include_router(contributions_router, tags=["Admin Contributions"])
+
+# Chatbot cache endpoints
+router.include_router(chatbot_router, tags=["Admin Chatbot"])
@@ -1,6 +1,6 @@
 """
 API Routes cho Admin Blog Management
-Endpoints: List posts, Delete post
+Endpoints: List posts, Delete post, Blog DB executor stats
 """
 from typing import Optional
 from math import ceil
@@ -8,6 +8,7 @@ from fastapi import APIRouter, Depends, Query, Path, status
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
+from app.core.db_executor import get_blog_db_executor
 from app.api.deps import get_current_admin_user
 from app.models.auth import User
 from app.schemas.admin import (
@@ -158,3 +159,24 @@ def restore_post(
         action="restore_post",
         performed_by=admin_user.id
     )
+
+
+@router.get(
+    "/blog/db-executor",
+    summary="Admin - Blog DB Executor Stats",
+    description="""
+    Số liệu thread pool chạy query DB của blog module.
+    
+    **Authorization:** Chỉ admin
+    
+    **Returns:**
+    - in_flight / queue_depth: Số call đang chạy / đang chờ thread
+    - counters: submitted, completed, failed, rejected_queue_full, queue_timeouts
+    - wait_ms / run_ms: p50, p95, max (ms) của thời gian chờ thread và thời gian chạy
+    """
+)
+def get_blog_db_executor_stats(
+    admin_user: User = Depends(get_current_admin_user)
+):
+    """Stats của blog DB executor (trong process hiện tại)"""
+    return get_blog_db_executor().stats()
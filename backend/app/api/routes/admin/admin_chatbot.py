@@ -0,0 +1,40 @@
+"""
+API Routes cho Admin Chatbot (quản lý cache)
+Endpoint: DELETE /admin/chatbot/response-cache
+"""
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+
+from app.api.deps import get_current_admin_user
+from app.models.auth import User
+
+
+router = APIRouter()
+
+
+# ==================== CHATBOT CACHE ENDPOINTS ====================
+
+@router.delete(
+    "/chatbot/response-cache",
+    summary="Admin - Purge Chatbot Response Cache",
+    description="""
+    Xóa cache câu trả lời của chatbot (VD: sau khi sửa dữ liệu món ăn).
+
+    **Authorization:** Chỉ admin
+
+    **Query Parameters:**
+    - intent: Chỉ xóa 1 intent (FOOD_NUTRITION_INQUIRY, CALORIE_BASED_RECOMMENDATION), bỏ trống = xóa hết
+
+    **Returns:**
+    - purged: Số response đã xóa
+    """
+)
+def purge_chatbot_response_cache(
+    intent: Optional[str] = Query(None, description="Intent cần xóa, bỏ trống = tất cả"),
+    admin_user: User = Depends(get_current_admin_user)
+):
+    """Xóa response cache (chỉ cache trong process hiện tại)"""
+    from app.services.nutri_chatbot.response_cache import get_response_cache
+
+    purged = get_response_cache().purge(intent)
+    return {"purged": purged, "intent": intent}
@@ -5,8 +5,9 @@ Tuân theo OpenAPI spec: /feed, /posts, /posts/{id}, /posts/{id}/like, /posts/{i
 Endpoints:
 - POST /media/upload: Upload single file lên ImageKit
 - POST /media/upload-multiple: Upload nhiều files lên ImageKit
-- GET /feed: Feed (recent/trending/hashtag/author/saved)
+- GET /feed: Feed (recent/trending/hashtag/author/saved), cursor hoặc page mode
 - POST /posts: Tạo bài viết
+- GET /posts/search: Tìm bài viết theo nội dung (full-text)
 - GET /posts/{post_id}: Chi tiết bài viết
 - PATCH /posts/{post_id}: Cập nhật bài viết (author only)
 - DELETE /posts/{post_id}: Xóa bài viết (author only)
@@ -16,6 +17,9 @@ Endpoints:
 - DELETE /posts/{post_id}/save: Unsave bài viết
 - GET /hashtags/search: Tìm hashtags
 - GET /hashtags/{name}/posts: Bài viết theo hashtag
+
+BlogService/BlogRepository dùng Session sync → mọi call DB đi qua run_blog_db
+(thread pool riêng có giới hạn), không bao giờ chạy trên event loop.
 """
 import uuid
 from typing import Optional, List
@@ -24,7 +28,8 @@ from fastapi import APIRouter, Depends, status, Query, File, UploadFile
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user_offloaded
+from app.core.db_executor import run_blog_db
 from app.models.auth import User
 from app.services.blog_service import BlogService
 from app.services.media_service import MediaService
@@ -60,6 +65,7 @@ router = APIRouter(prefix="/blog", tags=["Blog"])
     
     **Response:** URL và metadata của file đã upload.
     Sử dụng URL này trong media array khi tạo/cập nhật post.
+    Nội dung đã từng được upload (cùng SHA-256) → trả về file cũ, `deduplicated = true`.
     """,
     responses={
         400: {"model": ErrorResponse, "description": "Invalid file type"},
@@ -70,7 +76,8 @@ router = APIRouter(prefix="/blog", tags=["Blog"])
 )
 async def upload_media(
     file: UploadFile = File(..., description="File ảnh hoặc video cần upload"),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user_offloaded),
+    db: Session = Depends(get_db)
 ) -> MediaUploadResponse:
     """
     Upload file lên ImageKit để lấy URL.
@@ -81,6 +88,7 @@ async def upload_media(
     3. Dùng URL này trong request tạo/cập nhật post
     """
     result = await MediaService.upload_file(
+        db=db,
         file=file,
         user_id=current_user.id,
         folder="blog"
@@ -111,7 +119,8 @@ async def upload_media(
 )
 async def upload_multiple_media(
     files: List[UploadFile] = File(..., description="Danh sách files cần upload (tối đa 10)"),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user_offloaded),
+    db: Session = Depends(get_db)
 ) -> MultipleMediaUploadResponse:
     """
     Upload nhiều files lên ImageKit.
@@ -119,6 +128,7 @@ async def upload_multiple_media(
     Mỗi file sẽ có sort_order tự động theo thứ tự upload.
     """
     results = await MediaService.upload_multiple_files(
+        db=db,
         files=files,
         user_id=current_user.id,
         folder="blog"
@@ -140,8 +150,16 @@ async def upload_multiple_media(
     - author_id: Lọc theo tác giả
     - saved: true để chỉ lấy bài đã lưu
     
-    Offset/Limit pagination - 15 bài viết mỗi trang.
-    """
+    **Cursor mode (mặc định):** trang đầu không cần cursor, trang sau gửi `cursor=next_cursor`
+    (giữ nguyên sort + filter). Không đếm tổng, mọi trang nhanh như nhau.
+    `include_total=true` để kèm total_count (cache ngắn hạn, có thể lệch).
+    
+    **Page mode:** gửi `page` để dùng Offset/Limit + total_count/total_pages chính xác.
+    """,
+    responses={
+        400: {"model": ErrorResponse, "description": "Invalid cursor / both page and cursor"},
+        401: {"model": ErrorResponse, "description": "Not authenticated"}
+    }
 )
 async def get_feed(
     sort: FeedSort = Query(FeedSort.RECENT, description="Sắp xếp"),
@@ -149,11 +167,14 @@ async def get_feed(
     author_id: Optional[uuid.UUID] = Query(None, description="Lọc theo tác giả"),
     saved: Optional[bool] = Query(None, description="Chỉ bài đã lưu"),
     limit: int = Query(15, ge=1, le=100, description="Số lượng items mỗi trang"),
-    page: int = Query(1, ge=1, description="Số trang (bắt đầu từ 1)"),
-    current_user: User = Depends(get_current_user),
+    cursor: Optional[str] = Query(None, description="next_cursor của trang trước (cursor mode)"),
+    page: Optional[int] = Query(None, ge=1, description="Số trang, bắt đầu từ 1 (page mode)"),
+    include_total: bool = Query(False, description="Kèm total_count (cache) ở cursor mode"),
+    current_user: User = Depends(get_current_user_offloaded),
     db: Session = Depends(get_db)
 ) -> FeedResponse:
-    return BlogService.get_feed(
+    return await run_blog_db(
+        BlogService.get_feed,
         db=db,
         user_id=current_user.id,
         sort=sort.value,
@@ -161,7 +182,9 @@ async def get_feed(
         author_id=author_id,
         saved_only=saved or False,
         limit=limit,
-        page=page
+        page=page,
+        cursor=cursor,
+        include_total=include_total
     )
 
 
@@ -178,7 +201,7 @@ async def get_feed(
 )
 async def create_post(
     request: PostCreateRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_offloaded),
     db: Session = Depends(get_db)
 ) -> PostDetail:
     """
@@ -187,13 +210,51 @@ async def create_post(
     Media URLs phải được upload lên ImageKit trước, sau đó gửi URLs trong request.
     Hashtags không cần ký tự #.
     """
-    return BlogService.create_post(
+    return await run_blog_db(
+        BlogService.create_post,
         db=db,
         user_id=current_user.id,
         request=request
     )
 
 
+# Khai báo trước /posts/{post_id} để "search" không bị match thành post_id
+@router.get(
+    "/posts/search",
+    response_model=FeedResponse,
+    summary="Search posts (full-text, title + content)",
+    description="""
+    Tìm bài viết theo nội dung, xếp theo độ liên quan (từ khớp ở tiêu đề nặng hơn nội dung).
+    Bài phải chứa đủ mọi từ khóa. Có thể kết hợp filter hashtag / author_id.
+    
+    Cursor mode như /feed: trang sau gửi `cursor=next_cursor` với cùng q + filter.
+    """,
+    responses={
+        400: {"model": ErrorResponse, "description": "Invalid cursor"},
+        401: {"model": ErrorResponse, "description": "Not authenticated"}
+    }
+)
+async def search_posts(
+    q: str = Query(..., min_length=1, max_length=200, description="Từ khóa tìm kiếm"),
+    hashtag: Optional[str] = Query(None, description="Lọc theo hashtag"),
+    author_id: Optional[uuid.UUID] = Query(None, description="Lọc theo tác giả"),
+    limit: int = Query(15, ge=1, le=100, description="Số lượng items mỗi trang"),
+    cursor: Optional[str] = Query(None, description="next_cursor của trang trước"),
+    current_user: User = Depends(get_current_user_offloaded),
+    db: Session = Depends(get_db)
+) -> FeedResponse:
+    return await run_blog_db(
+        BlogService.search_posts,
+        db=db,
+        user_id=current_user.id,
+        q=q,
+        hashtag=hashtag,
+        author_id=author_id,
+        limit=limit,
+        cursor=cursor
+    )
+
+
 @router.get(
     "/posts/{post_id}",
     response_model=PostDetail,
@@ -205,11 +266,12 @@ async def create_post(
 )
 async def get_post(
     post_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_offloaded),
     db: Session = Depends(get_db)
 ) -> PostDetail:
     """Lấy chi tiết bài viết theo ID"""
-    return BlogService.get_post(
+    return await run_blog_db(
+        BlogService.get_post,
         db=db,
         post_id=post_id,
         current_user_id=current_user.id
@@ -230,7 +292,7 @@ async def get_post(
 async def update_post(
     post_id: int,
     request: PostPatchRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_offloaded),
     db: Session = Depends(get_db)
 ) -> PostDetail:
     """
@@ -239,7 +301,8 @@ async def update_post(
     PATCH semantics: chỉ gửi fields cần cập nhật.
     Media và hashtags sẽ được thay thế toàn bộ nếu gửi.
     """
-    return BlogService.update_post(
+    return await run_blog_db(
+        BlogService.update_post,
         db=db,
         post_id=post_id,
         current_user_id=current_user.id,
@@ -259,11 +322,12 @@ async def update_post(
 )
 async def delete_post(
     post_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_offloaded),
     db: Session = Depends(get_db)
 ) -> None:
     """Xóa bài viết (soft delete, chỉ tác giả)"""
-    BlogService.delete_post(
+    await run_blog_db(
+        BlogService.delete_post,
         db=db,
         post_id=post_id,
         current_user_id=current_user.id
@@ -282,11 +346,11 @@ async def delete_post(
 )
 async def like_post(
     post_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_offloaded),
     db: Session = Depends(get_db)
 ) -> None:
     """Like bài viết (idempotent - like lại không lỗi)"""
-    BlogService.like_post(db=db, post_id=post_id, user_id=current_user.id)
+    await run_blog_db(BlogService.like_post, db=db, post_id=post_id, user_id=current_user.id)
 
 
 @router.delete(
@@ -300,11 +364,11 @@ async def like_post(
 )
 async def unlike_post(
     post_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_offloaded),
     db: Session = Depends(get_db)
 ) -> None:
     """Unlike bài viết (idempotent)"""
-    BlogService.unlike_post(db=db, post_id=post_id, user_id=current_user.id)
+    await run_blog_db(BlogService.unlike_post, db=db, post_id=post_id, user_id=current_user.id)
 
 
 # ==================== SAVE / UNSAVE ====================
@@ -319,11 +383,11 @@ async def unlike_post(
 )
 async def save_post(
     post_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_offloaded),
     db: Session = Depends(get_db)
 ) -> None:
     """Lưu bài viết để đọc sau (idempotent)"""
-    BlogService.save_post(db=db, post_id=post_id, user_id=current_user.id)
+    await run_blog_db(BlogService.save_post, db=db, post_id=post_id, user_id=current_user.id)
 
 
 @router.delete(
@@ -337,11 +401,11 @@ async def save_post(
 )
 async def unsave_post(
     post_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_offloaded),
     db: Session = Depends(get_db)
 ) -> None:
     """Bỏ lưu bài viết (idempotent)"""
-    BlogService.unsave_post(db=db, post_id=post_id, user_id=current_user.id)
+    await run_blog_db(BlogService.unsave_post, db=db, post_id=post_id, user_id=current_user.id)
 
 
 # ==================== HASHTAGS ====================
@@ -356,11 +420,11 @@ async def unsave_post(
 async def search_hashtags(
     q: str = Query(..., min_length=1, description="Search query"),
     limit: int = Query(20, ge=1, le=100, description="Số lượng kết quả"),
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_offloaded),
     db: Session = Depends(get_db)
 ) -> HashtagSearchResponse:
     """Tìm kiếm hashtags theo prefix"""
-    return BlogService.search_hashtags(db=db, query=q, limit=limit)
+    return await run_blog_db(BlogService.search_hashtags, db=db, query=q, limit=limit)
 
 
 @router.get(
@@ -375,11 +439,12 @@ async def get_posts_by_hashtag(
     name: str,
     limit: int = Query(20, ge=1, le=100, description="Số lượng items"),
     cursor: Optional[str] = Query(None, description="Cursor pagination"),
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_offloaded),
     db: Session = Depends(get_db)
 ) -> FeedResponse:
     """Lấy bài viết theo hashtag"""
-    return BlogService.get_posts_by_hashtag(
+    return await run_blog_db(
+        BlogService.get_posts_by_hashtag,
         db=db,
         user_id=current_user.id,
         hashtag_name=name,
@@ -1,4 +1,7 @@
+import json
+
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
@@ -21,6 +24,7 @@ class ChatResponse(BaseModel):
     response: str
     intent: str
     data: dict | list | None = None
+    timings: dict | None = None  # Chỉ có khi CHATBOT_DEBUG_TIMINGS
 
 
 @router.post("/chat", response_model=ChatResponse)
@@ -54,16 +58,124 @@ async def chat(
             )
         raise
     
+    from app.services.nutri_chatbot.async_utils import StageTimeoutError
+    from app.services.nutri_chatbot.llm_gateway import LLMGatewayError
+    
     try:
         # ✅ Pass user_id to ChatbotService
         chatbot = ChatbotService(db=db, user_id=current_user.id)
-        result = chatbot.chat(request.message)
+        # Pipeline async: không chặn event loop khi chờ Gemini/Chroma/DB
+        result = await chatbot.chat(request.message)
         return result
+    except StageTimeoutError as e:
+        print(f"⏱️ Chatbot timeout: {e}")
+        raise HTTPException(status_code=504, detail=str(e))
+    except LLMGatewayError as e:
+        # Quá tải → fail nhanh, client thử lại sau Retry-After giây
+        print(f"🚦 Chatbot overloaded: {e}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, round(e.retry_after)))}
+        )
     except Exception as e:
         print(f"❌ Chatbot error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _sse(event: str, data) -> str:
+    """1 sự kiện Server-Sent Events"""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_stream(
+    request: ChatRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Chatbot endpoint dạng streaming (Server-Sent Events) - Requires authentication
+    
+    Sự kiện theo thứ tự:
+    - intent: {"intent", "entities"}
+    - results: {"data"} - kết quả RAG (nếu có)
+    - token: {"text"} - từng đoạn câu trả lời, nối lại = response
+    - done: {"response", "intent", "data"} - giống /chatbot/chat
+    - error: {"status", "detail"} - thay cho done khi lỗi (504 timeout, 429/503 quá tải)
+    
+    Client ngắt kết nối → pipeline bị hủy, không tiếp tục gọi Gemini.
+    """
+    if not settings.GEMINI_API_KEY:
+        raise HTTPException(
+            status_code=503,
+            detail="Chatbot service is not available. GEMINI_API_KEY is not configured. Please set GEMINI_API_KEY in your .env file."
+        )
+    
+    try:
+        from app.services.nutri_chatbot.chatbot_service import ChatbotService
+    except ImportError as e:
+        if "google" in str(e).lower() or "generativeai" in str(e).lower():
+            raise HTTPException(
+                status_code=503,
+                detail="Chatbot service is not available. Please install google-generativeai package: pip install google-generativeai"
+            )
+        raise
+    
+    chatbot = ChatbotService(db=db, user_id=current_user.id)
+    
+    async def event_stream():
+        # Gửi ngay 1 comment để client/proxy nhận header + byte đầu tiên
+        yield ": stream opened\n\n"
+        async for event, data in chatbot.chat_stream(request.message):
+            yield _sse(event, data)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # Tắt buffer của nginx
+        }
+    )
+
+
 @router.get("/health")
 async def health_check():
-    return {"status": "ok", "service": "chatbot"}
\ No newline at end of file
+    health = {"status": "ok", "service": "chatbot"}
+    
+    try:
+        from app.services.nutri_chatbot.embedding_cache import get_embedding_cache
+        from app.services.nutri_chatbot.intent_classifier import intent_stage_stats
+        from app.services.nutri_chatbot.llm_gateway import peek_llm_gateway
+        from app.services.nutri_chatbot.response_cache import get_response_cache
+        from app.services.nutri_chatbot.tracing import get_histograms
+        from app.services.nutri_chatbot.translate_service import translation_cache_stats
+        health["embedding_cache"] = get_embedding_cache().stats()
+        health["translation_cache"] = translation_cache_stats()
+        health["intent_stages"] = intent_stage_stats()
+        health["response_cache"] = get_response_cache().stats()
+        health["stage_timings"] = get_histograms().stats()
+        gateway = peek_llm_gateway()
+        if gateway is not None:
+            health["llm_gateway"] = gateway.stats()
+    except ImportError:
+        pass
+    
+    return health
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Histogram thời gian từng stage của chatbot (Prometheus text format)
+    
+    Stage: translate, classify, embed, vector_search, hydrate, filter, optimize, generate, total
+    """
+    from app.services.nutri_chatbot.tracing import get_histograms
+    
+    return PlainTextResponse(
+        get_histograms().render_prometheus(),
+        media_type="text/plain; version=0.0.4"
+    )
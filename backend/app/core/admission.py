@@ -0,0 +1,92 @@
+# Gioi han so call async dong thoi + hang doi co gioi han (dung chung LLM gateway va DB executor)
+import asyncio
+import time
+from collections import deque
+
+
+# Số mẫu latency giữ lại để tính percentile
+LATENCY_WINDOW = 512
+
+
+class AdmissionRejected(Exception):
+    """Không nhận thêm call (caller đổi sang lỗi 503 / 429 của mình)"""
+
+
+class AdmissionQueueFull(AdmissionRejected):
+    """Hết slot và hàng đợi đã đầy"""
+
+
+class AdmissionTimeout(AdmissionRejected):
+    """Chờ slot quá queue_timeout"""
+
+
+class AdmissionLimiter:
+    """
+    Tối đa `max_concurrency` call giữ slot cùng lúc, tối đa `max_queue` call chờ slot.
+
+    Hàng đợi đầy → AdmissionQueueFull ngay, chờ quá `queue_timeout` → AdmissionTimeout.
+    Ghi lại queue depth và thời gian chờ slot cho stats() của caller.
+
+    Args:
+        max_concurrency: Số slot
+        max_queue: Số call chờ slot tối đa
+        queue_timeout: Thời gian chờ slot tối đa (giây)
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._semaphore = None
+        self._loop = None
+        self.waiting = 0
+        self.max_waiting = 0
+        self.wait_ms = deque(maxlen=LATENCY_WINDOW)
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Semaphore gắn với event loop → tạo lại nếu loop đổi (test chạy nhiều asyncio.run)
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def acquire(self) -> asyncio.Semaphore:
+        """
+        Chờ 1 slot (xếp hàng nếu hết slot)
+
+        Returns:
+            Semaphore đã giữ slot, caller gọi release() trên chính semaphore này
+
+        Raises:
+            AdmissionQueueFull: hàng đợi đầy
+            AdmissionTimeout: chờ slot quá queue_timeout
+        """
+        semaphore = self._get_semaphore()
+        if semaphore.locked() and self.waiting >= self.max_queue:
+            raise AdmissionQueueFull()
+
+        started = time.perf_counter()
+        if semaphore.locked():
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+            try:
+                await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise AdmissionTimeout()
+            finally:
+                self.waiting -= 1
+        else:
+            await semaphore.acquire()
+        self.wait_ms.append((time.perf_counter() - started) * 1000)
+        return semaphore
+
+
+def percentiles(samples) -> dict:
+    """p50 / p95 / max (ms) của các mẫu latency"""
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 1)
+    return {"p50": pick(0.5), "p95": pick(0.95), "max": round(ordered[-1], 1)}
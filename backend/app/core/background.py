@@ -0,0 +1,64 @@
+# Job chay dinh ky trong process (bat/tat trong lifespan cua app)
+import asyncio
+import time
+from typing import Callable, Optional
+
+
+class PeriodicJob:
+    """
+    Chạy 1 hàm blocking định kỳ trong worker thread, không chặn event loop.
+
+    Lỗi của 1 lần chạy chỉ được log lại, job vẫn tiếp tục ở chu kỳ sau.
+
+    Args:
+        name: Tên job (để log)
+        interval_seconds: Chu kỳ chạy
+        fn: Hàm blocking không tham số
+        initial_delay: Chờ bao lâu trước lần chạy đầu tiên
+    """
+
+    def __init__(self, name: str, interval_seconds: float, fn: Callable[[], object], initial_delay: float = 0):
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.fn = fn
+        self.initial_delay = initial_delay
+        self.runs = 0
+        self.last_run_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self):
+        try:
+            await asyncio.to_thread(self.fn)
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"⚠️  Background job '{self.name}' failed: {e}")
+        finally:
+            self.runs += 1
+            self.last_run_at = time.time()
+
+    async def _loop(self):
+        await asyncio.sleep(self.initial_delay)
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop(), name=self.name)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+async def stop_jobs(jobs):
+    for job in jobs:
+        await job.stop()
@@ -0,0 +1,160 @@
+# Chay code DB dong bo (Session sync) ngoai event loop, tren thread pool rieng co gioi han
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from fastapi import HTTPException, status
+
+from app.core.admission import LATENCY_WINDOW, AdmissionLimiter, AdmissionQueueFull, AdmissionTimeout, percentiles
+from app.core.settings import settings
+
+
+T = TypeVar("T")
+
+
+class DBExecutorBusyError(HTTPException):
+    """Hàng đợi DB executor đầy hoặc chờ quá lâu → 503 kèm Retry-After"""
+
+    def __init__(self, detail: str, retry_after: float = 1.0):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers={"Retry-After": str(max(1, round(retry_after)))},
+        )
+
+
+class DBExecutor:
+    """
+    Thread pool riêng cho code DB blocking, route async chỉ `await` kết quả.
+
+    - Tối đa `max_workers` call chạy cùng lúc (= số thread, nên đặt <= pool size của engine)
+    - Tối đa `max_queue` call chờ, đầy hoặc chờ quá `queue_timeout` → DBExecutorBusyError (503)
+    - Contextvars được copy sang worker thread
+    - Số liệu in_flight / queue depth / latency cho stats()
+
+    Args:
+        name: Prefix tên thread (để debug)
+        max_workers: Số thread tối đa
+        max_queue: Số call chờ slot tối đa
+        queue_timeout: Thời gian chờ slot tối đa (giây)
+    """
+
+    def __init__(self, name: str, max_workers: int = 8, max_queue: int = 64, queue_timeout: float = 5.0):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._admission = AdmissionLimiter(max_workers, max_queue, queue_timeout)
+        self._in_flight = 0
+        self._counters = Counter()
+        self._run_ms = deque(maxlen=LATENCY_WINDOW)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+            return self._executor
+
+    async def _acquire(self) -> asyncio.Semaphore:
+        try:
+            return await self._admission.acquire()
+        except AdmissionQueueFull:
+            self._counters["rejected_queue_full"] += 1
+            raise DBExecutorBusyError("Server is busy, please retry shortly", retry_after=self.queue_timeout)
+        except AdmissionTimeout:
+            self._counters["queue_timeouts"] += 1
+            raise DBExecutorBusyError("Timed out waiting for a database worker", retry_after=self.queue_timeout)
+
+    async def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Chạy fn(*args, **kwargs) trên worker thread và chờ kết quả
+
+        Slot chỉ được trả khi fn chạy xong thật sự (kể cả khi request bị hủy giữa chừng),
+        nên số thread đang giữ connection không bao giờ vượt max_workers.
+
+        Raises:
+            DBExecutorBusyError: hàng đợi đầy hoặc chờ slot quá queue_timeout
+        """
+        self._counters["submitted"] += 1
+        loop = asyncio.get_running_loop()
+        semaphore = await self._acquire()
+
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, self._timed, fn, *args, **kwargs)
+        self._in_flight += 1
+        try:
+            future = self._get_executor().submit(call)
+        except BaseException:
+            self._in_flight -= 1
+            semaphore.release()
+            raise
+        future.add_done_callback(lambda done: self._release_threadsafe(loop, semaphore, done))
+        return await asyncio.wrap_future(future)
+
+    def _timed(self, fn, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._run_ms.append((time.perf_counter() - started) * 1000)
+
+    def _release_threadsafe(self, loop, semaphore, future) -> None:
+        # Done callback chạy trên worker thread → trả slot + cập nhật số liệu trên loop thread
+        def release():
+            self._in_flight -= 1
+            self._counters["failed" if future.cancelled() or future.exception() else "completed"] += 1
+            semaphore.release()
+
+        try:
+            loop.call_soon_threadsafe(release)
+        except RuntimeError:
+            # Loop đã đóng (shutdown) → không còn ai chờ slot
+            pass
+
+    def stats(self) -> dict:
+        """Số call đang chạy / chờ, bộ đếm và latency p50/p95 (ms)"""
+        return {
+            "name": self.name,
+            "max_workers": self.max_workers,
+            "in_flight": self._in_flight,
+            "queue_depth": self._admission.waiting,
+            "max_queue_depth": self._admission.max_waiting,
+            "counters": dict(self._counters),
+            "wait_ms": percentiles(self._admission.wait_ms),
+            "run_ms": percentiles(self._run_ms),
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+_blog_executor: Optional[DBExecutor] = None
+
+
+def get_blog_db_executor() -> DBExecutor:
+    """Executor dùng chung cả process cho blog module"""
+    global _blog_executor
+    if _blog_executor is None:
+        _blog_executor = DBExecutor(
+            "blog-db",
+            max_workers=settings.BLOG_DB_EXECUTOR_WORKERS,
+            max_queue=settings.BLOG_DB_EXECUTOR_MAX_QUEUE,
+            queue_timeout=settings.BLOG_DB_EXECUTOR_QUEUE_TIMEOUT_SECONDS,
+        )
+    return _blog_executor
+
+
+async def run_blog_db(fn: Callable[..., T], *args, **kwargs) -> T:
+    """Chạy hàm DB blocking của blog trên blog executor"""
+    return await get_blog_db_executor().run(fn, *args, **kwargs)
@@ -15,7 +15,77 @@ class Settings(BaseSettings):
 
     # ChromaDB Configuration
     CHROMA_DB_PATH: str = "./chroma_db"
-    
+
+    # Chatbot async pipeline
+    CHATBOT_RAG_CONCURRENCY: int = 8  # So RAG search chay song song toi da trong 1 request
+    CHATBOT_EMBED_TIMEOUT_SECONDS: float = 5.0  # Timeout tao embedding cho query
+    CHATBOT_VECTOR_SEARCH_TIMEOUT_SECONDS: float = 5.0  # Timeout query Chroma + hydrate tu DB
+    CHATBOT_CLASSIFY_TIMEOUT_SECONDS: float = 10.0  # Timeout phan loai intent (dich + LLM)
+    CHATBOT_LLM_TIMEOUT_SECONDS: float = 30.0  # Timeout sinh cau tra loi bang Gemini
+
+    # Cache embedding cho query chatbot (memory LRU + SQLite tren dia)
+    EMBEDDING_CACHE_SIZE: int = 2048  # So embedding toi da giu trong memory
+    EMBEDDING_CACHE_PATH: Optional[str] = "./embedding_cache/query_embeddings.sqlite3"  # De trong = chi dung memory
+    CHATBOT_CALORIE_BUCKET: int = 50  # Lam tron so calo trong query (437 -> 450) de dung chung cache
+
+    # Cache dich Viet -> Anh va nhan dien ngon ngu (dung chung ca process)
+    TRANSLATE_CACHE_SIZE: int = 4096  # So entry toi da moi cache
+    TRANSLATE_CACHE_TTL_SECONDS: int = 86400  # Thoi gian song cua ban dich
+
+    # Phan loai intent local truoc khi goi LLM
+    CHATBOT_LOCAL_INTENT_ENABLED: bool = True  # Tat = moi message deu goi Gemini
+    CHATBOT_INTENT_MODEL_THRESHOLD: float = 0.9  # Xac suat toi thieu de tin model n-gram
+
+    # Embedding backend + dong bo Chroma collection "foods" tu bang foods
+    CHATBOT_EMBEDDER: str = "gemini"  # gemini | hashing (local, dung cho test/benchmark offline)
+    FOOD_INDEX_BATCH_SIZE: int = 200  # So food doc tu DB moi batch khi index
+    FOOD_INDEX_SYNC_INTERVAL_SECONDS: int = 900  # Chu ky job dong bo index nen, 0 = tat
+
+    # LLM gateway: gioi han so call Gemini dong thoi + hang doi co gioi han
+    CHATBOT_LLM_BACKEND: str = "gemini"  # gemini | fake (load test, khong goi mang)
+    CHATBOT_LLM_MAX_CONCURRENCY: int = 16  # So call LLM dong thoi toi da trong 1 process
+    CHATBOT_LLM_PER_USER_CONCURRENCY: int = 2  # So call dang chay/cho toi da cua 1 user, vuot = 429
+    CHATBOT_LLM_MAX_QUEUE: int = 64  # So call cho slot toi da, vuot = 503 ngay
+    CHATBOT_LLM_QUEUE_TIMEOUT_SECONDS: float = 5.0  # Cho slot qua lau = 503
+    CHATBOT_LLM_MAX_RETRIES: int = 2  # So lan thu lai khi Gemini loi tam thoi (429/5xx)
+    CHATBOT_LLM_RETRY_BASE_SECONDS: float = 0.5  # Backoff = random(0, base * 2^attempt)
+
+    # Cache cau tra loi cho intent deterministic (tra cuu mon, goi y theo calo)
+    CHATBOT_RESPONSE_CACHE_SIZE: int = 2048  # So response toi da
+    CHATBOT_RESPONSE_CACHE_TTL_SECONDS: int = 21600  # Thoi gian song cua response
+    CHATBOT_RESPONSE_CACHE_SEMANTIC_THRESHOLD: float = 0.0  # Cosine toi thieu de hit theo nghia, 0 = tat (VD 0.92)
+
+    # Snapshot user (profile + goal + biometrics moi nhat) cho chatbot
+    USER_CONTEXT_CACHE_SIZE: int = 10000  # So user toi da giu trong memory
+    USER_CONTEXT_CACHE_TTL_SECONDS: int = 600  # Luoi an toan khi worker khac sua du lieu
+
+    # Do thoi gian tung stage cua chatbot (histogram xuat o /chatbot/metrics)
+    CHATBOT_DEBUG_TIMINGS: bool = False  # Gan timings tung stage vao response (chi bat khi debug)
+
+    # Blog: query DB sync chay tren thread pool rieng, khong chan event loop
+    BLOG_DB_EXECUTOR_WORKERS: int = 8  # So thread toi da (nen <= pool_size + max_overflow cua engine)
+    BLOG_DB_EXECUTOR_MAX_QUEUE: int = 128  # So call cho thread toi da, vuot = 503 ngay
+    BLOG_DB_EXECUTOR_QUEUE_TIMEOUT_SECONDS: float = 5.0  # Cho thread qua lau = 503
+    BLOG_FEED_COUNT_CACHE_TTL_SECONDS: int = 60  # total_count o cursor mode duoc cache bao lau (gan dung)
+    BLOG_FEED_PAGE_CACHE_TTL_SECONDS: int = 30  # Trang dau feed recent/trending khong filter, worker khac lech toi da chung nay, 0 = tat
+
+    # Blog: diem trending luu san (posts.trending_score), xem app/utils/trending.py
+    BLOG_TRENDING_DECAY_HOURS: float = 24.0  # Bai moi hon N gio chi can 1/10 tuong tac de dung ngang (doi = chay refresh toan bo)
+    BLOG_TRENDING_REFRESH_INTERVAL_SECONDS: int = 600  # Chu ky job tinh lai diem bai gan day, 0 = tat
+    BLOG_TRENDING_REFRESH_WINDOW_DAYS: int = 7  # Job chi tinh lai bai tao trong N ngay gan nhat
+    BLOG_TRENDING_VIEW_WEIGHT: float = 0.1  # 1 nguoi xem = N like trong diem trending, 0 = bo qua view (doi = chay refresh toan bo)
+
+    # Blog: delta like/save gom trong memory, ghi vao posts theo chu ky (xem blog_counters.py)
+    BLOG_COUNTER_FLUSH_INTERVAL_SECONDS: float = 2.0  # Chu ky ghi delta xuong DB (worker khac thay counter cham toi da chung nay)
+    BLOG_COUNTER_RECONCILE_INTERVAL_SECONDS: int = 3600  # Chu ky dem lai counter tu post_likes/post_saves, 0 = tat
+
+    # Blog: autocomplete hashtag trong memory (xem blog_hashtag_index.py)
+    BLOG_HASHTAG_USAGE_WINDOW_DAYS: int = 30  # Do pho bien = so bai dung hashtag trong N ngay gan nhat
+    BLOG_HASHTAG_INDEX_REFRESH_INTERVAL_SECONDS: int = 900  # Chu ky nap lai index (truot cua so, hashtag tu worker khac), 0 = tat
+
+    # Blog: dem nguoi xem khac nhau bang HyperLogLog, gom trong memory (xem blog_views.py)
+    BLOG_VIEW_FLUSH_INTERVAL_SECONDS: float = 30.0  # Chu ky merge sketch xuong post_view_sketches (view_count cham toi da chung nay)
+
     # Can cap nhat gia tri nay de phu hop voi frontend
     FRONTEND_URL: Optional[str] = "http://testUrl.com"  # URL frontend
     
@@ -24,6 +94,13 @@ class Settings(BaseSettings):
     IMAGEKIT_PRIVATE_KEY: Optional[str] = None
     IMAGEKIT_PUBLIC_KEY: Optional[str] = None
     IMAGEKIT_URL: Optional[str] = None
+    MEDIA_UPLOAD_WORKERS: int = 8  # So upload len ImageKit chay cung luc (ca process), moi upload giu 1 thread
+    MEDIA_UPLOAD_MAX_QUEUE: int = 32  # So upload cho thread toi da, vuot = 503 ngay
+    MEDIA_UPLOAD_QUEUE_TIMEOUT_SECONDS: float = 30.0  # Cho thread qua lau = 503
+    MEDIA_UPLOAD_BATCH_CONCURRENCY: int = 3  # So file upload song song trong 1 request upload-multiple
+    MEDIA_BLOB_UNUSED_GRACE_HOURS: float = 24.0  # File khong bai nao dung (ke ca upload xong chua dang) giu lai bao lau truoc khi xoa
+    MEDIA_BLOB_PURGE_INTERVAL_SECONDS: int = 3600  # Chu ky job xoa file khong dung tren ImageKit, 0 = tat
+    MEDIA_BLOB_PURGE_BATCH_SIZE: int = 100  # So file moi lan xoa hang loat
 
     SMTP_ENABLED: bool = True
     SMTP_SERVER: Optional[str] = "smtp.gmail.com"
@@ -7,6 +7,12 @@ from sqlalchemy import text
 
 from app.core.settings import settings
 from app.core.database import get_db, engine
+from app.core.background import PeriodicJob, stop_jobs
+from app.core.db_executor import get_blog_db_executor
+from app.services.blog_counters import flush_counters, reconcile_counters
+from app.services.blog_hashtag_index import refresh_hashtag_index
+from app.services.blog_views import flush_post_views
+from app.services.media_service import get_media_upload_executor, purge_unused_media
 
 # ==================== Import Routes ====================
 from app.api.routes import (
@@ -40,9 +46,72 @@ async def lifespan(app: FastAPI):
     Lifespan context manager để xử lý startup và shutdown events.
     Giúp đóng database connection pool một cách graceful khi server shutdown.
     """
-    # Startup
+    # Startup - các job nền định kỳ
+    jobs = []
+    if chatbot is not None and settings.FOOD_INDEX_SYNC_INTERVAL_SECONDS > 0:
+        from app.services.nutri_chatbot.food_index import sync_food_index
+        jobs.append(PeriodicJob(
+            "food_index_sync",
+            settings.FOOD_INDEX_SYNC_INTERVAL_SECONDS,
+            sync_food_index,
+            initial_delay=30
+        ))
+    if settings.BLOG_TRENDING_REFRESH_INTERVAL_SECONDS > 0:
+        from app.services.blog_service import refresh_trending_scores
+        jobs.append(PeriodicJob(
+            "blog_trending_refresh",
+            settings.BLOG_TRENDING_REFRESH_INTERVAL_SECONDS,
+            refresh_trending_scores,
+            initial_delay=60
+        ))
+    jobs.append(PeriodicJob(
+        "blog_counter_flush",
+        settings.BLOG_COUNTER_FLUSH_INTERVAL_SECONDS,
+        flush_counters
+    ))
+    jobs.append(PeriodicJob(
+        "blog_view_flush",
+        settings.BLOG_VIEW_FLUSH_INTERVAL_SECONDS,
+        flush_post_views
+    ))
+    if settings.BLOG_COUNTER_RECONCILE_INTERVAL_SECONDS > 0:
+        jobs.append(PeriodicJob(
+            "blog_counter_reconcile",
+            settings.BLOG_COUNTER_RECONCILE_INTERVAL_SECONDS,
+            reconcile_counters,
+            initial_delay=300
+        ))
+    if settings.BLOG_HASHTAG_INDEX_REFRESH_INTERVAL_SECONDS > 0:
+        jobs.append(PeriodicJob(
+            "blog_hashtag_index_refresh",
+            settings.BLOG_HASHTAG_INDEX_REFRESH_INTERVAL_SECONDS,
+            refresh_hashtag_index,
+            initial_delay=settings.BLOG_HASHTAG_INDEX_REFRESH_INTERVAL_SECONDS
+        ))
+    if settings.MEDIA_BLOB_PURGE_INTERVAL_SECONDS > 0:
+        jobs.append(PeriodicJob(
+            "media_blob_purge",
+            settings.MEDIA_BLOB_PURGE_INTERVAL_SECONDS,
+            purge_unused_media,
+            initial_delay=600
+        ))
+    for job in jobs:
+        job.start()
+    
     yield
-    # Shutdown - đóng database connection pool
+    
+    # Shutdown - dừng job nền, ghi nốt delta like/save + người xem, executor DB của blog + upload media, đóng database connection pool
+    await stop_jobs(jobs)
+    try:
+        flush_counters()
+    except Exception as e:
+        print(f"⚠️  Error flushing blog counters: {e}")
+    try:
+        flush_post_views()
+    except Exception as e:
+        print(f"⚠️  Error flushing blog post views: {e}")
+    get_blog_db_executor().shutdown(wait=False)
+    get_media_upload_executor().shutdown(wait=False)
     try:
         engine.dispose()
     except Exception as e:
@@ -49,8 +49,10 @@ from app.models.support import (
 from app.models.blog import (
     Post,
     PostMedia,
+    MediaBlob,
     PostLike,
     PostSave,
+    PostViewSketch,
     Hashtag,
     PostHashtag,
     MediaType
@@ -112,8 +114,10 @@ __all__ = [
     # Blog
     "Post",
     "PostMedia",
+    "MediaBlob",
     "PostLike",
     "PostSave",
+    "PostViewSketch",
     "Hashtag",
     "PostHashtag",
     "MediaType",
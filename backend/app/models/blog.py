@@ -4,8 +4,8 @@ import uuid
 from datetime import datetime, timezone
 from typing import Optional, List
 
-from sqlalchemy import String, Text, BigInteger, Integer, Index, ForeignKey, DateTime, CheckConstraint
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import String, Text, BigInteger, Integer, Float, LargeBinary, Index, ForeignKey, DateTime, CheckConstraint, FetchedValue, text
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy import Enum as SQLEnum
 
@@ -68,12 +68,38 @@ class Post(Base, TimestampMixin):
         comment="Số lượt lưu"
     )
     
+    view_count: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
+        comment="Số người xem khác nhau (ước lượng HyperLogLog, xem post_view_sketches)"
+    )
+    
+    trending_score: Mapped[float] = mapped_column(
+        Float,
+        nullable=False,
+        default=0.0,
+        server_default="0",
+        comment="Điểm trending có decay theo thời gian (app/utils/trending.py)"
+    )
+    
     deleted_at: Mapped[Optional[datetime]] = mapped_column(
         DateTime(timezone=True),
         nullable=True,
         comment="Soft delete timestamp" # Khoi phuc bai viet neu can
     )
     
+    # Cot generated (migration 008): PG tu tinh lai khi title/content_text doi, ORM khong ghi
+    search_vector: Mapped[Optional[str]] = mapped_column(
+        TSVECTOR().with_variant(Text(), "sqlite"),
+        nullable=True,
+        server_default=FetchedValue(),
+        server_onupdate=FetchedValue(),
+        deferred=True,
+        comment="tsvector cua title (weight A) + content_text (weight B) cho full-text search"
+    )
+    
     # Relationships
     user: Mapped["User"] = relationship(
         "User",
@@ -104,6 +130,16 @@ class Post(Base, TimestampMixin):
 
         # Feed theo trending - gan day: gioi han trong bao nhieu ngay
         Index("ix_posts_like_count_save_count_created_at", "like_count", "save_count", "created_at"),
+
+        # Feed trending: ORDER BY trending_score DESC, created_at DESC, id DESC = quet nguoc index
+        Index(
+            "ix_posts_trending_score_created_at_id",
+            "trending_score", "created_at", "id",
+            postgresql_where=text("deleted_at IS NULL")
+        ),
+
+        # Full-text search: WHERE search_vector @@ query
+        Index("ix_posts_search_vector", "search_vector", postgresql_using="gin"),
     )
 
     # Vi du query:
@@ -115,7 +151,7 @@ class Post(Base, TimestampMixin):
     # SELECT *
     # FROM posts
     # WHERE deleted_at IS NULL
-    # ORDER BY (like_count + save_count) DESC
+    # ORDER BY trending_score DESC, created_at DESC, id DESC
     # LIMIT 20;
 
 class PostMedia(Base):
@@ -198,6 +234,118 @@ class PostMedia(Base):
     )
 
 
+class MediaBlob(Base):
+    """Bảng media_blobs - File đã upload lên ImageKit, khử trùng lặp theo SHA-256 nội dung"""
+    __tablename__ = "media_blobs"
+    
+    sha256: Mapped[str] = mapped_column(
+        String(64),
+        primary_key=True,
+        comment="SHA-256 (hex) của nội dung file"
+    )
+    
+    url: Mapped[str] = mapped_column(
+        Text,
+        nullable=False,
+        unique=True,
+        comment="URL trên ImageKit (khớp post_media.url)"
+    )
+    
+    file_id: Mapped[str] = mapped_column(
+        Text,
+        nullable=False,
+        comment="ImageKit file ID (dùng để xóa)"
+    )
+    
+    file_name: Mapped[str] = mapped_column(
+        Text,
+        nullable=False,
+        comment="Tên file trên ImageKit"
+    )
+    
+    media_type: Mapped[MediaType] = mapped_column(
+        String(20),
+        nullable=False,
+        comment="Loại media: image/video"
+    )
+    
+    mime_type: Mapped[Optional[str]] = mapped_column(
+        Text,
+        nullable=True,
+        comment="MIME type (vd: image/jpeg)"
+    )
+    
+    width: Mapped[Optional[int]] = mapped_column(
+        Integer,
+        nullable=True,
+        comment="Chiều rộng (pixels)"
+    )
+    
+    height: Mapped[Optional[int]] = mapped_column(
+        Integer,
+        nullable=True,
+        comment="Chiều cao (pixels)"
+    )
+    
+    size_bytes: Mapped[int] = mapped_column(
+        BigInteger,
+        nullable=False,
+        comment="Kích thước file (bytes)"
+    )
+    
+    ref_count: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
+        comment="Số dòng post_media đang dùng url này"
+    )
+    
+    last_used_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+        comment="Lần cuối upload trùng / bỏ tham chiếu (tính thời gian chờ trước khi xóa)"
+    )
+    
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+        comment="Thời điểm upload"
+    )
+    
+    __table_args__ = (
+        # Job dọn file không còn bài nào dùng
+        Index("ix_media_blobs_unused", "last_used_at", postgresql_where=text("ref_count = 0")),
+    )
+
+
+class PostViewSketch(Base):
+    """Bảng post_view_sketches - Sketch HyperLogLog người xem của từng bài"""
+    __tablename__ = "post_view_sketches"
+    
+    post_id: Mapped[int] = mapped_column(
+        BigInteger,
+        ForeignKey("posts.id", ondelete="CASCADE"),
+        primary_key=True,
+        comment="FK tới posts.id"
+    )
+    
+    registers: Mapped[bytes] = mapped_column(
+        LargeBinary,
+        nullable=False,
+        comment="Thanh ghi HyperLogLog (app/utils/hyperloglog.py)"
+    )
+    
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+        comment="Lần merge gần nhất"
+    )
+
+
 class PostLike(Base):
     """Bảng post_likes - Lượt thích bài viết"""
     __tablename__ = "post_likes"
@@ -225,6 +373,8 @@ class PostLike(Base):
 
     __table_args__ = (
         Index("ix_post_likes_user_created", "user_id", "created_at"),
+        # Đếm lại like_count theo post (reconcile counter)
+        Index("ix_post_likes_post_id", "post_id"),
     )
 
 
@@ -255,6 +405,8 @@ class PostSave(Base):
 
     __table_args__ = (
         Index("ix_post_saves_user_created", "user_id", "created_at"),
+        # Đếm lại save_count theo post (reconcile counter)
+        Index("ix_post_saves_post_id", "post_id"),
     )
 
 
@@ -2,15 +2,27 @@
 Blog Repository - Data access layer cho Blog module.
 CRUD operations cho posts, media, likes, saves, hashtags.
 """
+import math
+import re
 import uuid
+from collections import Counter
 from datetime import datetime, timezone
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Dict, Any
 
-from sqlalchemy import select, delete, update, func, and_, or_, desc, asc
+from sqlalchemy import select, delete, update, func, and_, or_, desc, asc, tuple_, case, literal, union_all, cast, Float
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session, selectinload
 
-from app.models.blog import Post, PostMedia, PostLike, PostSave, Hashtag, PostHashtag
+from app.models.blog import Post, PostMedia, MediaBlob, PostLike, PostSave, PostViewSketch, Hashtag, PostHashtag
 from app.models.auth import User
+from app.utils.hyperloglog import HyperLogLog
+from app.utils.trending import trending_score
+
+
+def _non_negative(expr):
+    """Counter không bao giờ âm (GREATEST(expr, 0) chạy được trên mọi dialect)"""
+    return case((expr < 0, 0), else_=expr)
 
 
 class BlogRepository:
@@ -25,12 +37,15 @@ class BlogRepository:
         title: Optional[str] = None
     ) -> Post:
         """Tạo post mới (chưa có media/hashtags)"""
+        now = datetime.now(timezone.utc)
         post = Post(
             user_id=user_id,
             title=title,
             content_text=content_text,
             like_count=0,
-            save_count=0
+            save_count=0,
+            created_at=now,
+            trending_score=trending_score(0, 0, now)
         )
         db.add(post)
         db.flush()  # Để lấy post.id
@@ -104,12 +119,98 @@ class BlogRepository:
             db.add(media)
             result.append(media)
         db.flush()
+        BlogRepository._change_media_blob_refs(db, [m.url for m in result], 1)
         return result
     
     @staticmethod
     def delete_all_media_of_post(db: Session, post_id: int) -> None:
-        """Xóa tất cả media của post"""
-        db.execute(delete(PostMedia).where(PostMedia.post_id == post_id))
+        """Xóa tất cả media của post (giảm ref_count của media_blobs tương ứng)"""
+        urls = db.execute(
+            delete(PostMedia).where(PostMedia.post_id == post_id).returning(PostMedia.url)
+        ).scalars().all()
+        BlogRepository._change_media_blob_refs(db, urls, -1)
+    
+    # ==================== MEDIA BLOBS ====================
+    @staticmethod
+    def _change_media_blob_refs(db: Session, urls: List[str], sign: int) -> None:
+        """
+        Cộng / trừ ref_count theo url (url không có trong media_blobs - link ngoài,
+        file upload trước khi có bảng - được bỏ qua). Về 0 → tính lại last_used_at
+        để job dọn chờ đủ thời gian ân hạn.
+        """
+        # Gom url theo số lần xuất hiện → 1 UPDATE cho mỗi mức (thường chỉ 1)
+        by_times: Dict[int, List[str]] = {}
+        for url, times in Counter(urls).items():
+            by_times.setdefault(times, []).append(url)
+        now = datetime.now(timezone.utc)
+        for times, group in by_times.items():
+            if sign > 0:
+                values = {"ref_count": MediaBlob.ref_count + times}
+            else:
+                values = {
+                    "ref_count": case((MediaBlob.ref_count > times, MediaBlob.ref_count - times), else_=0),
+                    "last_used_at": case((MediaBlob.ref_count > times, MediaBlob.last_used_at), else_=now),
+                }
+            db.execute(
+                update(MediaBlob)
+                .where(MediaBlob.url.in_(group))
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+    
+    @staticmethod
+    def reuse_media_blob(db: Session, sha256: str) -> Optional[MediaBlob]:
+        """
+        Tìm file đã upload có cùng nội dung, đánh dấu vừa dùng (job dọn không xóa
+        trong thời gian ân hạn dù chưa bài nào gắn)
+        """
+        return db.execute(
+            update(MediaBlob)
+            .where(MediaBlob.sha256 == sha256)
+            .values(last_used_at=datetime.now(timezone.utc))
+            .returning(MediaBlob)
+            .execution_options(synchronize_session=False)
+        ).scalar_one_or_none()
+    
+    @staticmethod
+    def create_media_blob(db: Session, **values) -> Tuple[Optional[MediaBlob], bool]:
+        """
+        Ghi file vừa upload. Request khác đã ghi cùng sha256 trước (upload song song)
+        → trả về dòng đó, created = False.
+        """
+        dialect_insert = sqlite_insert if db.get_bind().dialect.name == "sqlite" else pg_insert
+        now = datetime.now(timezone.utc)
+        blob = db.execute(
+            dialect_insert(MediaBlob)
+            .values(ref_count=0, last_used_at=now, created_at=now, **values)
+            .on_conflict_do_nothing(index_elements=[MediaBlob.sha256])
+            .returning(MediaBlob)
+        ).scalar_one_or_none()
+        if blob is None:
+            return BlogRepository.reuse_media_blob(db, values["sha256"]), False
+        return blob, True
+    
+    @staticmethod
+    def delete_unused_media_blobs(db: Session, used_before: datetime, limit: int) -> List[str]:
+        """
+        Xóa tối đa `limit` dòng ref_count = 0 và không dùng từ trước `used_before`.
+        Điều kiện được kiểm tra lại trong chính câu DELETE → dòng vừa được gắn / upload
+        trùng song song không bị xóa. Trả về file_id cần xóa trên ImageKit.
+        """
+        unused = and_(MediaBlob.ref_count == 0, MediaBlob.last_used_at < used_before)
+        candidates = (
+            select(MediaBlob.sha256)
+            .where(unused)
+            .order_by(MediaBlob.last_used_at)
+            .limit(limit)
+            .scalar_subquery()
+        )
+        return list(db.execute(
+            delete(MediaBlob)
+            .where(MediaBlob.sha256.in_(candidates), unused)
+            .returning(MediaBlob.file_id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all())
     
     # ==================== HASHTAGS ====================
     @staticmethod
@@ -158,10 +259,19 @@ class BlogRepository:
         return name[:50] if name else ""
     
     @staticmethod
-    def set_post_hashtags(db: Session, post_id: int, hashtag_ids: List[int]) -> None:
-        """Set hashtags cho post (xóa cũ, thêm mới)"""
+    def set_post_hashtags(db: Session, post_id: int, hashtag_ids: List[int]) -> List[int]:
+        """
+        Set hashtags cho post (xóa cũ, thêm mới)
+        
+        Returns:
+            hashtag_ids trước khi set (để cập nhật index autocomplete theo chênh lệch)
+        """
         # Xóa cũ
-        db.execute(delete(PostHashtag).where(PostHashtag.post_id == post_id))
+        previous_ids = db.execute(
+            delete(PostHashtag)
+            .where(PostHashtag.post_id == post_id)
+            .returning(PostHashtag.hashtag_id)
+        ).scalars().all()
         
         # Thêm mới
         for h_id in hashtag_ids:
@@ -169,6 +279,7 @@ class BlogRepository:
             db.add(link)
         
         db.flush()
+        return list(previous_ids)
     
     @staticmethod
     def search_hashtags(db: Session, query: str, limit: int = 20) -> List[Hashtag]:
@@ -185,6 +296,25 @@ class BlogRepository:
         )
         return result.scalars().all()
     
+    @staticmethod
+    def get_hashtag_usage(db: Session, since: datetime) -> List[Tuple[int, str, int]]:
+        """
+        (id, name, số bài còn hiện dùng hashtag từ `since`) của mọi hashtag - nạp index autocomplete.
+        Hashtag không được dùng gần đây vẫn có mặt với count 0.
+        """
+        usage = (
+            select(PostHashtag.hashtag_id, func.count().label("uses"))
+            .join(Post, Post.id == PostHashtag.post_id)
+            .where(Post.deleted_at.is_(None), PostHashtag.created_at >= since)
+            .group_by(PostHashtag.hashtag_id)
+            .subquery()
+        )
+        rows = db.execute(
+            select(Hashtag.id, Hashtag.name, func.coalesce(usage.c.uses, 0))
+            .outerjoin(usage, usage.c.hashtag_id == Hashtag.id)
+        ).all()
+        return [tuple(row) for row in rows]
+    
     @staticmethod
     def get_hashtag_by_name(db: Session, name: str) -> Optional[Hashtag]:
         """Lấy hashtag theo tên"""
@@ -192,35 +322,218 @@ class BlogRepository:
         result = db.execute(select(Hashtag).where(Hashtag.name == normalized))
         return result.scalar_one_or_none()
     
-    # ==================== LIKES ====================
+    # ==================== COUNTERS / TRENDING ====================
     @staticmethod
-    def add_like(db: Session, user_id: uuid.UUID, post_id: int) -> bool:
+    def apply_counter_deltas(db: Session, deltas: Dict[int, Tuple[int, int]]) -> List[int]:
         """
-        Thêm like. Trả về True nếu like mới, False nếu đã like.
+        Cộng dồn delta (like, save) vào posts và tính lại trending_score (chưa commit).
+        Update theo thứ tự post_id để các worker flush song song không deadlock.
+        
+        Args:
+            deltas: post_id → (like_delta, save_delta)
+        
+        Returns:
+            Danh sách post_id đã cập nhật (post bị xóa hẳn thì bỏ qua)
         """
-        # Check existing
-        existing = db.execute(
-            select(PostLike).where(
-                PostLike.user_id == user_id,
-                PostLike.post_id == post_id
+        scores = []
+        for post_id in sorted(deltas):
+            like_delta, save_delta = deltas[post_id]
+            row = db.execute(
+                update(Post)
+                .where(Post.id == post_id)
+                .values(
+                    like_count=_non_negative(Post.like_count + like_delta),
+                    save_count=_non_negative(Post.save_count + save_delta)
+                )
+                .returning(Post.like_count, Post.save_count, Post.created_at, Post.view_count)
+            ).one_or_none()
+            if row is not None:
+                score = trending_score(row.like_count, row.save_count, row.created_at, view_count=row.view_count)
+                scores.append({"id": post_id, "trending_score": score})
+        
+        if scores:
+            # Bulk UPDATE theo primary key (executemany)
+            db.execute(update(Post), scores)
+        return [s["id"] for s in scores]
+    
+    @staticmethod
+    def get_counter_rows(db: Session, after_id: int = 0, limit: int = 500) -> list:
+        """(id, like_count, save_count, created_at, view_count) của post theo id tăng dần, dùng khi reconcile"""
+        return db.execute(
+            select(Post.id, Post.like_count, Post.save_count, Post.created_at, Post.view_count)
+            .where(Post.id > after_id)
+            .order_by(Post.id)
+            .limit(limit)
+        ).all()
+    
+    @staticmethod
+    def count_interactions(db: Session, post_ids: List[int]) -> Tuple[Dict[int, int], Dict[int, int]]:
+        """Số like / save thật trong post_likes, post_saves theo post_id"""
+        if not post_ids:
+            return {}, {}
+        likes = db.execute(
+            select(PostLike.post_id, func.count())
+            .where(PostLike.post_id.in_(post_ids))
+            .group_by(PostLike.post_id)
+        ).all()
+        saves = db.execute(
+            select(PostSave.post_id, func.count())
+            .where(PostSave.post_id.in_(post_ids))
+            .group_by(PostSave.post_id)
+        ).all()
+        return dict(likes), dict(saves)
+    
+    @staticmethod
+    def set_counters(db: Session, changes: List[Dict[str, Any]]) -> None:
+        """Ghi đè like_count/save_count/trending_score theo post id (bulk, chưa commit)"""
+        if changes:
+            db.execute(update(Post), changes)
+    
+    @staticmethod
+    def refresh_trending_scores(
+        db: Session,
+        created_after: Optional[datetime] = None,
+        batch_size: int = 500
+    ) -> int:
+        """
+        Tính lại trending_score theo batch (keyset theo id), commit sau mỗi batch.
+        Chỉ ghi những post có điểm thay đổi.
+        
+        Args:
+            created_after: Chỉ xét post tạo sau mốc này, None = toàn bộ (VD sau khi đổi decay)
+        
+        Returns:
+            Số post đã cập nhật
+        """
+        updated = 0
+        last_id = 0
+        while True:
+            query = (
+                select(
+                    Post.id, Post.like_count, Post.save_count, Post.created_at, Post.view_count,
+                    Post.trending_score
+                )
+                .where(Post.deleted_at.is_(None), Post.id > last_id)
+                .order_by(Post.id)
+                .limit(batch_size)
             )
-        ).scalar_one_or_none()
+            if created_after is not None:
+                query = query.where(Post.created_at >= created_after)
+            
+            rows = db.execute(query).all()
+            if not rows:
+                return updated
+            last_id = rows[-1].id
+            
+            changes = []
+            for row in rows:
+                score = trending_score(row.like_count, row.save_count, row.created_at, view_count=row.view_count)
+                if not math.isclose(score, row.trending_score, rel_tol=0, abs_tol=1e-9):
+                    changes.append({"id": row.id, "trending_score": score})
+            
+            if changes:
+                # Bulk UPDATE theo primary key (executemany)
+                db.execute(update(Post), changes)
+                db.commit()
+                updated += len(changes)
+    
+    @staticmethod
+    def merge_view_sketches(db: Session, sketches: Dict[int, HyperLogLog]) -> List[int]:
+        """
+        Gộp sketch người xem vào post_view_sketches, cập nhật posts.view_count và
+        trending_score của bài có ước lượng thay đổi (chưa commit).
+        Khóa dòng sketch theo thứ tự post_id (SELECT ... FOR UPDATE) → worker khác
+        merge cùng bài phải chờ, không ghi đè lẫn nhau.
         
-        if existing:
-            return False
+        Args:
+            sketches: post_id → sketch người xem mới (post bị xóa hẳn thì bỏ qua)
         
-        like = PostLike(user_id=user_id, post_id=post_id)
-        db.add(like)
+        Returns:
+            Danh sách post_id có view_count thay đổi
+        """
+        post_ids = sorted(sketches)
+        if not post_ids:
+            return []
+        existing = set(db.execute(select(Post.id).where(Post.id.in_(post_ids))).scalars())
+        post_ids = [post_id for post_id in post_ids if post_id in existing]
+        if not post_ids:
+            return []
         
-        # Update counter
+        now = datetime.now(timezone.utc)
+        dialect_insert = sqlite_insert if db.get_bind().dialect.name == "sqlite" else pg_insert
         db.execute(
-            update(Post)
-            .where(Post.id == post_id)
-            .values(like_count=Post.like_count + 1)
+            dialect_insert(PostViewSketch)
+            .values([
+                {"post_id": post_id, "registers": HyperLogLog(sketches[post_id].precision).to_bytes(), "updated_at": now}
+                for post_id in post_ids
+            ])
+            .on_conflict_do_nothing()
         )
-        
-        db.flush()
-        return True
+        rows = db.execute(
+            select(PostViewSketch.post_id, PostViewSketch.registers)
+            .where(PostViewSketch.post_id.in_(post_ids))
+            .order_by(PostViewSketch.post_id)
+            .with_for_update()
+        ).all()
+        
+        merged_rows, counts = [], {}
+        for post_id, registers in rows:
+            sketch = sketches[post_id]
+            merged = HyperLogLog.from_bytes(registers, sketch.precision)
+            if merged.merge(sketch):
+                merged_rows.append({"post_id": post_id, "registers": merged.to_bytes(), "updated_at": now})
+                counts[post_id] = merged.count()
+        if not merged_rows:
+            return []
+        # Bulk UPDATE theo primary key (executemany)
+        db.execute(update(PostViewSketch), merged_rows)
+        
+        changes = []
+        for row in db.execute(
+            select(Post.id, Post.like_count, Post.save_count, Post.created_at, Post.view_count)
+            .where(Post.id.in_(counts))
+        ):
+            view_count = counts[row.id]
+            if view_count != row.view_count:
+                changes.append({
+                    "id": row.id,
+                    "view_count": view_count,
+                    "trending_score": trending_score(
+                        row.like_count, row.save_count, row.created_at, view_count=view_count
+                    ),
+                })
+        if changes:
+            db.execute(update(Post), changes)
+        return [c["id"] for c in changes]
+    
+    # ==================== LIKES / SAVES ====================
+    # Chỉ ghi membership (1 câu INSERT ... ON CONFLICT DO NOTHING / DELETE), không đụng
+    # dòng posts → không tranh row lock trên bài hot. Delta counter do BlogCounterBuffer gom lại.
+    @staticmethod
+    def post_exists(db: Session, post_id: int) -> bool:
+        """Post tồn tại và chưa bị xóa (không load relationships)"""
+        return db.execute(
+            select(Post.id).where(Post.id == post_id, Post.deleted_at.is_(None))
+        ).first() is not None
+    
+    @staticmethod
+    def _insert_ignore(db: Session, model, **values) -> bool:
+        """INSERT ... ON CONFLICT DO NOTHING RETURNING - True nếu thật sự chèn dòng mới"""
+        dialect_insert = sqlite_insert if db.get_bind().dialect.name == "sqlite" else pg_insert
+        stmt = (
+            dialect_insert(model)
+            .values(**values)
+            .on_conflict_do_nothing()
+            .returning(model.post_id)
+        )
+        return db.execute(stmt).first() is not None
+    
+    @staticmethod
+    def add_like(db: Session, user_id: uuid.UUID, post_id: int) -> bool:
+        """
+        Thêm like. Trả về True nếu like mới, False nếu đã like.
+        """
+        return BlogRepository._insert_ignore(db, PostLike, user_id=user_id, post_id=post_id)
     
     @staticmethod
     def remove_like(db: Session, user_id: uuid.UUID, post_id: int) -> bool:
@@ -233,17 +546,7 @@ class BlogRepository:
                 PostLike.post_id == post_id
             )
         )
-        
-        if result.rowcount > 0:
-            # Update counter
-            db.execute(
-                update(Post)
-                .where(Post.id == post_id)
-                .values(like_count=func.greatest(Post.like_count - 1, 0))
-            )
-            db.flush()
-            return True
-        return False
+        return result.rowcount > 0
     
     @staticmethod
     def is_liked(db: Session, user_id: uuid.UUID, post_id: int) -> bool:
@@ -256,32 +559,10 @@ class BlogRepository:
         )
         return result.scalar_one_or_none() is not None
     
-    # ==================== SAVES ====================
     @staticmethod
     def add_save(db: Session, user_id: uuid.UUID, post_id: int) -> bool:
         """Thêm save. Trả về True nếu save mới."""
-        existing = db.execute(
-            select(PostSave).where(
-                PostSave.user_id == user_id,
-                PostSave.post_id == post_id
-            )
-        ).scalar_one_or_none()
-        
-        if existing:
-            return False
-        
-        save = PostSave(user_id=user_id, post_id=post_id)
-        db.add(save)
-        
-        # Update counter
-        db.execute(
-            update(Post)
-            .where(Post.id == post_id)
-            .values(save_count=Post.save_count + 1)
-        )
-        
-        db.flush()
-        return True
+        return BlogRepository._insert_ignore(db, PostSave, user_id=user_id, post_id=post_id)
     
     @staticmethod
     def remove_save(db: Session, user_id: uuid.UUID, post_id: int) -> bool:
@@ -292,16 +573,7 @@ class BlogRepository:
                 PostSave.post_id == post_id
             )
         )
-        
-        if result.rowcount > 0:
-            db.execute(
-                update(Post)
-                .where(Post.id == post_id)
-                .values(save_count=func.greatest(Post.save_count - 1, 0))
-            )
-            db.flush()
-            return True
-        return False
+        return result.rowcount > 0
     
     @staticmethod
     def is_saved(db: Session, user_id: uuid.UUID, post_id: int) -> bool:
@@ -315,6 +587,76 @@ class BlogRepository:
         return result.scalar_one_or_none() is not None
     
     # ==================== FEED QUERIES ====================
+    @staticmethod
+    def feed_order_columns(sort: str) -> list:
+        """
+        Cột sắp xếp (DESC) của feed, cột cuối luôn là Post.id để thứ tự duy nhất.
+        Dùng chung cho ORDER BY và keyset.
+        """
+        if sort == "trending":
+            # Khớp index ix_posts_trending_score_created_at_id
+            return [Post.trending_score, Post.created_at, Post.id]
+        return [Post.created_at, Post.id]
+    
+    @staticmethod
+    def feed_sort_key(post: Post, sort: str) -> tuple:
+        """Giá trị các cột sắp xếp của 1 post (để tạo cursor trang sau)"""
+        if sort == "trending":
+            return (post.trending_score, post.created_at, post.id)
+        return (post.created_at, post.id)
+    
+    @staticmethod
+    def _apply_feed_filters(
+        query,
+        user_id: uuid.UUID,
+        hashtag: Optional[str] = None,
+        author_id: Optional[uuid.UUID] = None,
+        saved_only: bool = False
+    ):
+        """Filter hashtag / author / saved, dùng chung cho feed, count và keyset"""
+        query = query.where(Post.deleted_at.is_(None))
+        
+        # Filter: hashtag
+        if hashtag:
+            normalized_hashtag = BlogRepository._normalize_hashtag(hashtag)
+            query = query.join(PostHashtag).join(Hashtag).where(
+                Hashtag.name == normalized_hashtag
+            )
+        
+        # Filter: author
+        if author_id:
+            query = query.where(Post.user_id == author_id)
+        
+        # Filter: saved only
+        if saved_only:
+            query = query.join(PostSave).where(PostSave.user_id == user_id)
+        
+        return query
+    
+    @staticmethod
+    def _feed_select():
+        """select(Post) kèm eager loading cho feed"""
+        return select(Post).options(
+            selectinload(Post.media),
+            selectinload(Post.hashtags),
+            selectinload(Post.user).selectinload(User.profile)
+        )
+    
+    @staticmethod
+    def count_feed(
+        db: Session,
+        user_id: uuid.UUID,
+        hashtag: Optional[str] = None,
+        author_id: Optional[uuid.UUID] = None,
+        saved_only: bool = False
+    ) -> int:
+        """Đếm tổng số bài viết khớp filter (COUNT(*) - tốn kém với feed lớn)"""
+        base_query = BlogRepository._apply_feed_filters(
+            select(Post.id), user_id, hashtag, author_id, saved_only
+        )
+        count_query = select(func.count()).select_from(base_query.subquery())
+        return db.execute(count_query).scalar() or 0
+    
     @staticmethod
     def get_feed(
         db: Session,
@@ -327,7 +669,7 @@ class BlogRepository:
         page: int = 1
     ) -> Tuple[List[Post], int]:
         """
-        Lấy feed với filters và offset/limit pagination.
+        Lấy feed với filters và offset/limit pagination (page mode).
         
         Args:
             sort: "recent" hoặc "trending"
@@ -340,56 +682,17 @@ class BlogRepository:
         Returns:
             (posts, total_count) - danh sách posts và tổng số bài viết
         """
-        # Base query cho đếm tổng
-        base_query = select(Post).where(Post.deleted_at.is_(None))
+        # Đếm tổng số bài viết (cho pagination info)
+        total_count = BlogRepository.count_feed(db, user_id, hashtag, author_id, saved_only)
         
-        # Query lấy dữ liệu với eager loading
-        query = (
-            select(Post)
-            .options(
-                selectinload(Post.media),
-                selectinload(Post.hashtags),
-                selectinload(Post.user).selectinload(User.profile)
-            )
-            .where(Post.deleted_at.is_(None))
+        query = BlogRepository._apply_feed_filters(
+            BlogRepository._feed_select(), user_id, hashtag, author_id, saved_only
         )
         
-        # Filter: hashtag
-        if hashtag:
-            normalized_hashtag = BlogRepository._normalize_hashtag(hashtag)
-            query = query.join(PostHashtag).join(Hashtag).where(
-                Hashtag.name == normalized_hashtag
-            )
-        
-        # Filter: author
-        if author_id:
-            query = query.where(Post.user_id == author_id)
-            base_query = base_query.where(Post.user_id == author_id)
-        
-        # Filter: saved only
-        if saved_only:
-            query = query.join(PostSave).where(PostSave.user_id == user_id)
-            base_query = base_query.join(PostSave).where(PostSave.user_id == user_id)
-        
-        # Filter: hashtag (áp dụng cho cả count query)
-        if hashtag:
-            normalized_hashtag = BlogRepository._normalize_hashtag(hashtag)
-            base_query = base_query.join(PostHashtag).join(Hashtag).where(
-                Hashtag.name == normalized_hashtag
-            )
-        
-        # Đếm tổng số bài viết (cho pagination info)
-        count_query = select(func.count()).select_from(base_query.subquery())
-        total_count = db.execute(count_query).scalar() or 0
-        
         # Sorting - luôn áp dụng ORDER BY trước OFFSET/LIMIT
-        if sort == "trending":
-            # Trending: (like_count + save_count) DESC, sau đó created_at DESC
-            score_expr = Post.like_count + Post.save_count
-            query = query.order_by(score_expr.desc(), Post.created_at.desc(), Post.id.desc())
-        else:
-            # Recent: created_at DESC (mới nhất trước)
-            query = query.order_by(Post.created_at.desc(), Post.id.desc())
+        # Recent: created_at DESC, id DESC
+        # Trending: trending_score DESC, sau đó created_at DESC, id DESC
+        query = query.order_by(*[c.desc() for c in BlogRepository.feed_order_columns(sort)])
         
         # Offset/Limit pagination
         # page=1 → offset=0, page=2 → offset=15, page=3 → offset=30...
@@ -401,6 +704,116 @@ class BlogRepository:
         
         return posts, total_count
     
+    @staticmethod
+    def get_feed_after(
+        db: Session,
+        user_id: uuid.UUID,
+        sort: str = "recent",
+        hashtag: Optional[str] = None,
+        author_id: Optional[uuid.UUID] = None,
+        saved_only: bool = False,
+        limit: int = 15,
+        after: Optional[tuple] = None
+    ) -> Tuple[List[Post], bool]:
+        """
+        Lấy feed theo keyset (cursor mode): các post đứng sau `after` theo thứ tự feed.
+        Không COUNT, không OFFSET → chi phí như nhau ở mọi độ sâu.
+        
+        Args:
+            after: feed_sort_key của post cuối trang trước, None = trang đầu
+        
+        Returns:
+            (posts, has_more) - tối đa `limit` posts và còn trang sau không
+        """
+        query = BlogRepository._apply_feed_filters(
+            BlogRepository._feed_select(), user_id, hashtag, author_id, saved_only
+        )
+        
+        columns = BlogRepository.feed_order_columns(sort)
+        if after is not None:
+            # ORDER BY toàn DESC → (a, b, c) < (a0, b0, c0) là "đứng sau" theo row comparison
+            query = query.where(tuple_(*columns) < tuple_(*after))
+        
+        query = query.order_by(*[c.desc() for c in columns]).limit(limit + 1)  # Lấy thêm 1 để check trang sau
+        
+        posts = list(db.execute(query).scalars().all())
+        has_more = len(posts) > limit
+        return posts[:limit], has_more
+    
+    # ==================== SEARCH ====================
+    # Số từ khóa tối đa mỗi lần tìm
+    SEARCH_MAX_TERMS = 8
+    
+    @staticmethod
+    def search_terms(text_query: str) -> List[str]:
+        """Tách từ khóa (lowercase, bỏ trùng, giữ dấu tiếng Việt)"""
+        terms: List[str] = []
+        for term in re.findall(r"\w+", text_query.lower()):
+            if term not in terms:
+                terms.append(term)
+        return terms[:BlogRepository.SEARCH_MAX_TERMS]
+    
+    @staticmethod
+    def _search_match(db: Session, terms: List[str]):
+        """
+        (điều kiện khớp, điểm rank) cho danh sách từ khóa - bài phải chứa đủ mọi từ.
+        
+        PostgreSQL: posts.search_vector @@ plainto_tsquery, rank = ts_rank_cd (title nặng hơn body).
+        Dialect khác (SQLite trong test): ILIKE từng từ, title khớp 1 điểm, body khớp 0.5.
+        """
+        if db.get_bind().dialect.name == "postgresql":
+            ts_query = func.plainto_tsquery("simple", " ".join(terms))
+            # Ép float8 để giá trị trong cursor so sánh lại chính xác (ts_rank_cd trả float4)
+            rank = cast(func.ts_rank_cd(Post.search_vector, ts_query, 1), Float)
+            return Post.search_vector.op("@@")(ts_query), rank
+        
+        condition = and_(*[
+            or_(Post.title.icontains(t, autoescape=True), Post.content_text.icontains(t, autoescape=True))
+            for t in terms
+        ])
+        rank = sum(
+            case((Post.title.icontains(t, autoescape=True), 1.0), else_=0.0)
+            + case((Post.content_text.icontains(t, autoescape=True), 0.5), else_=0.0)
+            for t in terms
+        )
+        return condition, cast(rank, Float)
+    
+    @staticmethod
+    def search_posts(
+        db: Session,
+        terms: List[str],
+        hashtag: Optional[str] = None,
+        author_id: Optional[uuid.UUID] = None,
+        limit: int = 15,
+        after: Optional[tuple] = None
+    ) -> Tuple[List[Tuple[Post, float]], bool]:
+        """
+        Tìm bài theo nội dung (title + content_text), kết hợp filter hashtag / author trong 1 query.
+        Sắp xếp (rank, created_at, id) DESC, phân trang keyset như get_feed_after.
+        
+        Args:
+            terms: Kết quả search_terms(), không rỗng
+            after: (rank, created_at, id) của bài cuối trang trước, None = trang đầu
+        
+        Returns:
+            ([(post, rank)], has_more)
+        """
+        condition, rank = BlogRepository._search_match(db, terms)
+        query = BlogRepository._apply_feed_filters(
+            BlogRepository._feed_select().add_columns(rank.label("rank")).where(condition),
+            user_id=None, hashtag=hashtag, author_id=author_id
+        )
+        
+        columns = [rank, Post.created_at, Post.id]
+        if after is not None:
+            query = query.where(tuple_(*columns) < tuple_(*after))
+        
+        query = query.order_by(*[c.desc() for c in columns]).limit(limit + 1)
+        
+        rows = [(post, float(score)) for post, score in db.execute(query).all()]
+        has_more = len(rows) > limit
+        return rows[:limit], has_more
+    
     @staticmethod
     def get_user_interactions(
         db: Session,
@@ -408,26 +821,22 @@ class BlogRepository:
         post_ids: List[int]
     ) -> Tuple[set, set]:
         """
-        Lấy liked_ids và saved_ids của user cho list post_ids.
+        Lấy liked_ids và saved_ids của user cho list post_ids (1 query UNION ALL).
         Returns: (liked_ids_set, saved_ids_set)
         """
         if not post_ids:
             return set(), set()
         
-        # Liked
-        liked = db.execute(
-            select(PostLike.post_id).where(
-                PostLike.user_id == user_id,
-                PostLike.post_id.in_(post_ids)
-            )
-        ).scalars().all()
-        
-        # Saved
-        saved = db.execute(
-            select(PostSave.post_id).where(
-                PostSave.user_id == user_id,
-                PostSave.post_id.in_(post_ids)
-            )
-        ).scalars().all()
+        liked = select(literal("like").label("kind"), PostLike.post_id).where(
+            PostLike.user_id == user_id,
+            PostLike.post_id.in_(post_ids)
+        )
+        saved = select(literal("save").label("kind"), PostSave.post_id).where(
+            PostSave.user_id == user_id,
+            PostSave.post_id.in_(post_ids)
+        )
         
-        return set(liked), set(saved)
\ No newline at end of file
+        liked_ids, saved_ids = set(), set()
+        for kind, post_id in db.execute(union_all(liked, saved)).all():
+            (liked_ids if kind == "like" else saved_ids).add(post_id)
+        return liked_ids, saved_ids
\ No newline at end of file
@@ -43,6 +43,7 @@ class TopPostItem(BaseModel):
     like_count: int
     save_count: int
     total_engagement: int = Field(..., description="like_count + save_count")
+    view_count: int = Field(0, description="Số người xem khác nhau (gần đúng)")
     created_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
@@ -54,10 +55,12 @@ class BlogStatsResponse(BaseModel):
     posts_in_range: int = Field(..., description="Số bài viết trong khoảng thời gian")
     total_likes: int = Field(..., description="Tổng số lượt thích")
     total_saves: int = Field(..., description="Tổng số lượt lưu")
+    total_views: int = Field(0, description="Tổng người xem khác nhau của các bài (cộng theo bài, gần đúng)")
     top_liked_posts: List[TopPostItem] = Field(default_factory=list, description="Top N bài được thích nhiều nhất")
     top_saved_posts: List[TopPostItem] = Field(default_factory=list, description="Top N bài được lưu nhiều nhất")
     top_engagement_posts: List[TopPostItem] = Field(default_factory=list, description="Top N bài có tổng tương tác cao nhất")
     trending_posts: List[TopPostItem] = Field(default_factory=list, description="Top N bài trending gần đây")
+    top_viewed_posts: List[TopPostItem] = Field(default_factory=list, description="Top N bài có nhiều người xem nhất")
 
 
 class StreakUserItem(BaseModel):
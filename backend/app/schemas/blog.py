@@ -124,6 +124,7 @@ class PostDetail(BaseModel):
     content_text: str = Field(..., description="Nội dung text")
     like_count: int = Field(..., ge=0, description="Số lượt thích")
     save_count: int = Field(..., ge=0, description="Số lượt lưu")
+    view_count: int = Field(0, ge=0, description="Số người xem khác nhau (gần đúng, cập nhật theo chu kỳ)")
     created_at: datetime = Field(..., description="Thời điểm tạo")
     updated_at: Optional[datetime] = Field(None, description="Thời điểm cập nhật")
     media: List[PostMediaOut] = Field(..., description="Danh sách media")
@@ -144,14 +145,17 @@ class FeedItem(PostDetail):
 
 class FeedResponse(BaseModel):
     """
-    Response cho GET /feed - Offset/Limit pagination.
+    Response cho GET /feed.
+    - Cursor mode (mặc định): dùng next_cursor để lấy trang sau, total_count chỉ có khi include_total (cache, gần đúng)
+    - Page mode (có `page`): Offset/Limit pagination, total_count chính xác
     """
     items: List[FeedItem] = Field(..., description="Danh sách bài viết")
-    page: int = Field(..., description="Trang hiện tại (bắt đầu từ 1)")
     limit: int = Field(..., description="Số lượng items mỗi trang")
-    total_count: int = Field(..., description="Tổng số bài viết")
-    total_pages: int = Field(..., description="Tổng số trang")
     has_next: bool = Field(..., description="Còn trang tiếp theo không")
+    next_cursor: Optional[str] = Field(None, description="Cursor của trang sau (cursor mode), None = hết")
+    page: Optional[int] = Field(None, description="Trang hiện tại, bắt đầu từ 1 (page mode)")
+    total_count: Optional[int] = Field(None, description="Tổng số bài viết (cursor mode: giá trị cache, có thể lệch)")
+    total_pages: Optional[int] = Field(None, description="Tổng số trang (page mode)")
 
 
 # ==================== Hashtag Schemas ====================
@@ -176,7 +180,9 @@ class FeedQueryParams(BaseModel):
     author_id: Optional[uuid.UUID] = Field(None, description="Lọc theo tác giả")
     saved: Optional[bool] = Field(None, description="Chỉ lấy bài đã lưu")
     limit: int = Field(15, ge=1, le=100, description="Số lượng items mỗi trang")
-    page: int = Field(1, ge=1, description="Số trang (bắt đầu từ 1)")
+    cursor: Optional[str] = Field(None, description="next_cursor của trang trước (cursor mode)")
+    page: Optional[int] = Field(None, ge=1, description="Số trang, bắt đầu từ 1 (page mode)")
+    include_total: bool = Field(False, description="Kèm total_count (cache) ở cursor mode")
 
 
 # ==================== Media Upload Schemas ====================
@@ -191,6 +197,7 @@ class MediaUploadResponse(BaseModel):
     height: Optional[int] = Field(None, description="Chiều cao (pixels) - chỉ có với ảnh")
     size_bytes: int = Field(..., description="Kích thước file (bytes)")
     sort_order: int = Field(0, description="Thứ tự sắp xếp (khi upload nhiều file)")
+    deduplicated: bool = Field(False, description="True nếu nội dung đã được upload trước đó → dùng lại file cũ")
 
 
 class MultipleMediaUploadResponse(BaseModel):
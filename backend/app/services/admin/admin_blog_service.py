@@ -11,6 +11,8 @@ import uuid
 
 from app.models.auth import User
 from app.models.blog import Post
+from app.services.blog_feed_cache import get_feed_page_cache
+from app.services.blog_hashtag_index import get_hashtag_index
 
 class AdminBlogService:
     """Service xử lý Blog Management"""
@@ -67,12 +69,16 @@ class AdminBlogService:
         if post.deleted_at:
             raise HTTPException(status_code=400, detail="Post already deleted")
         
+        tag_ids = [h.id for h in post.hashtags]
         post.deleted_at = datetime.now(timezone.utc)
         post.updated_at = datetime.now(timezone.utc)
         
         # TODO: Log action
         
         db.commit()
+        get_hashtag_index().record_post_hashtags([], tag_ids)
+        # Bài bị gỡ phải biến mất khỏi trang đầu feed ngay
+        get_feed_page_cache().invalidate()
         db.refresh(post)
         
         return post
\ No newline at end of file
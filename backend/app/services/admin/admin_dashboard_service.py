@@ -192,6 +192,7 @@ class AdminDashboardService:
             like_count=post.like_count,
             save_count=post.save_count,
             total_engagement=post.like_count + post.save_count,
+            view_count=post.view_count,
             created_at=post.created_at
         )
 
@@ -222,6 +223,11 @@ class AdminDashboardService:
         # Tổng saves
         total_saves = db.query(func.count(PostSave.post_id)).scalar() or 0
         
+        # Tổng người xem (posts.view_count - ước lượng HyperLogLog theo bài)
+        total_views = db.query(func.sum(Post.view_count)).filter(
+            Post.deleted_at.is_(None)
+        ).scalar() or 0
+        
         # Base query cho posts
         base_query = (
             db.query(Post)
@@ -246,16 +252,20 @@ class AdminDashboardService:
             limit=top_n
         )
         
+        # Top viewed posts
+        top_viewed_posts = AdminDashboardService._get_top_posts(base_query, order_by=desc(Post.view_count), limit=top_n)
         
         return BlogStatsResponse(
             total_posts=total_posts,
             posts_in_range=posts_in_range,
             total_likes=total_likes,
             total_saves=total_saves,
+            total_views=total_views,
             top_liked_posts=top_liked_posts,
             top_saved_posts=top_saved_posts,
             top_engagement_posts=top_engagement_posts,
-            trending_posts=trending_posts
+            trending_posts=trending_posts,
+            top_viewed_posts=top_viewed_posts
         )
     
     @staticmethod
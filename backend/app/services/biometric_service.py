@@ -20,6 +20,7 @@ from app.schemas.biometric import (
     BiometricsPatchRequest,
     BiometricsLogResponse
 )
+from app.services.user_context_service import UserContextService
 from app.utils.timezone import local_date_to_utc_range
 
 
@@ -144,6 +145,9 @@ class BiometricService:
         db.commit()
         db.refresh(db_log)
         
+        # Biometrics mới nhất có thể đã đổi → snapshot chatbot cũ
+        UserContextService.invalidate(user_id)
+        
         return db_log
 
     @staticmethod
@@ -301,6 +305,8 @@ class BiometricService:
         db.commit()
         db.refresh(db_log)
         
+        UserContextService.invalidate(user_id)
+        
         return db_log
 
     @staticmethod
@@ -324,6 +330,8 @@ class BiometricService:
         
         db.delete(db_log)
         db.commit()
+        
+        UserContextService.invalidate(user_id)
 
     @staticmethod
     def get_summary(db, user_id, from_date, to_date):
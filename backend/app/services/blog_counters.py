@@ -0,0 +1,169 @@
+"""
+Blog Counters - Gom delta like/save trong memory rồi ghi vào posts theo chu kỳ.
+
+Like/save chỉ ghi membership (post_likes / post_saves) trong request. Delta counter
+được cộng vào buffer của process, job `flush_counters` định kỳ cộng dồn vào posts
+(1 UPDATE / bài / chu kỳ thay vì 1 UPDATE / lượt like) và tính lại trending_score.
+
+- Đọc post (detail / feed) cộng thêm delta đang chờ của process → thấy ngay kết quả
+- Flush lỗi → delta được trả lại buffer, lần sau ghi tiếp
+- `reconcile_counters` đếm lại từ post_likes / post_saves để sửa lệch (VD process chết
+  khi còn delta chưa flush)
+- Counter đổi → xóa trang feed đã cache có bài đó (blog_feed_cache)
+"""
+import logging
+import threading
+from typing import Dict, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.repositories.blog_repository import BlogRepository
+from app.services.blog_feed_cache import get_feed_page_cache
+from app.utils.trending import trending_score
+
+
+logger = logging.getLogger(__name__)
+
+
+class BlogCounterBuffer:
+    """
+    Delta like/save chưa ghi xuống DB (thread-safe)
+
+    `flush_lock` được giữ trong suốt 1 lần flush / 1 batch reconcile để 2 việc này
+    không ghi đè nhau trong cùng process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._deltas: Dict[int, list] = {}  # post_id → [like_delta, save_delta]
+        self.flush_lock = threading.Lock()
+        self.flushed_posts = 0
+        self.flushed_events = 0
+
+    def add(self, post_id: int, likes: int = 0, saves: int = 0) -> None:
+        with self._lock:
+            entry = self._deltas.setdefault(post_id, [0, 0])
+            entry[0] += likes
+            entry[1] += saves
+            if entry == [0, 0]:
+                # Like rồi unlike trong cùng chu kỳ → không cần ghi gì
+                del self._deltas[post_id]
+
+    def pending(self, post_id: int) -> Tuple[int, int]:
+        """Delta (like, save) đang chờ của 1 post"""
+        with self._lock:
+            entry = self._deltas.get(post_id)
+            return (entry[0], entry[1]) if entry else (0, 0)
+
+    def drain(self) -> Dict[int, Tuple[int, int]]:
+        """Lấy toàn bộ delta ra khỏi buffer"""
+        with self._lock:
+            deltas, self._deltas = self._deltas, {}
+        return {post_id: (d[0], d[1]) for post_id, d in deltas.items()}
+
+    def restore(self, deltas: Dict[int, Tuple[int, int]]) -> None:
+        """Trả delta lại buffer (flush lỗi)"""
+        for post_id, (likes, saves) in deltas.items():
+            self.add(post_id, likes, saves)
+
+    def flush(self, db: Session) -> int:
+        """
+        Ghi toàn bộ delta vào posts trong 1 transaction
+
+        Returns:
+            Số post đã cập nhật
+        """
+        with self.flush_lock:
+            deltas = self.drain()
+            if not deltas:
+                return 0
+            try:
+                updated = BlogRepository.apply_counter_deltas(db, deltas)
+                db.commit()
+            except Exception:
+                db.rollback()
+                self.restore(deltas)
+                raise
+            if updated:
+                get_feed_page_cache().invalidate(updated, reorder_trending=True)
+            self.flushed_posts += len(updated)
+            self.flushed_events += sum(abs(l) + abs(s) for l, s in deltas.values())
+            return len(updated)
+
+    def reconcile(self, db: Session, batch_size: int = 500) -> int:
+        """
+        Đặt lại like_count / save_count = số dòng thật trong post_likes / post_saves
+        (trừ delta process này chưa flush, vì membership của chúng đã được ghi).
+
+        Returns:
+            Số post bị lệch đã sửa
+        """
+        fixed = 0
+        last_id = 0
+        while True:
+            with self.flush_lock:
+                rows = BlogRepository.get_counter_rows(db, after_id=last_id, limit=batch_size)
+                if not rows:
+                    db.commit()
+                    return fixed
+                last_id = rows[-1].id
+
+                likes, saves = BlogRepository.count_interactions(db, [r.id for r in rows])
+                changes = []
+                for row in rows:
+                    pending_likes, pending_saves = self.pending(row.id)
+                    like_count = max(0, likes.get(row.id, 0) - pending_likes)
+                    save_count = max(0, saves.get(row.id, 0) - pending_saves)
+                    if (like_count, save_count) != (row.like_count, row.save_count):
+                        changes.append({
+                            "id": row.id,
+                            "like_count": like_count,
+                            "save_count": save_count,
+                            "trending_score": trending_score(
+                                like_count, save_count, row.created_at, view_count=row.view_count
+                            ),
+                        })
+                BlogRepository.set_counters(db, changes)
+                db.commit()
+                if changes:
+                    get_feed_page_cache().invalidate([c["id"] for c in changes], reorder_trending=True)
+                fixed += len(changes)
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending_posts = len(self._deltas)
+        return {
+            "pending_posts": pending_posts,
+            "flushed_posts": self.flushed_posts,
+            "flushed_events": self.flushed_events,
+        }
+
+
+_buffer = BlogCounterBuffer()
+
+
+def get_counter_buffer() -> BlogCounterBuffer:
+    """Buffer dùng chung cả process"""
+    return _buffer
+
+
+def flush_counters() -> int:
+    """Job nền: ghi delta đang chờ xuống posts"""
+    db = SessionLocal()
+    try:
+        return _buffer.flush(db)
+    finally:
+        db.close()
+
+
+def reconcile_counters() -> int:
+    """Job nền: đếm lại counter từ post_likes / post_saves"""
+    db = SessionLocal()
+    try:
+        fixed = _buffer.reconcile(db)
+        if fixed:
+            logger.warning("Reconciled like/save counters of %d posts", fixed)
+        return fixed
+    finally:
+        db.close()
@@ -0,0 +1,123 @@
+"""
+Blog Feed Cache - Cache trang đầu của feed công khai (recent / trending, không filter).
+
+Chỉ lưu phần không phụ thuộc user: danh sách PostDetail (is_liked / is_saved = False,
+counter chưa cộng delta đang chờ) + has_next / next_cursor. Khi đọc, service overlay
+trạng thái like/save của user (1 query) và delta counter của process.
+
+Invalidate theo sự kiện trong process:
+- Tạo bài → xóa toàn bộ (bài mới đứng đầu recent, có thể vào trang đầu trending)
+- Sửa / xóa bài → xóa các trang chứa bài đó
+- Counter / trending_score thay đổi → xóa trang chứa bài đó + toàn bộ trending (thứ tự có thể đổi)
+
+Worker khác không nhận được sự kiện → TTL (BLOG_FEED_PAGE_CACHE_TTL_SECONDS) là giới hạn lệch.
+"""
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from app.core.settings import settings
+from app.schemas.blog import FeedResponse
+
+
+class FeedPageCache:
+    """
+    Cache (sort, limit) → FeedResponse, thread-safe.
+
+    Dùng generation để tránh race: trang được build từ DB trước một lần invalidate
+    sẽ không được ghi vào cache sau lần invalidate đó.
+    """
+
+    SORTS = ("recent", "trending")
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, int], Tuple[float, frozenset, FeedResponse]] = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _ttl(self) -> float:
+        return settings.BLOG_FEED_PAGE_CACHE_TTL_SECONDS if self.ttl is None else self.ttl
+
+    def generation(self) -> int:
+        """Lấy trước khi query DB, truyền lại cho set()"""
+        with self._lock:
+            return self._generation
+
+    def get(self, sort: str, limit: int) -> Optional[FeedResponse]:
+        with self._lock:
+            entry = self._entries.get((sort, limit))
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop((sort, limit), None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[2]
+
+    def set(self, sort: str, limit: int, response: FeedResponse, generation: int) -> bool:
+        """Ghi trang vào cache, bỏ qua nếu đã có invalidate kể từ `generation`"""
+        ttl = self._ttl()
+        if ttl <= 0:
+            return False
+        post_ids = frozenset(item.id for item in response.items)
+        with self._lock:
+            if generation != self._generation:
+                return False
+            self._entries[(sort, limit)] = (time.monotonic() + ttl, post_ids, response)
+            return True
+
+    def invalidate(
+        self,
+        post_ids: Optional[Iterable[int]] = None,
+        reorder_trending: bool = False
+    ) -> int:
+        """
+        Xóa entry bị ảnh hưởng
+
+        Args:
+            post_ids: Xóa trang chứa 1 trong các bài này. None = xóa toàn bộ
+            reorder_trending: Xóa luôn mọi trang trending (điểm đổi → bài ngoài trang có thể lọt vào)
+
+        Returns:
+            Số entry đã xóa
+        """
+        ids = None if post_ids is None else set(post_ids)
+        with self._lock:
+            self._generation += 1
+            if ids is None:
+                keys = list(self._entries)
+            else:
+                keys = [
+                    key for key, (_, cached_ids, _) in self._entries.items()
+                    if (reorder_trending and key[0] == "trending") or not cached_ids.isdisjoint(ids)
+                ]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        self.invalidate()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        total = self.hits + self.misses
+        return {
+            "size": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+_feed_page_cache = FeedPageCache()
+
+
+def get_feed_page_cache() -> FeedPageCache:
+    """Cache dùng chung cả process"""
+    return _feed_page_cache
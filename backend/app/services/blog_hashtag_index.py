@@ -0,0 +1,158 @@
+"""
+Blog Hashtag Index - Autocomplete hashtag trong memory, xếp theo độ phổ biến gần đây.
+
+Mảng tên hashtag đã sắp xếp: prefix → khoảng [lo, hi) bằng bisect, lấy top-k theo
+(số bài dùng trong BLOG_HASHTAG_USAGE_WINDOW_DAYS ngày DESC, tên ASC). Prefix 1-2 ký tự
+khớp rất nhiều tên nên top list của chúng được cache sẵn, prefix dài hơn thì khoảng nhỏ.
+
+- Nạp lười ở lần tìm đầu tiên, job `refresh_hashtag_index` nạp lại định kỳ (trượt cửa sổ
+  thời gian, nhận hashtag do worker khác tạo)
+- Tạo / sửa / xóa bài cập nhật ngay phần chênh lệch (sau commit) qua `record_post_hashtags`
+"""
+import bisect
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.core.settings import settings
+from app.repositories.blog_repository import BlogRepository
+
+
+class HashtagIndex:
+    """Index prefix của hashtag (thread-safe)"""
+
+    # Prefix ngắn hơn hoặc bằng → cache top list
+    CACHED_PREFIX_LEN = 2
+    # Số gợi ý tối đa mỗi lần tìm (khớp limit của route)
+    MAX_LIMIT = 100
+    # Mọi ký tự của tên đã chuẩn hóa ([a-z0-9_]) đều nhỏ hơn ký tự này
+    _UPPER = "\x7f"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self._names_by_id: Dict[int, str] = {}
+        self._weights: Dict[str, int] = {}
+        self._top_cache: Dict[str, List[str]] = {}
+        self.loaded_at: Optional[float] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def load(self, rows: Iterable[Tuple[int, str, int]]) -> int:
+        """Thay toàn bộ index bằng (id, name, weight). Trả về số hashtag."""
+        ids, names_by_id, weights = {}, {}, {}
+        for hashtag_id, name, weight in rows:
+            ids[name] = hashtag_id
+            names_by_id[hashtag_id] = name
+            weights[name] = weight
+        names = sorted(ids)
+        with self._lock:
+            self._names, self._ids, self._names_by_id, self._weights = names, ids, names_by_id, weights
+            self._top_cache = {}
+            self.loaded_at = time.monotonic()
+        return len(names)
+
+    def clear(self) -> None:
+        """Bỏ index, lần tìm sau nạp lại từ DB"""
+        with self._lock:
+            self._names, self._ids, self._names_by_id, self._weights = [], {}, {}, {}
+            self._top_cache = {}
+            self.loaded_at = None
+
+    def load_from_db(self, db: Session) -> int:
+        since = datetime.now(timezone.utc) - timedelta(days=settings.BLOG_HASHTAG_USAGE_WINDOW_DAYS)
+        return self.load(BlogRepository.get_hashtag_usage(db, since))
+
+    def ensure_loaded(self, db: Session) -> None:
+        if not self.loaded:
+            self.load_from_db(db)
+
+    def record_post_hashtags(
+        self,
+        current: List[Tuple[int, str]],
+        previous_ids: Iterable[int] = ()
+    ) -> None:
+        """
+        Áp chênh lệch khi hashtag của 1 bài đổi (gọi sau commit)
+
+        Args:
+            current: (id, name) hashtag hiện tại của bài ([] khi xóa bài)
+            previous_ids: hashtag_id trước đó của bài
+        """
+        if not self.loaded:
+            return  # Lần nạp đầu sẽ đọc từ DB
+        current_ids = {hashtag_id for hashtag_id, _ in current}
+        previous = set(previous_ids)
+        with self._lock:
+            for hashtag_id, name in current:
+                if name not in self._ids:
+                    bisect.insort(self._names, name)
+                    self._ids[name] = hashtag_id
+                    self._names_by_id[hashtag_id] = name
+                    self._weights[name] = 0
+                    self._drop_cached(name)
+            for hashtag_id in current_ids ^ previous:
+                name = self._names_by_id.get(hashtag_id)
+                if name is None:
+                    continue
+                delta = 1 if hashtag_id in current_ids else -1
+                self._weights[name] = max(0, self._weights[name] + delta)
+                self._drop_cached(name)
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[int, str]]:
+        """Top `limit` hashtag có tên bắt đầu bằng `query` (đã chuẩn hóa): [(id, name)]"""
+        if not query:
+            return []
+        limit = min(limit, self.MAX_LIMIT)
+        with self._lock:
+            if len(query) <= self.CACHED_PREFIX_LEN:
+                top = self._top_cache.get(query)
+                if top is None:
+                    top = self._top_cache[query] = self._top_in_range(query, self.MAX_LIMIT)
+                names = top[:limit]
+            else:
+                names = self._top_in_range(query, limit)
+            return [(self._ids[name], name) for name in names]
+
+    def _top_in_range(self, prefix: str, limit: int) -> List[str]:
+        lo = bisect.bisect_left(self._names, prefix)
+        hi = bisect.bisect_left(self._names, prefix + self._UPPER, lo)
+        weights = self._weights
+        return heapq.nsmallest(limit, self._names[lo:hi], key=lambda name: (-weights[name], name))
+
+    def _drop_cached(self, name: str) -> None:
+        for length in range(1, self.CACHED_PREFIX_LEN + 1):
+            self._top_cache.pop(name[:length], None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hashtags": len(self._names),
+                "cached_prefixes": len(self._top_cache),
+                "age_seconds": round(time.monotonic() - self.loaded_at, 1) if self.loaded else None,
+            }
+
+
+_index = HashtagIndex()
+
+
+def get_hashtag_index() -> HashtagIndex:
+    """Index dùng chung cả process"""
+    return _index
+
+
+def refresh_hashtag_index() -> int:
+    """Job nền: nạp lại index từ hashtags + post_hashtags"""
+    db = SessionLocal()
+    try:
+        return _index.load_from_db(db)
+    finally:
+        db.close()
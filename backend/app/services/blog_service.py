@@ -2,13 +2,22 @@
 Blog Service - Business logic cho Blog module.
 Orchestrates repository operations, validation, authorization.
 """
+import base64
+import binascii
+import hashlib
+import json
 import uuid
+from datetime import datetime, timedelta, timezone
 from typing import Optional, List, Dict, Any
 
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 
 from app.repositories.blog_repository import BlogRepository
+from app.services.blog_counters import get_counter_buffer
+from app.services.blog_feed_cache import get_feed_page_cache
+from app.services.blog_hashtag_index import get_hashtag_index
+from app.services.blog_views import get_view_buffer
 from app.models.blog import Post
 from app.schemas.blog import (
     PostCreateRequest,
@@ -20,6 +29,13 @@ from app.schemas.blog import (
     HashtagOut,
     HashtagSearchResponse,
 )
+from app.core.database import SessionLocal
+from app.core.settings import settings
+from app.utils.cache import TTLCache
+
+
+# Tổng số bài theo (sort, filters) cho cursor mode - tránh COUNT(*) mỗi trang
+_feed_count_cache = TTLCache(maxsize=4096, ttl=settings.BLOG_FEED_COUNT_CACHE_TTL_SECONDS)
 
 
 class BlogService:
@@ -50,12 +66,15 @@ class BlogService:
             BlogRepository.add_media_to_post(db, post.id, media_dicts)
         
         # 3. Handle hashtags (nếu có)
+        tags = []
         if request.hashtags:
             hashtags = BlogRepository.get_or_create_hashtags(db, request.hashtags)
-            hashtag_ids = [h.id for h in hashtags]
-            BlogRepository.set_post_hashtags(db, post.id, hashtag_ids)
+            tags = [(h.id, h.name) for h in hashtags]
+            BlogRepository.set_post_hashtags(db, post.id, [h.id for h in hashtags])
         
         db.commit()
+        get_feed_page_cache().invalidate()
+        get_hashtag_index().record_post_hashtags(tags)
         
         # Refetch để lấy relationships
         post = BlogRepository.get_post_by_id(db, post.id)
@@ -76,6 +95,10 @@ class BlogService:
                 detail="Post not found"
             )
         
+        # Đếm người xem (trong memory, tác giả tự xem không tính)
+        if post.user_id != current_user_id:
+            get_view_buffer().record(post_id, current_user_id)
+        
         # Check user interactions
         is_liked = BlogRepository.is_liked(db, current_user_id, post_id)
         is_saved = BlogRepository.is_saved(db, current_user_id, post_id)
@@ -124,15 +147,16 @@ class BlogService:
                 BlogRepository.add_media_to_post(db, post_id, media_dicts)
         
         # Update hashtags (thay thế toàn bộ nếu gửi)
+        tags, previous_tag_ids = None, []
         if request.hashtags is not None:
-            if request.hashtags:
-                hashtags = BlogRepository.get_or_create_hashtags(db, request.hashtags)
-                hashtag_ids = [h.id for h in hashtags]
-                BlogRepository.set_post_hashtags(db, post_id, hashtag_ids)
-            else:
-                BlogRepository.set_post_hashtags(db, post_id, [])
+            hashtags = BlogRepository.get_or_create_hashtags(db, request.hashtags) if request.hashtags else []
+            tags = [(h.id, h.name) for h in hashtags]
+            previous_tag_ids = BlogRepository.set_post_hashtags(db, post_id, [h.id for h in hashtags])
         
         db.commit()
+        get_feed_page_cache().invalidate([post_id])
+        if tags is not None:
+            get_hashtag_index().record_post_hashtags(tags, previous_tag_ids)
         
         # Refetch
         post = BlogRepository.get_post_by_id(db, post_id)
@@ -163,10 +187,23 @@ class BlogService:
                 detail="Not allowed to delete this post"
             )
         
+        tag_ids = [h.id for h in post.hashtags]
         BlogRepository.soft_delete_post(db, post)
         db.commit()
+        get_hashtag_index().record_post_hashtags([], tag_ids)
+        # Xóa toàn bộ: has_next của trang đầu có thể đổi dù bài không nằm trong trang
+        get_feed_page_cache().invalidate()
     
     # ==================== LIKE / UNLIKE ====================
+    # Chỉ ghi membership + commit, delta counter vào buffer (flush định kỳ, xem blog_counters)
+    @staticmethod
+    def _ensure_post_exists(db: Session, post_id: int) -> None:
+        if not BlogRepository.post_exists(db, post_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Post not found"
+            )
+    
     @staticmethod
     def like_post(
         db: Session,
@@ -174,16 +211,11 @@ class BlogService:
         user_id: uuid.UUID
     ) -> None:
         """Like bài viết"""
-        # Check post exists
-        post = BlogRepository.get_post_by_id(db, post_id)
-        if not post:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Post not found"
-            )
-        
-        BlogRepository.add_like(db, user_id, post_id)
+        BlogService._ensure_post_exists(db, post_id)
+        changed = BlogRepository.add_like(db, user_id, post_id)
         db.commit()
+        if changed:
+            get_counter_buffer().add(post_id, likes=1)
     
     @staticmethod
     def unlike_post(
@@ -192,15 +224,11 @@ class BlogService:
         user_id: uuid.UUID
     ) -> None:
         """Unlike bài viết"""
-        post = BlogRepository.get_post_by_id(db, post_id)
-        if not post:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Post not found"
-            )
-        
-        BlogRepository.remove_like(db, user_id, post_id)
+        BlogService._ensure_post_exists(db, post_id)
+        changed = BlogRepository.remove_like(db, user_id, post_id)
         db.commit()
+        if changed:
+            get_counter_buffer().add(post_id, likes=-1)
     
     # ==================== SAVE / UNSAVE ====================
     @staticmethod
@@ -210,15 +238,11 @@ class BlogService:
         user_id: uuid.UUID
     ) -> None:
         """Save bài viết"""
-        post = BlogRepository.get_post_by_id(db, post_id)
-        if not post:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Post not found"
-            )
-        
-        BlogRepository.add_save(db, user_id, post_id)
+        BlogService._ensure_post_exists(db, post_id)
+        changed = BlogRepository.add_save(db, user_id, post_id)
         db.commit()
+        if changed:
+            get_counter_buffer().add(post_id, saves=1)
     
     @staticmethod
     def unsave_post(
@@ -227,15 +251,11 @@ class BlogService:
         user_id: uuid.UUID
     ) -> None:
         """Unsave bài viết"""
-        post = BlogRepository.get_post_by_id(db, post_id)
-        if not post:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Post not found"
-            )
-        
-        BlogRepository.remove_save(db, user_id, post_id)
+        BlogService._ensure_post_exists(db, post_id)
+        changed = BlogRepository.remove_save(db, user_id, post_id)
         db.commit()
+        if changed:
+            get_counter_buffer().add(post_id, saves=-1)
     
     # ==================== FEED ====================
     @staticmethod
@@ -247,50 +267,208 @@ class BlogService:
         author_id: Optional[uuid.UUID] = None,
         saved_only: bool = False,
         limit: int = 15,
-        page: int = 1
+        page: Optional[int] = None,
+        cursor: Optional[str] = None,
+        include_total: bool = False
     ) -> FeedResponse:
         """
         Lấy feed với các filters.
-        Offset/Limit pagination cho infinite scroll hoặc load more.
+        
+        - Cursor mode (mặc định, infinite scroll): keyset theo (created_at, id) hoặc
+          (trending_score, created_at, id), không COUNT/OFFSET. total_count chỉ có khi include_total
+          và lấy từ cache (có thể lệch tối đa BLOG_FEED_COUNT_CACHE_TTL_SECONDS).
+        - Page mode (truyền `page`): Offset/Limit + COUNT chính xác, cho UI phân trang.
         """
-        posts, total_count = BlogRepository.get_feed(
-            db=db,
-            user_id=user_id,
-            sort=sort,
-            hashtag=hashtag,
-            author_id=author_id,
-            saved_only=saved_only,
-            limit=limit,
-            page=page
-        )
+        if page is not None and cursor is not None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Use either page or cursor, not both"
+            )
+        
+        filters = dict(hashtag=hashtag, author_id=author_id, saved_only=saved_only)
+        
+        if page is not None:
+            posts, total_count = BlogRepository.get_feed(
+                db=db, user_id=user_id, sort=sort, limit=limit, page=page, **filters
+            )
+            total_pages = (total_count + limit - 1) // limit  # ceil division
+            return FeedResponse(
+                items=BlogService._to_feed_items(db, user_id, posts),
+                page=page,
+                limit=limit,
+                total_count=total_count,
+                total_pages=total_pages,
+                has_next=page < total_pages
+            )
+        
+        fingerprint = BlogService._feed_fingerprint(user_id, sort, **filters)
         
-        # Lấy user interactions cho batch posts
-        post_ids = [p.id for p in posts]
+        # Trang đầu recent/trending không filter: phần chung cho mọi user nằm trong cache
+        cache_sort = "trending" if sort == "trending" else "recent"
+        cacheable = cursor is None and not (hashtag or author_id or saved_only)
+        cache = get_feed_page_cache()
+        response = cache.get(cache_sort, limit) if cacheable else None
+        
+        if response is None:
+            generation = cache.generation()
+            after = BlogService._decode_cursor(cursor, sort, fingerprint) if cursor else None
+            posts, has_next = BlogRepository.get_feed_after(
+                db=db, user_id=user_id, sort=sort, limit=limit, after=after, **filters
+            )
+            next_cursor = None
+            if has_next:
+                next_cursor = BlogService._encode_cursor(
+                    sort, fingerprint, BlogRepository.feed_sort_key(posts[-1], sort)
+                )
+            response = FeedResponse(
+                items=[BlogService._to_post_detail(p, include_pending=False) for p in posts],
+                limit=limit,
+                has_next=has_next,
+                next_cursor=next_cursor
+            )
+            if cacheable:
+                cache.set(cache_sort, limit, response, generation)
+        
+        total_count = None
+        if include_total:
+            # Tổng số không phụ thuộc sort → dùng chung 1 key cho recent/trending
+            total_count = _feed_count_cache.get_or_set(
+                BlogService._feed_fingerprint(user_id, "recent", **filters),
+                lambda: BlogRepository.count_feed(db, user_id, **filters)
+            )
+        
+        return response.model_copy(update={
+            "items": BlogService._with_viewer_state(db, user_id, response.items),
+            "total_count": total_count,
+        })
+    
+    @staticmethod
+    def _to_feed_items(db: Session, user_id: uuid.UUID, posts: List[Post]) -> List[PostDetail]:
+        """Convert posts + trạng thái like/save của user (1 query cho cả batch)"""
+        items = [BlogService._to_post_detail(p, include_pending=False) for p in posts]
+        return BlogService._with_viewer_state(db, user_id, items)
+    
+    @staticmethod
+    def _with_viewer_state(
+        db: Session,
+        user_id: uuid.UUID,
+        items: List[PostDetail]
+    ) -> List[PostDetail]:
+        """
+        Bản sao của các item chung (cache / vừa build) có is_liked / is_saved của user
+        và delta counter chưa flush. Không sửa item gốc.
+        """
         liked_ids, saved_ids = BlogRepository.get_user_interactions(
-            db, user_id, post_ids
+            db, user_id, [item.id for item in items]
         )
+        buffer = get_counter_buffer()
+        result = []
+        for item in items:
+            pending_likes, pending_saves = buffer.pending(item.id)
+            result.append(item.model_copy(update={
+                "is_liked": item.id in liked_ids,
+                "is_saved": item.id in saved_ids,
+                "like_count": max(0, item.like_count + pending_likes),
+                "save_count": max(0, item.save_count + pending_saves),
+            }))
+        return result
+    
+    @staticmethod
+    def _feed_fingerprint(
+        user_id: uuid.UUID,
+        sort: str,
+        hashtag: Optional[str],
+        author_id: Optional[uuid.UUID],
+        saved_only: bool,
+        search_query: str = ""
+    ) -> str:
+        """Định danh ngắn của (sort, filters) - cursor chỉ hợp lệ với đúng feed đã tạo ra nó"""
+        normalized_hashtag = BlogRepository._normalize_hashtag(hashtag) if hashtag else ""
+        raw = "|".join([
+            sort if sort in ("trending", "search") else "recent",
+            normalized_hashtag,
+            str(author_id or ""),
+            str(user_id) if saved_only else "",
+            search_query,
+        ])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+    
+    @staticmethod
+    def _encode_cursor(sort: str, fingerprint: str, key: tuple) -> str:
+        """Cursor opaque: base64url(JSON {f, k}), datetime lưu dạng ISO"""
+        values = [v.isoformat() if isinstance(v, datetime) else v for v in key]
+        payload = json.dumps({"f": fingerprint, "k": values}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+    
+    @staticmethod
+    def _decode_cursor(cursor: str, sort: str, fingerprint: str) -> tuple:
+        """Giải mã cursor → feed_sort_key, 400 nếu sai format hoặc thuộc feed khác"""
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+            values = payload["k"]
+            ranked = sort in ("trending", "search")  # (score, created_at, id)
+            expected = 3 if ranked else 2
+            if len(values) != expected:
+                raise ValueError("wrong key length")
+            # created_at đứng ngay trước id ở mọi kiểu sort
+            key = list(values)
+            key[-2] = datetime.fromisoformat(key[-2])
+            key[-1] = int(key[-1])
+            if ranked:
+                key[0] = float(key[0])
+        except (ValueError, TypeError, KeyError, UnicodeError, binascii.Error):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor format"
+            )
         
-        # Convert to response
-        items = [
-            BlogService._to_post_detail(
-                p,
-                is_liked=(p.id in liked_ids),
-                is_saved=(p.id in saved_ids)
+        if payload.get("f") != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursor does not match the requested feed (sort/filters changed)"
             )
-            for p in posts
-        ]
+        return tuple(key)
+    
+    # ==================== SEARCH ====================
+    @staticmethod
+    def search_posts(
+        db: Session,
+        user_id: uuid.UUID,
+        q: str,
+        hashtag: Optional[str] = None,
+        author_id: Optional[uuid.UUID] = None,
+        limit: int = 15,
+        cursor: Optional[str] = None
+    ) -> FeedResponse:
+        """
+        Tìm bài viết theo nội dung (title + content_text), xếp theo độ liên quan.
+        Cursor mode như feed, cursor gắn với đúng từ khóa + filters.
+        """
+        terms = BlogRepository.search_terms(q)
+        if not terms:
+            return FeedResponse(items=[], limit=limit, has_next=False)
         
-        # Tính pagination info
-        total_pages = (total_count + limit - 1) // limit  # ceil division
-        has_next = page < total_pages
+        fingerprint = BlogService._feed_fingerprint(
+            user_id, "search", hashtag, author_id, False, search_query=" ".join(terms)
+        )
+        after = BlogService._decode_cursor(cursor, "search", fingerprint) if cursor else None
+        
+        rows, has_next = BlogRepository.search_posts(
+            db, terms, hashtag=hashtag, author_id=author_id, limit=limit, after=after
+        )
+        next_cursor = None
+        if has_next:
+            last_post, last_rank = rows[-1]
+            next_cursor = BlogService._encode_cursor(
+                "search", fingerprint, (last_rank, last_post.created_at, last_post.id)
+            )
         
         return FeedResponse(
-            items=items,
-            page=page,
+            items=BlogService._to_feed_items(db, user_id, [post for post, _ in rows]),
             limit=limit,
-            total_count=total_count,
-            total_pages=total_pages,
-            has_next=has_next
+            has_next=has_next,
+            next_cursor=next_cursor
         )
     
     # ==================== HASHTAGS ====================
@@ -300,9 +478,11 @@ class BlogService:
         query: str,
         limit: int = 20
     ) -> HashtagSearchResponse:
-        """Tìm kiếm hashtags theo prefix"""
-        hashtags = BlogRepository.search_hashtags(db, query, limit)
-        items = [HashtagOut(id=h.id, name=h.name) for h in hashtags]
+        """Tìm kiếm hashtags theo prefix, phổ biến gần đây trước (index trong memory)"""
+        index = get_hashtag_index()
+        index.ensure_loaded(db)
+        matches = index.search(BlogRepository._normalize_hashtag(query), limit)
+        items = [HashtagOut(id=hashtag_id, name=name) for hashtag_id, name in matches]
         return HashtagSearchResponse(items=items)
     
     @staticmethod
@@ -318,7 +498,7 @@ class BlogService:
         hashtag = BlogRepository.get_hashtag_by_name(db, hashtag_name)
         if not hashtag:
             # Trả về empty response thay vì 404
-            return FeedResponse(items=[], next_cursor=None)
+            return FeedResponse(items=[], limit=limit, has_next=False)
         
         return BlogService.get_feed(
             db=db,
@@ -334,22 +514,33 @@ class BlogService:
     def _to_post_detail(
         post: Post,
         is_liked: bool = False,
-        is_saved: bool = False
+        is_saved: bool = False,
+        include_pending: bool = True
     ) -> PostDetail:
-        """Convert Post model to PostDetail schema"""
+        """
+        Convert Post model to PostDetail schema
+        
+        include_pending=False: giữ counter như trong DB (bản dùng chung, xem _with_viewer_state)
+        """
         # Lấy full_name từ user.profile nếu có
         full_name = None
         if post.user and post.user.profile:
             full_name = post.user.profile.full_name
         
+        # Cộng delta like/save chưa flush → user thấy ngay thao tác của mình
+        pending_likes, pending_saves = (0, 0)
+        if include_pending:
+            pending_likes, pending_saves = get_counter_buffer().pending(post.id)
+        
         return PostDetail(
             id=post.id,
             user_id=post.user_id,
             full_name=full_name,
             title=post.title,
             content_text=post.content_text,
-            like_count=post.like_count,
-            save_count=post.save_count,
+            like_count=max(0, post.like_count + pending_likes),
+            save_count=max(0, post.save_count + pending_saves),
+            view_count=post.view_count,
             created_at=post.created_at,
             updated_at=post.updated_at,
             media=[
@@ -368,4 +559,32 @@ class BlogService:
             hashtags=[h.name for h in post.hashtags],
             is_liked=is_liked,
             is_saved=is_saved
-        )
\ No newline at end of file
+        )
+
+
+def refresh_trending_scores(window_days: Optional[int] = None) -> int:
+    """
+    Job nền: tính lại trending_score cho bài tạo trong `window_days` ngày gần nhất.
+    Flush counter like/save đã cập nhật điểm, job này chỉ sửa lệch (VD counter bị sửa tay).
+    
+    Args:
+        window_days: Mặc định BLOG_TRENDING_REFRESH_WINDOW_DAYS, 0 = toàn bộ bài
+    
+    Returns:
+        Số bài đã cập nhật
+    """
+    if window_days is None:
+        window_days = settings.BLOG_TRENDING_REFRESH_WINDOW_DAYS
+    created_after = None
+    if window_days:
+        created_after = datetime.now(timezone.utc) - timedelta(days=window_days)
+    
+    db = SessionLocal()
+    try:
+        updated = BlogRepository.refresh_trending_scores(db, created_after=created_after)
+    finally:
+        db.close()
+    if updated:
+        # Counter không đổi, chỉ thứ tự trending
+        get_feed_page_cache().invalidate([], reorder_trending=True)
+    return updated
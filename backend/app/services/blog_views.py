@@ -0,0 +1,124 @@
+"""
+Blog Views - Đếm người xem khác nhau của bài bằng HyperLogLog, gom trong memory.
+
+Mỗi lượt xem chi tiết bài chỉ thêm hash của viewer vào buffer của process (không ghi DB).
+Job `flush_post_views` định kỳ gộp buffer vào post_view_sketches (max từng thanh ghi)
+và ghi ước lượng mới vào posts.view_count + trending_score.
+
+- Bài có ít người xem trong 1 chu kỳ giữ set hash (vài chục byte / viewer), quá
+  SPARSE_LIMIT thì chuyển sang sketch dense (2^precision byte, cố định dù bao nhiêu viewer)
+- Xem lại / nhiều worker cùng thấy 1 viewer không làm tăng số đếm (HLL là union)
+- Flush lỗi → sketch được trả lại buffer, lần sau ghi tiếp; process chết thì mất
+  tối đa BLOG_VIEW_FLUSH_INTERVAL_SECONDS lượt xem (chấp nhận được với số gần đúng)
+- view_count đổi → xóa trang feed đã cache có bài đó (blog_feed_cache)
+"""
+import threading
+import uuid
+from typing import Dict, Set, Union
+
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.repositories.blog_repository import BlogRepository
+from app.services.blog_feed_cache import get_feed_page_cache
+from app.utils.hyperloglog import DEFAULT_PRECISION, HyperLogLog, hash64
+
+
+class PostViewBuffer:
+    """Viewer chưa merge xuống DB theo bài (thread-safe)"""
+
+    # Số hash tối đa giữ dạng set trước khi chuyển sang sketch dense
+    SPARSE_LIMIT = 64
+
+    def __init__(self, precision: int = DEFAULT_PRECISION):
+        self.precision = precision
+        self._lock = threading.Lock()
+        self._pending: Dict[int, Union[Set[int], HyperLogLog]] = {}
+        self.flush_lock = threading.Lock()
+        self.recorded = 0
+        self.flushed_posts = 0
+
+    def record(self, post_id: int, viewer_id: uuid.UUID) -> None:
+        value = hash64(viewer_id.bytes)
+        with self._lock:
+            self.recorded += 1
+            entry = self._pending.get(post_id)
+            if entry is None:
+                self._pending[post_id] = {value}
+            elif isinstance(entry, HyperLogLog):
+                entry.add_hash(value)
+            else:
+                entry.add(value)
+                if len(entry) > self.SPARSE_LIMIT:
+                    self._pending[post_id] = self._to_sketch(entry)
+
+    def _to_sketch(self, entry: Union[Set[int], HyperLogLog]) -> HyperLogLog:
+        if isinstance(entry, HyperLogLog):
+            return entry
+        sketch = HyperLogLog(self.precision)
+        sketch.update(entry)
+        return sketch
+
+    def drain(self) -> Dict[int, HyperLogLog]:
+        """Lấy toàn bộ viewer đang chờ ra khỏi buffer (dạng sketch)"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return {post_id: self._to_sketch(entry) for post_id, entry in pending.items()}
+
+    def restore(self, sketches: Dict[int, HyperLogLog]) -> None:
+        """Trả sketch lại buffer (flush lỗi)"""
+        with self._lock:
+            for post_id, sketch in sketches.items():
+                entry = self._pending.get(post_id)
+                if entry is not None:
+                    sketch.merge(self._to_sketch(entry))
+                self._pending[post_id] = sketch
+
+    def flush(self, db: Session) -> int:
+        """
+        Gộp toàn bộ buffer vào post_view_sketches trong 1 transaction
+
+        Returns:
+            Số post có view_count thay đổi
+        """
+        with self.flush_lock:
+            sketches = self.drain()
+            if not sketches:
+                return 0
+            try:
+                updated = BlogRepository.merge_view_sketches(db, sketches)
+                db.commit()
+            except Exception:
+                db.rollback()
+                self.restore(sketches)
+                raise
+            if updated:
+                get_feed_page_cache().invalidate(updated, reorder_trending=True)
+            self.flushed_posts += len(updated)
+            return len(updated)
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending_posts = len(self._pending)
+        return {
+            "pending_posts": pending_posts,
+            "recorded": self.recorded,
+            "flushed_posts": self.flushed_posts,
+        }
+
+
+_buffer = PostViewBuffer()
+
+
+def get_view_buffer() -> PostViewBuffer:
+    """Buffer dùng chung cả process"""
+    return _buffer
+
+
+def flush_post_views() -> int:
+    """Job nền: gộp viewer đang chờ vào post_view_sketches"""
+    db = SessionLocal()
+    try:
+        return _buffer.flush(db)
+    finally:
+        db.close()
@@ -9,6 +9,8 @@ from sqlalchemy.orm import Session
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 from fastapi import HTTPException
 
+from app.services.user_context_service import UserContextService
+
 
 class GoalService:
     """
@@ -455,6 +457,9 @@ class GoalService:
         if commit:
             db.commit()
         
+        # Snapshot chatbot của user đã cũ
+        UserContextService.invalidate(user_id)
+        
         # Fetch updated goal
         updated_goal = GoalService.get_goal(db, user_id)
         
@@ -564,4 +569,6 @@ class GoalService:
         db.commit()
         db.refresh(goal)
         
+        UserContextService.invalidate(user_id)
+        
         return goal
\ No newline at end of file
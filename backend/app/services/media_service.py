@@ -2,21 +2,100 @@
 Media Service - Xử lý upload media lên ImageKit.
 Hỗ trợ upload ảnh/video cho Blog module.
 Compatible với imagekitio SDK v5.0.0
+
+Starlette đã nhận multipart body vào SpooledTemporaryFile (nhỏ trong RAM, lớn ra đĩa).
+File đó được đưa thẳng cho SDK qua _UploadStream, httpx đọc từng chunk khi gửi → không
+có bản copy toàn bộ file trong memory hay temp file thứ hai. Call SDK (blocking) chạy trên
+thread pool riêng có giới hạn, không chặn event loop.
+
+Khử trùng lặp theo nội dung: trước khi upload, đọc file đã spool 1 lượt để tính SHA-256
+(cũng là lúc kiểm tra size thật). Trùng với dòng trong media_blobs → trả về file cũ, không
+upload. media_blobs.ref_count = số dòng post_media dùng url đó (BlogRepository cập nhật khi
+gắn / gỡ media khỏi bài); job purge_unused_media xóa hàng loạt trên ImageKit các file
+ref_count = 0 đã quá MEDIA_BLOB_UNUSED_GRACE_HOURS (gồm cả file upload xong nhưng không đăng).
 """
-import os
+import asyncio
+import hashlib
+import io
+import logging
 import uuid
-import tempfile
+from datetime import datetime, timedelta, timezone
 from typing import Optional, List
 
 from fastapi import UploadFile, HTTPException, status
 from imagekitio import ImageKit
+from sqlalchemy.orm import Session
 
+from app.core.database import SessionLocal
+from app.core.db_executor import DBExecutor, run_blog_db
 from app.core.settings import settings
+from app.models.blog import MediaBlob
+from app.repositories.blog_repository import BlogRepository
+
+
+logger = logging.getLogger(__name__)
+
+
+class _UploadStream(io.IOBase):
+    """
+    File-like bọc file upload gốc cho SDK: đọc theo chunk, đếm bytes đã gửi,
+    dừng khi vượt max_size (phòng Content-Length sai). Hỗ trợ seek để SDK retry được.
+    """
+
+    def __init__(self, raw, max_size: int):
+        self._raw = raw
+        self._max_size = max_size
+        self._position = 0
+        self.size_bytes = 0
+        self.too_large = False
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._raw.read(size)
+        self._position += len(chunk)
+        if self._position > self._max_size:
+            self.too_large = True
+            raise ValueError("upload exceeds size limit")
+        self.size_bytes = max(self.size_bytes, self._position)
+        return chunk
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._position = self._raw.seek(offset, whence)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+
+_upload_executor: Optional[DBExecutor] = None
+
+
+def get_media_upload_executor() -> DBExecutor:
+    """Thread pool cho call upload blocking của ImageKit SDK (cùng cơ chế giới hạn với blog DB executor)"""
+    global _upload_executor
+    if _upload_executor is None:
+        _upload_executor = DBExecutor(
+            "media-upload",
+            max_workers=settings.MEDIA_UPLOAD_WORKERS,
+            max_queue=settings.MEDIA_UPLOAD_MAX_QUEUE,
+            queue_timeout=settings.MEDIA_UPLOAD_QUEUE_TIMEOUT_SECONDS,
+        )
+    return _upload_executor
 
 
 class MediaService:
     """Service xử lý upload media lên ImageKit"""
     
+    # Chunk đọc khi tính hash
+    HASH_CHUNK_SIZE = 1024 * 1024
+    # Số file tối đa mỗi call xóa hàng loạt của ImageKit
+    BULK_DELETE_SIZE = 100
+    
     # Các định dạng file được phép
     ALLOWED_IMAGE_TYPES = {
         "image/jpeg": ".jpg",
@@ -97,127 +176,192 @@ class MediaService:
                 detail=f"File too large. Maximum for {media_type}: {max_mb:.0f}MB. Your file: {file_mb:.2f}MB"
             )
     
+    @classmethod
+    def _hash_file(cls, raw, max_size: int) -> tuple[str, int]:
+        """
+        Đọc file upload (đã spool) theo chunk → (sha256 hex, size). Chạy trên upload executor.
+        Raises: ValueError nếu vượt max_size (header Content-Length sai / không có)
+        """
+        digest = hashlib.sha256()
+        size = 0
+        raw.seek(0)
+        while chunk := raw.read(cls.HASH_CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_size:
+                raise ValueError("upload exceeds size limit")
+            digest.update(chunk)
+        raw.seek(0)
+        return digest.hexdigest(), size
+    
+    @staticmethod
+    def _blob_result(blob: MediaBlob, deduplicated: bool) -> dict:
+        return {
+            "url": blob.url,
+            "file_id": blob.file_id,
+            "file_name": blob.file_name,
+            "media_type": blob.media_type,
+            "mime_type": blob.mime_type,
+            "width": blob.width,
+            "height": blob.height,
+            "size_bytes": blob.size_bytes,
+            "sort_order": 0,
+            "deduplicated": deduplicated
+        }
+    
+    @staticmethod
+    def _reuse_blob(db: Session, sha256: str) -> Optional[dict]:
+        blob = BlogRepository.reuse_media_blob(db, sha256)
+        result = MediaService._blob_result(blob, deduplicated=True) if blob else None
+        db.commit()
+        return result
+    
+    @staticmethod
+    def _record_blob(db: Session, result: dict, sha256: str) -> Optional[dict]:
+        """Ghi file vừa upload vào media_blobs. Trả về file cũ nếu request khác đã ghi cùng nội dung trước."""
+        try:
+            blob, created = BlogRepository.create_media_blob(
+                db,
+                sha256=sha256,
+                **{key: result[key] for key in (
+                    "url", "file_id", "file_name", "media_type", "mime_type", "width", "height", "size_bytes"
+                )}
+            )
+            existing = None if created or blob is None else MediaService._blob_result(blob, deduplicated=True)
+            db.commit()
+            return existing
+        except Exception:
+            db.rollback()
+            raise
+    
     @classmethod
     async def upload_file(
         cls,
+        db: Session,
         file: UploadFile,
         user_id: uuid.UUID,
-        folder: str = "blog"
+        folder: str = "blog",
+        db_lock: Optional[asyncio.Lock] = None
     ) -> dict:
         """
-        Upload file lên ImageKit.
+        Upload file lên ImageKit (stream từ file upload, SDK chạy ngoài event loop).
+        Nội dung đã từng upload (cùng SHA-256) → trả về file cũ, không upload lại.
         
         Args:
+            db: Database session (media_blobs)
             file: File từ request
             user_id: UUID của user upload
             folder: Thư mục trên ImageKit (mặc định: blog)
+            db_lock: Lock dùng chung khi nhiều upload song song cùng 1 session (Session không thread-safe)
             
         Returns:
-            dict với thông tin file: url, file_id, media_type, mime_type, width, height, size_bytes
+            dict với thông tin file: url, file_id, media_type, mime_type, width, height, size_bytes,
+            deduplicated (True = dùng lại file đã có)
         """
-        temp_file_path = None
+        # 1. Validate file type
+        media_type, extension = cls._validate_file(file)
         
+        # 2. CHECK KÍCH THƯỚC TRƯỚC (từ header - không cần đọc file)
+        cls._check_file_size(file, media_type)
+        
+        # 3. Hash nội dung (đồng thời đo size thật, phòng trường hợp header sai)
+        max_size = cls.MAX_IMAGE_SIZE if media_type == "image" else cls.MAX_VIDEO_SIZE
         try:
-            # 1. Validate file type
-            media_type, extension = cls._validate_file(file)
-            
-            # 2. CHECK KÍCH THƯỚC TRƯỚC (từ header - không cần đọc file)
-            cls._check_file_size(file, media_type)
-            
-            # 3. Get original filename
-            original_filename = file.filename or f"upload{extension}"
-            
-            # 4. Xác định giới hạn size dựa trên media type
-            max_size = cls.MAX_IMAGE_SIZE if media_type == "image" else cls.MAX_VIDEO_SIZE
-            
-            # 5. Đọc file theo chunks để an toàn với memory
-            contents = bytearray()
-            chunk_size = 1024 * 1024  # 1MB per chunk
-            
-            while True:
-                chunk = await file.read(chunk_size)
-                if not chunk:
-                    break
-                contents.extend(chunk)
-                
-                # Double-check kích thước trong khi đọc (phòng trường hợp header sai)
-                if len(contents) > max_size:
-                    max_mb = max_size / (1024 * 1024)
-                    raise HTTPException(
-                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                        detail=f"File too large. Maximum for {media_type}: {max_mb:.0f}MB"
-                    )
-            
-            size_bytes = len(contents)
-            
-            # 6. Lưu vào temp file (ImageKit SDK cần file path hoặc file object)
-            with tempfile.NamedTemporaryFile(
-                delete=False,
-                suffix=extension
-            ) as temp_file:
-                temp_file_path = temp_file.name
-                temp_file.write(contents)  # Ghi bytes trực tiếp
-            
-            # 7. Upload lên ImageKit (SDK v5.0.0 API)
+            sha256, size_bytes = await get_media_upload_executor().run(cls._hash_file, file.file, max_size)
+        except ValueError:
+            max_mb = max_size / (1024 * 1024)
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File too large. Maximum for {media_type}: {max_mb:.0f}MB"
+            )
+        
+        # 4. Đã có file cùng nội dung → dùng lại
+        db_lock = db_lock or asyncio.Lock()
+        async with db_lock:
+            existing = await run_blog_db(cls._reuse_blob, db, sha256)
+        if existing is not None:
+            return existing
+        
+        # 5. Tên file unique
+        original_filename = file.filename or f"upload{extension}"
+        unique_filename = f"{uuid.uuid4().hex}_{original_filename}"
+        
+        # 6. Giới hạn size vẫn kiểm tra trong lúc stream (file gốc không đổi thì không bao giờ vượt)
+        await file.seek(0)
+        stream = _UploadStream(file.file, max_size)
+        
+        try:
+            # 7. Upload lên ImageKit (SDK v5.0.0 API) trên upload executor
             imagekit = cls._get_imagekit()
-            
-            # Tạo tên file unique
-            unique_filename = f"{uuid.uuid4().hex}_{original_filename}"
-            
-            # Mở temp file để upload
-            with open(temp_file_path, "rb") as f:
-                # SDK v5.0.0: sử dụng ik.files.upload()
-                upload_result = imagekit.files.upload(
-                    file=f,
-                    file_name=unique_filename,
-                    folder=f"/{folder}/{str(user_id)}",
-                    tags=["blog-upload", str(user_id)],
-                    use_unique_file_name=True
-                )
-            
-            # 8. Trả về kết quả
-            # SDK v5.0.0 trả về object với các attributes
-            return {
-                "url": upload_result.url,
-                "file_id": upload_result.file_id,
-                "file_name": upload_result.name,
-                "media_type": media_type,
-                "mime_type": file.content_type,
-                "width": getattr(upload_result, 'width', None),
-                "height": getattr(upload_result, 'height', None),
-                "size_bytes": size_bytes,
-                "sort_order": 0
-            }
-            
+            upload_result = await get_media_upload_executor().run(
+                imagekit.files.upload,
+                file=(unique_filename, stream, file.content_type),
+                file_name=unique_filename,
+                folder=f"/{folder}/{str(user_id)}",
+                tags=["blog-upload", str(user_id)],
+                use_unique_file_name=True
+            )
         except HTTPException:
             raise
         except Exception as e:
+            if stream.too_large:
+                max_mb = max_size / (1024 * 1024)
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"File too large. Maximum for {media_type}: {max_mb:.0f}MB"
+                )
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Upload failed: {str(e)}"
             )
-        finally:
-            # Xóa temp file sau khi upload xong
-            if temp_file_path and os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
+        
+        # 8. Ghi vào media_blobs
+        # SDK v5.0.0 trả về object với các attributes
+        result = {
+            "url": upload_result.url,
+            "file_id": upload_result.file_id,
+            "file_name": upload_result.name,
+            "media_type": media_type,
+            "mime_type": file.content_type,
+            "width": getattr(upload_result, 'width', None),
+            "height": getattr(upload_result, 'height', None),
+            "size_bytes": size_bytes,
+            "sort_order": 0,
+            "deduplicated": False
+        }
+        try:
+            async with db_lock:
+                existing = await run_blog_db(cls._record_blob, db, result, sha256)
+        except Exception:
+            # Không ghi được → không ai dọn file này, xóa luôn
+            await get_media_upload_executor().run(cls.delete_file, result["file_id"])
+            raise
+        if existing is not None:
+            # Request song song cùng nội dung ghi trước → bỏ bản vừa upload
+            await get_media_upload_executor().run(cls.delete_file, result["file_id"])
+            return existing
+        return result
     
     @classmethod
     async def upload_multiple_files(
         cls,
+        db: Session,
         files: List[UploadFile],
         user_id: uuid.UUID,
         folder: str = "blog"
     ) -> List[dict]:
         """
-        Upload nhiều files lên ImageKit.
+        Upload nhiều files lên ImageKit, tối đa MEDIA_UPLOAD_BATCH_CONCURRENCY file song song.
+        Có file lỗi → báo lỗi. File đã upload xong của batch có thể đang được bài khác dùng
+        (trùng nội dung) nên không xóa ngay: chưa bài nào gắn → job purge_unused_media dọn sau.
         
         Args:
+            db: Database session (media_blobs), các file dùng chung tuần tự (db_lock)
             files: Danh sách files từ request
             user_id: UUID của user upload
             folder: Thư mục trên ImageKit
             
         Returns:
-            List các dict với thông tin từng file
+            List các dict với thông tin từng file (sort_order theo thứ tự gửi lên)
         """
         if len(files) > 10:
             raise HTTPException(
@@ -225,13 +369,30 @@ class MediaService:
                 detail="Maximum 10 files allowed per upload"
             )
         
-        results = []
-        for idx, file in enumerate(files):
-            result = await cls.upload_file(file, user_id, folder)
-            result["sort_order"] = idx
-            results.append(result)
+        # Validate hết trước khi upload file nào
+        for file in files:
+            media_type, _ = cls._validate_file(file)
+            cls._check_file_size(file, media_type)
+        
+        semaphore = asyncio.Semaphore(max(1, settings.MEDIA_UPLOAD_BATCH_CONCURRENCY))
+        db_lock = asyncio.Lock()
+        
+        async def upload_one(file: UploadFile) -> dict:
+            async with semaphore:
+                return await cls.upload_file(db, file, user_id, folder, db_lock)
         
-        return results
+        outcomes = await asyncio.gather(*[upload_one(f) for f in files], return_exceptions=True)
+        
+        errors = [o for o in outcomes if isinstance(o, BaseException)]
+        if errors:
+            uploaded = sum(1 for o in outcomes if isinstance(o, dict))
+            if uploaded:
+                logger.warning("Batch upload failed, %d uploaded files left for purge", uploaded)
+            raise errors[0]
+        
+        for idx, result in enumerate(outcomes):
+            result["sort_order"] = idx
+        return outcomes
     
     @classmethod
     def delete_file(cls, file_id: str) -> bool:
@@ -251,4 +412,48 @@ class MediaService:
             return True
         except Exception:
             # Log error nhưng không throw - file có thể đã bị xóa
-            return False
\ No newline at end of file
+            return False
+    
+    @classmethod
+    def delete_files(cls, file_ids: List[str]) -> int:
+        """
+        Xóa nhiều file trên ImageKit (best-effort), mỗi call bulk tối đa BULK_DELETE_SIZE file.
+        Call bulk lỗi (vd: có file đã bị xóa) → xóa từng file của nhóm đó.
+        Trả về số file xóa thành công.
+        """
+        deleted = 0
+        for start in range(0, len(file_ids), cls.BULK_DELETE_SIZE):
+            batch = file_ids[start:start + cls.BULK_DELETE_SIZE]
+            try:
+                cls._get_imagekit().files.bulk.delete(file_ids=batch)
+                deleted += len(batch)
+            except Exception:
+                deleted += sum(1 for file_id in batch if cls.delete_file(file_id))
+        return deleted
+
+
+def purge_unused_media() -> int:
+    """
+    Job nền: xóa media_blobs không còn bài nào dùng (ref_count = 0) quá thời gian ân hạn,
+    rồi xóa hàng loạt trên ImageKit. Dòng DB xóa + commit trước → upload trùng sau đó
+    không còn thấy file sắp bị xóa. Trả về số file đã xóa khỏi media_blobs.
+    """
+    used_before = datetime.now(timezone.utc) - timedelta(hours=settings.MEDIA_BLOB_UNUSED_GRACE_HOURS)
+    batch_size = settings.MEDIA_BLOB_PURGE_BATCH_SIZE
+    total = 0
+    db = SessionLocal()
+    try:
+        while True:
+            file_ids = BlogRepository.delete_unused_media_blobs(db, used_before, batch_size)
+            db.commit()
+            if not file_ids:
+                break
+            deleted = MediaService.delete_files(file_ids)
+            if deleted < len(file_ids):
+                logger.warning("Purged %d media blobs, %d ImageKit deletes failed", len(file_ids), len(file_ids) - deleted)
+            total += len(file_ids)
+            if len(file_ids) < batch_size:
+                break
+        return total
+    finally:
+        db.close()
@@ -0,0 +1,55 @@
+"""
+Async helpers cho chatbot pipeline
+Chạy các bước blocking (DB, Chroma) ngoài event loop và giới hạn thời gian từng stage
+"""
+
+import asyncio
+
+
+class StageTimeoutError(TimeoutError):
+    """Một stage của pipeline chạy quá thời gian cho phép"""
+
+    def __init__(self, stage: str, seconds: float):
+        self.stage = stage
+        self.seconds = seconds
+        super().__init__(f"Chatbot stage '{stage}' timed out after {seconds}s")
+
+
+async def with_timeout(awaitable, seconds: float, stage: str):
+    """
+    Chờ awaitable với timeout
+
+    Raises:
+        StageTimeoutError: nếu quá `seconds` giây
+    """
+    try:
+        return await asyncio.wait_for(awaitable, timeout=seconds)
+    except asyncio.TimeoutError:
+        raise StageTimeoutError(stage, seconds)
+
+
+class SessionRunner:
+    """
+    Chạy thao tác DB blocking trên thread pool
+
+    Session của SQLAlchemy không thread-safe → các thao tác DB trong 1 request
+    được tuần tự hóa bằng lock, nhưng không chặn event loop.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._lock = asyncio.Lock()
+
+    async def run(self, fn, *args, **kwargs):
+        """Chạy fn(*args, **kwargs) trong worker thread, giữ lock session"""
+        async with self._lock:
+            return await asyncio.to_thread(fn, *args, **kwargs)
+
+    async def release(self):
+        """
+        Trả connection về pool trước khi chờ lâu (LLM)
+
+        Session vẫn dùng tiếp được: lần truy vấn sau sẽ lấy connection mới.
+        """
+        if self.db is not None:
+            await self.run(self.db.close)
@@ -0,0 +1,461 @@
+"""
+Benchmark chatbot offline - đo latency từng stage không cần Gemini / Google Translate / Chroma thật
+
+Chạy bộ message mẫu (đủ 5 intent, tiếng Việt + tiếng Anh) qua ChatbotService thật với:
+- DB SQLite in-memory (hoặc --database-url tới 1 DB Postgres TRỐNG) đã seed món ăn + 1 user có goal
+- Chroma in-memory được index bằng FoodIndexer
+- LLM / embedding / dịch phát lại từ cassette (xem cassette.py)
+
+Báo cáo p50/p95 theo stage (xem tracing.STAGES, do chính pipeline ghi qua tracing.span):
+translate, classify, embed (gồm embedding cache), vector_search, hydrate, filter, optimize,
+generate, total. Stage chạy song song (VD các search của thực đơn) được cộng dồn nên có
+thể lớn hơn total.
+
+Chạy tay (từ thư mục backend):
+    # Không có cassette: response giả lập theo intent mong đợi của suite
+    python -m app.services.nutri_chatbot.benchmark --mode cold --repeat 3
+
+    # Ghi cassette từ Gemini + Google Translate thật (cần GEMINI_API_KEY, mạng)
+    python -m app.services.nutri_chatbot.benchmark --record cassettes/chatbot.json
+
+    # Phát lại cassette với đúng latency đã ghi, so với lần chạy trước
+    python -m app.services.nutri_chatbot.benchmark --cassette cassettes/chatbot.json \\
+        --json after.json --compare before.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import csv
+import io
+import json
+import os
+import random
+import re
+import time
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import numpy as np
+
+from app.services.nutri_chatbot.tracing import STAGES
+
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+DEFAULT_SUITE_PATH = os.path.join(DATA_DIR, "benchmark_suite.jsonl")
+DEFAULT_FOODS_PATH = os.path.join(DATA_DIR, "benchmark_foods.csv")
+
+
+_MACROS = (("calories", "kcal"), ("protein", "g"), ("carbs", "g"), ("fat", "g"))
+
+_SYNTHETIC_ANSWER = (
+    "Dựa trên dữ liệu dinh dưỡng, đây là gợi ý phù hợp với bạn. "
+    "Hãy ưu tiên món giàu protein, nhiều rau xanh và kiểm soát khẩu phần tinh bột. "
+    "Uống đủ nước và chia nhỏ bữa ăn trong ngày để no lâu hơn. "
+)
+
+
+# ==================== Suite ====================
+
+def load_suite(path: str = DEFAULT_SUITE_PATH) -> list:
+    """Message mẫu: text, intent, entities, english (nếu là tiếng Việt), analysis (thực đơn)"""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class SuiteResponder:
+    """
+    Response giả lập cho prompt không có trong cassette, dựa vào đáp án của suite
+
+    - Prompt phân loại intent → JSON intent/entities mong đợi
+    - Prompt phân tích thực đơn → JSON goal_type/calorie_target mong đợi
+    - Prompt còn lại → đoạn trả lời tiếng Việt dài answer_words từ
+    """
+
+    _CLASSIFY_RE = re.compile(r'CÂU CẦN PHÂN LOẠI:\*\*\s*"(.*?)"', re.S)
+    _MEAL_ANALYSIS_RE = re.compile(r'YÊU CẦU: "(.*?)"', re.S)
+
+    def __init__(self, suite: list, answer_words: int = 120):
+        self.by_english = {case.get("english", case["text"]): case for case in suite}
+        self.by_text = {case["text"]: case for case in suite}
+        words = _SYNTHETIC_ANSWER.split()
+        self.answer = " ".join(words[i % len(words)] for i in range(answer_words))
+
+    def translate(self, text: str) -> str:
+        case = self.by_text.get(text)
+        return case.get("english", text) if case else text
+
+    def __call__(self, prompt: str) -> str:
+        match = self._CLASSIFY_RE.search(prompt)
+        if match:
+            case = self.by_english.get(match.group(1), {"intent": "SOCIAL", "entities": {}})
+            return json.dumps({"intent": case["intent"], "entities": case["entities"]})
+
+        match = self._MEAL_ANALYSIS_RE.search(prompt)
+        if match:
+            case = self.by_text.get(match.group(1), {})
+            return json.dumps(case.get("analysis") or {"goal_type": None, "calorie_target": None})
+
+        return self.answer
+
+
+# ==================== Seed ====================
+
+def create_benchmark_engine(database_url: str):
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import StaticPool
+
+    if database_url.startswith("sqlite"):
+        # In-memory: mọi thread (SessionRunner) phải dùng chung 1 connection
+        return create_engine(database_url, poolclass=StaticPool, connect_args={"check_same_thread": False})
+    return create_engine(database_url)
+
+
+def seed_database(engine, foods_path: str = DEFAULT_FOODS_PATH):
+    """
+    Tạo bảng + seed món ăn (macro per 100g) và 1 user có profile/goal/biometrics
+
+    Returns:
+        uuid.UUID: id của user benchmark
+    """
+    from sqlalchemy.orm import Session
+
+    from app.models.auth import Goal, Profile, User
+    from app.models.base import Base
+    from app.models.biometric import BiometricsLog
+    from app.models.food import Food, FoodNutrient, FoodPortion
+
+    Base.metadata.create_all(engine, tables=[
+        User.__table__, Profile.__table__, Goal.__table__, BiometricsLog.__table__,
+        Food.__table__, FoodNutrient.__table__, FoodPortion.__table__,
+    ])
+
+    now = datetime.now(timezone.utc)
+    user_id = uuid.uuid4()
+    with Session(engine) as db:
+        with open(foods_path, encoding="utf-8") as f:
+            for food_id, row in enumerate(csv.DictReader(f), start=1):
+                food = Food(
+                    id=food_id, name=row["name"], food_group=row["food_group"],
+                    created_at=now, updated_at=now + timedelta(microseconds=food_id)
+                )
+                food.nutrients = [
+                    FoodNutrient(nutrient_name=name, unit=unit, amount_per_100g=Decimal(row[name]))
+                    for name, unit in _MACROS
+                ]
+                db.add(food)
+
+        db.add(User(id=user_id, username=f"bench_{user_id.hex[:8]}", email=f"bench_{user_id.hex[:8]}@example.com", password_hash="x"))
+        db.add(Profile(user_id=user_id, full_name="Benchmark User", gender="female",
+                       date_of_birth=date(1995, 6, 1), height_cm_default=Decimal("162")))
+        db.add(Goal(user_id=user_id, goal_type="lose_weight", daily_calorie_target=Decimal("1800"),
+                    weekly_exercise_min=150))
+        db.add(BiometricsLog(id=1, user_id=user_id, logged_at=now, weight_kg=Decimal("62"), height_cm=Decimal("162")))
+        db.commit()
+    return user_id
+
+
+# ==================== Run ====================
+
+@contextlib.contextmanager
+def _patched(owner, name, value):
+    original = getattr(owner, name)
+    setattr(owner, name, value)
+    try:
+        yield
+    finally:
+        setattr(owner, name, original)
+
+
+def _percentiles(values) -> dict:
+    if not values:
+        return {"n": 0, "p50": None, "p95": None, "max": None}
+    arr = np.asarray(values, dtype=np.float64)
+    return {
+        "n": len(values),
+        "p50": round(float(np.percentile(arr, 50)), 2),
+        "p95": round(float(np.percentile(arr, 95)), 2),
+        "max": round(float(arr.max()), 2),
+    }
+
+
+def _reset_caches(user_id) -> None:
+    """Xóa mọi cache trong process → mỗi message chạy như lần đầu"""
+    from app.services.nutri_chatbot import translate_service
+    from app.services.nutri_chatbot.embedding_cache import get_embedding_cache
+    from app.services.nutri_chatbot.response_cache import get_response_cache
+    from app.services.user_context_service import UserContextService
+
+    translate_service._language_cache.clear()
+    translate_service._translation_cache.clear()
+    get_embedding_cache().memory.clear()
+    get_response_cache().purge()
+    UserContextService.invalidate(user_id)
+
+
+async def _run_case(session_factory, user_id, case: dict) -> dict:
+    from app.services.nutri_chatbot.chatbot_service import ChatbotService
+
+    db = session_factory()
+    error = None
+    result = {}
+    start = time.perf_counter()
+    try:
+        chatbot = ChatbotService(db=db, user_id=user_id)
+        result = await chatbot.chat(case["text"])
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        db.close()
+
+    # Timings do chính pipeline ghi (tracing.span), có được nhờ bật CHATBOT_DEBUG_TIMINGS
+    timings = {stage: value["ms"] for stage, value in (result.get("timings") or {}).items()}
+    timings["total"] = (time.perf_counter() - start) * 1000
+
+    return {
+        "text": case["text"],
+        "expected_intent": case["intent"],
+        "intent": result.get("intent"),
+        "timings": timings,
+        "error": error,
+    }
+
+
+async def _run_suite(session_factory, user_id, suite: list, mode: str, repeat: int) -> list:
+    if mode == "warm":
+        for case in suite:
+            await _run_case(session_factory, user_id, case)
+
+    records = []
+    for _ in range(repeat):
+        for case in suite:
+            if mode == "cold":
+                _reset_caches(user_id)
+            records.append(await _run_case(session_factory, user_id, case))
+    return records
+
+
+def summarize(records: list) -> dict:
+    """p50/p95 theo stage và theo intent + độ chính xác intent"""
+    stages = {stage: _percentiles([r["timings"][stage] for r in records if stage in r["timings"]]) for stage in STAGES}
+
+    by_intent = defaultdict(list)
+    for r in records:
+        by_intent[r["expected_intent"]].append(r["timings"]["total"])
+
+    return {
+        "messages": len(records),
+        "errors": [r for r in records if r["error"]],
+        "mismatches": [r for r in records if not r["error"] and r["intent"] != r["expected_intent"]],
+        "intent_accuracy": round(sum(r["intent"] == r["expected_intent"] for r in records) / max(len(records), 1), 4),
+        "stages": stages,
+        "intents": {intent: _percentiles(values) for intent, values in sorted(by_intent.items())},
+    }
+
+
+def run_benchmark(
+    suite: list,
+    mode: str = "warm",
+    repeat: int = 1,
+    database_url: str = "sqlite://",
+    foods_path: str = DEFAULT_FOODS_PATH,
+    cassette_path: str = None,
+    record_path: str = None,
+    replay_latency: bool = True,
+    llm_latency: float = 0.0,
+    translate_latency: float = 0.0,
+    answer_words: int = 120,
+    seed: int = 0,
+    verbose: bool = False,
+) -> dict:
+    """
+    Seed DB + Chroma, thay backend bằng cassette rồi chạy suite
+
+    Args:
+        mode: "warm" (chạy 1 lượt làm nóng cache rồi mới đo) | "cold" (xóa cache trước mỗi message)
+        cassette_path: Cassette để phát lại (None = chỉ dùng response giả lập của suite)
+        record_path: Ghi cassette mới từ backend thật vào file này
+        replay_latency: False = không sleep theo latency đã ghi (chỉ đo overhead của mình)
+        llm_latency / translate_latency: Latency giả lập (giây) cho response không có trong cassette
+
+    Returns:
+        dict: summarize() + thông tin cassette / LLM gateway
+    """
+    import chromadb
+    from sqlalchemy.orm import sessionmaker
+
+    from app.core.settings import settings
+    from app.services.nutri_chatbot import embedders, embedding_cache, llm_gateway, rag_service, translate_service
+    from app.services.nutri_chatbot import response_cache
+    from app.services.nutri_chatbot.cassette import (
+        Cassette, CassetteEmbedder, CassetteLLMBackend, CassetteTranslator,
+        RecordingEmbedder, RecordingLLMBackend, RecordingTranslator,
+    )
+    from app.services.nutri_chatbot.embedding_cache import EmbeddingCache
+    from app.services.nutri_chatbot.food_index import FoodIndexer
+    from app.services.nutri_chatbot.response_cache import ResponseCache
+    from app.services.user_context_service import UserContextService
+
+    random.seed(seed)
+    responder = SuiteResponder(suite, answer_words=answer_words)
+
+    if record_path:
+        from deep_translator import GoogleTranslator
+
+        cassette = Cassette()
+        llm_backend = RecordingLLMBackend(llm_gateway.GeminiBackend(), cassette)
+        embedder = RecordingEmbedder(embedders.GeminiEmbedder(), cassette)
+        translator = RecordingTranslator(GoogleTranslator(source='vi', target='en'), cassette)
+    else:
+        cassette = Cassette(cassette_path)
+        llm_backend = CassetteLLMBackend(cassette, fallback=responder, fallback_latency=llm_latency, replay_latency=replay_latency)
+        embedder = CassetteEmbedder(cassette, fallback=embedders.HashingEmbedder(), replay_latency=replay_latency)
+        translator = CassetteTranslator(cassette, fallback=responder.translate, fallback_latency=translate_latency, replay_latency=replay_latency)
+
+    gateway = llm_gateway.LLMGateway(
+        llm_backend,
+        max_concurrency=settings.CHATBOT_LLM_MAX_CONCURRENCY,
+        per_user_concurrency=settings.CHATBOT_LLM_PER_USER_CONCURRENCY,
+        max_queue=settings.CHATBOT_LLM_MAX_QUEUE,
+        queue_timeout=settings.CHATBOT_LLM_QUEUE_TIMEOUT_SECONDS,
+    )
+
+    with contextlib.ExitStack() as stack:
+        if not verbose:
+            stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+
+        engine = create_benchmark_engine(database_url)
+        stack.callback(engine.dispose)
+        user_id = seed_database(engine, foods_path)
+        session_factory = sessionmaker(bind=engine)
+
+        collection = chromadb.EphemeralClient().create_collection(
+            f"benchmark-foods-{uuid.uuid4().hex[:8]}", metadata={"hnsw:space": "cosine"}
+        )
+        with session_factory() as db:
+            FoodIndexer(db, collection, embedder).sync(full=True)
+
+        for owner, name, value in (
+            (rag_service, "_get_foods_collection", lambda: collection),
+            (embedders, "_embedder", embedder),
+            (embedding_cache, "_embedding_cache", EmbeddingCache(model=embedder.model, maxsize=settings.EMBEDDING_CACHE_SIZE)),
+            (llm_gateway, "_gateway", gateway),
+            (translate_service, "_translator", translator),
+            (response_cache, "_response_cache", ResponseCache(
+                maxsize=settings.CHATBOT_RESPONSE_CACHE_SIZE,
+                ttl=settings.CHATBOT_RESPONSE_CACHE_TTL_SECONDS,
+                semantic_threshold=settings.CHATBOT_RESPONSE_CACHE_SEMANTIC_THRESHOLD,
+            )),
+        ):
+            stack.enter_context(_patched(owner, name, value))
+        stack.enter_context(_patched(settings, "CHATBOT_DEBUG_TIMINGS", True))
+        stack.callback(UserContextService.invalidate, user_id)
+        stack.callback(translate_service._translation_cache.clear)
+
+        records = asyncio.run(_run_suite(session_factory, user_id, suite, mode, repeat))
+
+    if record_path:
+        cassette.save(record_path)
+
+    summary = summarize(records)
+    summary.update({
+        "mode": mode,
+        "repeat": repeat,
+        "llm": "recording" if record_path else ("cassette" if cassette_path else "synthetic"),
+        "cassette": cassette.stats(),
+        "llm_gateway": {k: v for k, v in gateway.stats().items() if k != "backend"},
+    })
+    return summary
+
+
+# ==================== Report ====================
+
+def _fmt(value) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+
+def format_report(summary: dict, baseline: dict = None) -> str:
+    lines = [
+        f"Chatbot benchmark: {summary['messages']} messages, mode={summary['mode']}, llm={summary['llm']}",
+        "",
+        f"{'stage':<30}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}" + ("   Δp50     Δp95" if baseline else ""),
+    ]
+
+    def row(name, stats, base):
+        line = f"{name:<30}{stats['n']:>6}{_fmt(stats['p50']):>10}{_fmt(stats['p95']):>10}{_fmt(stats['max']):>10}"
+        if base and base.get("p50") is not None and stats["p50"] is not None:
+            line += f"{stats['p50'] - base['p50']:>+9.1f}{stats['p95'] - base['p95']:>+9.1f}"
+        return line
+
+    for stage, stats in summary["stages"].items():
+        lines.append(row(stage, stats, (baseline or {}).get("stages", {}).get(stage)))
+
+    lines += ["", "total by intent"]
+    for intent, stats in summary["intents"].items():
+        lines.append(row(intent, stats, (baseline or {}).get("intents", {}).get(intent)))
+
+    cassette = summary["cassette"]
+    lines += [
+        "",
+        f"intent accuracy: {summary['intent_accuracy']:.0%}",
+        "cassette: " + ", ".join(f"{kind} {s['hits']} hit / {s['misses']} miss" for kind, s in cassette.items()),
+        f"llm gateway: {summary['llm_gateway']['counters']}",
+    ]
+    for record in summary["mismatches"]:
+        lines.append(f"intent mismatch {record['text']!r}: {record['intent']} (expected {record['expected_intent']})")
+    for record in summary["errors"]:
+        lines.append(f"ERROR {record['text']!r}: {record['error']}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark chatbot offline (cassette LLM / embedding / dịch)")
+    parser.add_argument("--suite", default=DEFAULT_SUITE_PATH)
+    parser.add_argument("--foods", default=DEFAULT_FOODS_PATH, help="CSV món ăn để seed DB + Chroma")
+    parser.add_argument("--database-url", default="sqlite://", help="Postgres phải là DB trống riêng cho benchmark")
+    parser.add_argument("--mode", choices=("warm", "cold"), default="warm")
+    parser.add_argument("--repeat", type=int, default=1)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--cassette", help="Phát lại cassette đã ghi")
+    source.add_argument("--record", help="Gọi backend thật và ghi cassette vào file này")
+    parser.add_argument("--no-latency", action="store_true", help="Không sleep theo latency đã ghi")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Latency giả lập khi prompt không có trong cassette")
+    parser.add_argument("--translate-latency-ms", type=float, default=0.0)
+    parser.add_argument("--answer-words", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Ghi summary ra file JSON (dùng làm baseline cho --compare)")
+    parser.add_argument("--compare", help="Summary JSON của lần chạy trước để so sánh")
+    parser.add_argument("--verbose", action="store_true", help="Giữ log print của chatbot")
+    args = parser.parse_args(argv)
+
+    summary = run_benchmark(
+        load_suite(args.suite),
+        mode=args.mode,
+        repeat=args.repeat,
+        database_url=args.database_url,
+        foods_path=args.foods,
+        cassette_path=args.cassette,
+        record_path=args.record,
+        replay_latency=not args.no_latency,
+        llm_latency=args.llm_latency_ms / 1000,
+        translate_latency=args.translate_latency_ms / 1000,
+        answer_words=args.answer_words,
+        seed=args.seed,
+        verbose=args.verbose,
+    )
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print(format_report(summary, baseline))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+Cassette - Ghi lại / phát lại response của LLM, embedding và dịch (dùng cho benchmark)
+
+Chế độ ghi: bọc backend thật (GeminiBackend, GeminiEmbedder, GoogleTranslator),
+lưu response + latency đo được. Chế độ phát: trả lại đúng response đó và sleep
+đúng latency đã ghi → đo được pipeline của mình mà không cần mạng / quota.
+
+File cassette (JSON):
+    {
+        "version": 1,
+        "embedding_model": "models/text-embedding-004" | null,
+        "llm": {key: {"chunks": [...], "latency_ms": ..., "first_chunk_ms": ...}},
+        "embeddings": {key: {"vector": [...], "latency_ms": ...}},
+        "translations": {key: {"text": ..., "latency_ms": ...}}
+    }
+
+key = sha256 của (model, input) → cassette không chứa lại prompt dài.
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+
+
+CASSETTE_VERSION = 1
+_KINDS = ("llm", "embeddings", "translations")
+
+
+class CassetteMissError(KeyError):
+    """Input chưa được ghi trong cassette và không có fallback"""
+
+
+def _key(*parts) -> str:
+    return hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+class Cassette:
+    """
+    Kho response đã ghi
+
+    Args:
+        path: File JSON để load (None = cassette rỗng, chỉ dùng fallback / để ghi)
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self.embedding_model = None
+        self.entries = {kind: {} for kind in _KINDS}
+        self.hits = {kind: 0 for kind in _KINDS}
+        self.misses = {kind: 0 for kind in _KINDS}
+        if path:
+            self.load(path)
+
+    def load(self, path: str) -> None:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != CASSETTE_VERSION:
+            raise ValueError(f"Unsupported cassette version: {data.get('version')}")
+        self.embedding_model = data.get("embedding_model")
+        for kind in _KINDS:
+            self.entries[kind] = data.get(kind, {})
+
+    def save(self, path: str = None) -> None:
+        data = {"version": CASSETTE_VERSION, "embedding_model": self.embedding_model, **self.entries}
+        with open(path or self.path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    def get(self, kind: str, key: str):
+        entry = self.entries[kind].get(key)
+        if entry is None:
+            self.misses[kind] += 1
+        else:
+            self.hits[kind] += 1
+        return entry
+
+    def put(self, kind: str, key: str, entry: dict) -> None:
+        self.entries[kind][key] = entry
+
+    def stats(self) -> dict:
+        return {
+            kind: {"entries": len(self.entries[kind]), "hits": self.hits[kind], "misses": self.misses[kind]}
+            for kind in _KINDS
+        }
+
+
+# ==================== LLM ====================
+
+class RecordingLLMBackend:
+    """Bọc backend LLM thật (VD GeminiBackend), ghi response + latency vào cassette"""
+
+    def __init__(self, backend, cassette: Cassette):
+        self.backend = backend
+        self.cassette = cassette
+
+    async def generate(self, prompt: str, model: str) -> str:
+        start = time.perf_counter()
+        text = await self.backend.generate(prompt, model)
+        latency = _elapsed_ms(start)
+        self.cassette.put("llm", _key(model, prompt), {"chunks": [text], "latency_ms": latency, "first_chunk_ms": latency})
+        return text
+
+    async def generate_stream(self, prompt: str, model: str):
+        start = time.perf_counter()
+        chunks = []
+        first_chunk_ms = None
+        async for chunk in self.backend.generate_stream(prompt, model):
+            if first_chunk_ms is None:
+                first_chunk_ms = _elapsed_ms(start)
+            chunks.append(chunk)
+            yield chunk
+        self.cassette.put("llm", _key(model, prompt), {
+            "chunks": chunks,
+            "latency_ms": _elapsed_ms(start),
+            "first_chunk_ms": first_chunk_ms or 0.0,
+        })
+
+
+class CassetteLLMBackend:
+    """
+    Phát lại response LLM từ cassette (cùng interface với GeminiBackend)
+
+    Args:
+        cassette: Cassette đã load
+        fallback: fn(prompt) -> str khi prompt chưa được ghi (None = raise CassetteMissError)
+        fallback_latency: Latency (giây) giả lập cho response fallback
+        replay_latency: False = không sleep (chỉ đo overhead của pipeline)
+    """
+
+    def __init__(self, cassette: Cassette, fallback=None, fallback_latency: float = 0.0, replay_latency: bool = True):
+        self.cassette = cassette
+        self.fallback = fallback
+        self.fallback_latency = fallback_latency
+        self.replay_latency = replay_latency
+        self.calls = 0
+
+    def _lookup(self, prompt: str, model: str) -> dict:
+        self.calls += 1
+        entry = self.cassette.get("llm", _key(model, prompt))
+        if entry is not None:
+            return entry
+        if self.fallback is None:
+            raise CassetteMissError(f"LLM prompt not in cassette ({prompt[:60]!r}...)")
+        latency_ms = self.fallback_latency * 1000
+        return {"chunks": [self.fallback(prompt)], "latency_ms": latency_ms, "first_chunk_ms": latency_ms}
+
+    async def _sleep_ms(self, ms: float) -> None:
+        if self.replay_latency and ms > 0:
+            await asyncio.sleep(ms / 1000)
+
+    async def generate(self, prompt: str, model: str) -> str:
+        entry = self._lookup(prompt, model)
+        await self._sleep_ms(entry["latency_ms"])
+        return "".join(entry["chunks"])
+
+    async def generate_stream(self, prompt: str, model: str):
+        entry = self._lookup(prompt, model)
+        chunks = entry["chunks"]
+        await self._sleep_ms(entry["first_chunk_ms"])
+        # Phần còn lại chia đều giữa các chunk
+        gap = (entry["latency_ms"] - entry["first_chunk_ms"]) / max(len(chunks) - 1, 1)
+        for i, chunk in enumerate(chunks):
+            if i:
+                await self._sleep_ms(gap)
+            yield chunk
+
+
+# ==================== Embedding ====================
+
+class RecordingEmbedder:
+    """Bọc embedder thật, ghi vector query + document vào cassette"""
+
+    def __init__(self, embedder, cassette: Cassette):
+        self.embedder = embedder
+        self.cassette = cassette
+        self.model = embedder.model
+        self.max_batch_size = embedder.max_batch_size
+        cassette.embedding_model = embedder.model
+
+    def embed_documents(self, texts):
+        start = time.perf_counter()
+        vectors = self.embedder.embed_documents(texts)
+        latency = _elapsed_ms(start) / max(len(texts), 1)
+        for text, vector in zip(texts, vectors):
+            self.cassette.put("embeddings", _key(self.model, "document", text), {"vector": list(vector), "latency_ms": latency})
+        return vectors
+
+    async def embed_query(self, text: str):
+        start = time.perf_counter()
+        vector = await self.embedder.embed_query(text)
+        self.cassette.put("embeddings", _key(self.model, "query", text), {"vector": list(vector), "latency_ms": _elapsed_ms(start)})
+        return vector
+
+
+class CassetteEmbedder:
+    """
+    Phát lại embedding từ cassette
+
+    Cassette ghi bằng embedder thật thì mọi text phải có trong cassette (vector của
+    model khác không so sánh được). Cassette không có embedding → dùng fallback
+    (thường là HashingEmbedder) cho tất cả.
+    """
+
+    def __init__(self, cassette: Cassette, fallback=None, replay_latency: bool = True):
+        self.cassette = cassette
+        self.replay_latency = replay_latency
+        self.fallback = None if cassette.embedding_model else fallback
+        if self.fallback is None and not cassette.embedding_model:
+            raise ValueError("Cassette has no embeddings: a fallback embedder is required")
+        self.model = cassette.embedding_model or fallback.model
+        self.max_batch_size = 1000
+
+    def _entry(self, kind: str, text: str) -> dict:
+        entry = self.cassette.get("embeddings", _key(self.model, kind, text))
+        if entry is None:
+            raise CassetteMissError(f"Embedding not in cassette ({kind}: {text[:60]!r})")
+        return entry
+
+    def embed_documents(self, texts):
+        if self.fallback is not None:
+            return self.fallback.embed_documents(texts)
+        return [self._entry("document", text)["vector"] for text in texts]
+
+    async def embed_query(self, text: str):
+        if self.fallback is not None:
+            return await self.fallback.embed_query(text)
+        entry = self._entry("query", text)
+        if self.replay_latency and entry["latency_ms"] > 0:
+            await asyncio.sleep(entry["latency_ms"] / 1000)
+        return entry["vector"]
+
+
+# ==================== Translation ====================
+
+class RecordingTranslator:
+    """
+    Bọc GoogleTranslator (deep_translator), ghi bản dịch vào cassette.
+    1 instance dùng cho mọi thread → khóa quanh translate() (instance giữ text của call hiện tại)
+    """
+
+    def __init__(self, translator, cassette: Cassette):
+        self.translator = translator
+        self.cassette = cassette
+        self._lock = threading.Lock()
+
+    def translate(self, text: str) -> str:
+        start = time.perf_counter()
+        with self._lock:
+            english = self.translator.translate(text)
+        self.cassette.put("translations", _key(text), {"text": english, "latency_ms": _elapsed_ms(start)})
+        return english
+
+
+class CassetteTranslator:
+    """
+    Phát lại bản dịch (blocking giống GoogleTranslator.translate)
+
+    Args:
+        fallback: fn(text) -> str khi text chưa được ghi (None = raise CassetteMissError)
+        fallback_latency: Latency (giây) giả lập cho bản dịch fallback
+    """
+
+    def __init__(self, cassette: Cassette, fallback=None, fallback_latency: float = 0.0, replay_latency: bool = True):
+        self.cassette = cassette
+        self.fallback = fallback
+        self.fallback_latency = fallback_latency
+        self.replay_latency = replay_latency
+
+    def translate(self, text: str) -> str:
+        entry = self.cassette.get("translations", _key(text))
+        if entry is None:
+            if self.fallback is None:
+                raise CassetteMissError(f"Translation not in cassette ({text[:60]!r})")
+            entry = {"text": self.fallback(text), "latency_ms": self.fallback_latency * 1000}
+        if self.replay_latency and entry["latency_ms"] > 0:
+            time.sleep(entry["latency_ms"] / 1000)
+        return entry["text"]
@@ -1,11 +1,21 @@
 from sqlalchemy.orm import Session
+import asyncio
 import json
+import logging
 import re
 
 from app.core.settings import settings
+from app.services.user_context_service import UserContextService
+from app.services.nutri_chatbot.async_utils import SessionRunner
+from app.services.nutri_chatbot.meal_optimizer import MEAL_SPLIT, PLATE_SPLIT, plan_day
+from app.services.nutri_chatbot.response_cache import CACHEABLE_INTENTS, ResponseCache, get_response_cache
 # Lazy imports để tránh lỗi khi không có google-generativeai
 # IntentClassifier, RAGService sẽ được import trong __init__
-from app.services.nutri_chatbot.translate_service import TranslateService
+from app.services.nutri_chatbot.tracing import span, start_trace
+from app.services.nutri_chatbot.translate_service import TranslateService, detect_language
+
+
+logger = logging.getLogger(__name__)
 
 
 class ChatbotService:
@@ -36,20 +46,26 @@ class ChatbotService:
                 "Please install it with: pip install google-generativeai"
             )
         
-        if not settings.GEMINI_API_KEY:
-            raise ValueError("GEMINI_API_KEY is not configured in settings")
-        
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
-        
         # Lazy import các service con
         from app.services.nutri_chatbot.intent_classifier import IntentClassifier
+        from app.services.nutri_chatbot.llm_gateway import get_llm_gateway
         from app.services.nutri_chatbot.rag_service import RAGService
         
+        # Mọi call LLM đi qua gateway chung (giới hạn đồng thời + hàng đợi + retry).
+        # Chỉ backend Gemini cần GEMINI_API_KEY (fake / cassette chạy offline)
+        self.llm = get_llm_gateway()
+        
+        # Mọi thao tác DB của request đi qua 1 runner (không chặn event loop)
+        self.session_runner = SessionRunner(db)
+        
         self.intent_classifier = IntentClassifier()
-        self.rag_service = RAGService(db)
+        self.rag_service = RAGService(db, self.session_runner)
+        self.response_cache = get_response_cache()
+        
+        # Queue sự kiện khi chạy chat_stream (None = chat thường)
+        self._events = None
     
-    def chat(self, message):
+    async def chat(self, message):
         """
         Xử lý message từ user
         
@@ -60,51 +76,195 @@ class ChatbotService:
             dict: {
                 "response": "Câu trả lời...",
                 "intent": "FOOD_NUTRITION_INQUIRY",
-                "data": [...] (kết quả RAG nếu có)
+                "data": [...] (kết quả RAG nếu có),
+                "timings": {stage: {"ms", "count"}} (chỉ khi CHATBOT_DEBUG_TIMINGS)
             }
         """
+        with start_trace() as trace:
+            with span("total"):
+                result = await self._chat(message)
         
-        print(f"\n📝 User: {message}")
+        if settings.CHATBOT_DEBUG_TIMINGS:
+            result = {**result, "timings": trace.to_dict()}
+        return result
+    
+    async def _chat(self, message):
+        """Pipeline của chat(): classify → response cache → handler"""
+        logger.debug("User message: %s", message)
+        
+        # Connection của get_db (đã dùng để auth) không giữ trong lúc chờ LLM
+        await self.session_runner.release()
         
         # Step 1: Classify intent
-        intent_result = self.intent_classifier.classify(message)
+        intent_result = await self.intent_classifier.classify(message, user_id=self.user_id)
         intent = intent_result['intent']
         entities = intent_result['entities']
         
-        print(f"🎯 Intent: {intent}")
-        print(f"📦 Entities: {entities}")
+        logger.debug("Intent: %s, entities: %s", intent, entities)
+        
+        self._emit("intent", {"intent": intent, "entities": entities})
+        
+        # Step 2: Intent deterministic → thử response cache (hit = bỏ qua RAG + Gemini)
+        cache_key = vector = None
+        if intent in CACHEABLE_INTENTS:
+            cache_key = ResponseCache.make_key(intent, entities, locale=detect_language(message))
+            cached, vector = await self.response_cache.lookup(
+                cache_key, embed=self.rag_service._generate_query_embedding
+            )
+            if cached is not None:
+                logger.debug("Response cache hit: %s", intent)
+                self._emit("results", {"data": cached["data"]})
+                return dict(cached)
         
-        # Step 2: Route to appropriate handler
+        # Step 3: Route to appropriate handler
+        result = await self._route(intent, entities, message)
+        
+        # Chỉ cache khi tìm được món (câu "không tìm thấy" có thể đổi khi thêm dữ liệu)
+        if cache_key is not None and result.get("data"):
+            self.response_cache.store(cache_key, result, vector)
+        
+        return result
+    
+    async def _route(self, intent, entities, message):
+        """Gọi handler theo intent"""
         if intent == 'SOCIAL':
-            return self._handle_social(message)
+            return await self._handle_social(message)
         
         elif intent == 'FOOD_NUTRITION_INQUIRY':
-            return self._handle_food_nutrition_inquiry(message, entities)
+            return await self._handle_food_nutrition_inquiry(message, entities)
         
         elif intent == 'CALORIE_BASED_RECOMMENDATION':
-            return self._handle_calorie_based_recommendation(message, entities)
+            return await self._handle_calorie_based_recommendation(message, entities)
         
         elif intent == 'GOAL_BASED_RECOMMENDATION':
-            return self._handle_goal_based_recommendation(message, entities)
+            return await self._handle_goal_based_recommendation(message, entities)
         
         elif intent == 'MEAL_PLAN_REQUEST':
-            return self._handle_meal_plan_request(message, entities)
+            return await self._handle_meal_plan_request(message, entities)
         
         else:
             # Fallback
-            return self._handle_social(message)
+            return await self._handle_social(message)
+    
+    async def chat_stream(self, message):
+        """
+        Như chat() nhưng yield sự kiện ngay khi có (cho SSE)
+        
+        Thứ tự: intent → results (kết quả RAG) → token (nhiều lần) → done
+        Lỗi giữa chừng → sự kiện error (timeout 504, quá tải 429/503).
+        Generator bị đóng (client ngắt kết nối) → hủy pipeline, trả slot LLM.
+        
+        Yields:
+            tuple: (event, data)
+        """
+        from app.services.nutri_chatbot.async_utils import StageTimeoutError
+        from app.services.nutri_chatbot.llm_gateway import LLMGatewayError
+        
+        queue = asyncio.Queue()
+        self._events = queue
+        
+        async def run():
+            try:
+                result = await self.chat(message)
+                if not self._streamed:
+                    # Câu trả lời không qua LLM (VD: tra cứu món) → gửi nguyên 1 lần
+                    queue.put_nowait(("token", {"text": result["response"]}))
+                queue.put_nowait(("done", result))
+            except StageTimeoutError as e:
+                queue.put_nowait(("error", {"status": 504, "detail": str(e)}))
+            except LLMGatewayError as e:
+                queue.put_nowait(("error", {"status": e.status_code, "detail": str(e), "retry_after": e.retry_after}))
+            except Exception as e:
+                logger.exception("Chatbot stream error")
+                queue.put_nowait(("error", {"status": 500, "detail": str(e)}))
+        
+        self._streamed = False
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                event, data = await queue.get()
+                yield event, data
+                if event in ("done", "error"):
+                    break
+        finally:
+            if not task.done():
+                logger.info("Client disconnected, cancelling chat pipeline")
+                task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            self._events = None
+    
+    def _emit(self, event, data):
+        """Đẩy sự kiện cho chat_stream (không làm gì khi chat thường)"""
+        if self._events is not None:
+            if event == "token":
+                self._streamed = True
+            self._events.put_nowait((event, data))
     
     # ========== HELPER METHODS ==========
     
+    async def _generate(self, prompt, stream=True):
+        """
+        Sinh câu trả lời bằng Gemini qua LLM gateway (async, có timeout + retry)
+        
+        Khi đang chat_stream và stream=True: dùng streaming API, mỗi đoạn text
+        được emit thành sự kiện "token" ngay khi model sinh ra.
+        
+        Args:
+            prompt (str): Prompt gửi cho model
+            stream (bool): False cho các prompt nội bộ (VD: phân tích JSON), không gửi cho user
+        
+        Returns:
+            str: Text trả về (đã strip)
+        
+        Raises:
+            LLMGatewayError: gateway quá tải (route trả 429/503)
+        """
+        # Trả connection DB về pool trước khi xếp hàng chờ LLM
+        await self.session_runner.release()
+        
+        with span("generate"):
+            if stream and self._events is not None:
+                chunks = []
+                async for chunk in self.llm.generate_stream(
+                    prompt,
+                    timeout=settings.CHATBOT_LLM_TIMEOUT_SECONDS,
+                    stage="generate",
+                    user_id=self.user_id
+                ):
+                    chunks.append(chunk)
+                    self._emit("token", {"text": chunk})
+                return "".join(chunks).strip()
+            
+            text = await self.llm.generate(
+                prompt,
+                timeout=settings.CHATBOT_LLM_TIMEOUT_SECONDS,
+                stage="generate",
+                user_id=self.user_id
+            )
+        return text.strip()
+    
+    async def _load_user_profile(self):
+        """
+        Snapshot user cho handler: cache hit → trả ngay, không cần thread/DB
+        """
+        if not self.user_id:
+            return None
+        
+        snapshot = UserContextService.get_cached(self.user_id)
+        if snapshot is not None:
+            return snapshot
+        
+        return await self.session_runner.run(self._get_user_profile)
+    
     def _get_user_profile(self):
         """
         ✅ FIXED: Lấy FULL thông tin user từ database
         
-        Lấy từ 4 bảng:
+        Lấy từ 4 bảng (qua UserContextService, có cache theo user):
         - users: username, email
         - profiles: full_name, gender, date_of_birth, height_cm_default
-        - goals: goal_type, daily_calorie_target, baseline_activity, weekly_goal, macros
-        - biometrics_logs: weight_kg, bmi (record mới nhất) - QUERY TRỰC TIẾP
+        - goals: goal_type, daily_calorie_target, baseline_activity, weekly_goal, macros, weekly_exercise_min
+        - biometrics_logs: weight_kg, bmi (record mới nhất)
         
         Returns:
             dict: {
@@ -123,72 +283,18 @@ class ChatbotService:
                 'weekly_goal': float,
                 'protein_grams': float,
                 'fat_grams': float,
-                'carb_grams': float
+                'carb_grams': float,
+                'weekly_exercise_min': int
             } hoặc None
         """
         if not self.user_id:
             return None
         
         try:
-            from app.models.auth import User
-            from app.models.biometric import BiometricsLog 
-            
-            # Lấy user
-            user = self.db.query(User).filter(User.id == self.user_id).first()
-            if not user:
-                return None
-            
-            # Lấy profile (dùng relationship - đã có sẵn trong User model)
-            profile = None
-            if hasattr(user, 'profile') and user.profile:
-                profile = user.profile
-            
-            # Lấy goals (dùng relationship - đã có sẵn trong User model)
-            goals = None
-            if hasattr(user, 'goal') and user.goal:
-                goals = user.goal
-            
-            # ✅ FIX: Query biometrics_logs trực tiếp từ database
-            # KHÔNG dùng relationship vì User model không có biometrics_logs
-            biometrics = (
-                self.db.query(BiometricsLog)
-                .filter(BiometricsLog.user_id == self.user_id)
-                .order_by(BiometricsLog.logged_at.desc())
-                .first()
-            )
-            
-            # Tính tuổi từ date_of_birth
-            age = None
-            if profile and hasattr(profile, 'date_of_birth') and profile.date_of_birth:
-                from datetime import date
-                today = date.today()
-                dob = profile.date_of_birth
-                age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
-            
-            # Build result dictionary
-            return {
-                'user_id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'full_name': profile.full_name if profile and hasattr(profile, 'full_name') else None,
-                'gender': profile.gender if profile and hasattr(profile, 'gender') else None,
-                'age': age,
-                'height_cm': float(profile.height_cm_default) if profile and hasattr(profile, 'height_cm_default') and profile.height_cm_default else None,
-                'weight_kg': float(biometrics.weight_kg) if biometrics and hasattr(biometrics, 'weight_kg') and biometrics.weight_kg else None,
-                'bmi': float(biometrics.bmi) if biometrics and hasattr(biometrics, 'bmi') and biometrics.bmi else None,
-                'goal_type': goals.goal_type if goals and hasattr(goals, 'goal_type') else None,
-                'daily_calorie_target': float(goals.daily_calorie_target) if goals and hasattr(goals, 'daily_calorie_target') else None,
-                'baseline_activity': goals.baseline_activity if goals and hasattr(goals, 'baseline_activity') else None,
-                'weekly_goal': float(goals.weekly_goal) if goals and hasattr(goals, 'weekly_goal') and goals.weekly_goal else None,
-                'protein_grams': float(goals.protein_grams) if goals and hasattr(goals, 'protein_grams') and goals.protein_grams else None,
-                'fat_grams': float(goals.fat_grams) if goals and hasattr(goals, 'fat_grams') and goals.fat_grams else None,
-                'carb_grams': float(goals.carb_grams) if goals and hasattr(goals, 'carb_grams') and goals.carb_grams else None,
-            }
+            return UserContextService.get_snapshot(self.db, self.user_id)
             
         except Exception as e:
-            print(f"⚠️ Error getting user profile: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error getting user profile")
             return None
     
     def _goal_to_vietnamese(self, goal_type):
@@ -246,9 +352,31 @@ class ChatbotService:
             result += f"   📊 {food['calories']}cal | {food['protein']}g protein | {food['carbs']}g carbs | {food['fat']}g fat\n\n"
         return result.strip()
     
+    def _format_planned_meal(self, meal_plan, labeled=False):
+        """
+        Format 1 bữa do MealOptimizer chọn (dinh dưỡng theo khẩu phần)
+        
+        Args:
+            meal_plan (dict | None): Kết quả optimize_meal
+            labeled (bool): Thêm nhãn PROTEIN / CARBS / RAU theo category của món
+        """
+        if not meal_plan:
+            return "(Không có món phù hợp)"
+        
+        labels = {'protein': 'PROTEIN', 'carbs': 'CARBS', 'veggie': 'RAU'}
+        result = ""
+        for i, food in enumerate(meal_plan['items'], 1):
+            label = f"{labels.get(food.get('category'), 'MÓN')}: " if labeled else ""
+            result += f"{i}. {label}{food['name']} - {food['portion_g']}g\n"
+            result += (
+                f"   📊 {food['portion_calories']}cal | {food['portion_protein']}g protein | "
+                f"{food['portion_carbs']}g carbs | {food['portion_fat']}g fat\n"
+            )
+        return result.strip()
+    
     # ========== HANDLER: SOCIAL ==========
     
-    def _handle_social(self, message):
+    async def _handle_social(self, message):
         """
         Handler cho SOCIAL intent
         
@@ -291,17 +419,17 @@ Nhiệm vụ của bạn là phản hồi các câu giao tiếp xã hội của
 **BẮT ĐẦU TRẢ LỜI (chỉ câu trả lời, không giải thích):**
 """
         
-        response = self.model.generate_content(prompt)
+        response_text = await self._generate(prompt)
         
         return {
-            "response": response.text.strip(),
+            "response": response_text,
             "intent": "SOCIAL",
             "data": []
         }
     
     # ========== HANDLER: FOOD_NUTRITION_INQUIRY ==========
     
-    def _handle_food_nutrition_inquiry(self, message, entities):
+    async def _handle_food_nutrition_inquiry(self, message, entities):
         """
         Handler cho FOOD_NUTRITION_INQUIRY intent
         
@@ -330,8 +458,8 @@ Nhiệm vụ của bạn là phản hồi các câu giao tiếp xã hội của
             }
         
         # Search món ăn trong database qua RAG Service
-        print(f"🔍 Searching: {food_name}")
-        foods = self.rag_service.search_foods(food_name, top_k=5)
+        logger.debug("Searching food: %s", food_name)
+        foods = await self.rag_service.search_foods(food_name, top_k=5)
         
         if not foods:
             return {
@@ -340,6 +468,8 @@ Nhiệm vụ của bạn là phản hồi các câu giao tiếp xã hội của
                 "data": []
             }
         
+        self._emit("results", {"data": foods})
+        
         # Build response - Liệt kê từng món tìm được
         response_text = f"Mình tìm thấy {len(foods)} món liên quan đến '{food_name}':\n\n"
         
@@ -373,7 +503,7 @@ Nhiệm vụ của bạn là phản hồi các câu giao tiếp xã hội của
     
     # ========== HANDLER: CALORIE_BASED_RECOMMENDATION ==========
     
-    def _handle_calorie_based_recommendation(self, message, entities):
+    async def _handle_calorie_based_recommendation(self, message, entities):
         """
         ✅ ENHANCED: Hiển thị đầy đủ macros
         
@@ -397,7 +527,7 @@ Nhiệm vụ của bạn là phản hồi các câu giao tiếp xã hội của
         comparison = entities.get('comparison', 'around')
         
         # Search món ăn theo calo
-        foods = self.rag_service.search_by_calories(
+        foods = await self.rag_service.search_by_calories(
             target_calories=target_calories,
             comparison=comparison,
             top_k=10
@@ -450,17 +580,19 @@ QUY TẮC:
 TRẢ LỜI:
 """
         
-        response = self.model.generate_content(prompt)
+        self._emit("results", {"data": foods})
+        
+        response_text = await self._generate(prompt)
         
         return {
-            "response": response.text.strip(),
+            "response": response_text,
             "intent": "CALORIE_BASED_RECOMMENDATION",
             "data": foods
         }
     
     # ========== HANDLER: GOAL_BASED_RECOMMENDATION ==========
     
-    def _handle_goal_based_recommendation(self, message, entities):
+    async def _handle_goal_based_recommendation(self, message, entities):
         """
         ✅ COMPLETELY REWRITTEN: Gợi ý theo CATEGORY, KHÔNG phải món cụ thể
         
@@ -488,51 +620,53 @@ TRẢ LỜI:
         
         # ✅ Nếu user không nói goal → Lấy từ database
         if not goal:
-            user_profile = self._get_user_profile()
+            user_profile = await self._load_user_profile()
             if user_profile and user_profile.get('goal_type'):
                 goal = user_profile['goal_type']
-                print(f"✅ Using goal from database: {goal}")
+                logger.debug("Using goal from database: %s", goal)
             else:
                 goal = 'maintain_weight'
         
-        print(f"🎯 Goal-based recommendation for: {goal}")
+        logger.debug("Goal-based recommendation for: %s", goal)
         
         # ✅ Search theo 3 CATEGORY: Protein + Carbs + Veggie
-        # Mỗi category search với calorie estimate phù hợp
+        # Mỗi category search với calorie estimate phù hợp - chạy song song
         
         # 1. PROTEIN - Luôn quan trọng cho mọi goal
         protein_cal = 200 if goal == 'lose_weight' else 300
-        protein_foods = self.rag_service.search_by_goal_and_calories(
-            goal=goal,
-            target_calories=protein_cal,
-            meal_type='lunch',
-            food_category='protein',
-            comparison='around',
-            top_k=8
-        )
         
         # 2. CARBS - Điều chỉnh theo goal
         carbs_cal = 150 if goal == 'lose_weight' else 250
-        carbs_foods = self.rag_service.search_by_goal_and_calories(
-            goal=goal,
-            target_calories=carbs_cal,
-            meal_type='lunch',
-            food_category='carbs',
-            comparison='around',
-            top_k=8
-        )
         
-        # 3. VEGGIE - Ít calo, nhiều chất xơ
-        veggie_foods = self.rag_service.search_by_goal_and_calories(
-            goal=goal,
-            target_calories=80,
-            meal_type='lunch',
-            food_category='veggie',
-            comparison='around',
-            top_k=6
+        # 3. VEGGIE - Ít calo, nhiều chất xơ (80 cal)
+        protein_foods, carbs_foods, veggie_foods = await asyncio.gather(
+            self.rag_service.search_by_goal_and_calories(
+                goal=goal,
+                target_calories=protein_cal,
+                meal_type='lunch',
+                food_category='protein',
+                comparison='around',
+                top_k=8
+            ),
+            self.rag_service.search_by_goal_and_calories(
+                goal=goal,
+                target_calories=carbs_cal,
+                meal_type='lunch',
+                food_category='carbs',
+                comparison='around',
+                top_k=8
+            ),
+            self.rag_service.search_by_goal_and_calories(
+                goal=goal,
+                target_calories=80,
+                meal_type='lunch',
+                food_category='veggie',
+                comparison='around',
+                top_k=6
+            ),
         )
         
-        print(f"📊 Found: Protein={len(protein_foods)}, Carbs={len(carbs_foods)}, Veggie={len(veggie_foods)}")
+        logger.debug("Found: protein=%d, carbs=%d, veggie=%d", len(protein_foods), len(carbs_foods), len(veggie_foods))
         
         if not (protein_foods or carbs_foods or veggie_foods):
             return {
@@ -611,10 +745,12 @@ QUY TẮC:
 TRẢ LỜI:
 """
         
-        response = self.model.generate_content(prompt)
+        self._emit("results", {"data": {"protein": protein_foods[:5], "carbs": carbs_foods[:5], "veggie": veggie_foods[:4]}})
+        
+        response_text = await self._generate(prompt)
         
         return {
-            "response": response.text.strip(),
+            "response": response_text,
             "intent": "GOAL_BASED_RECOMMENDATION",
             "data": {
                 "protein": protein_foods[:5],
@@ -625,7 +761,7 @@ TRẢ LỜI:
     
     # ========== HANDLER: MEAL_PLAN_REQUEST ==========
     
-    def _handle_meal_plan_request(self, message, entities):
+    async def _handle_meal_plan_request(self, message, entities):
         """
         ✅ FIXED: BẮT BUỘC dùng database hoặc user input - KHÔNG tự bịa
         
@@ -680,30 +816,29 @@ CHỈ TRẢ JSON, KHÔNG GIẢI THÍCH:
 """
         
         try:
-            analysis = self.model.generate_content(analysis_prompt)
-            analysis_text = analysis.text.strip()
+            analysis_text = await self._generate(analysis_prompt, stream=False)
             # Remove markdown if present
             analysis_text = re.sub(r'```json|```', '', analysis_text).strip()
             result = json.loads(analysis_text)
-            print(f"📊 Analysis result: {result}")
+            logger.debug("Meal plan analysis: %s", result)
         except Exception as e:
-            print(f"⚠️ Analysis error: {e}")
+            logger.warning("Meal plan analysis error: %s", e)
             result = {"goal_type": None, "calorie_target": None}
         
         goal_type = result.get('goal_type')
         calorie_target = result.get('calorie_target')
         
         # Step 2: Lấy user profile từ database
-        user_profile = self._get_user_profile()
+        user_profile = await self._load_user_profile()
         
         # ============ CASE 1: User nói số calo cụ thể → Ưu tiên số đó ============
         if calorie_target:
             # Lấy goal từ user hoặc database
             final_goal = goal_type or (user_profile.get('goal_type') if user_profile else 'maintain_weight')
             
-            print(f"✅ User specified calories: {calorie_target}, goal: {final_goal}")
+            logger.debug("User specified calories: %s, goal: %s", calorie_target, final_goal)
             
-            return self._create_full_day_meal(final_goal, calorie_target, message)
+            return await self._create_full_day_meal(final_goal, calorie_target, message)
         
         # ============ CASE 2: Dùng database (BẮT BUỘC) ============
         if user_profile and user_profile.get('daily_calorie_target'):
@@ -717,12 +852,12 @@ CHỈ TRẢ JSON, KHÔNG GIẢI THÍCH:
             daily_exercise_burn = (weekly_exercise_min / 7) * 5
             meal_calorie = int(db_calorie_target - daily_exercise_burn)
 
-            print(f"✅ Using database: Goal={final_goal}, Total={db_calorie_target}, Exercise burn={daily_exercise_burn:.0f}, Meal={meal_calorie}")
-            
-            # Tạo thực đơn
-            result = self._create_full_day_meal(final_goal, meal_calorie, message)
+            logger.debug(
+                "Using database: goal=%s, total=%s, exercise burn=%.0f, meal=%s",
+                final_goal, db_calorie_target, daily_exercise_burn, meal_calorie
+            )
             
-            # Thêm prefix giải thích
+            # Prefix giải thích (stream: gửi trước khi sinh thực đơn)
             goal_viet = self._goal_to_vietnamese(final_goal)
             prefix = f"""✅ **Dựa trên mục tiêu của bạn:**
 - Mục tiêu: {goal_viet}
@@ -731,6 +866,10 @@ CHỈ TRẢ JSON, KHÔNG GIẢI THÍCH:
 ---
 
 """
+            self._emit("token", {"text": prefix})
+            
+            # Tạo thực đơn
+            result = await self._create_full_day_meal(final_goal, meal_calorie, message)
             result['response'] = prefix + result['response']
             return result
         
@@ -754,16 +893,19 @@ Sau đó bạn quay lại đây, mình sẽ tạo thực đơn phù hợp ngay!
             "needs_setup": True  # ✅ Flag để frontend biết cần setup
         }
     
-    def _create_full_day_meal(self, goal, total_calories, message):
+    async def _create_full_day_meal(self, goal, total_calories, message):
         """
-        ✅ ENHANCED: Tạo thực đơn 4 bữa - CHỈ SỬA PROMPT (in thêm macros)
+        ✅ ENHANCED: Tạo thực đơn 4 bữa - món + khẩu phần do MealOptimizer chọn
         
-        Cấu trúc:
-        - SÁNG (25%): 1-2 món
+        Cấu trúc (MEAL_SPLIT / PLATE_SPLIT trong meal_optimizer):
+        - SÁNG (25%): 1 món
         - TRƯA (35%): 3 món (1 protein + 1 carbs + 1 rau)
         - SNACK (10%): 1 món
         - TỐI (30%): 3 món (1 protein + 1 carbs + 1 rau)
         
+        RAG tìm ứng viên → optimizer chọn món + gram sát kcal/macros của từng bữa
+        → LLM chỉ trình bày, không tự chọn món hay tính lại số liệu.
+        
         Args:
             goal (str): Mục tiêu sức khỏe ('lose_weight', 'gain_muscle', etc.)
             total_calories (int): Tổng calo trong ngày
@@ -774,106 +916,48 @@ Sau đó bạn quay lại đây, mình sẽ tạo thực đơn phù hợp ngay!
         """
         
         # Phân bổ calo cho từng bữa
-        breakfast_cal = int(total_calories * 0.25)  # 25%
-        lunch_cal = int(total_calories * 0.35)      # 35%
-        snack_cal = int(total_calories * 0.10)      # 10%
-        dinner_cal = int(total_calories * 0.30)     # 30%
-        
-        print(f"📊 Calorie distribution:")
-        print(f"   Sáng: {breakfast_cal} cal (25%) - 1-2 món")
-        print(f"   Trưa: {lunch_cal} cal (35%) - 3 món (protein + carbs + rau)")
-        print(f"   Snack: {snack_cal} cal (10%) - 1 món")
-        print(f"   Tối: {dinner_cal} cal (30%) - 3 món (protein + carbs + rau)")
-        
-        # ===== BỮA SÁNG: 1-2 món =====
-        breakfast_foods = self.rag_service.search_by_goal_and_calories(
-            goal=goal or 'maintain_weight',
-            target_calories=breakfast_cal,
-            meal_type='breakfast',
-            comparison='around',
-            top_k=10
-        )
-        
-        # ===== BỮA TRƯA: 3 món (Protein + Carbs + Rau) =====
-        # 45% protein, 35% carbs, 20% veggie 
-        lunch_protein_cal = int(lunch_cal * 0.45)
-        lunch_carbs_cal = int(lunch_cal * 0.35)
-        lunch_veggie_cal = int(lunch_cal * 0.20)
-        
-        lunch_protein = self.rag_service.search_by_goal_and_calories(
-            goal=goal or 'maintain_weight',
-            target_calories=lunch_protein_cal,
-            meal_type='lunch',
-            food_category='protein',  
-            comparison='around',
-            top_k=8
-        )
-        
-        lunch_carbs = self.rag_service.search_by_goal_and_calories(
-            goal=goal or 'maintain_weight',
-            target_calories=lunch_carbs_cal,
-            meal_type='lunch',
-            food_category='carbs',    
-            comparison='around',
-            top_k=8
-        )
-        
-        lunch_veggie = self.rag_service.search_by_goal_and_calories(
-            goal=goal or 'maintain_weight',
-            target_calories=lunch_veggie_cal,
-            meal_type='lunch',
-            food_category='veggie',  
-            comparison='around',
-            top_k=8
-        )
-        
-        # ===== SNACK: 1 món =====
-        snack_foods = self.rag_service.search_by_goal_and_calories(
-            goal=goal or 'maintain_weight',
-            target_calories=snack_cal,
-            meal_type='snack',
-            comparison='around',
-            top_k=10
-        )
-        
-        # ===== BỮA TỐI: 3 món (Protein + Carbs + Rau) =====
-        dinner_protein_cal = int(dinner_cal * 0.45)
-        dinner_carbs_cal = int(dinner_cal * 0.35)
-        dinner_veggie_cal = int(dinner_cal * 0.20)
-        
-        dinner_protein = self.rag_service.search_by_goal_and_calories(
-            goal=goal or 'maintain_weight',
-            target_calories=dinner_protein_cal,
-            meal_type='dinner',
-            food_category='protein',  
-            comparison='around',
-            top_k=8
-        )
-        
-        dinner_carbs = self.rag_service.search_by_goal_and_calories(
-            goal=goal or 'maintain_weight',
-            target_calories=dinner_carbs_cal,
-            meal_type='dinner',
-            food_category='carbs',   
-            comparison='around',
-            top_k=8
-        )
+        meal_cal = {meal: int(total_calories * share) for meal, share in MEAL_SPLIT.items()}
+        breakfast_cal = meal_cal['breakfast']
+        lunch_cal = meal_cal['lunch']
+        snack_cal = meal_cal['snack']
+        dinner_cal = meal_cal['dinner']
+        
+        logger.debug("Calorie distribution: %s", meal_cal)
+        
+        search_goal = goal or 'maintain_weight'
+        
+        # (meal_type, food_category, target_calories, top_k) cho từng lượt search
+        # Bữa trưa / tối: 3 món theo PLATE_SPLIT (45% protein, 35% carbs, 20% rau)
+        searches = [('breakfast', None, breakfast_cal, 10)]
+        searches += [('lunch', category, int(lunch_cal * share), 8) for category, share in PLATE_SPLIT.items()]
+        searches += [('snack', None, snack_cal, 10)]
+        searches += [('dinner', category, int(dinner_cal * share), 8) for category, share in PLATE_SPLIT.items()]
+        
+        # ✅ Chạy song song (giới hạn bởi semaphore trong RAGService)
+        # → thời gian ≈ lượt search chậm nhất, không phải tổng
+        (
+            breakfast_foods,
+            lunch_protein, lunch_carbs, lunch_veggie,
+            snack_foods,
+            dinner_protein, dinner_carbs, dinner_veggie,
+        ) = await asyncio.gather(*[
+            self.rag_service.search_by_goal_and_calories(
+                goal=search_goal,
+                target_calories=target,
+                meal_type=meal_type,
+                food_category=category,
+                comparison='around',
+                top_k=top_k
+            )
+            for meal_type, category, target, top_k in searches
+        ])
         
-        dinner_veggie = self.rag_service.search_by_goal_and_calories(
-            goal=goal or 'maintain_weight',
-            target_calories=dinner_veggie_cal,
-            meal_type='dinner',
-            food_category='veggie',   
-            comparison='around',
-            top_k=8
+        logger.debug(
+            "Search results: breakfast=%d, lunch=%d/%d/%d, snack=%d, dinner=%d/%d/%d",
+            len(breakfast_foods), len(lunch_protein), len(lunch_carbs), len(lunch_veggie),
+            len(snack_foods), len(dinner_protein), len(dinner_carbs), len(dinner_veggie)
         )
         
-        print(f"📊 Search results:")
-        print(f"   Breakfast: {len(breakfast_foods)} items")
-        print(f"   Lunch: Protein={len(lunch_protein)}, Carbs={len(lunch_carbs)}, Veggie={len(lunch_veggie)}")
-        print(f"   Snack: {len(snack_foods)} items")
-        print(f"   Dinner: Protein={len(dinner_protein)}, Carbs={len(dinner_carbs)}, Veggie={len(dinner_veggie)}")
-        
         if not (breakfast_foods and lunch_protein and dinner_protein):
             return {
                 "response": "Mình không thể tạo thực đơn được. Bạn thử lại với mức calo khác nhé!",
@@ -881,117 +965,94 @@ Sau đó bạn quay lại đây, mình sẽ tạo thực đơn phù hợp ngay!
                 "data": []
             }
         
-        # ✅ Build context với đầy đủ macros
+        candidates = {
+            "breakfast": breakfast_foods,
+            "lunch": {"protein": lunch_protein, "carbs": lunch_carbs, "veggie": lunch_veggie},
+            "snack": snack_foods,
+            "dinner": {"protein": dinner_protein, "carbs": dinner_carbs, "veggie": dinner_veggie},
+        }
+        
+        # ✅ Chọn món + khẩu phần deterministic (vài ms, không cần thread)
+        with span("optimize"):
+            plan = plan_day(candidates, total_calories, search_goal)
+        
         context = f"""
-🌅 MÓN SÁNG (~{breakfast_cal} calo - CHỌN 1-2 MÓN):
-{self._format_foods_with_macros(breakfast_foods[:8])}
+🌅 BỮA SÁNG (mục tiêu ~{breakfast_cal} calo):
+{self._format_planned_meal(plan['breakfast'])}
 
-🍽️ BỮA TRƯA (~{lunch_cal} calo - CHỌN 3 MÓN):
+🍽️ BỮA TRƯA (mục tiêu ~{lunch_cal} calo):
+{self._format_planned_meal(plan['lunch'], labeled=True)}
 
-**1. MÓN PROTEIN (~{lunch_protein_cal} cal - CHỌN 1):**
-{self._format_foods_with_macros(lunch_protein[:5])}
+🍎 SNACK (mục tiêu ~{snack_cal} calo):
+{self._format_planned_meal(plan['snack'])}
 
-**2. MÓN CARBS/TINH BỘT (~{lunch_carbs_cal} cal - CHỌN 1):**
-{self._format_foods_with_macros(lunch_carbs[:5])}
-
-**3. MÓN RAU (~{lunch_veggie_cal} cal - CHỌN 1):**
-{self._format_foods_with_macros(lunch_veggie[:5])}
-
-🍎 SNACK (~{snack_cal} calo - CHỌN 1 MÓN):
-{self._format_foods_with_macros(snack_foods[:8])}
-
-🌙 BỮA TỐI (~{dinner_cal} calo - CHỌN 3 MÓN):
-
-**1. MÓN PROTEIN (~{dinner_protein_cal} cal - CHỌN 1):**
-{self._format_foods_with_macros(dinner_protein[:5])}
-
-**2. MÓN CARBS/TINH BỘT (~{dinner_carbs_cal} cal - CHỌN 1):**
-{self._format_foods_with_macros(dinner_carbs[:5])}
-
-**3. MÓN RAU (~{dinner_veggie_cal} cal - CHỌN 1):**
-{self._format_foods_with_macros(dinner_veggie[:5])}
+🌙 BỮA TỐI (mục tiêu ~{dinner_cal} calo):
+{self._format_planned_meal(plan['dinner'], labeled=True)}
 """
         
+        day_totals = {
+            key: round(sum(meal['totals'][key] for meal in plan.values() if meal))
+            for key in ('calories', 'protein', 'carbs', 'fat')
+        }
+        
         goal_viet = self._goal_to_vietnamese(goal) if goal else 'lành mạnh'
         
-        # ✅ ENHANCED PROMPT: Hiển thị đầy đủ macros
+        # ✅ Món + khẩu phần đã tính sẵn → LLM chỉ trình bày và giải thích
         prompt = f"""
-Bạn là chuyên gia dinh dưỡng chuyên nghiệp. Tạo thực đơn cả ngày.
+Bạn là chuyên gia dinh dưỡng chuyên nghiệp. Trình bày thực đơn cả ngày đã được tính sẵn.
 
 YÊU CẦU: "{message}"
 MỤC TIÊU: {goal_viet}
 TỔNG CALO: {total_calories} calo
 
-CÁC MÓN GỢI Ý:
+THỰC ĐƠN ĐÃ TÍNH (món, khẩu phần và dinh dưỡng theo khẩu phần):
 {context}
 
+TỔNG CẢ NGÀY: {day_totals['calories']} kcal | {day_totals['protein']}g protein | {day_totals['carbs']}g carbs | {day_totals['fat']}g fat
+
 QUY TẮC BẮT BUỘC:
-1. **BỮA SÁNG:** Chọn 1-2 món từ danh sách Sáng
-2. **BỮA TRƯA:** Chọn ĐÚNG 3 món:
-   - 1 món PROTEIN (từ danh sách Protein)
-   - 1 món CARBS/TINH BỘT (từ danh sách Carbs)
-   - 1 món RAU (từ danh sách Rau)
-3. **SNACK:** Chọn 1 món từ danh sách Snack
-4. **BỮA TỐI:** Chọn ĐÚNG 3 món:
-   - 1 món PROTEIN (từ danh sách Protein)
-   - 1 món CARBS/TINH BỘT (từ danh sách Carbs)
-   - 1 món RAU (từ danh sách Rau)
-5. CHỈ CHỌN TỪ DANH SÁCH ĐÃ CHO
-6. Format BẮT BUỘC (có đầy đủ macros):
+1. GIỮ NGUYÊN các món, khẩu phần (gram) và số liệu ở trên - KHÔNG đổi món, KHÔNG tính lại
+2. Bữa trưa và tối giữ nhãn PROTEIN / CARBS / RAU như trên
+3. Format BẮT BUỘC (có đầy đủ macros):
 
 🌅 **BỮA SÁNG** (~{breakfast_cal} cal)
-**[Tên món]**
+**[Tên món]** - [X]g
 📊 X kcal | Xg protein | Xg carbs | Xg fat
 ✅ Lý do ngắn gọn (1 câu).
 
 🍽️ **BỮA TRƯA** (~{lunch_cal} cal)
-1. **PROTEIN: [Tên món]**
-   📊 X kcal | Xg protein | Xg carbs | Xg fat
-   ✅ Lý do ngắn.
-   
-2. **CARBS: [Tên món]**
-   📊 X kcal | Xg protein | Xg carbs | Xg fat
-   ✅ Lý do ngắn.
-   
-3. **RAU: [Tên món]**
+1. **PROTEIN: [Tên món]** - [X]g
    📊 X kcal | Xg protein | Xg carbs | Xg fat
    ✅ Lý do ngắn.
+(tương tự cho CARBS, RAU)
 
 🍎 **SNACK** (~{snack_cal} cal)
-**[Tên món]**
+**[Tên món]** - [X]g
 📊 X kcal | Xg protein | Xg carbs | Xg fat
 ✅ Lý do ngắn.
 
 🌙 **BỮA TỐI** (~{dinner_cal} cal)
-1. **PROTEIN: [Tên món]**
-   📊 X kcal | Xg protein | Xg carbs | Xg fat
-   ✅ Lý do ngắn.
-   
-2. **CARBS: [Tên món]**
-   📊 X kcal | Xg protein | Xg carbs | Xg fat
-   ✅ Lý do ngắn.
-   
-3. **RAU: [Tên món]**
-   📊 X kcal | Xg protein | Xg carbs | Xg fat
-   ✅ Lý do ngắn.
+(giống bữa trưa)
 
-📊 **TỔNG CỘNG:** ~{total_calories} cal | [Tổng protein]g protein | [Tổng carbs]g carbs | [Tổng fat]g fat
+📊 **TỔNG CỘNG:** {day_totals['calories']} cal | {day_totals['protein']}g protein | {day_totals['carbs']}g carbs | {day_totals['fat']}g fat
 
 QUY TẮC:
 - BẮT BUỘC hiển thị: Calo + Protein + Carbs + Fat cho MỖI món
-- Tính TỔNG CỘNG cuối cùng (tổng các macros)
 - Giải thích ngắn gọn tại sao phù hợp
 - KHÔNG dài dòng
 
 TRẢ LỜI:
 """
         
-        response = self.model.generate_content(prompt)
+        self._emit("results", {"data": {"plan": plan}})
+        
+        response_text = await self._generate(prompt)
         
         return {
-            "response": response.text.strip(),
+            "response": response_text,
             "intent": "MEAL_PLAN_REQUEST",
             "data": {
+                "plan": plan,
                 "breakfast": breakfast_foods[:8],
                 "lunch": {
                     "protein": lunch_protein[:5],
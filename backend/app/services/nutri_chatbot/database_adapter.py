@@ -2,8 +2,23 @@
 Database Adapter - Chuyển đổi backend format sang chatbot format
 """
 
+import logging
+
+from sqlalchemy import case, func, select
 from sqlalchemy.orm import Session
-from app.models.food import Food
+from app.models.food import Food, FoodNutrient
+
+
+logger = logging.getLogger(__name__)
+
+MACRO_NUTRIENTS = ("calories", "protein", "fat", "carbs")
+
+
+def _macro_column(name: str):
+    """Pivot 1 dòng food_nutrients thành 1 cột (NULL nếu món không có chất này)"""
+    return func.max(
+        case((func.lower(FoodNutrient.nutrient_name) == name, FoodNutrient.amount_per_100g))
+    ).label(name)
 
 
 class DatabaseAdapter:
@@ -12,7 +27,8 @@ class DatabaseAdapter:
     def __init__(self, db: Session):
         self.db = db
     
-    def _to_chatbot_format(self, food: Food) -> dict:
+    @staticmethod
+    def _to_chatbot_format(food: Food) -> dict:
      
         
         # Extract nutrients từ relationship
@@ -24,7 +40,7 @@ class DatabaseAdapter:
                 key = nutrient.nutrient_name.lower()
                 nutrients[key] = float(nutrient.amount_per_100g)
         except Exception as e:
-            print(f"⚠️  Error parsing nutrients for food_id {food.id}: {e}")
+            logger.warning("Error parsing nutrients for food_id %s: %s", food.id, e)
         
         return {
             "id": food.id,
@@ -36,4 +52,41 @@ class DatabaseAdapter:
             "protein": nutrients.get('protein', 0),
             "fat": nutrients.get('fat', 0),
             "carbs": nutrients.get('carbs', 0),
-        }
\ No newline at end of file
+        }
+    
+    def load_macro_records(self, food_ids) -> dict:
+        """
+        Load tên + macros của nhiều món trong 1 query (không lazy-load nutrients)
+        
+        Returns:
+            dict: food_id → record cùng format với _to_chatbot_format
+                  (món đã xóa / không tồn tại thì không có trong dict)
+        """
+        if not food_ids:
+            return {}
+        
+        stmt = (
+            select(
+                Food.id,
+                Food.name,
+                Food.food_group,
+                *(_macro_column(name) for name in MACRO_NUTRIENTS)
+            )
+            .outerjoin(FoodNutrient, FoodNutrient.food_id == Food.id)
+            .where(Food.id.in_(food_ids), Food.deleted_at.is_(None))
+            .group_by(Food.id, Food.name, Food.food_group)
+        )
+        
+        records = {}
+        for row in self.db.execute(stmt):
+            records[row.id] = {
+                "id": row.id,
+                "food_id": row.id,
+                "name": row.name,
+                "group": row.food_group or "Other",
+                "calories": float(row.calories or 0),
+                "protein": float(row.protein or 0),
+                "fat": float(row.fat or 0),
+                "carbs": float(row.carbs or 0),
+            }
+        return records
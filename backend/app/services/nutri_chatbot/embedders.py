@@ -0,0 +1,106 @@
+"""
+Embedders - Backend tạo embedding cho chatbot (có thể thay thế)
+
+- GeminiEmbedder: Gemini text-embedding-004 (production)
+- HashingEmbedder: Feature hashing local, deterministic, không cần mạng
+  (dùng cho test offline và benchmark)
+
+Index (food_index) và query (RAGService) phải dùng cùng 1 embedder,
+chọn bằng settings.CHATBOT_EMBEDDER.
+"""
+
+import hashlib
+import math
+import re
+
+from app.core.settings import settings
+
+
+GEMINI_EMBEDDING_MODEL = "models/text-embedding-004"
+
+
+class GeminiEmbedder:
+    """Embedding qua Gemini API"""
+
+    # Gemini nhận tối đa 100 text mỗi lần batch
+    max_batch_size = 100
+
+    def __init__(self, model: str = GEMINI_EMBEDDING_MODEL):
+        import google.generativeai as genai
+
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        self._genai = genai
+        self.model = model
+
+    def embed_documents(self, texts):
+        """Embed danh sách document (blocking)"""
+        result = self._genai.embed_content(
+            model=self.model,
+            content=list(texts),
+            task_type="retrieval_document"
+        )
+        return result['embedding']
+
+    async def embed_query(self, text: str):
+        result = await self._genai.embed_content_async(
+            model=self.model,
+            content=text,
+            task_type="retrieval_query"
+        )
+        return result['embedding']
+
+
+class HashingEmbedder:
+    """
+    Embedding bằng feature hashing (từ + trigram ký tự), chuẩn hóa L2
+
+    Cùng text luôn ra cùng vector, text có nhiều từ chung thì gần nhau
+    → đủ để test/benchmark pipeline RAG mà không gọi API.
+    """
+
+    max_batch_size = 1000
+
+    _TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.model = f"hashing-v1-{dim}"
+
+    def _features(self, text: str):
+        for word in self._TOKEN_RE.findall(text.lower()):
+            yield word, 1.0
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3], 0.5
+
+    def embed(self, text: str):
+        vector = [0.0] * self.dim
+        for feature, weight in self._features(text):
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+            sign = 1.0 if digest >> 63 else -1.0
+            vector[digest % self.dim] += sign * weight
+
+        norm = math.sqrt(sum(v * v for v in vector))
+        return [v / norm for v in vector] if norm else vector
+
+    def embed_documents(self, texts):
+        return [self.embed(t) for t in texts]
+
+    async def embed_query(self, text: str):
+        return self.embed(text)
+
+
+_embedder = None
+
+
+def get_embedder():
+    """Embedder dùng chung cho cả process, theo settings.CHATBOT_EMBEDDER"""
+    global _embedder
+    if _embedder is None:
+        if settings.CHATBOT_EMBEDDER == "hashing":
+            _embedder = HashingEmbedder()
+        elif settings.CHATBOT_EMBEDDER == "gemini":
+            _embedder = GeminiEmbedder()
+        else:
+            raise ValueError(f"Unknown CHATBOT_EMBEDDER: {settings.CHATBOT_EMBEDDER}")
+    return _embedder
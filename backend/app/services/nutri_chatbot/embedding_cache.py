@@ -0,0 +1,188 @@
+"""
+Embedding Cache - Cache embedding của query 2 tầng
+1. In-memory LRU (dùng chung trong process)
+2. SQLite trên đĩa (giữ lại qua các lần restart), vector lưu dạng float32
+
+Query từ _build_smart_query lặp lại rất nhiều (goal × meal_type × category × calo)
+→ phần lớn embedding không cần gọi Gemini.
+"""
+
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+
+from app.core.settings import settings
+from app.services.nutri_chatbot.embedders import get_embedder
+from app.utils.cache import TTLCache
+
+
+# Số calo đi kèm đơn vị: "around 437 calories", "300kcal", "500 calo"
+_CALORIE_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(kcal|calories|calorie|calo|cal)\b")
+
+
+def normalize_query(text: str, calorie_bucket: int = None) -> str:
+    """
+    Chuẩn hóa query trước khi cache/embed
+
+    - lowercase, gộp khoảng trắng
+    - làm tròn số calo theo bucket (VD bucket=50: 437 → 450) để các query
+      gần giống nhau dùng chung 1 embedding
+
+    Examples:
+        >>> normalize_query("High protein  LUNCH around 437 calories", 50)
+        'high protein lunch around 450 calories'
+    """
+    bucket = calorie_bucket or settings.CHATBOT_CALORIE_BUCKET
+    text = " ".join(text.lower().split())
+
+    def _round(match):
+        value = float(match.group(1))
+        rounded = int(round(value / bucket) * bucket) if bucket > 1 else int(value)
+        return f"{rounded} calories"
+
+    return _CALORIE_RE.sub(_round, text)
+
+
+class _SQLiteVectorStore:
+    """Bảng key → vector float32 trong SQLite (thread-safe)"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector FROM query_embeddings WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        vector = array("f")
+        vector.frombytes(row[0])
+        return vector.tolist()
+
+    def put(self, key: str, vector) -> None:
+        blob = array("f", vector).tobytes()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO query_embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                (key, blob, time.time()),
+            )
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+
+
+class EmbeddingCache:
+    """
+    Cache normalized text → embedding
+
+    Args:
+        model: Tên model embedding (là 1 phần của key, đổi model thì cache cũ tự vô hiệu)
+        maxsize: Số entry tối đa trong memory
+        path: File SQLite. None/"" = chỉ dùng memory
+    """
+
+    def __init__(self, model: str, maxsize: int = 2048, path: str = None):
+        self.model = model
+        self.memory = TTLCache(maxsize=maxsize)
+        self.disk = _SQLiteVectorStore(path) if path else None
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _key(self, normalized: str) -> str:
+        return f"{self.model}|{normalized}"
+
+    def lookup(self, normalized: str):
+        """Tìm embedding: memory trước, rồi tới đĩa (blocking). None nếu miss."""
+        key = self._key(normalized)
+        vector = self.memory.get(key)
+        if vector is not None:
+            return vector
+
+        if self.disk is not None:
+            vector = self.disk.get(key)
+            if vector is not None:
+                self.disk_hits += 1
+                self.memory.set(key, vector)
+                return vector
+
+        self.misses += 1
+        return None
+
+    def store(self, normalized: str, vector) -> None:
+        """Lưu embedding vào cả memory và đĩa (blocking)"""
+        key = self._key(normalized)
+        self.memory.set(key, vector)
+        if self.disk is not None:
+            self.disk.put(key, vector)
+
+    async def get_or_embed(self, text: str, embed_fn):
+        """
+        Lấy embedding cho text, chỉ gọi embed_fn khi cả 2 tầng đều miss
+
+        Args:
+            text: Query gốc
+            embed_fn: async callable(normalized_text) -> list[float]
+
+        Returns:
+            list[float]: Embedding của query đã chuẩn hóa
+        """
+        normalized = normalize_query(text)
+
+        # Memory hit: trả về ngay, không cần thread
+        vector = self.memory.get(self._key(normalized))
+        if vector is not None:
+            return vector
+
+        vector = await asyncio.to_thread(self.lookup, normalized)
+        if vector is not None:
+            return vector
+
+        vector = await embed_fn(normalized)
+        await asyncio.to_thread(self.store, normalized, vector)
+        return vector
+
+    def stats(self) -> dict:
+        """Hit-rate theo từng tầng"""
+        memory_hits = self.memory.hits
+        total = memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_size": len(self.memory),
+            "memory_hits": memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((memory_hits + self.disk_hits) / total, 4) if total else 0.0,
+        }
+
+
+_embedding_cache = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Embedding cache dùng chung cho cả process"""
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache(
+            model=get_embedder().model,
+            maxsize=settings.EMBEDDING_CACHE_SIZE,
+            path=settings.EMBEDDING_CACHE_PATH,
+        )
+    return _embedding_cache
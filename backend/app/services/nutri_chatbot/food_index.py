@@ -0,0 +1,333 @@
+"""
+Food Index - Đồng bộ bảng foods (Postgres) → Chroma collection "foods"
+
+Mỗi món được lưu kèm calories/macros (per 100g), category, các cờ blacklist và độ hợp
+từng bữa (food_labels) để RAGService lọc ngay trong Chroma bằng `where` / đọc nhãn có sẵn
+thay vì quét keyword lúc request.
+
+Đồng bộ tăng dần:
+- Chỉ đọc các food có updated_at > watermark (lưu trong metadata của collection)
+- Chỉ embed lại khi content_hash (tên + nhóm + dinh dưỡng + model) thay đổi
+- Food bị soft delete / không còn public thì xóa khỏi collection
+- Nhãn chỉ tính lại khi tên đổi; đổi luật gán nhãn (FOOD_LABELS_VERSION) → quét lại toàn bộ,
+  chỉ cập nhật metadata, không embed lại
+
+Chạy tay:
+    python -m app.services.nutri_chatbot.food_index sync [--full]
+    python -m app.services.nutri_chatbot.food_index backfill-metadata
+"""
+
+import argparse
+import hashlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import Session, selectinload
+
+from app.core.settings import settings
+from app.models.food import Food
+from app.services.nutri_chatbot.database_adapter import DatabaseAdapter
+from app.services.nutri_chatbot.embedders import get_embedder
+from app.services.nutri_chatbot.food_labels import FOOD_LABELS_VERSION, food_labels
+from app.services.nutri_chatbot.rag_service import FOOD_METADATA_VERSION, _get_chroma_client
+
+
+# Đọc lùi lại một chút so với watermark: transaction commit muộn vẫn có
+# updated_at cũ hơn watermark. Đọc trùng không tốn gì vì content_hash không đổi.
+WATERMARK_OVERLAP = timedelta(seconds=60)
+
+
+def is_indexable(food: Food) -> bool:
+    """Chỉ index món global và món đóng góp đã được duyệt, chưa bị xóa"""
+    if food.deleted_at is not None:
+        return False
+    if food.owner_user_id is None:
+        return True
+    return food.is_contribution and food.contribution_status == 'approved'
+
+
+def build_food_document(record: dict) -> str:
+    """Text được embed cho 1 món (record theo format của DatabaseAdapter)"""
+    return (
+        f"{record['name']}. Food group: {record['group']}. "
+        f"Per 100g: {record['calories']:g} kcal, protein {record['protein']:g}g, "
+        f"carbs {record['carbs']:g}g, fat {record['fat']:g}g"
+    )
+
+
+def build_food_metadata(food: Food) -> dict:
+    """
+    Metadata Chroma cho 1 món (giá trị không được None)
+
+    Returns:
+        dict: food_id, food_group, calories, protein, carbs, fat,
+              category, is_blacklisted, is_false_veggie, meal_*, labels_version
+    """
+    record = DatabaseAdapter._to_chatbot_format(food)
+    return {
+        "food_id": food.id,
+        "food_group": record["group"],
+        "calories": float(record["calories"]),
+        "protein": float(record["protein"]),
+        "carbs": float(record["carbs"]),
+        "fat": float(record["fat"]),
+        **food_labels(food.name).to_metadata(),
+    }
+
+
+def content_hash(document: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\n{document}".encode("utf-8")).hexdigest()
+
+
+def _collection_metadata(collection) -> dict:
+    # Chroma không cho modify các key hnsw:* (cấu hình index)
+    return {
+        k: v for k, v in (collection.metadata or {}).items()
+        if not k.startswith("hnsw:")
+    }
+
+
+def mark_metadata_version(collection, **extra) -> None:
+    """Ghi version metadata (+ watermark...) vào collection để RAGService bật lọc bằng `where`"""
+    metadata = _collection_metadata(collection)
+    metadata["food_metadata_version"] = FOOD_METADATA_VERSION
+    metadata["labels_version"] = FOOD_LABELS_VERSION
+    metadata.update(extra)
+    collection.modify(metadata=metadata)
+
+
+def get_or_create_foods_collection():
+    return _get_chroma_client().get_or_create_collection(
+        "foods",
+        metadata={"hnsw:space": "cosine"}
+    )
+
+
+class FoodIndexer:
+    """
+    Đồng bộ tăng dần bảng foods vào Chroma
+
+    Args:
+        db: SQLAlchemy session
+        collection: Chroma collection "foods"
+        embedder: GeminiEmbedder | HashingEmbedder (xem embedders.py)
+        batch_size: Số food đọc từ DB mỗi batch
+    """
+
+    def __init__(self, db: Session, collection, embedder, batch_size: int = 200):
+        self.db = db
+        self.collection = collection
+        self.embedder = embedder
+        self.batch_size = batch_size
+
+    def _watermark(self, full: bool):
+        metadata = self.collection.metadata or {}
+        # Đổi embedder → vector cũ không dùng được, phải quét lại toàn bộ
+        # Đổi luật gán nhãn → quét lại để cập nhật metadata (không embed lại)
+        if full or metadata.get("embedding_model") != self.embedder.model:
+            return None
+        if metadata.get("labels_version") != FOOD_LABELS_VERSION:
+            return None
+        value = metadata.get("indexed_until")
+        return datetime.fromisoformat(value) - WATERMARK_OVERLAP if value else None
+
+    def _fetch_batch(self, since, last_key):
+        stmt = select(Food).options(selectinload(Food.nutrients))
+        if since is not None:
+            stmt = stmt.where(Food.updated_at > since)
+        if last_key is not None:
+            last_updated_at, last_id = last_key
+            stmt = stmt.where(or_(
+                Food.updated_at > last_updated_at,
+                and_(Food.updated_at == last_updated_at, Food.id > last_id)
+            ))
+        stmt = stmt.order_by(Food.updated_at, Food.id).limit(self.batch_size)
+        return self.db.scalars(stmt).all()
+
+    def _existing_items(self, food_ids):
+        """food_id → (chroma id, metadata) của các item đã có trong collection"""
+        page = self.collection.get(
+            where={"food_id": {"$in": food_ids}},
+            include=["metadatas"]
+        )
+        return {
+            m["food_id"]: (item_id, m)
+            for item_id, m in zip(page["ids"], page["metadatas"])
+        }
+
+    def _embed(self, documents):
+        embeddings = []
+        step = self.embedder.max_batch_size
+        for i in range(0, len(documents), step):
+            embeddings.extend(self.embedder.embed_documents(documents[i:i + step]))
+        return embeddings
+
+    def _sync_batch(self, foods, stats):
+        existing = self._existing_items([f.id for f in foods])
+
+        to_embed = []        # (id, document, metadata)
+        to_update = []       # (id, metadata) - chỉ đổi metadata, giữ vector
+        to_delete = []
+
+        for food in foods:
+            item_id, old_metadata = existing.get(food.id, (str(food.id), None))
+
+            if not is_indexable(food):
+                if old_metadata is not None:
+                    to_delete.append(item_id)
+                continue
+
+            metadata = build_food_metadata(food)
+            document = build_food_document(DatabaseAdapter._to_chatbot_format(food))
+            metadata["content_hash"] = content_hash(document, self.embedder.model)
+
+            if old_metadata is None or old_metadata.get("content_hash") != metadata["content_hash"]:
+                to_embed.append((item_id, document, metadata))
+            elif old_metadata != metadata:
+                to_update.append((item_id, metadata))
+            else:
+                stats["unchanged"] += 1
+
+        if to_embed:
+            ids, documents, metadatas = zip(*to_embed)
+            self.collection.upsert(
+                ids=list(ids),
+                embeddings=self._embed(list(documents)),
+                documents=list(documents),
+                metadatas=list(metadatas)
+            )
+            stats["embedded"] += len(to_embed)
+
+        if to_update:
+            ids, metadatas = zip(*to_update)
+            self.collection.update(ids=list(ids), metadatas=list(metadatas))
+            stats["metadata_updated"] += len(to_update)
+
+        if to_delete:
+            self.collection.delete(ids=to_delete)
+            stats["deleted"] += len(to_delete)
+
+    def sync(self, full: bool = False) -> dict:
+        """
+        Đồng bộ các food thay đổi từ lần chạy trước
+
+        Args:
+            full: Bỏ qua watermark, quét lại toàn bộ bảng (vẫn chỉ embed món đã đổi)
+
+        Returns:
+            dict: scanned, embedded, metadata_updated, deleted, unchanged
+        """
+        stats = {"scanned": 0, "embedded": 0, "metadata_updated": 0, "deleted": 0, "unchanged": 0}
+        since = self._watermark(full)
+        last_key = None
+
+        while True:
+            foods = self._fetch_batch(since, last_key)
+            if not foods:
+                break
+
+            self._sync_batch(foods, stats)
+            stats["scanned"] += len(foods)
+            last_key = (foods[-1].updated_at, foods[-1].id)
+
+            # Lưu watermark sau mỗi batch → chạy lại sau khi lỗi không phải làm lại từ đầu
+            mark_metadata_version(
+                self.collection,
+                embedding_model=self.embedder.model,
+                indexed_until=last_key[0].isoformat()
+            )
+
+        if stats["scanned"] == 0:
+            mark_metadata_version(self.collection, embedding_model=self.embedder.model)
+
+        print(f"📦 Food index sync: {stats}")
+        return stats
+
+
+def backfill_metadata(db: Session, collection, batch_size: int = 500) -> int:
+    """
+    Bổ sung metadata dinh dưỡng cho các item đã có trong collection (không embed lại)
+
+    Returns:
+        int: Số item đã cập nhật
+    """
+    updated = 0
+    offset = 0
+
+    while True:
+        page = collection.get(limit=batch_size, offset=offset, include=["metadatas"])
+        ids = page["ids"]
+        if not ids:
+            break
+        offset += len(ids)
+
+        food_ids = [m["food_id"] for m in page["metadatas"]]
+        stmt = (
+            select(Food)
+            .options(selectinload(Food.nutrients))
+            .where(Food.id.in_(food_ids))
+        )
+        foods_by_id = {f.id: f for f in db.scalars(stmt).all()}
+
+        batch_ids, batch_metadatas = [], []
+        for item_id, metadata in zip(ids, page["metadatas"]):
+            food = foods_by_id.get(metadata["food_id"])
+            if food is None:
+                continue
+            batch_ids.append(item_id)
+            batch_metadatas.append(build_food_metadata(food))
+
+        if batch_ids:
+            collection.update(ids=batch_ids, metadatas=batch_metadatas)
+            updated += len(batch_ids)
+        print(f"📦 Backfilled {updated} items")
+
+    mark_metadata_version(collection)
+    return updated
+
+
+def sync_food_index(full: bool = False) -> dict:
+    """Job đồng bộ index (blocking): tự mở session + collection"""
+    from app.core.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        indexer = FoodIndexer(
+            db,
+            get_or_create_foods_collection(),
+            get_embedder(),
+            batch_size=settings.FOOD_INDEX_BATCH_SIZE
+        )
+        return indexer.sync(full=full)
+    finally:
+        db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quản lý Chroma collection 'foods'")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sync = subparsers.add_parser("sync", help="Đồng bộ các food mới/thay đổi vào index")
+    sync.add_argument("--full", action="store_true", help="Quét lại toàn bộ bảng foods")
+
+    backfill = subparsers.add_parser("backfill-metadata", help="Bổ sung metadata cho collection cũ")
+    backfill.add_argument("--batch-size", type=int, default=500)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "sync":
+        sync_food_index(full=args.full)
+        return
+
+    from app.core.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        count = backfill_metadata(db, _get_chroma_client().get_collection("foods"), batch_size=args.batch_size)
+        print(f"✅ Backfill xong {count} items")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
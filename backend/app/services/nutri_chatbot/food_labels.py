@@ -0,0 +1,261 @@
+"""
+Food Labels - Gán nhãn món ăn theo tên: category, blacklist, false veggie, độ hợp từng bữa
+
+Trước đây mỗi request chạy hàng chục phép `kw in name_lower` cho từng món. Giờ toàn bộ
+keyword được compile vào 1 automaton Aho-Corasick: mỗi tên chỉ quét 1 lần (O(độ dài tên)),
+kết quả cache theo tên và được FoodIndexer lưu vào metadata Chroma. Lúc request,
+filter chỉ còn đọc nhãn có sẵn.
+
+Đổi keyword / luật gán nhãn → tăng FOOD_LABELS_VERSION để lần sync sau tính lại toàn bộ.
+"""
+
+from collections import Counter, deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+
+# Version của luật gán nhãn (lưu trong metadata từng item + metadata collection)
+FOOD_LABELS_VERSION = 1
+
+PROTEIN_KEYWORDS = [
+    'chicken', 'beef', 'pork', 'fish', 'salmon', 'tuna', 'shrimp',
+    'egg', 'tofu', 'turkey', 'duck', 'lamb', 'steak', 'meat',
+    'gà', 'thịt', 'cá', 'tôm', 'trứng', 'đậu phụ'
+]
+
+CARBS_KEYWORDS = [
+    'rice', 'bread', 'pasta', 'noodles', 'potato', 'sweet potato',
+    'oatmeal', 'cereal', 'quinoa', 'corn', 'wheat', 'bagel',
+    'cơm', 'bánh mì', 'mì', 'khoai', 'bột', 'ngũ cốc'
+]
+
+VEGGIE_KEYWORDS = [
+    'salad', 'broccoli', 'spinach', 'kale', 'lettuce', 'tomato',
+    'cucumber', 'carrot', 'cabbage', 'cauliflower', 'bell pepper',
+    'vegetables', 'veggie', 'greens', 'asparagus', 'zucchini',
+    'mushroom', 'onion', 'garlic', 'celery', 'eggplant',
+    'rau', 'salad', 'súp lơ', 'cà rốt', 'cải', 'rau xào'
+]
+
+# Có 1 trong các từ này → category 'snack' (ưu tiên cao nhất)
+SNACK_KEYWORDS = [
+    'chip', 'candy', 'cookie', 'brownie', 'cake',
+    'ice cream', 'popcorn', 'pretzel', 'cracker',
+    'chocolate', 'bar'
+]
+
+# Món KHÔNG được chọn
+BLACKLIST_KEYWORDS = [
+    'babyfood', 'baby food', 'infant', 'toddler', 'gerber',
+    'formula', 'pediatric', 'junior', 'baby', 'strained',
+    'trẻ em', 'bé', 'sữa bột'
+]
+
+# Không phải món rau thực sự
+FALSE_VEGGIE_KEYWORDS = [
+    'dressing', 'sauce', 'mayo', 'mayonnaise', 'ketchup',
+    'mustard', 'relish', 'gravy', 'butter', 'oil',
+    'sốt', 'tương', 'dầu', 'Fast'
+]
+
+MEAL_KEYWORDS = {
+    'breakfast': {
+        'include': ['egg', 'omelette', 'scrambled', 'milk', 'yogurt',
+                    'cereal', 'oatmeal', 'pancake', 'waffle', 'toast',
+                    'bacon', 'sausage', 'fruit', 'breakfast', 'muffin',
+                    'bagel', 'croissant', 'hash brown'],
+        'exclude': ['lunch', 'dinner', 'pizza', 'burger', 'steak', 'ready-to-eat'],
+        # Prefer: Món nấu > Món khô
+        'prefer': ['egg', 'omelette', 'scrambled', 'pancake', 'waffle',
+                   'bacon', 'sausage', 'hash brown']
+    },
+    'lunch': {
+        'include': ['sandwich', 'wrap', 'burger', 'salad', 'soup',
+                    'chicken', 'rice', 'noodles', 'pasta', 'lunch'],
+        'exclude': ['breakfast', 'cereal', 'oatmeal', 'ready-to-eat']
+    },
+    'dinner': {
+        'include': ['steak', 'roast', 'grilled', 'baked', 'chicken',
+                    'beef', 'fish', 'rice', 'potato', 'pasta', 'dinner'],
+        'exclude': ['breakfast', 'cereal', 'ready-to-eat']
+    },
+    'snack': {
+        'include': ['chips', 'crackers', 'cookie', 'candy', 'nuts',
+                    'fruit', 'yogurt', 'bar', 'snack'],
+        'exclude': []
+    }
+}
+
+# Bữa chính không nhận món ăn vặt
+MAIN_MEAL_SNACK_WORDS = ['chip', 'candy', 'cookie', 'brownie', 'cake']
+
+MEALS = ('breakfast', 'lunch', 'dinner', 'snack')
+
+# Độ hợp của món với 1 bữa
+MEAL_UNSUITABLE = 0
+MEAL_OK = 1
+MEAL_PREFERRED = 2
+
+
+class AhoCorasick:
+    """
+    Automaton Aho-Corasick: tìm mọi pattern xuất hiện trong text với 1 lần quét
+
+    Args:
+        patterns: Danh sách pattern (so khớp chính xác, phân biệt hoa thường)
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+
+        for index, pattern in enumerate(self.patterns):
+            node = 0
+            for ch in pattern:
+                child = self._goto[node].get(ch)
+                if child is None:
+                    child = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                    self._goto[node][ch] = child
+                node = child
+            self._output[node] += (index,)
+
+        # BFS: fail link = trạng thái ứng với hậu tố dài nhất cũng là tiền tố của 1 pattern
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._output[child] += self._output[self._fail[child]]
+
+    def find(self, text: str) -> set:
+        """Index của các pattern có trong text"""
+        found = set()
+        node = 0
+        goto, fail, output = self._goto, self._fail, self._output
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if output[node]:
+                found.update(output[node])
+        return found
+
+
+def _build_matcher():
+    """1 automaton cho mọi nhóm keyword, pattern → danh sách nhãn (trùng keyword = đếm nhiều lần)"""
+    groups = {
+        'protein': PROTEIN_KEYWORDS,
+        'carbs': CARBS_KEYWORDS,
+        'veggie': VEGGIE_KEYWORDS,
+        'snack': SNACK_KEYWORDS,
+        'blacklist': BLACKLIST_KEYWORDS,
+        'false_veggie': FALSE_VEGGIE_KEYWORDS,
+        'main_meal_snack': MAIN_MEAL_SNACK_WORDS,
+    }
+    for meal, rules in MEAL_KEYWORDS.items():
+        for rule, keywords in rules.items():
+            groups[f'{meal}:{rule}'] = keywords
+
+    labels_by_pattern = {}
+    for label, keywords in groups.items():
+        for keyword in keywords:
+            labels_by_pattern.setdefault(keyword, []).append(label)
+
+    patterns = list(labels_by_pattern)
+    return AhoCorasick(patterns), [tuple(labels_by_pattern[p]) for p in patterns]
+
+
+_matcher, _pattern_labels = _build_matcher()
+
+
+@dataclass(frozen=True)
+class FoodLabels:
+    """Nhãn của 1 món (tính từ tên)"""
+
+    category: str               # 'protein' | 'carbs' | 'veggie' | 'mixed' | 'snack'
+    is_blacklisted: bool
+    is_false_veggie: bool
+    meal_fit: tuple             # Độ hợp theo thứ tự MEALS (MEAL_UNSUITABLE / MEAL_OK / MEAL_PREFERRED)
+
+    def fit(self, meal_type: str) -> int:
+        return self.meal_fit[MEALS.index(meal_type)]
+
+    def to_metadata(self) -> dict:
+        """Field lưu vào metadata Chroma"""
+        return {
+            "category": self.category,
+            "is_blacklisted": self.is_blacklisted,
+            "is_false_veggie": self.is_false_veggie,
+            **{f"meal_{meal}": fit for meal, fit in zip(MEALS, self.meal_fit)},
+            "labels_version": FOOD_LABELS_VERSION,
+        }
+
+    @classmethod
+    def from_metadata(cls, metadata: dict) -> Optional["FoodLabels"]:
+        """Nhãn đã lưu lúc index, None nếu item chưa có / được gán bằng luật cũ"""
+        if metadata.get("labels_version") != FOOD_LABELS_VERSION:
+            return None
+        return cls(
+            category=metadata["category"],
+            is_blacklisted=metadata["is_blacklisted"],
+            is_false_veggie=metadata["is_false_veggie"],
+            meal_fit=tuple(metadata[f"meal_{meal}"] for meal in MEALS),
+        )
+
+
+def _category(counts: Counter) -> str:
+    if counts['snack']:
+        return 'snack'
+
+    protein, carbs, veggie = counts['protein'], counts['carbs'], counts['veggie']
+    if protein > carbs and protein > veggie:
+        return 'protein'
+    if carbs > protein and carbs > veggie:
+        return 'carbs'
+    if veggie > protein and veggie > carbs:
+        return 'veggie'
+    return 'mixed'  # Món ăn kết hợp / không nhận ra
+
+
+def _meal_fit(meal: str, counts: Counter) -> int:
+    if counts[f'{meal}:exclude'] or not counts[f'{meal}:include']:
+        return MEAL_UNSUITABLE
+    if meal in ('lunch', 'dinner') and counts['main_meal_snack']:
+        return MEAL_UNSUITABLE
+    if counts[f'{meal}:prefer']:
+        return MEAL_PREFERRED
+    return MEAL_OK
+
+
+@lru_cache(maxsize=16384)
+def food_labels(food_name: str) -> FoodLabels:
+    """
+    Gán nhãn theo tên món (1 lần quét Aho-Corasick, cache theo tên)
+
+    Examples:
+        >>> food_labels("Egg, whole, boiled").category
+        'protein'
+        >>> food_labels("Egg, whole, boiled").fit("breakfast") == MEAL_PREFERRED
+        True
+    """
+    counts = Counter()
+    for index in _matcher.find(food_name.lower()):
+        counts.update(_pattern_labels[index])
+
+    return FoodLabels(
+        category=_category(counts),
+        is_blacklisted=bool(counts['blacklist']),
+        is_false_veggie=bool(counts['false_veggie']),
+        meal_fit=tuple(_meal_fit(meal, counts) for meal in MEALS),
+    )
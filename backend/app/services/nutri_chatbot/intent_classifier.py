@@ -1,11 +1,33 @@
-import google.generativeai as genai
+import asyncio
 import json
+import logging
 import re
+from collections import Counter
 
 from app.core.settings import settings
+from app.services.nutri_chatbot.intent_rules import get_local_classifier
+from app.services.nutri_chatbot.llm_gateway import LLMGatewayError, get_llm_gateway
+from app.services.nutri_chatbot.tracing import span
 from app.services.nutri_chatbot.translate_service import TranslateService
 
 
+logger = logging.getLogger(__name__)
+
+
+# Số message được quyết định ở từng tầng: rules / model / llm / fallback
+_stage_counts = Counter()
+
+
+def intent_stage_stats() -> dict:
+    """Tỉ lệ message được phân loại local (không gọi Gemini)"""
+    total = sum(_stage_counts.values())
+    local = _stage_counts["rules"] + _stage_counts["model"]
+    return {
+        "counts": dict(_stage_counts),
+        "fast_path_ratio": round(local / total, 4) if total else 0.0,
+    }
+
+
 class IntentClassifier:
     """
     Phân loại ý định của user thành 5 loại:
@@ -17,16 +39,16 @@ class IntentClassifier:
     """
     
     def __init__(self):
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')  
+        self.llm = get_llm_gateway()
         self.translator = TranslateService()  # dịch message trước khi classify
     
-    def classify(self, message):
+    async def classify(self, message, user_id=None):
         """
         Phân loại intent và trích xuất entities
         
         Args:
             message (str): Tin nhắn từ user (tiếng Việt hoặc tiếng Anh)
+            user_id: Để LLM gateway giới hạn số call đồng thời theo user
         
         Returns:
             dict: {
@@ -34,15 +56,34 @@ class IntentClassifier:
                 "entities": {
                     "food_name": "egg",  # ✅ LUÔN LÀ ENGLISH
                     "nutrient": "calories"
-                }
+                },
+                "stage": "rules" | "model" | "llm" | "fallback"
             }
         """
         
         # ✅ DỊCH NGAY TỪ ĐẦU - Đây là thay đổi quan trọng nhất
-        english_message = self.translator.translate_to_english(message)
+        # English / đã có trong cache → không cần worker thread
+        english_message = self.translator.translate_cached(message)
+        if english_message is None:
+            # deep_translator / langdetect là blocking → chạy trong worker thread
+            with span("translate"):
+                english_message = await asyncio.to_thread(self.translator.translate_to_english, message)
         
         if english_message != message:
-            print(f"🌏 Translated for intent: '{message}' → '{english_message}'")
+            logger.debug("Translated for intent: %r → %r", message, english_message)
+        
+        with span("classify"):
+            return await self._classify_english(english_message, user_id)
+    
+    async def _classify_english(self, english_message, user_id=None):
+        """Phân loại message đã dịch: tầng local (rules + model) trước, rồi mới tới Gemini"""
+        
+        # ✅ Tầng local (regex + model n-gram): câu rõ ràng không cần gọi Gemini
+        if settings.CHATBOT_LOCAL_INTENT_ENABLED:
+            local_result = get_local_classifier().classify(english_message)
+            if local_result is not None:
+                _stage_counts[local_result['stage']] += 1
+                return local_result
         
         prompt = f"""
 Bạn là một chuyên gia phân loại ý định (intent classification) trong hệ thống chatbot dinh dưỡng thông minh.
@@ -309,8 +350,13 @@ Output: {{"intent": "MEAL_PLAN_REQUEST", "entities": {{"duration": "daily", "goa
 """
         
         try:
-            response = self.model.generate_content(prompt)
-            text = response.text.strip()
+            response_text = await self.llm.generate(
+                prompt,
+                timeout=settings.CHATBOT_CLASSIFY_TIMEOUT_SECONDS,
+                stage="classify",
+                user_id=user_id
+            )
+            text = response_text.strip()
             
             # Remove markdown code blocks
             text = re.sub(r'```json\s*', '', text)
@@ -326,14 +372,24 @@ Output: {{"intent": "MEAL_PLAN_REQUEST", "entities": {{"duration": "daily", "goa
             if 'entities' not in result:
                 result['entities'] = {}
             
+            result['stage'] = 'llm'
+            _stage_counts['llm'] += 1
             return result
         
+        except LLMGatewayError:
+            # Quá tải → để route trả 429/503, không fallback SOCIAL (cũng sẽ gọi LLM)
+            raise
+        
         except Exception as e:
-            print(f"⚠️  Intent classification error: {e}")
-            print(f"   Raw response: {response.text if 'response' in locals() else 'N/A'}")
+            logger.warning(
+                "Intent classification error: %s (raw response: %r)",
+                e, response_text if 'response_text' in locals() else None
+            )
             
             # Fallback
+            _stage_counts['fallback'] += 1
             return {
                 "intent": "SOCIAL",
-                "entities": {}
+                "entities": {},
+                "stage": "fallback"
             }
\ No newline at end of file
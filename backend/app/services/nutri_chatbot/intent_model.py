@@ -0,0 +1,191 @@
+"""
+Intent Model - Multinomial Naive Bayes trên n-gram ký tự (mô hình tuyến tính trong log-space)
+
+Model nhỏ, train bằng Python thuần (không cần sklearn), lưu thành file JSON
+đi kèm source code. Dùng làm tầng 2 của LocalIntentClassifier.
+
+Ngoài 5 intent của chatbot còn có class OTHER (câu lạc đề / mơ hồ) → luôn để LLM xử lý.
+
+Train lại từ seed data:
+    python -m app.services.nutri_chatbot.intent_model
+"""
+
+import argparse
+import json
+import math
+import os
+from collections import Counter, defaultdict
+
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+DEFAULT_SEED_PATH = os.path.join(DATA_DIR, "intent_seed.jsonl")
+DEFAULT_MODEL_PATH = os.path.join(DATA_DIR, "intent_model.json")
+
+MODEL_VERSION = 1
+
+
+def char_ngrams(text: str, n_min: int = 2, n_max: int = 4):
+    """N-gram ký tự của text đã chuẩn hóa (lowercase, gộp khoảng trắng, pad 2 đầu)"""
+    text = f" {' '.join(text.lower().split())} "
+    for n in range(n_min, n_max + 1):
+        for i in range(len(text) - n + 1):
+            yield text[i:i + n]
+
+
+class CharNgramNB:
+    """
+    Multinomial Naive Bayes: score(c) = log P(c) + Σ count(g) * log P(g|c)
+
+    Khi predict, tổng log-likelihood được chia cho số n-gram rồi nhân `sharpness`
+    → xác suất không bị quá tự tin với câu dài (NB thuần gần như luôn ra ~1.0).
+
+    Args:
+        classes: Danh sách intent
+        class_log_prior: log P(c)
+        feature_log_prob: n-gram → [log P(g|c) cho từng class]
+        unknown_log_prob: log P(g|c) của n-gram chưa gặp khi train (smoothing)
+        sharpness: Hệ số nhân log-likelihood trung bình mỗi n-gram
+    """
+
+    def __init__(self, classes, class_log_prior, feature_log_prob, unknown_log_prob, n_min=2, n_max=4, sharpness=10.0):
+        self.classes = list(classes)
+        self.class_log_prior = list(class_log_prior)
+        self.feature_log_prob = feature_log_prob
+        self.unknown_log_prob = list(unknown_log_prob)
+        self.n_min = n_min
+        self.n_max = n_max
+        self.sharpness = sharpness
+
+    @classmethod
+    def train(cls, samples, alpha: float = 0.5, n_min: int = 2, n_max: int = 4, sharpness: float = 10.0):
+        """
+        Train từ list (text, intent)
+        """
+        classes = sorted({intent for _, intent in samples})
+        index = {c: i for i, c in enumerate(classes)}
+
+        doc_counts = Counter(intent for _, intent in samples)
+        feature_counts = defaultdict(lambda: [0] * len(classes))
+        totals = [0] * len(classes)
+
+        for text, intent in samples:
+            ci = index[intent]
+            for gram, count in Counter(char_ngrams(text, n_min, n_max)).items():
+                feature_counts[gram][ci] += count
+                totals[ci] += count
+
+        vocab_size = len(feature_counts)
+        denominators = [totals[i] + alpha * vocab_size for i in range(len(classes))]
+
+        feature_log_prob = {
+            gram: [round(math.log((counts[i] + alpha) / denominators[i]), 4) for i in range(len(classes))]
+            for gram, counts in feature_counts.items()
+        }
+        unknown_log_prob = [round(math.log(alpha / d), 4) for d in denominators]
+        class_log_prior = [round(math.log(doc_counts[c] / len(samples)), 4) for c in classes]
+
+        return cls(classes, class_log_prior, feature_log_prob, unknown_log_prob, n_min, n_max, sharpness)
+
+    def _score(self, text: str):
+        """(log-score mỗi class, tỉ lệ n-gram đã gặp khi train)"""
+        likelihood = [0.0] * len(self.classes)
+        known = total = 0
+        for gram, count in Counter(char_ngrams(text, self.n_min, self.n_max)).items():
+            total += count
+            log_probs = self.feature_log_prob.get(gram)
+            if log_probs is None:
+                # N-gram lạ không phân biệt được class nào → bỏ qua
+                continue
+            known += count
+            for i, lp in enumerate(log_probs):
+                likelihood[i] += count * lp
+
+        scale = self.sharpness / known if known else 0.0
+        scores = [prior + ll * scale for prior, ll in zip(self.class_log_prior, likelihood)]
+        return scores, (known / total if total else 0.0)
+
+    def predict_proba(self, text: str) -> dict:
+        """intent → xác suất (softmax của log-score)"""
+        scores, _ = self._score(text)
+        top = max(scores)
+        exp_scores = [math.exp(s - top) for s in scores]
+        total = sum(exp_scores)
+        return {c: e / total for c, e in zip(self.classes, exp_scores)}
+
+    def predict(self, text: str):
+        """
+        Returns:
+            (intent, confidence, coverage): coverage = tỉ lệ n-gram của text có trong vocab
+        """
+        scores, coverage = self._score(text)
+        top = max(scores)
+        exp_scores = [math.exp(s - top) for s in scores]
+        best = scores.index(top)
+        return self.classes[best], exp_scores[best] / sum(exp_scores), coverage
+
+    def to_dict(self) -> dict:
+        return {
+            "version": MODEL_VERSION,
+            "ngram_range": [self.n_min, self.n_max],
+            "sharpness": self.sharpness,
+            "classes": self.classes,
+            "class_log_prior": self.class_log_prior,
+            "unknown_log_prob": self.unknown_log_prob,
+            "feature_log_prob": self.feature_log_prob,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        if data.get("version") != MODEL_VERSION:
+            raise ValueError(f"Unsupported intent model version: {data.get('version')}")
+        n_min, n_max = data["ngram_range"]
+        return cls(
+            data["classes"],
+            data["class_log_prior"],
+            data["feature_log_prob"],
+            data["unknown_log_prob"],
+            n_min,
+            n_max,
+            data.get("sharpness", 10.0),
+        )
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def load_seed(path: str = DEFAULT_SEED_PATH):
+    """Đọc seed data (jsonl: {"text": ..., "intent": ...})"""
+    samples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                row = json.loads(line)
+                samples.append((row["text"], row["intent"]))
+    return samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train intent model (char n-gram Naive Bayes)")
+    parser.add_argument("--seed", default=DEFAULT_SEED_PATH)
+    parser.add_argument("--out", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--alpha", type=float, default=0.5)
+    args = parser.parse_args(argv)
+
+    samples = load_seed(args.seed)
+    model = CharNgramNB.train(samples, alpha=args.alpha)
+    model.save(args.out)
+
+    correct = sum(1 for text, intent in samples if model.predict(text)[0] == intent)
+    print(f"✅ Trained on {len(samples)} samples, {len(model.feature_log_prob)} n-grams")
+    print(f"   Train accuracy: {correct / len(samples):.3f} → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
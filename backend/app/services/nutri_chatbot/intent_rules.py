@@ -0,0 +1,275 @@
+"""
+Intent Rules - Tầng phân loại intent local (không gọi mạng) trước Gemini
+
+1. Rules: regex đã compile cho các câu rõ ràng ("hi", "thanks",
+   "suggest foods under 300 calories", "meal plan for today"...)
+2. Model: Naive Bayes trên n-gram ký tự (intent_model.py), chỉ nhận khi đủ tự tin
+   và trích xuất đủ entity bắt buộc của intent đó
+3. Còn lại → trả về None để IntentClassifier gọi LLM
+
+Tất cả chạy trên message đã dịch sang tiếng Anh.
+"""
+
+import os
+import re
+
+from app.services.nutri_chatbot.intent_model import DEFAULT_MODEL_PATH, CharNgramNB
+
+
+# Model chỉ được tin khi phần lớn n-gram của câu đã gặp lúc train
+MIN_MODEL_COVERAGE = 0.8
+
+
+# ==================== Entity patterns ====================
+
+_CALORIES_RE = re.compile(r"\b(\d{2,4})\s*(?:-\s*)?(?:kcal|calories|calorie|cals?|calo)\b")
+_UNDER_RE = re.compile(r"\b(under|below|less than|fewer than|at most|no more than|lower than|max(?:imum)?)\b")
+_ABOVE_RE = re.compile(r"\b(over|above|more than|at least|higher than|min(?:imum)?)\b")
+
+# Không có số cụ thể: áp dụng quy tắc mặc định giống prompt của LLM
+_LOW_CAL_RE = re.compile(r"\b(low[- ]cal(?:orie)?s?|light meals?|diet foods?)\b")
+_MODERATE_CAL_RE = re.compile(r"\b(moderate|medium)[- ]?(cal(?:orie)?s?)?\b")
+_HIGH_CAL_RE = re.compile(r"\b(high[- ]cal(?:orie)?s?|calorie[- ]dense)\b")
+
+_GOAL_PATTERNS = [
+    ("lose_weight", re.compile(r"\b(los(?:e|ing)(?: \w+)? (?:weight|fat|kg|pounds)|weight[- ]loss|fat[- ]loss|slim(?:ming)?|cutting|diet(?:ing)?)\b")),
+    ("gain_muscle", re.compile(r"\b(muscle|bodybuild(?:ing|er)?|gym|build(?:ing)? mass)\b")),
+    ("gain_weight", re.compile(r"\b(gain(?:ing)?(?: \w+)? weight|weight[- ]gain|put(?:ting)? on weight|bulk(?:ing)?(?: up)?)\b")),
+    ("maintain_weight", re.compile(r"\b(maintain(?:ing)?|healthy|balanced|nutritious|wellness)\b")),
+]
+
+_MEAL_TYPE_RE = re.compile(r"\b(breakfast|lunch|dinner|snacks?)\b")
+_WEEKLY_RE = re.compile(r"\b(week|weekly|7[- ]day|seven[- ]day)\b")
+
+_NUTRIENTS = {
+    "calories": "calories", "calorie": "calories", "kcal": "calories",
+    "protein": "protein", "proteins": "protein",
+    "carbs": "carbs", "carb": "carbs", "carbohydrates": "carbs",
+    "fat": "fat", "fats": "fat",
+}
+_NUTRIENT_WORDS = "|".join(sorted(_NUTRIENTS, key=len, reverse=True))
+
+
+# ==================== Intent rules ====================
+
+_SOCIAL_RE = re.compile(
+    r"^(hi+|hello+|hey+|yo|hiya|good (?:morning|afternoon|evening|night)|"
+    r"thanks?(?: you)?(?: so much| a lot| very much)?|thank u|thx|ty|"
+    r"bye|goodbye|bye bye|see (?:you|ya)(?: later)?|"
+    r"ok(?:ay)?|cool|great|nice|awesome|lol|"
+    r"who are you|what(?:'s| is) your name|how are you(?: doing| today)?|nice to meet you)"
+    r"(?: there| bot| buddy)?[\s!.,?]*$"
+)
+
+_MEAL_PLAN_RE = re.compile(
+    r"\b(meal[- ]?plans?|menus?|eating plan|diet plan|meal schedule|meal prep plan|(?:3|three) meals|"
+    r"plan(?:ning)? (?:out )?(?:my |our |the |a )?(?:daily |weekly |whole |full )?(?:meals?|menus?|eating|diet)|"
+    r"meals? for (?:the )?(?:whole )?(?:today|tomorrow|day|week)|"
+    r"(?:daily|weekly) meals|(?:full|whole) day of (?:eating|meals))\b"
+)
+# Có chữ "plan" nhưng không khớp mẫu thực đơn nào → không tự quyết là gợi ý theo calo
+_PLAN_WORD_RE = re.compile(r"\bplan(?:s|ning|ned)?\b")
+
+_FOOD_INQUIRY_RES = [
+    re.compile(
+        rf"^(?:how (?:many|much)) (?P<nutrient>{_NUTRIENT_WORDS})\s+(?:are |is )?(?:there )?(?:in|does)\s+"
+        r"(?:a |an |one |100 ?g (?:of )?)?(?P<food>[a-z][a-z' \-]{1,40}?)(?: have| contain)?\s*\??$"
+    ),
+    re.compile(
+        r"^(?:tell me )?(?:the )?nutrition(?:al)? (?:info(?:rmation)?|facts|value)s? (?:of|for|in) "
+        r"(?:a |an )?(?P<food>[a-z][a-z' \-]{1,40}?)\s*\??$"
+    ),
+    re.compile(
+        rf"^does (?:a |an )?(?P<food>[a-z][a-z' \-]{{1,40}}?) (?:have|contain) (?:any |much |a lot of )?(?P<nutrient>{_NUTRIENT_WORDS})\s*\??$"
+    ),
+    re.compile(
+        rf"^(?P<nutrient>{_NUTRIENT_WORDS}) (?:in|of) (?:a |an |one )?(?P<food>[a-z][a-z' \-]{{1,40}}?)\s*\??$"
+    ),
+]
+
+_RECOMMEND_RE = re.compile(
+    r"\b(suggest|recommend|give me|find|show|list|ideas?|options?|what (?:should|can|to) i? ?eat|"
+    r"what to eat|foods?|dishes|meals?|snacks?|something)\b"
+)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().strip().split())
+
+
+def extract_calories(text: str):
+    """
+    target_calories + comparison từ text (None nếu không có)
+
+    Examples:
+        >>> extract_calories("foods under 300 calories")
+        {'target_calories': 300, 'comparison': 'under'}
+        >>> extract_calories("low calorie foods")
+        {'target_calories': 200, 'comparison': 'under'}
+    """
+    match = _CALORIES_RE.search(text)
+    if match:
+        if _UNDER_RE.search(text):
+            comparison = "under"
+        elif _ABOVE_RE.search(text):
+            comparison = "above"
+        else:
+            comparison = "around"
+        return {"target_calories": int(match.group(1)), "comparison": comparison}
+
+    if _LOW_CAL_RE.search(text):
+        return {"target_calories": 200, "comparison": "under"}
+    if _HIGH_CAL_RE.search(text):
+        return {"target_calories": 600, "comparison": "above"}
+    if _MODERATE_CAL_RE.search(text):
+        return {"target_calories": 400, "comparison": "around"}
+    return None
+
+
+def extract_goal(text: str):
+    for goal, pattern in _GOAL_PATTERNS:
+        if pattern.search(text):
+            return goal
+    return None
+
+
+def extract_entities(text: str) -> dict:
+    """Tất cả entity tìm được: target_calories, comparison, goal, meal_type, duration"""
+    text = _normalize(text)
+    entities = {}
+
+    calories = extract_calories(text)
+    if calories:
+        entities.update(calories)
+
+    goal = extract_goal(text)
+    if goal:
+        entities["goal"] = goal
+
+    meal_types = {m.rstrip("s") for m in _MEAL_TYPE_RE.findall(text)}
+    if len(meal_types) == 1:
+        entities["meal_type"] = meal_types.pop()
+
+    entities["duration"] = "weekly" if _WEEKLY_RE.search(text) else "daily"
+    return entities
+
+
+def _match_food_inquiry(text: str):
+    for pattern in _FOOD_INQUIRY_RES:
+        match = pattern.match(text)
+        if match:
+            entities = {"food_name": match.group("food").strip()}
+            nutrient = match.groupdict().get("nutrient")
+            if nutrient:
+                entities["nutrient"] = _NUTRIENTS[nutrient]
+            return entities
+    return None
+
+
+def _entities_for(intent: str, entities: dict):
+    """
+    Entity theo đúng format của từng intent (giống output LLM).
+    None nếu thiếu entity bắt buộc → không tự quyết được.
+    """
+    if intent == "SOCIAL":
+        return {}
+    if intent == "CALORIE_BASED_RECOMMENDATION":
+        if "target_calories" not in entities:
+            return None
+        return {"target_calories": entities["target_calories"], "comparison": entities["comparison"]}
+    if intent == "GOAL_BASED_RECOMMENDATION":
+        return {"goal": entities.get("goal", "maintain_weight")}
+    if intent == "MEAL_PLAN_REQUEST":
+        result = {"duration": entities["duration"]}
+        if "goal" in entities:
+            result["goal"] = entities["goal"]
+        return result
+    # FOOD_NUTRITION_INQUIRY cần food_name → chỉ rules mới trích xuất được
+    return None
+
+
+def match_rules(message: str):
+    """
+    Tầng 1: regex cho các câu rõ ràng
+
+    Returns:
+        dict {"intent", "entities"} hoặc None
+    """
+    text = _normalize(message)
+    if not text:
+        return None
+
+    if _SOCIAL_RE.match(text):
+        return {"intent": "SOCIAL", "entities": {}}
+
+    entities = extract_entities(text)
+
+    # Thứ tự ưu tiên giống quy tắc trong prompt LLM
+    meal_mentions = {m.rstrip("s") for m in _MEAL_TYPE_RE.findall(text)} - {"snack"}
+    if _MEAL_PLAN_RE.search(text) or len(meal_mentions) >= 2:
+        return {"intent": "MEAL_PLAN_REQUEST", "entities": _entities_for("MEAL_PLAN_REQUEST", entities)}
+
+    food_entities = _match_food_inquiry(text)
+    if food_entities:
+        return {"intent": "FOOD_NUTRITION_INQUIRY", "entities": food_entities}
+
+    if not _RECOMMEND_RE.search(text):
+        return None
+
+    if "target_calories" in entities:
+        if _PLAN_WORD_RE.search(text):
+            return None  # Có thể là thực đơn theo calo → để model / LLM quyết
+        return {"intent": "CALORIE_BASED_RECOMMENDATION", "entities": _entities_for("CALORIE_BASED_RECOMMENDATION", entities)}
+
+    if "goal" in entities:
+        return {"intent": "GOAL_BASED_RECOMMENDATION", "entities": _entities_for("GOAL_BASED_RECOMMENDATION", entities)}
+
+    return None
+
+
+class LocalIntentClassifier:
+    """
+    Rules + model local. classify() trả về None nếu phải hỏi LLM.
+
+    Args:
+        model_path: File JSON của CharNgramNB (None/không tồn tại = chỉ dùng rules)
+        threshold: Xác suất tối thiểu để tin model
+    """
+
+    def __init__(self, model_path: str = DEFAULT_MODEL_PATH, threshold: float = 0.9):
+        self.threshold = threshold
+        self.model = CharNgramNB.load(model_path) if model_path and os.path.exists(model_path) else None
+
+    def classify(self, message: str):
+        """
+        Returns:
+            dict {"intent", "entities", "stage": "rules" | "model", "confidence"} hoặc None
+        """
+        result = match_rules(message)
+        if result is not None:
+            return {**result, "stage": "rules", "confidence": 1.0}
+
+        if self.model is None:
+            return None
+
+        intent, confidence, coverage = self.model.predict(_normalize(message))
+        if intent == "OTHER" or confidence < self.threshold or coverage < MIN_MODEL_COVERAGE:
+            return None
+
+        entities = _entities_for(intent, extract_entities(message))
+        if entities is None:
+            return None
+
+        return {"intent": intent, "entities": entities, "stage": "model", "confidence": round(confidence, 4)}
+
+
+_local_classifier = None
+
+
+def get_local_classifier() -> LocalIntentClassifier:
+    """Classifier local dùng chung (model chỉ load 1 lần)"""
+    global _local_classifier
+    if _local_classifier is None:
+        from app.core.settings import settings
+        _local_classifier = LocalIntentClassifier(threshold=settings.CHATBOT_INTENT_MODEL_THRESHOLD)
+    return _local_classifier
@@ -0,0 +1,332 @@
+"""
+LLM Gateway - Điểm duy nhất gọi LLM (Gemini) của chatbot
+
+- Giới hạn số call đồng thời trong process + theo từng user
+- Hàng đợi có giới hạn: đầy hoặc chờ quá lâu → fail nhanh (503), user gửi dồn → 429
+- Timeout từng lần gọi, retry lỗi tạm thời (429/5xx) với backoff có jitter
+- Streaming (generate_stream) cho /chatbot/chat/stream, cùng hàng đợi với generate
+- Số liệu queue depth / latency cho /chatbot/health
+- FakeLLMBackend để load test không tốn quota
+"""
+
+import asyncio
+import json
+import random
+import re
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+
+from app.core.admission import LATENCY_WINDOW, AdmissionLimiter, AdmissionQueueFull, AdmissionTimeout, percentiles
+from app.core.settings import settings
+from app.services.nutri_chatbot.async_utils import StageTimeoutError, with_timeout
+
+
+# Lỗi tạm thời của google.api_core (so theo tên class để không phải import google)
+RETRYABLE_ERROR_NAMES = {
+    "ResourceExhausted",
+    "TooManyRequests",
+    "ServiceUnavailable",
+    "InternalServerError",
+    "BadGateway",
+    "GatewayTimeout",
+}
+
+
+class LLMGatewayError(Exception):
+    """LLM đang quá tải → route trả về `status_code` kèm header Retry-After"""
+
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        self.retry_after = retry_after
+        super().__init__(message)
+
+
+class LLMQueueFullError(LLMGatewayError):
+    """Hàng đợi đầy hoặc chờ slot quá lâu"""
+
+    status_code = 503
+
+
+class LLMUserLimitError(LLMGatewayError):
+    """User đã có quá nhiều call LLM đang chạy/chờ"""
+
+    status_code = 429
+
+
+class LLMTransientError(Exception):
+    """Lỗi tạm thời của backend (retry được)"""
+
+
+def _is_retryable(error: Exception) -> bool:
+    return (
+        isinstance(error, (LLMTransientError, ConnectionError))
+        or type(error).__name__ in RETRYABLE_ERROR_NAMES
+    )
+
+
+# ==================== Backends ====================
+
+class GeminiBackend:
+    """Gọi Gemini qua google-generativeai (model được cache theo tên)"""
+
+    def __init__(self):
+        if not settings.GEMINI_API_KEY:
+            raise ValueError("GEMINI_API_KEY is not configured in settings")
+        import google.generativeai as genai
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        self._genai = genai
+        self._models = {}
+
+    def _get_model(self, model: str):
+        if model not in self._models:
+            self._models[model] = self._genai.GenerativeModel(model)
+        return self._models[model]
+
+    async def generate(self, prompt: str, model: str) -> str:
+        response = await self._get_model(model).generate_content_async(prompt)
+        return response.text
+
+    async def generate_stream(self, prompt: str, model: str):
+        """Từng đoạn text theo streaming API của Gemini"""
+        response = await self._get_model(model).generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            # Chunk cuối (finish_reason) có thể không có parts
+            if chunk.parts:
+                yield chunk.text
+
+
+class FakeLLMBackend:
+    """
+    Backend giả cho load test / benchmark: chỉ sleep rồi trả text cố định
+
+    Args:
+        latency: Thời gian trả lời trung bình (giây), với stream là thời gian tới chunk đầu
+        jitter: Dao động ± quanh latency (giây)
+        chunk_delay: Thời gian giữa 2 chunk khi stream (giây)
+        failure_rate: Tỉ lệ raise LLMTransientError (test retry)
+        responder: fn(prompt) -> str, mặc định JSON intent SOCIAL cho prompt phân loại
+        seed: Seed random để kết quả lặp lại được
+    """
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, chunk_delay: float = 0.0, failure_rate: float = 0.0, responder=None, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_delay = chunk_delay
+        self.failure_rate = failure_rate
+        self.responder = responder or self._default_response
+        self.calls = 0
+        self._random = random.Random(seed)
+
+    @staticmethod
+    def _default_response(prompt: str) -> str:
+        if "JSON" in prompt:
+            return json.dumps({"intent": "SOCIAL", "entities": {}})
+        return "Xin chào! Mình là trợ lý dinh dưỡng (fake backend)."
+
+    async def generate(self, prompt: str, model: str) -> str:
+        self.calls += 1
+        delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+        await asyncio.sleep(delay)
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            raise LLMTransientError("fake backend transient error")
+        return self.responder(prompt)
+
+    async def generate_stream(self, prompt: str, model: str):
+        text = await self.generate(prompt, model)
+        for i, chunk in enumerate(re.findall(r"\S+\s*", text)):
+            if i and self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            yield chunk
+
+
+# ==================== Gateway ====================
+
+class LLMGateway:
+    """
+    Giới hạn đồng thời + hàng đợi + retry cho mọi call LLM
+
+    Args:
+        backend: Object có `async generate(prompt, model) -> str`
+        max_concurrency: Số call chạy cùng lúc tối đa
+        per_user_concurrency: Số call (chạy + chờ) tối đa của 1 user
+        max_queue: Số call chờ slot tối đa, vượt → LLMQueueFullError ngay
+        queue_timeout: Thời gian chờ slot tối đa (giây)
+        max_retries: Số lần thử lại khi lỗi tạm thời
+        retry_base: Backoff "full jitter": random(0, retry_base * 2^attempt)
+    """
+
+    def __init__(
+        self,
+        backend,
+        max_concurrency: int = 16,
+        per_user_concurrency: int = 2,
+        max_queue: int = 64,
+        queue_timeout: float = 5.0,
+        max_retries: int = 2,
+        retry_base: float = 0.5,
+    ):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.per_user_concurrency = per_user_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+
+        self._admission = AdmissionLimiter(max_concurrency, max_queue, queue_timeout)
+        self._in_flight = 0
+        self._per_user = Counter()
+        self._counters = Counter()
+        self._call_ms = deque(maxlen=LATENCY_WINDOW)
+        self._first_chunk_ms = deque(maxlen=LATENCY_WINDOW)
+
+    @asynccontextmanager
+    async def _slot(self, user_id):
+        """
+        Giữ 1 slot LLM trong suốt block (xếp hàng nếu hết slot)
+
+        Raises:
+            LLMUserLimitError: user vượt per_user_concurrency
+            LLMQueueFullError: hàng đợi đầy hoặc chờ slot quá queue_timeout
+        """
+        self._counters["requests"] += 1
+
+        if user_id is not None and self._per_user[user_id] >= self.per_user_concurrency:
+            self._counters["rejected_user_limit"] += 1
+            raise LLMUserLimitError("Too many concurrent chatbot requests for this user", retry_after=1.0)
+
+        if user_id is not None:
+            self._per_user[user_id] += 1
+        try:
+            # Hết slot → xếp hàng, chờ tối đa queue_timeout
+            try:
+                semaphore = await self._admission.acquire()
+            except AdmissionQueueFull:
+                self._counters["rejected_queue_full"] += 1
+                raise LLMQueueFullError("Chatbot is overloaded, please retry shortly", retry_after=self.queue_timeout)
+            except AdmissionTimeout:
+                self._counters["queue_timeouts"] += 1
+                raise LLMQueueFullError("Timed out waiting for a chatbot slot", retry_after=self.queue_timeout)
+
+            self._in_flight += 1
+            try:
+                yield
+            finally:
+                self._in_flight -= 1
+                semaphore.release()
+        finally:
+            if user_id is not None:
+                self._per_user[user_id] -= 1
+                if self._per_user[user_id] <= 0:
+                    del self._per_user[user_id]
+
+    async def generate(self, prompt: str, *, timeout: float, stage: str = "generate", user_id=None, model: str = "gemini-2.5-flash") -> str:
+        """
+        Gọi LLM qua hàng đợi
+
+        Raises:
+            LLMUserLimitError: user vượt per_user_concurrency
+            LLMQueueFullError: hàng đợi đầy hoặc chờ slot quá queue_timeout
+            StageTimeoutError: 1 lần gọi quá `timeout` giây
+        """
+        async with self._slot(user_id):
+            return await self._call_with_retry(prompt, model, timeout, stage)
+
+    async def generate_stream(self, prompt: str, *, timeout: float, stage: str = "generate", user_id=None, model: str = "gemini-2.5-flash"):
+        """
+        Như generate() nhưng yield từng đoạn text ngay khi model sinh ra
+
+        `timeout` tính cho cả stream. Chỉ retry khi lỗi xảy ra trước chunk đầu tiên
+        (đã gửi text cho client thì không gửi lại được). Client ngắt kết nối →
+        generator bị đóng → slot được trả lại ngay.
+        """
+        loop = asyncio.get_running_loop()
+        async with self._slot(user_id):
+            attempt = 0
+            while True:
+                started = time.perf_counter()
+                deadline = loop.time() + timeout
+                stream = self.backend.generate_stream(prompt, model)
+                emitted = False
+                try:
+                    while True:
+                        remaining = deadline - loop.time()
+                        if remaining <= 0:
+                            raise StageTimeoutError(stage, timeout)
+                        try:
+                            chunk = await with_timeout(anext(stream), remaining, stage=stage)
+                        except StopAsyncIteration:
+                            break
+                        if not emitted:
+                            emitted = True
+                            self._first_chunk_ms.append((time.perf_counter() - started) * 1000)
+                        yield chunk
+                    self._call_ms.append((time.perf_counter() - started) * 1000)
+                    return
+                except Exception as e:
+                    if emitted or not _is_retryable(e) or attempt >= self.max_retries:
+                        self._counters["timeouts" if isinstance(e, TimeoutError) else "errors"] += 1
+                        raise
+                    self._counters["retries"] += 1
+                finally:
+                    await stream.aclose()
+                await asyncio.sleep(random.uniform(0, self.retry_base * 2 ** attempt))
+                attempt += 1
+
+    async def _call_with_retry(self, prompt, model, timeout, stage):
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                text = await with_timeout(self.backend.generate(prompt, model), timeout, stage=stage)
+                self._call_ms.append((time.perf_counter() - started) * 1000)
+                return text
+            except Exception as e:
+                if not _is_retryable(e) or attempt >= self.max_retries:
+                    self._counters["timeouts" if isinstance(e, TimeoutError) else "errors"] += 1
+                    raise
+                self._counters["retries"] += 1
+                await asyncio.sleep(random.uniform(0, self.retry_base * 2 ** attempt))
+                attempt += 1
+
+    def stats(self) -> dict:
+        """Queue depth, số call đang chạy, bộ đếm lỗi và latency p50/p95 (ms)"""
+        return {
+            "backend": type(self.backend).__name__,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._in_flight,
+            "queue_depth": self._admission.waiting,
+            "max_queue_depth": self._admission.max_waiting,
+            "active_users": len(self._per_user),
+            "counters": dict(self._counters),
+            "wait_ms": percentiles(self._admission.wait_ms),
+            "call_ms": percentiles(self._call_ms),
+            "first_chunk_ms": percentiles(self._first_chunk_ms),
+        }
+
+
+_gateway = None
+
+
+def get_llm_gateway() -> LLMGateway:
+    """Gateway dùng chung cả process, backend theo CHATBOT_LLM_BACKEND"""
+    global _gateway
+    if _gateway is None:
+        backend = FakeLLMBackend() if settings.CHATBOT_LLM_BACKEND == "fake" else GeminiBackend()
+        _gateway = LLMGateway(
+            backend,
+            max_concurrency=settings.CHATBOT_LLM_MAX_CONCURRENCY,
+            per_user_concurrency=settings.CHATBOT_LLM_PER_USER_CONCURRENCY,
+            max_queue=settings.CHATBOT_LLM_MAX_QUEUE,
+            queue_timeout=settings.CHATBOT_LLM_QUEUE_TIMEOUT_SECONDS,
+            max_retries=settings.CHATBOT_LLM_MAX_RETRIES,
+            retry_base=settings.CHATBOT_LLM_RETRY_BASE_SECONDS,
+        )
+    return _gateway
+
+
+def peek_llm_gateway():
+    """Gateway hiện tại nếu đã khởi tạo (không tạo mới, dùng cho health check)"""
+    return _gateway
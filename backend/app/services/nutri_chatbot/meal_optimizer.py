@@ -0,0 +1,213 @@
+"""
+Meal Optimizer - Chọn món + khẩu phần cho thực đơn cả ngày (deterministic, NumPy)
+
+Thay cho việc shuffle rồi để LLM tự chọn: với mỗi bữa, duyệt (vector hóa) mọi tổ hợp
+1 món / slot trong tập ứng viên đã rút gọn, giải khẩu phần (gram) bằng least-squares
+có regularization theo lô, rồi chọn tổ hợp sai lệch ít nhất so với mục tiêu
+kcal / protein / carbs / fat của bữa đó.
+
+Dinh dưỡng của món trong RAG là per 100g.
+"""
+
+import itertools
+
+import numpy as np
+
+
+# Phân bổ calo cả ngày cho từng bữa (sáng 25% - trưa 35% - snack 10% - tối 30%)
+MEAL_SPLIT = {
+    "breakfast": 0.25,
+    "lunch": 0.35,
+    "snack": 0.10,
+    "dinner": 0.30,
+}
+
+# Bữa trưa / tối: 3 món (45% protein, 35% carbs, 20% rau)
+PLATE_SPLIT = {
+    "protein": 0.45,
+    "carbs": 0.35,
+    "veggie": 0.20,
+}
+
+# % năng lượng từ protein / carbs / fat theo mục tiêu
+MACRO_RATIOS = {
+    "lose_weight": (0.35, 0.35, 0.30),
+    "gain_muscle": (0.30, 0.45, 0.25),
+    "gain_weight": (0.20, 0.50, 0.30),
+    "maintain_weight": (0.20, 0.50, 0.30),
+}
+
+# Sai số kcal quan trọng hơn sai số từng macro
+MACRO_WEIGHTS = np.array([2.0, 1.0, 1.0, 1.0])
+
+# Giới hạn khẩu phần mỗi món (gram)
+MIN_PORTION_G = 30.0
+MAX_PORTION_G = 400.0
+
+# Số ứng viên giữ lại mỗi slot trước khi duyệt tổ hợp (12³ = 1728 tổ hợp/bữa)
+BEAM_WIDTH = 12
+
+# Kéo khẩu phần về mức "tự nhiên" (slot kcal / mật độ kcal) để tránh nghiệm cực đoan
+PORTION_REGULARIZATION = 0.05
+
+
+def meal_targets(meal_calories: float, goal: str) -> np.ndarray:
+    """Mục tiêu [kcal, protein g, carbs g, fat g] của 1 bữa"""
+    protein, carbs, fat = MACRO_RATIOS.get(goal, MACRO_RATIOS["maintain_weight"])
+    return np.array([
+        meal_calories,
+        meal_calories * protein / 4,
+        meal_calories * carbs / 4,
+        meal_calories * fat / 9,
+    ])
+
+
+def _macro_matrix(foods) -> np.ndarray:
+    """(n, 4) macros per gram: kcal, protein, carbs, fat"""
+    return np.array(
+        [[f["calories"], f["protein"], f["carbs"], f["fat"]] for f in foods],
+        dtype=float
+    ).reshape(-1, 4) / 100.0
+
+
+def _natural_portion(per_gram: np.ndarray, slot_calories: float) -> np.ndarray:
+    """Khẩu phần để 1 món tự đạt đủ kcal của slot (đã clip)"""
+    density = np.maximum(per_gram[:, 0], 0.05)
+    return np.clip(slot_calories / density, MIN_PORTION_G, MAX_PORTION_G)
+
+
+def _prune(per_gram: np.ndarray, slot_target: np.ndarray, beam: int) -> np.ndarray:
+    """Index các món đứng đầu slot khi ăn 1 mình với khẩu phần tự nhiên"""
+    if len(per_gram) <= beam:
+        return np.arange(len(per_gram))
+    portions = _natural_portion(per_gram, slot_target[0])
+    error = ((per_gram * portions[:, None] - slot_target) / np.maximum(slot_target, 1.0)) ** 2
+    score = (error * MACRO_WEIGHTS).sum(axis=1)
+    return np.argsort(score, kind="stable")[:beam]
+
+
+def optimize_meal(slots, meal_calories: float, goal: str, slot_shares=None, exclude_ids=(), beam: int = BEAM_WIDTH):
+    """
+    Chọn 1 món / slot và khẩu phần để tổng dinh dưỡng sát mục tiêu bữa nhất
+
+    Args:
+        slots: list[list[food dict]] - ứng viên cho từng slot (VD: [protein, carbs, veggie])
+        meal_calories: kcal mục tiêu của bữa
+        goal: Mục tiêu (quyết định tỉ lệ macro)
+        slot_shares: Tỉ lệ kcal của từng slot (mặc định chia đều, slot rỗng bị bỏ qua)
+        exclude_ids: food_id không được chọn (đã dùng ở bữa khác)
+
+    Returns:
+        dict {"items": [food + portion], "totals": {...}, "target": {...}, "error": float}
+        hoặc None nếu không slot nào còn ứng viên
+    """
+    exclude_ids = set(exclude_ids)
+    if slot_shares is None:
+        slot_shares = [1.0] * len(slots)
+
+    # Slot hết ứng viên (VD: không tìm được món rau) → bỏ slot, chia lại kcal cho slot còn lại
+    pairs = [
+        ([f for f in slot if f["id"] not in exclude_ids], share)
+        for slot, share in zip(slots, slot_shares)
+    ]
+    pairs = [(slot, share) for slot, share in pairs if slot]
+    if not pairs:
+        return None
+
+    slots = [slot for slot, _ in pairs]
+    k = len(slots)
+    shares = np.array([share for _, share in pairs], dtype=float)
+    shares = shares / shares.sum()
+    target = meal_targets(meal_calories, goal)
+    slot_targets = shares[:, None] * target[None, :]
+
+    # 1. Rút gọn ứng viên mỗi slot
+    slot_macros, slot_indices = [], []
+    for slot, slot_target in zip(slots, slot_targets):
+        per_gram = _macro_matrix(slot)
+        keep = _prune(per_gram, slot_target, beam)
+        slot_macros.append(per_gram[keep])
+        slot_indices.append(keep)
+
+    # 2. Tất cả tổ hợp: (N, k) index trong từng slot đã rút gọn
+    combos = np.array(list(itertools.product(*[range(len(m)) for m in slot_macros])), dtype=int).reshape(-1, k)
+    n = len(combos)
+
+    # A[c] = (4, k): macros per gram của k món trong tổ hợp c
+    A = np.stack([slot_macros[s][combos[:, s]] for s in range(k)], axis=2)
+    g0 = np.stack([
+        _natural_portion(slot_macros[s][combos[:, s]], slot_targets[s, 0]) for s in range(k)
+    ], axis=1)
+
+    # 3. Weighted ridge least-squares theo lô: (AᵀWA + λI) g = AᵀWt + λ g0
+    w = MACRO_WEIGHTS / np.maximum(target, 1.0) ** 2
+    AtW = A.transpose(0, 2, 1) * w[None, None, :]
+    lam = PORTION_REGULARIZATION * (AtW @ A).trace(axis1=1, axis2=2)[:, None, None] / k + 1e-9
+    lhs = AtW @ A + lam * np.eye(k)[None, :, :]
+    rhs = AtW @ target + lam[:, :, 0] * g0
+    portions = np.linalg.solve(lhs, rhs[:, :, None])[:, :, 0]
+    portions = np.clip(portions, MIN_PORTION_G, MAX_PORTION_G)
+
+    # 4. Sai số sau khi clip → chọn tổ hợp tốt nhất
+    totals = (A @ portions[:, :, None])[:, :, 0]
+    errors = (((totals - target) ** 2) * w).sum(axis=1)
+    best = int(np.argmin(errors))
+
+    items = []
+    for s in range(k):
+        food = dict(slots[s][slot_indices[s][combos[best, s]]])
+        grams = float(portions[best, s])
+        factor = grams / 100.0
+        food["portion_g"] = round(grams)
+        food["portion_calories"] = round(food["calories"] * factor)
+        food["portion_protein"] = round(food["protein"] * factor, 1)
+        food["portion_carbs"] = round(food["carbs"] * factor, 1)
+        food["portion_fat"] = round(food["fat"] * factor, 1)
+        items.append(food)
+
+    keys = ("calories", "protein", "carbs", "fat")
+    return {
+        "items": items,
+        "totals": {key: round(float(v), 1) for key, v in zip(keys, totals[best])},
+        "target": {key: round(float(v), 1) for key, v in zip(keys, target)},
+        "error": round(float(errors[best]), 4),
+        "combinations": n,
+    }
+
+
+def plan_day(candidates: dict, total_calories: float, goal: str) -> dict:
+    """
+    Thực đơn cả ngày theo MEAL_SPLIT
+
+    Args:
+        candidates: {
+            "breakfast": [foods], "snack": [foods],
+            "lunch": {"protein": [...], "carbs": [...], "veggie": [...]},
+            "dinner": {"protein": [...], "carbs": [...], "veggie": [...]}
+        }
+        total_calories: kcal cả ngày
+        goal: Mục tiêu
+
+    Returns:
+        dict meal → kết quả optimize_meal (None nếu bữa đó thiếu ứng viên).
+        Món đã chọn ở bữa trước không lặp lại ở bữa sau.
+    """
+    goal = goal if goal in MACRO_RATIOS else "maintain_weight"
+    plan = {}
+    used_ids = set()
+
+    for meal, share in MEAL_SPLIT.items():
+        meal_candidates = candidates.get(meal)
+        if isinstance(meal_candidates, dict):
+            slots = [meal_candidates.get(category) or [] for category in PLATE_SPLIT]
+            shares = list(PLATE_SPLIT.values())
+        else:
+            slots = [meal_candidates or []]
+            shares = None
+
+        result = optimize_meal(slots, total_calories * share, goal, slot_shares=shares, exclude_ids=used_ids)
+        plan[meal] = result
+        if result:
+            used_ids.update(item["id"] for item in result["items"])
+
+    return plan
@@ -3,145 +3,208 @@ RAG Service - ENHANCED VERSION
 Phân loại món ăn: Protein, Carbs, Vegetables
 """
 
-import google.generativeai as genai
+import asyncio
 import chromadb
+import logging
 import random
 from sqlalchemy.orm import Session
-from sqlalchemy import select
 
 from app.core.settings import settings
+from app.services.nutri_chatbot.async_utils import SessionRunner, StageTimeoutError, with_timeout
 from app.services.nutri_chatbot.database_adapter import DatabaseAdapter
-from app.models.food import Food
+from app.services.nutri_chatbot.embedders import get_embedder
+from app.services.nutri_chatbot.embedding_cache import get_embedding_cache
+from app.services.nutri_chatbot.food_labels import (
+    MEALS, MEAL_PREFERRED, MEAL_UNSUITABLE, FoodLabels, food_labels,
+)
+from app.services.nutri_chatbot.tracing import span
+
+
+logger = logging.getLogger(__name__)
+
+
+# Chroma client dùng chung cho cả process (mở PersistentClient rất tốn kém)
+_chroma_client = None
+
+
+def _get_chroma_client():
+    global _chroma_client
+    if _chroma_client is None:
+        _chroma_client = chromadb.PersistentClient(path=settings.CHROMA_DB_PATH)
+    return _chroma_client
+
+
+def _get_foods_collection():
+    return _get_chroma_client().get_collection("foods")
+
+
+# Version của schema metadata trong collection "foods" (lưu ở collection.metadata)
+# 1 = chỉ có food_id, 2 = có calories/macros/category/blacklist → lọc được bằng `where`
+FOOD_METADATA_VERSION = 2
 
 
 class RAGService:
-    """RAG Service với food category detection"""
-    
-    # Food category keywords
-    PROTEIN_KEYWORDS = [
-        'chicken', 'beef', 'pork', 'fish', 'salmon', 'tuna', 'shrimp',
-        'egg', 'tofu', 'turkey', 'duck', 'lamb', 'steak', 'meat',
-        'gà', 'thịt', 'cá', 'tôm', 'trứng', 'đậu phụ'
-    ]
-    
-    CARBS_KEYWORDS = [
-        'rice', 'bread', 'pasta', 'noodles', 'potato', 'sweet potato',
-        'oatmeal', 'cereal', 'quinoa', 'corn', 'wheat', 'bagel',
-        'cơm', 'bánh mì', 'mì', 'khoai', 'bột', 'ngũ cốc'
-    ]
+    """RAG Service với food category detection (nhãn món ăn: xem food_labels)"""
     
-    VEGGIE_KEYWORDS = [
-        'salad', 'broccoli', 'spinach', 'kale', 'lettuce', 'tomato',
-        'cucumber', 'carrot', 'cabbage', 'cauliflower', 'bell pepper',
-        'vegetables', 'veggie', 'greens', 'asparagus', 'zucchini',
-        'mushroom', 'onion', 'garlic', 'celery', 'eggplant',
-        'rau', 'salad', 'súp lơ', 'cà rốt', 'cải', 'rau xào'
-    ]
+    # Số kết quả lấy từ Chroma so với top_k
+    # - Collection có metadata: đã lọc sẵn bằng `where`, chỉ cần dư một chút cho filter meal_type
+    # - Collection cũ (chỉ có food_id): phải lấy dư nhiều rồi lọc bằng Python
+    PREFILTER_FETCH_FACTOR = 3
+    OVERFETCH_FACTOR = 10
     
-    # ✅ NEW: Blacklist - Món KHÔNG được chọn
-    BLACKLIST_KEYWORDS = [
-        'babyfood', 'baby food', 'infant', 'toddler', 'gerber',
-        'formula', 'pediatric', 'junior', 'baby', 'strained',
-        'trẻ em', 'bé', 'sữa bột'
-    ]
-    
-    # ✅ NEW: False veggie - Không phải món rau thực sự
-    FALSE_VEGGIE_KEYWORDS = [
-        'dressing', 'sauce', 'mayo', 'mayonnaise', 'ketchup',
-        'mustard', 'relish', 'gravy', 'butter', 'oil',
-        'sốt', 'tương', 'dầu', 'Fast'
-    ]
-    
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, session_runner: SessionRunner = None):
         self.db = db
         self.db_adapter = DatabaseAdapter(db)
+        self.session_runner = session_runner or SessionRunner(db)
+        
+        self.embedder = get_embedder()
+        self.foods_collection = _get_foods_collection()
+        
+        # Collection đã được index kèm metadata dinh dưỡng chưa?
+        collection_meta = self.foods_collection.metadata or {}
+        self.has_metadata_filters = (
+            collection_meta.get("food_metadata_version", 1) >= FOOD_METADATA_VERSION
+        )
+        
+        # Giới hạn số search chạy song song trong 1 request
+        self._search_semaphore = asyncio.Semaphore(settings.CHATBOT_RAG_CONCURRENCY)
         
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.chroma_client = chromadb.PersistentClient(path=settings.CHROMA_DB_PATH)
-        self.foods_collection = self.chroma_client.get_collection("foods")
+        # food_id → FoodLabels đọc từ metadata của các kết quả search (dùng cho filter)
+        self._indexed_labels = {}
     
-    def _generate_query_embedding(self, text: str):
-        result = genai.embed_content(
-            model="models/text-embedding-004",
-            content=text,
-            task_type="retrieval_query"
+    async def _generate_query_embedding(self, text: str):
+        # ✅ Cache 2 tầng (memory + SQLite): chỉ gọi Gemini khi miss
+        with span("embed"):
+            return await get_embedding_cache().get_or_embed(text, self._embed_remote)
+    
+    async def _embed_remote(self, text: str):
+        return await with_timeout(
+            self.embedder.embed_query(text),
+            settings.CHATBOT_EMBED_TIMEOUT_SECONDS,
+            stage="embed"
         )
-        return result['embedding']
     
-    def _detect_food_category(self, food_name: str) -> str:
+    @staticmethod
+    def _detect_food_category(food_name: str) -> str:
         """
-        Phát hiện category của món ăn
+        Category của món ăn (nhãn tính 1 lần theo tên, xem food_labels)
         
         Returns:
             'protein' | 'carbs' | 'veggie' | 'mixed' | 'snack'
         """
-        name_lower = food_name.lower()
-        
-        # Check snack first (ưu tiên cao nhất cho snack)
-        snack_indicators = ['chip', 'candy', 'cookie', 'brownie', 'cake', 
-                           'ice cream', 'popcorn', 'pretzel', 'cracker', 
-                           'chocolate', 'bar']
-        if any(s in name_lower for s in snack_indicators):
-            return 'snack'
-        
-        # Count matches
-        protein_score = sum(1 for kw in self.PROTEIN_KEYWORDS if kw in name_lower)
-        carbs_score = sum(1 for kw in self.CARBS_KEYWORDS if kw in name_lower)
-        veggie_score = sum(1 for kw in self.VEGGIE_KEYWORDS if kw in name_lower)
-        
-        # Xác định category
-        if protein_score > carbs_score and protein_score > veggie_score:
-            return 'protein'
-        elif carbs_score > protein_score and carbs_score > veggie_score:
-            return 'carbs'
-        elif veggie_score > protein_score and veggie_score > carbs_score:
-            return 'veggie'
-        elif protein_score > 0 or carbs_score > 0 or veggie_score > 0:
-            return 'mixed'  # Món ăn kết hợp
-        
-        return 'mixed'
+        return food_labels(food_name).category
+    
+    @staticmethod
+    def _is_blacklisted(food_name: str) -> bool:
+        return food_labels(food_name).is_blacklisted
+    
+    @staticmethod
+    def _is_false_veggie(food_name: str) -> bool:
+        return food_labels(food_name).is_false_veggie
     
-    def search_foods(self, query: str, top_k: int = 5, randomize: bool = True):
-        """Tìm món ăn cơ bản (giữ nguyên)"""
+    def _labels(self, food) -> FoodLabels:
+        """Nhãn lưu trong metadata Chroma (từ search_foods), không có thì tính theo tên"""
+        labels = self._indexed_labels.get(food.get('id'))
+        return labels if labels is not None else food_labels(food.get('name', ''))
+    
+    @staticmethod
+    def _calorie_tolerance(target_calories, comparison) -> int:
+        # ✅ Tăng tolerance cho món rau (thường ít calo)
+        if target_calories < 150:
+            return 150  # Rất linh hoạt cho món rau
+        elif comparison == 'around':
+            return 100
+        return 50
+    
+    def _build_where(self, target_calories=None, comparison='around', food_category=None):
+        """
+        Build Chroma `where` từ metadata (chỉ dùng khi has_metadata_filters)
+        
+        Cùng điều kiện với _filter_by_calories / _filter_by_food_category / blacklist,
+        nhưng chạy trong Chroma → không phải lấy dư rồi bỏ bằng Python.
+        """
+        clauses = [{"is_blacklisted": False}]
+        
+        if target_calories is not None:
+            tolerance = self._calorie_tolerance(target_calories, comparison)
+            if comparison in ('under', 'around'):
+                clauses.append({"calories": {"$lte": target_calories + tolerance}})
+            if comparison in ('above', 'around'):
+                clauses.append({"calories": {"$gte": target_calories - tolerance}})
+        
+        if food_category == 'veggie':
+            clauses.append({"category": "veggie"})
+            clauses.append({"is_false_veggie": False})
+        elif food_category:
+            clauses.append({"category": {"$in": [food_category, 'mixed']}})
+        
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+    
+    def _query_collection(self, query_embedding, n_results: int, where: dict = None):
+        """Query Chroma (blocking) - chạy trong worker thread"""
+        return self.foods_collection.query(
+            query_embeddings=[query_embedding],
+            n_results=n_results,
+            where=where
+        )
+    
+    def _load_foods(self, food_ids):
+        """Load macros theo id trong 1 query (blocking) - chạy qua session_runner"""
+        return self.db_adapter.load_macro_records(food_ids)
+    
+    async def search_foods(self, query: str, top_k: int = 5, randomize: bool = True, where: dict = None):
+        """
+        Tìm món ăn cơ bản
+        
+        Args:
+            where: Bộ lọc metadata của Chroma (xem _build_where). Mặc định chỉ
+                loại món blacklist nếu collection có metadata.
+        """
+        
+        logger.debug("Searching: %r", query)
         
-        print(f"🔍 Searching: '{query}'")
+        if where is None and self.has_metadata_filters:
+            where = self._build_where()
         
-        query_embedding = self._generate_query_embedding(query)
+        query_embedding = await self._generate_query_embedding(query)
         search_k = top_k * 4 if randomize else top_k
         
-        results = self.foods_collection.query(
-            query_embeddings=[query_embedding],
-            n_results=search_k
-        )
+        with span("vector_search"):
+            results = await with_timeout(
+                asyncio.to_thread(self._query_collection, query_embedding, search_k, where),
+                settings.CHATBOT_VECTOR_SEARCH_TIMEOUT_SECONDS,
+                stage="vector_search"
+            )
         
         if not results['metadatas'] or len(results['metadatas']) == 0:
             return []
         
         food_ids = [m['food_id'] for m in results['metadatas'][0]]
         
-        stmt = select(Food).where(
-            Food.id.in_(food_ids),
-            Food.deleted_at.is_(None)
-        )
-        db_foods = self.db.scalars(stmt).all()
+        with span("hydrate"):
+            records = await with_timeout(
+                self.session_runner.run(self._load_foods, food_ids),
+                settings.CHATBOT_VECTOR_SEARCH_TIMEOUT_SECONDS,
+                stage="hydrate"
+            )
         
+        # Giữ thứ tự theo khoảng cách vector của Chroma
         foods = []
         for metadata, distance in zip(results['metadatas'][0], results['distances'][0]):
-            food_id = metadata['food_id']
-            db_food = next((f for f in db_foods if f.id == food_id), None)
-            if not db_food:
+            record = records.get(metadata['food_id'])
+            if record is None:
                 continue
             
-            food_dict = self.db_adapter._to_chatbot_format(db_food)
+            food_dict = dict(record)
             food_dict['similarity'] = 1 - distance
-
-            name_lower = food_dict['name'].lower()
-            if any(kw in name_lower for kw in self.BLACKLIST_KEYWORDS):
-                continue
-            
             
-            food_dict['category'] = self._detect_food_category(food_dict['name'])
+            # Nhãn đã tính sẵn lúc index thì dùng luôn
+            labels = FoodLabels.from_metadata(metadata) or food_labels(food_dict['name'])
+            if labels.is_blacklisted:
+                continue
             
+            self._indexed_labels[food_dict['id']] = labels
+            food_dict['category'] = labels.category
             
             foods.append(food_dict)
         
@@ -153,7 +216,7 @@ class RAGService:
         
         return foods[:top_k]
     
-    def search_by_goal_and_calories(
+    async def search_by_goal_and_calories(
         self,
         goal: str,
         target_calories: int,
@@ -165,43 +228,81 @@ class RAGService:
         """
         ✅ ENHANCED: Tìm món theo goal + calories + meal_type + food_category
         
+        Chạy song song được: mỗi lần gọi chiếm 1 slot của semaphore, quá timeout
+        thì trả về [] thay vì làm hỏng cả request.
+        
         Args:
             goal: 'lose_weight' | 'gain_muscle' | 'gain_weight' | 'maintain_weight'
             target_calories: Mức calo mục tiêu
-            meal_type: 'breakfast' | 'lunch' | 'dinner' | 'snack'
+            meal_type: 'breakfast' | 'lunch' | 'dinner' | 'snack' | None (mọi bữa)
             food_category: 'protein' | 'carbs' | 'veggie' (optional)
             comparison: 'under' | 'around' | 'above'
             top_k: Số món trả về
         """
         
-        print(f"🍽️  Goal={goal}, Calo={target_calories}, Meal={meal_type}, Category={food_category}")
-        
-        # 1. Build query
-        query = self._build_smart_query(goal, meal_type, target_calories, food_category)
-        
-        # 2. Search
-        all_foods = self.search_foods(query, top_k=top_k * 10, randomize=False)
-        
-        if not all_foods:
-            query_fallback = f"maintain_weight {meal_type} {food_category or 'meal'}"
-            all_foods = self.search_foods(query_fallback, top_k=top_k * 10, randomize=False)
-        
-        # 3. Filter theo meal_type
-        filtered_by_meal = self._filter_by_meal_type(all_foods, meal_type)
+        logger.debug("Goal=%s, calories=%s, meal=%s, category=%s", goal, target_calories, meal_type, food_category)
         
-        # 4. ✅ NEW: Filter theo food_category (protein/carbs/veggie)
-        if food_category:
-            filtered_by_meal = self._filter_by_food_category(filtered_by_meal, food_category)
-        
-        # 5. Filter theo calories
-        filtered_foods = self._filter_by_calories(filtered_by_meal, target_calories, comparison)
-        
-        # 6. Sort & Random
-        filtered_foods = self._sort_and_randomize(filtered_foods, target_calories, comparison, top_k)
+        # Lọc calo/category/blacklist ngay trong Chroma nếu collection có metadata
+        if self.has_metadata_filters:
+            where = self._build_where(target_calories, comparison, food_category)
+            fetch_k = top_k * self.PREFILTER_FETCH_FACTOR
+        else:
+            where = None
+            fetch_k = top_k * self.OVERFETCH_FACTOR
+        
+        async with self._search_semaphore:
+            try:
+                # 1. Build query
+                query = self._build_smart_query(goal, meal_type, target_calories, food_category)
+                
+                # 2. Search
+                all_foods = await self.search_foods(query, top_k=fetch_k, randomize=False, where=where)
+                
+                if not all_foods and where is not None:
+                    # Bộ lọc quá chặt (giống fallback "returning all" của filter Python) → chỉ giữ blacklist
+                    all_foods = await self.search_foods(query, top_k=fetch_k, randomize=False)
+                
+                if not all_foods:
+                    query_fallback = f"maintain_weight {meal_type or ''} {food_category or 'meal'}"
+                    all_foods = await self.search_foods(query_fallback, top_k=fetch_k, randomize=False)
+            except StageTimeoutError as e:
+                logger.warning("RAG search skipped: %s", e)
+                return []
+        
+        with span("filter"):
+            # 3. Filter theo meal_type
+            filtered_by_meal = self._filter_by_meal_type(all_foods, meal_type)
+            
+            # 4. ✅ NEW: Filter theo food_category (protein/carbs/veggie)
+            if food_category:
+                filtered_by_meal = self._filter_by_food_category(filtered_by_meal, food_category)
+            
+            # 5. Filter theo calories
+            filtered_foods = self._filter_by_calories(filtered_by_meal, target_calories, comparison)
+            
+            # 6. Xếp hạng (deterministic)
+            filtered_foods = self._rank_foods(filtered_foods, target_calories, comparison, top_k)
         
-        print(f"✅ Found {len(filtered_foods)} foods")
+        logger.debug("Found %d foods", len(filtered_foods))
         return filtered_foods
     
+    async def search_by_calories(self, target_calories: int, comparison: str = 'around', top_k: int = 10):
+        """
+        Tìm món theo mức calo (không gắn với bữa/mục tiêu cụ thể)
+        
+        Args:
+            target_calories: Mức calo mục tiêu
+            comparison: 'under' | 'around' | 'above'
+            top_k: Số món trả về
+        """
+        return await self.search_by_goal_and_calories(
+            goal='maintain_weight',
+            target_calories=target_calories,
+            meal_type=None,
+            comparison=comparison,
+            top_k=top_k
+        )
+    
     def _build_smart_query(self, goal, meal_type, target_calories, food_category=None):
         """Build query với food_category - ENHANCED VERSION"""
         
@@ -218,7 +319,7 @@ class RAGService:
         # breakfast queries
         if meal_type == 'breakfast':
             base = "healthy breakfast eggs omelette scrambled pancake bacon yogurt"
-        else:
+        elif meal_type:
             # Add meal type
             base += f" {meal_type}"
         
@@ -236,72 +337,26 @@ class RAGService:
         return base
     
     def _filter_by_meal_type(self, foods, meal_type):
-        """Filter theo meal_type (breakfast/lunch/dinner/snack)"""
-        
-        MEAL_KEYWORDS = {
-            'breakfast': {
-                'include': ['egg', 'omelette', 'scrambled', 'milk', 'yogurt', 
-                           'cereal', 'oatmeal', 'pancake', 'waffle', 'toast',
-                           'bacon', 'sausage', 'fruit', 'breakfast', 'muffin',
-                           'bagel', 'croissant', 'hash brown'],
-                'exclude': ['lunch', 'dinner', 'pizza', 'burger', 'steak', 'ready-to-eat'],
-                # ✅ Prefer: Món nấu > Món khô
-                'prefer': ['egg', 'omelette', 'scrambled', 'pancake', 'waffle', 
-                          'bacon', 'sausage', 'hash brown']
-            },
-            'lunch': {
-                'include': ['sandwich', 'wrap', 'burger', 'salad', 'soup', 
-                           'chicken', 'rice', 'noodles', 'pasta', 'lunch'],
-                'exclude': ['breakfast', 'cereal', 'oatmeal', 'ready-to-eat']
-            },
-            'dinner': {
-                'include': ['steak', 'roast', 'grilled', 'baked', 'chicken', 
-                           'beef', 'fish', 'rice', 'potato', 'pasta', 'dinner'],
-                'exclude': ['breakfast', 'cereal', 'ready-to-eat']
-            },
-            'snack': {
-                'include': ['chips', 'crackers', 'cookie', 'candy', 'nuts', 
-                           'fruit', 'yogurt', 'bar', 'snack'],
-                'exclude': []
-            }
-        }
-        
-        if meal_type not in MEAL_KEYWORDS:
+        """Filter theo meal_type (breakfast/lunch/dinner/snack) - đọc nhãn meal_fit, không quét keyword"""
+        
+        if meal_type not in MEALS:
             return foods
         
-        keywords = MEAL_KEYWORDS[meal_type]
         filtered = []
-        preferred = []  # ✅ Món được ưu tiên
+        preferred = []  # ✅ Món được ưu tiên (chỉ bữa sáng có)
         
         for food in foods:
-            name_lower = food.get('name', '').lower()
-            
-            # Check exclude
-            if any(ex in name_lower for ex in keywords['exclude']):
-                continue
-            
-            # Check include
-            if any(inc in name_lower for inc in keywords['include']):
-                # ✅ Check if preferred (for breakfast)
-                if meal_type == 'breakfast' and 'prefer' in keywords:
-                    if any(pref in name_lower for pref in keywords['prefer']):
-                        preferred.append(food)
-                    else:
-                        filtered.append(food)
-                else:
-                    filtered.append(food)
+            fit = self._labels(food).fit(meal_type)
+            if fit == MEAL_PREFERRED:
+                preferred.append(food)
+            elif fit != MEAL_UNSUITABLE:
+                filtered.append(food)
         
         # ✅ Prioritize preferred items for breakfast
-        if meal_type == 'breakfast' and preferred:
-            print(f"✅ Found {len(preferred)} preferred breakfast items")
+        if preferred:
+            logger.debug("Found %d preferred breakfast items", len(preferred))
             return preferred + filtered  # Preferred first
         
-        # Loại bỏ snacks cho lunch/dinner
-        if meal_type in ['lunch', 'dinner']:
-            snack_words = ['chip', 'candy', 'cookie', 'brownie', 'cake']
-            filtered = [f for f in filtered 
-                       if not any(sw in f.get('name', '').lower() for sw in snack_words)]
-        
         return filtered if filtered else foods
     
     def _filter_by_food_category(self, foods, food_category):
@@ -312,20 +367,13 @@ class RAGService:
         filtered = []
 
         for food in foods:
-            name_lower = food['name'].lower()
-            detected_category = food.get('category', self._detect_food_category(food['name']))
+            labels = self._labels(food)
+            detected_category = food.get('category') or labels.category
             
             # ✅ STRICT FILTER cho veggie - KHÔNG cho phép mixed
-            
-            if food_category =='veggie':
-                if detected_category != 'veggie':
-                    continue
-                if any(kw in name_lower for kw in self.FALSE_VEGGIE_KEYWORDS): 
-                    continue
-
-                filtered.append(food)
-
-
+            if food_category == 'veggie':
+                if detected_category == 'veggie' and not labels.is_false_veggie:
+                    filtered.append(food)
 
             # ✅ STRICT FILTER cho protein - Ưu tiên món protein thuần
             elif food_category == 'protein':
@@ -348,22 +396,16 @@ class RAGService:
                     filtered.append(food)
         
         if not filtered:
-            print(f"⚠️  No {food_category} foods found, returning all")
+            logger.debug("No %s foods found, returning all", food_category)
             return foods
         
-        print(f"✅ Category filter: {len(foods)} → {len(filtered)} ({food_category})")
+        logger.debug("Category filter: %d → %d (%s)", len(foods), len(filtered), food_category)
         return filtered
     
     def _filter_by_calories(self, foods, target_calories, comparison):
         """Filter theo calo với tolerance linh hoạt"""
         
-        # ✅ Tăng tolerance cho món rau (thường ít calo)
-        if target_calories < 150:
-            tolerance = 150  # Rất linh hoạt cho món rau
-        elif comparison == 'around':
-            tolerance = 100
-        else:
-            tolerance = 50
+        tolerance = self._calorie_tolerance(target_calories, comparison)
         
         filtered = []
         
@@ -378,20 +420,20 @@ class RAGService:
         
         return filtered if filtered else foods
     
-    def _sort_and_randomize(self, foods, target_calories, comparison, top_k):
-        """Sort và random"""
+    def _rank_foods(self, foods, target_calories, comparison, top_k):
+        """
+        Xếp hạng deterministic: độ khớp calo trước, similarity sau (không shuffle)
+        
+        Chọn món/khẩu phần cuối cùng do meal_optimizer đảm nhiệm, ở đây chỉ cần
+        cùng input → cùng danh sách ứng viên.
+        """
         
         if comparison == 'around':
-            foods.sort(key=lambda x: abs(x['calories'] - target_calories))
+            calorie_key = lambda x: abs(x['calories'] - target_calories)
         elif comparison == 'under':
-            foods.sort(key=lambda x: x['calories'], reverse=True)
+            calorie_key = lambda x: -x['calories']
         else:
-            foods.sort(key=lambda x: x['calories'])
-        
-        if len(foods) > top_k:
-            best_count = max(top_k, min(20, int(len(foods) * 0.4)))
-            best_foods = foods[:best_count]
-            random.shuffle(best_foods)
-            return best_foods[:top_k]
+            calorie_key = lambda x: x['calories']
         
+        foods = sorted(foods, key=lambda x: (calorie_key(x), -x.get('similarity', 0), x['id']))
         return foods[:top_k]
\ No newline at end of file
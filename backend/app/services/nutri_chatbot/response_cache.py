@@ -0,0 +1,190 @@
+"""
+Response Cache - Cache câu trả lời cho các intent deterministic
+
+FOOD_NUTRITION_INQUIRY và CALORIE_BASED_RECOMMENDATION không phụ thuộc profile,
+cùng entity → cùng câu trả lời. Hit = bỏ qua cả RAG lẫn Gemini.
+
+Key = (intent, entity đã chuẩn hóa, profile bucket, locale), TTL + LRU giới hạn.
+Tùy chọn semantic lookup: so embedding của food_name (dùng chung embedding cache
+với RAG) với các entry cùng partition → "boiled eggs" hit được "boiled egg".
+"""
+
+import logging
+from collections import OrderedDict
+
+from app.core.settings import settings
+from app.utils.cache import TTLCache
+
+
+logger = logging.getLogger(__name__)
+
+
+# intent → các field profile ảnh hưởng câu trả lời (rỗng = giống nhau cho mọi user)
+CACHEABLE_INTENTS = {
+    "FOOD_NUTRITION_INQUIRY": (),
+    "CALORIE_BASED_RECOMMENDATION": (),
+}
+
+# intent → entity dạng text được so khớp semantic
+_SEMANTIC_FIELDS = {
+    "FOOD_NUTRITION_INQUIRY": "food_name",
+}
+
+_ARTICLES = ("a ", "an ", "the ", "one ")
+
+
+def _normalize_text(value) -> str:
+    text = " ".join(str(value or "").lower().split())
+    for article in _ARTICLES:
+        if text.startswith(article):
+            text = text[len(article):]
+    return text
+
+
+def normalize_entities(intent: str, entities: dict) -> dict:
+    """Entity dùng làm key (đã điền giá trị mặc định giống handler)"""
+    if intent == "FOOD_NUTRITION_INQUIRY":
+        return {
+            "food_name": _normalize_text(entities.get("food_name")),
+            "nutrient": entities.get("nutrient") or "all",
+        }
+    if intent == "CALORIE_BASED_RECOMMENDATION":
+        return {
+            "target_calories": int(entities.get("target_calories") or 300),
+            "comparison": entities.get("comparison") or "around",
+        }
+    return dict(entities)
+
+
+def profile_buckets(intent: str, profile: dict = None) -> tuple:
+    """Giá trị profile liên quan tới intent (VD goal_type), theo thứ tự cố định"""
+    fields = CACHEABLE_INTENTS.get(intent, ())
+    profile = profile or {}
+    return tuple((field, profile.get(field)) for field in fields)
+
+
+class ResponseCache:
+    """
+    Cache response chatbot theo key deterministic + semantic lookup tùy chọn
+
+    Args:
+        maxsize: Số response tối đa
+        ttl: Thời gian sống (giây)
+        semantic_threshold: Cosine tối thiểu để coi là cùng câu hỏi (0 = tắt semantic)
+    """
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 21600, semantic_threshold: float = 0.0):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.maxsize = maxsize
+        self.semantic_threshold = semantic_threshold
+        # partition → OrderedDict[key → vector đã chuẩn hóa]
+        self._vectors = {}
+        self.semantic_hits = 0
+
+    @staticmethod
+    def make_key(intent: str, entities: dict, profile: dict = None, locale: str = "vi") -> tuple:
+        """
+        Key = (partition, text). partition gồm mọi thứ trừ entity text dùng cho semantic.
+
+        Examples:
+            >>> ResponseCache.make_key("FOOD_NUTRITION_INQUIRY", {"food_name": "an Egg", "nutrient": "calories"})
+            (('FOOD_NUTRITION_INQUIRY', (('nutrient', 'calories'),), (), 'vi'), 'egg')
+        """
+        normalized = normalize_entities(intent, entities)
+        text_field = _SEMANTIC_FIELDS.get(intent)
+        text = normalized.pop(text_field, None) if text_field else None
+        partition = (intent, tuple(sorted(normalized.items())), profile_buckets(intent, profile), locale)
+        return partition, text
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.semantic_threshold > 0
+
+    async def lookup(self, key: tuple, embed=None):
+        """
+        Tìm response: khớp chính xác trước, rồi semantic (nếu bật và có embed)
+
+        Args:
+            key: Từ make_key()
+            embed: async fn(text) -> list[float] (nên là hàm có embedding cache của RAG)
+
+        Returns:
+            (response | None, vector | None): vector để truyền lại cho store() khi miss
+        """
+        response = self.cache.get(key)
+        if response is not None:
+            return response, None
+
+        partition, text = key
+        if not (self.semantic_enabled and text and embed):
+            return None, None
+
+        import numpy as np
+
+        try:
+            vector = np.asarray(await embed(text), dtype=np.float32)
+        except Exception as e:
+            # Semantic chỉ là tối ưu → lỗi embed thì coi như miss
+            logger.warning("Response cache embed error: %s", e)
+            return None, None
+        vector /= max(float(np.linalg.norm(vector)), 1e-12)
+
+        candidates = self._vectors.get(partition)
+        if candidates:
+            keys = list(candidates)
+            scores = np.stack([candidates[k] for k in keys]) @ vector
+            for i in np.argsort(-scores):
+                if scores[i] < self.semantic_threshold:
+                    break
+                response = self.cache.get(keys[i])
+                if response is not None:
+                    self.semantic_hits += 1
+                    return response, vector
+                # Entry đã hết hạn / bị evict → bỏ khỏi index
+                candidates.pop(keys[i], None)
+
+        return None, vector
+
+    def store(self, key: tuple, response: dict, vector=None) -> None:
+        self.cache.set(key, response)
+        partition, text = key
+        if vector is None or not text:
+            return
+        candidates = self._vectors.setdefault(partition, OrderedDict())
+        candidates[key] = vector
+        candidates.move_to_end(key)
+        while len(candidates) > self.maxsize:
+            candidates.popitem(last=False)
+
+    def purge(self, intent: str = None) -> int:
+        """Xóa toàn bộ (hoặc 1 intent). Trả về số response đã xóa."""
+        if intent is None:
+            count = len(self.cache)
+            self.cache.clear()
+            self._vectors.clear()
+            return count
+        for partition in [p for p in self._vectors if p[0] == intent]:
+            del self._vectors[partition]
+        return self.cache.invalidate_where(lambda key: key[0][0] == intent)
+
+    def stats(self) -> dict:
+        return {
+            **self.cache.stats(),
+            "semantic_enabled": self.semantic_enabled,
+            "semantic_hits": self.semantic_hits,
+        }
+
+
+_response_cache = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Response cache dùng chung cả process"""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache(
+            maxsize=settings.CHATBOT_RESPONSE_CACHE_SIZE,
+            ttl=settings.CHATBOT_RESPONSE_CACHE_TTL_SECONDS,
+            semantic_threshold=settings.CHATBOT_RESPONSE_CACHE_SEMANTIC_THRESHOLD,
+        )
+    return _response_cache
@@ -0,0 +1,190 @@
+"""
+Tracing - Đo thời gian từng stage của pipeline chatbot (đủ rẻ để bật cả production)
+
+- span(stage): đo 1 đoạn code, cộng vào trace của request hiện tại và vào histogram
+  dùng chung cả process. Trace nằm trong contextvar nên đi theo cả asyncio.to_thread.
+- Trace: tổng ms + số lần theo stage của 1 request (gắn vào response khi CHATBOT_DEBUG_TIMINGS)
+- StageHistograms: bucket cố định kiểu Prometheus, xuất text format cho /chatbot/metrics
+
+Mỗi span chỉ tốn 2 lần perf_counter + 1 lock, không log / print gì.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Stage chính của pipeline (span khác vẫn được ghi nhận, chỉ là không có trong danh sách này)
+STAGES = (
+    "translate", "classify", "embed", "vector_search", "hydrate",
+    "filter", "optimize", "generate", "total",
+)
+
+# Biên trên của bucket (ms), thêm 1 bucket +Inf ở cuối
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class StageHistograms:
+    """
+    Histogram thời gian theo stage (thread-safe)
+
+    Args:
+        buckets: Biên trên các bucket (ms), tăng dần
+    """
+
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counts = {}   # stage → [count mỗi bucket] (không cộng dồn, bucket cuối = +Inf)
+        self._sums = {}     # stage → tổng ms
+
+    def observe(self, stage: str, ms: float) -> None:
+        index = bisect.bisect_left(self.buckets, ms)
+        with self._lock:
+            counts = self._counts.get(stage)
+            if counts is None:
+                counts = self._counts[stage] = [0] * (len(self.buckets) + 1)
+                self._sums[stage] = 0.0
+            counts[index] += 1
+            self._sums[stage] += ms
+
+    def _quantile(self, counts, q: float):
+        """Biên trên của bucket chứa quantile q (ước lượng, giống histogram_quantile không nội suy)"""
+        rank = q * sum(counts)
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+    def stats(self) -> dict:
+        """stage → count, sum_ms, mean_ms, p50_ms, p95_ms (p50/p95 là biên trên của bucket)"""
+        with self._lock:
+            snapshot = {stage: (list(counts), self._sums[stage]) for stage, counts in self._counts.items()}
+        result = {}
+        for stage, (counts, total_ms) in snapshot.items():
+            count = sum(counts)
+            result[stage] = {
+                "count": count,
+                "sum_ms": round(total_ms, 2),
+                "mean_ms": round(total_ms / count, 2) if count else 0.0,
+                "p50_ms": self._quantile(counts, 0.5),
+                "p95_ms": self._quantile(counts, 0.95),
+            }
+        return result
+
+    def render_prometheus(self, name: str = "chatbot_stage_duration_seconds") -> str:
+        """Prometheus text format (bucket cộng dồn, đơn vị giây)"""
+        with self._lock:
+            snapshot = {stage: (list(counts), self._sums[stage]) for stage, counts in self._counts.items()}
+
+        lines = [
+            f"# HELP {name} Duration of chatbot pipeline stages",
+            f"# TYPE {name} histogram",
+        ]
+        for stage in sorted(snapshot):
+            counts, total_ms = snapshot[stage]
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound / 1000:g}"
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total_ms / 1000:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {cumulative}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+            self._sums.clear()
+
+
+class Trace:
+    """Thời gian theo stage của 1 request (span chạy song song được cộng dồn)"""
+
+    __slots__ = ("stages", "_lock")
+
+    def __init__(self):
+        self.stages = {}    # stage → [tổng ms, số span]
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, ms: float) -> None:
+        with self._lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                self.stages[stage] = [ms, 1]
+            else:
+                entry[0] += ms
+                entry[1] += 1
+
+    def stage_ms(self) -> dict:
+        """stage → tổng ms"""
+        with self._lock:
+            return {stage: ms for stage, (ms, _) in self.stages.items()}
+
+    def to_dict(self) -> dict:
+        """stage → {"ms", "count"} (gắn vào response ở debug mode)"""
+        with self._lock:
+            return {
+                stage: {"ms": round(ms, 2), "count": count}
+                for stage, (ms, count) in self.stages.items()
+            }
+
+
+_histograms = StageHistograms()
+_current_trace = contextvars.ContextVar("chatbot_trace", default=None)
+
+
+def get_histograms() -> StageHistograms:
+    """Histogram dùng chung cả process"""
+    return _histograms
+
+
+def current_trace():
+    """Trace của request hiện tại (None nếu ngoài start_trace)"""
+    return _current_trace.get()
+
+
+@contextmanager
+def start_trace():
+    """Bắt đầu trace mới cho 1 request, các span bên trong (kể cả trong worker thread) ghi vào đây"""
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def record(stage: str, ms: float) -> None:
+    """Ghi 1 lần đo vào histogram + trace hiện tại"""
+    _histograms.observe(stage, ms)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(stage, ms)
+
+
+class span:
+    """
+    Đo thời gian 1 đoạn code (sync hoặc có await bên trong)
+
+    Examples:
+        >>> with span("embed"):
+        ...     vector = await embedder.embed_query(text)
+    """
+
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.stage, (time.perf_counter() - self.start) * 1000)
+        return False
@@ -1,77 +1,172 @@
+import logging
+import threading
+import unicodedata
+
 from langdetect import detect, LangDetectException
 from deep_translator import GoogleTranslator
 
+from app.core.settings import settings
+from app.utils.cache import TTLCache
+
+
+logger = logging.getLogger(__name__)
+
+
+# Cache dùng chung cho cả process (TranslateService được tạo lại mỗi request)
+_language_cache = TTLCache(maxsize=settings.TRANSLATE_CACHE_SIZE)
+_translation_cache = TTLCache(
+    maxsize=settings.TRANSLATE_CACHE_SIZE,
+    ttl=settings.TRANSLATE_CACHE_TTL_SECONDS
+)
+_fast_path_hits = {"en": 0, "vi": 0}
+
+# Dấu chỉ tiếng Việt mới có (sau khi tách NFD): móc (ư, ơ), hỏi, nặng, trăng (ă)
+# Sắc/huyền/ngã/mũ dùng chung với tiếng Pháp, Bồ Đào Nha... → vẫn để langdetect quyết định
+_VIETNAMESE_MARKS = {"\u031b", "\u0309", "\u0323", "\u0306"}
+
+# Translator thay thế (test / cassette của benchmark), None = GoogleTranslator riêng mỗi thread
+_translator = None
+_thread_local = threading.local()
+
+
+def _cache_key(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _get_translator():
+    """
+    GoogleTranslator của thread hiện tại. translate() ghi text vào self._url_params
+    rồi mới gửi request → 1 instance dùng chung giữa các worker thread (asyncio.to_thread)
+    có thể gửi nhầm text của request khác.
+    """
+    if _translator is not None:
+        return _translator
+    translator = getattr(_thread_local, "translator", None)
+    if translator is None:
+        translator = _thread_local.translator = GoogleTranslator(source='vi', target='en')
+    return translator
+
+
+def _fast_detect(text: str):
+    """
+    Nhận diện ngôn ngữ không cần langdetect
+
+    Returns:
+        'en' nếu toàn ký tự ASCII, 'vi' nếu có đ hoặc dấu riêng của tiếng Việt,
+        None nếu không chắc chắn
+    """
+    if text.isascii():
+        return 'en'
+    if 'đ' in text or 'Đ' in text:
+        return 'vi'
+    if any(ch in _VIETNAMESE_MARKS for ch in unicodedata.normalize('NFD', text)):
+        return 'vi'
+    return None
+
+
+def detect_language(text: str) -> str:
+    """Mã ngôn ngữ của text ('vi', 'en', ...). Có cache + fast path."""
+    lang = _fast_detect(text)
+    if lang is not None:
+        _fast_path_hits[lang] += 1
+        return lang
+
+    key = _cache_key(text)
+    lang = _language_cache.get(key)
+    if lang is None:
+        try:
+            lang = detect(text)
+        except LangDetectException:
+            # Nếu không detect được → coi như English
+            lang = 'en'
+        _language_cache.set(key, lang)
+    return lang
+
+
+def translation_cache_stats() -> dict:
+    """Số liệu cache dịch/nhận diện ngôn ngữ (cho /chatbot/health)"""
+    return {
+        "language": _language_cache.stats(),
+        "translation": _translation_cache.stats(),
+        "fast_path_hits": dict(_fast_path_hits),
+    }
+
+
 class TranslateService:
     """
     Dịch query Việt → Anh
-    
+
     ✅ THAY ĐỔI:
     - Dùng langdetect để detect ngôn ngữ (NHANH, CHÍNH XÁC)
     - Dùng deep_translator (Google Translate FREE API)
     - KHÔNG tốn Gemini quota
-    - Cache để tránh dịch lại
+    - Cache LRU/TTL dùng chung cả process để tránh dịch lại
     """
-    
-    def __init__(self):
-        self.translator = GoogleTranslator(source='vi', target='en')
-        self.cache = {}
-    
+
     def is_vietnamese(self, text):
         """
-        Kiểm tra có phải Tiếng Việt không bằng langdetect
-        
+        Kiểm tra có phải Tiếng Việt không (fast path ASCII/dấu tiếng Việt, rồi mới tới langdetect)
+
         Args:
             text (str): Text cần kiểm tra
-        
+
         Returns:
             bool: True nếu là tiếng Việt
         """
-        try:
-            # Detect language
-            lang = detect(text)
-            return lang == 'vi'
-        except LangDetectException:
-            # Nếu không detect được → coi như English
-            return False
-    
+        return detect_language(text) == 'vi'
+
+    def translate_cached(self, text):
+        """
+        Bản dịch có sẵn mà không cần gọi langdetect/Google Translate
+
+        Returns:
+            str | None: text gốc nếu là ASCII, bản dịch nếu đã cache, None nếu phải dịch
+        """
+        if _fast_detect(text) == 'en':
+            _fast_path_hits['en'] += 1
+            return text
+        return _translation_cache.get(_cache_key(text))
+
     def translate_to_english(self, text):
         """
         Dịch Việt → Anh với cache
-        
+
         Args:
             text (str): Text cần dịch
-        
+
         Returns:
             str: Text đã dịch (hoặc giữ nguyên nếu đã là English)
-        
+
         Examples:
             >>> translate_to_english("trứng gà")
             "chicken egg"
-            
+
             >>> translate_to_english("egg")
             "egg"
         """
-        
+
         # Không phải tiếng Việt → trả về nguyên
         if not self.is_vietnamese(text):
             return text
-        
+
         # Check cache
-        if text in self.cache:
-            return self.cache[text]
-        
+        key = _cache_key(text)
+        cached = _translation_cache.get(key)
+        if cached is not None:
+            return cached
+
         try:
             # Dịch bằng Google Translate
-            english = self.translator.translate(text)
-            
-            # Cache
-            self.cache[text] = english
-            
-            print(f"🌏 Translated: '{text}' → '{english}'")
-            
+            english = _get_translator().translate(text)
+
+            # Cache (lỗi thì không cache để lần sau dịch lại)
+            _translation_cache.set(key, english)
+
+            logger.debug("Translated: %r → %r", text, english)
+
             return english
-        
+
         except Exception as e:
-            print(f"⚠️ Translation error: {e}")
+            logger.warning("Translation error: %s", e)
             # Fallback: trả về text gốc
-            return text
\ No newline at end of file
+            return text
@@ -0,0 +1,116 @@
+"""
+Service Layer cho User Context Snapshot
+Chịu trách nhiệm:
+- Gom users + profiles + goals + biometrics_logs mới nhất thành 1 dict gọn (chatbot dùng)
+- Cache snapshot trong process (LRU + TTL) để các message sau không query lại
+- Invalidate khi goal / biometrics / profile thay đổi
+"""
+import uuid
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.settings import settings
+from app.utils.cache import TTLCache
+
+
+# TTL là lưới an toàn cho thay đổi từ worker khác (invalidate chỉ có hiệu lực trong process)
+_snapshot_cache = TTLCache(
+    maxsize=settings.USER_CONTEXT_CACHE_SIZE,
+    ttl=settings.USER_CONTEXT_CACHE_TTL_SECONDS
+)
+
+
+def _to_float(value) -> Optional[float]:
+    return float(value) if value else None
+
+
+class UserContextService:
+    """Service snapshot thông tin user cho chatbot"""
+
+    @staticmethod
+    def build_snapshot(db: Session, user_id: uuid.UUID) -> Optional[dict]:
+        """
+        Query snapshot từ database (2 query: user+profile+goal, biometrics mới nhất)
+
+        Returns:
+            dict hoặc None nếu không có user
+        """
+        from app.models.auth import Goal, Profile, User
+        from app.models.biometric import BiometricsLog
+
+        row = db.execute(
+            select(User, Profile, Goal)
+            .outerjoin(Profile, Profile.user_id == User.id)
+            .outerjoin(Goal, Goal.user_id == User.id)
+            .where(User.id == user_id)
+        ).first()
+        if row is None:
+            return None
+        user, profile, goal = row
+
+        biometrics = db.execute(
+            select(BiometricsLog.weight_kg, BiometricsLog.bmi)
+            .where(BiometricsLog.user_id == user_id)
+            .order_by(BiometricsLog.logged_at.desc())
+            .limit(1)
+        ).first()
+
+        age = None
+        if profile and profile.date_of_birth:
+            today = date.today()
+            dob = profile.date_of_birth
+            age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+
+        return {
+            'user_id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'full_name': profile.full_name if profile else None,
+            'gender': profile.gender if profile else None,
+            'age': age,
+            'height_cm': _to_float(profile.height_cm_default) if profile else None,
+            'weight_kg': _to_float(biometrics.weight_kg) if biometrics else None,
+            'bmi': _to_float(biometrics.bmi) if biometrics else None,
+            'goal_type': goal.goal_type if goal else None,
+            'daily_calorie_target': float(goal.daily_calorie_target) if goal and goal.daily_calorie_target is not None else None,
+            'baseline_activity': goal.baseline_activity if goal else None,
+            'weekly_goal': _to_float(goal.weekly_goal) if goal else None,
+            'protein_grams': _to_float(goal.protein_grams) if goal else None,
+            'fat_grams': _to_float(goal.fat_grams) if goal else None,
+            'carb_grams': _to_float(goal.carb_grams) if goal else None,
+            'weekly_exercise_min': goal.weekly_exercise_min if goal else None,
+        }
+
+    @staticmethod
+    def get_cached(user_id: uuid.UUID) -> Optional[dict]:
+        """Snapshot trong cache (không query DB), None nếu chưa có"""
+        snapshot = _snapshot_cache.get(user_id)
+        return dict(snapshot) if snapshot is not None else None
+
+    @staticmethod
+    def get_snapshot(db: Session, user_id: uuid.UUID) -> Optional[dict]:
+        """
+        Snapshot của user: lấy từ cache, miss thì query rồi cache lại
+
+        Returns:
+            dict (bản copy, sửa thoải mái) hoặc None nếu không có user
+        """
+        snapshot = _snapshot_cache.get(user_id)
+        if snapshot is None:
+            snapshot = UserContextService.build_snapshot(db, user_id)
+            if snapshot is None:
+                return None
+            _snapshot_cache.set(user_id, snapshot)
+        return dict(snapshot)
+
+    @staticmethod
+    def invalidate(user_id: uuid.UUID) -> None:
+        """Xóa snapshot (gọi sau khi goal / biometrics / profile thay đổi)"""
+        _snapshot_cache.pop(user_id)
+
+    @staticmethod
+    def cache_stats() -> dict:
+        return _snapshot_cache.stats()
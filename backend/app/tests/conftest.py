@@ -0,0 +1,84 @@
+"""
+Fixture dùng chung cho test blog: SQLite in-memory với các bảng blog, bắt câu SQL, tạo user
+
+Bảng cần tạo lấy từ fixture `blog_tables`: module cần thêm bảng (VD: PostViewSketch)
+override fixture này hoặc parametrize indirect. Module tự reset buffer / cache dùng chung
+của mình (counter buffer, feed cache, hashtag index, ...).
+"""
+import uuid
+
+import pytest
+from sqlalchemy import BigInteger, create_engine, event
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models.auth import Profile, User
+from app.models.base import Base
+from app.models.blog import Hashtag, Post, PostHashtag, PostLike, PostMedia, PostSave
+
+
+BLOG_TABLES = (User, Profile, Post, PostMedia, PostLike, PostSave, Hashtag, PostHashtag)
+
+
+@compiles(BigInteger, "sqlite")
+def _bigint_as_integer(type_, compiler, **kw):
+    # SQLite chỉ tự tăng PK kiểu INTEGER
+    return "INTEGER"
+
+
+@pytest.fixture
+def blog_tables(request):
+    """Model cần tạo bảng (mặc định BLOG_TABLES)"""
+    return getattr(request, "param", BLOG_TABLES)
+
+
+@pytest.fixture
+def blog_engine(blog_tables):
+    # 1 connection dùng chung, cho phép dùng từ thread khác (DB executor / threadpool)
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine, tables=[model.__table__ for model in blog_tables])
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(blog_engine):
+    return sessionmaker(bind=blog_engine)
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def statements(blog_engine):
+    """Câu SQL chạy trên engine (sau khi tạo bảng)"""
+    captured = []
+    event.listen(blog_engine, "before_cursor_execute", lambda *args: captured.append(args[2]))
+    return captured
+
+
+@pytest.fixture
+def make_users(db):
+    """
+    Tạo n user và commit, trả về list id
+
+    Id cố định theo thứ tự tạo trong test (hex bắt đầu bằng "f": SQLite không đọc nhầm
+    thành số) → kết quả phụ thuộc id (VD: ước lượng HyperLogLog) tất định giữa các lần chạy
+    """
+    created = 0
+
+    def make(n: int):
+        nonlocal created
+        ids = [uuid.UUID(int=(0xf << 124) + created + i + 1) for i in range(n)]
+        created += n
+        for user_id in ids:
+            db.add(User(id=user_id, username=f"u{user_id.hex[-8:]}", email=f"{user_id.hex[-8:]}@x.com", password_hash="x"))
+        db.commit()
+        return ids
+
+    return make
@@ -0,0 +1,71 @@
+"""
+Unit Tests cho cassette (ghi / phát lại) và benchmark chatbot offline
+"""
+import asyncio
+import json
+
+import pytest
+
+from app.services.nutri_chatbot.benchmark import SuiteResponder, load_suite, run_benchmark
+from app.services.nutri_chatbot.cassette import (
+    Cassette, CassetteLLMBackend, CassetteMissError, CassetteTranslator,
+    RecordingLLMBackend, RecordingTranslator,
+)
+from app.services.nutri_chatbot.llm_gateway import FakeLLMBackend
+
+
+async def _collect(stream):
+    return [chunk async for chunk in stream]
+
+
+class TestCassette:
+    def test_record_then_replay(self, tmp_path):
+        cassette = Cassette()
+        recorder = RecordingLLMBackend(FakeLLMBackend(latency=0, responder=lambda p: f"answer to {p}"), cassette)
+        asyncio.run(recorder.generate("q1", "m"))
+        asyncio.run(_collect(recorder.generate_stream("q2", "m")))
+        RecordingTranslator(type("T", (), {"translate": lambda self, t: "egg"})(), cassette).translate("trứng")
+        cassette.save(str(tmp_path / "c.json"))
+
+        replay = Cassette(str(tmp_path / "c.json"))
+        backend = CassetteLLMBackend(replay)
+        assert asyncio.run(backend.generate("q1", "m")) == "answer to q1"
+        assert "".join(asyncio.run(_collect(backend.generate_stream("q2", "m")))) == "answer to q2"
+        assert CassetteTranslator(replay).translate("trứng") == "egg"
+        assert replay.stats()["llm"] == {"entries": 2, "hits": 2, "misses": 0}
+
+        # Cùng prompt, khác model → không khớp
+        with pytest.raises(CassetteMissError):
+            asyncio.run(backend.generate("q1", "other-model"))
+
+    def test_miss_uses_fallback(self):
+        backend = CassetteLLMBackend(Cassette(), fallback=lambda p: "fallback")
+        assert asyncio.run(backend.generate("anything", "m")) == "fallback"
+
+
+class TestSuiteResponder:
+    def test_answers_classify_and_meal_analysis_prompts(self):
+        responder = SuiteResponder(load_suite())
+        classify = responder('**VI. CÂU CẦN PHÂN LOẠI:**\n\n"how many calories in beef pho?"\n')
+        assert json.loads(classify) == {
+            "intent": "FOOD_NUTRITION_INQUIRY",
+            "entities": {"food_name": "beef pho", "nutrient": "calories"},
+        }
+        analysis = responder('YÊU CẦU: "thực đơn 1500 calo một ngày"')
+        assert json.loads(analysis)["calorie_target"] == 1500
+        assert responder.translate("xin chào") == "hello"
+
+
+class TestBenchmark:
+    def test_runs_every_intent_and_reports_stages(self):
+        suite = load_suite()
+        cases = [next(c for c in suite if c["intent"] == intent) for intent in sorted({c["intent"] for c in suite})]
+
+        summary = run_benchmark(cases, mode="cold")
+
+        assert summary["messages"] == 5
+        assert summary["errors"] == []
+        assert set(summary["intents"]) == {c["intent"] for c in cases}
+        for stage in ("classify", "embed", "vector_search", "hydrate", "generate", "total"):
+            assert summary["stages"][stage]["n"] > 0, stage
+        assert summary["stages"]["total"]["p95"] >= summary["stages"]["total"]["p50"]
@@ -0,0 +1,133 @@
+"""
+Unit Tests cho counter like/save gom delta (BlogCounterBuffer): ghi membership,
+flush cộng dồn, đọc thấy ngay, reconcile
+Dùng SQLite in-memory
+"""
+import pytest
+
+from app.models.blog import Post, PostLike
+from app.repositories.blog_repository import BlogRepository
+from app.services.blog_counters import BlogCounterBuffer, get_counter_buffer
+from app.services.blog_feed_cache import get_feed_page_cache
+from app.services.blog_service import BlogService
+
+
+@pytest.fixture(autouse=True)
+def reset_counter_buffer():
+    get_counter_buffer().drain()
+    get_feed_page_cache().clear()
+    yield
+    get_counter_buffer().drain()
+
+
+def _post(db, author):
+    return BlogRepository.create_post(db, author, content_text="x" * 100)
+
+
+class TestMembershipWrites:
+    def test_like_only_touches_membership(self, db, statements, make_users):
+        alice, bob = make_users(2)
+        post = _post(db, alice)
+        db.commit()
+        statements.clear()
+
+        BlogService.like_post(db, post.id, bob)
+        BlogService.like_post(db, post.id, bob)  # idempotent
+
+        sql = [s.lower() for s in statements]
+        assert not any(s.startswith("update posts") for s in sql)
+        assert sum("on conflict do nothing" in s for s in sql) == 2
+        assert get_counter_buffer().pending(post.id) == (1, 0)
+        assert db.query(PostLike).count() == 1
+
+    def test_reads_reflect_pending_deltas(self, db, make_users):
+        alice, bob, carol = make_users(3)
+        post = _post(db, alice)
+        db.commit()
+
+        BlogService.like_post(db, post.id, bob)
+        BlogService.save_post(db, post.id, carol)
+
+        detail = BlogService.get_post(db, post.id, bob)
+        assert (detail.like_count, detail.save_count, detail.is_liked) == (1, 1, True)
+        assert db.get(Post, post.id).like_count == 0  # chưa flush
+
+        feed = BlogService.get_feed(db, carol)
+        assert (feed.items[0].like_count, feed.items[0].is_saved) == (1, True)
+
+    def test_missing_post_is_404(self, db, make_users):
+        (alice,) = make_users(1)
+
+        with pytest.raises(Exception) as error:
+            BlogService.like_post(db, 999, alice)
+        assert error.value.status_code == 404
+
+
+class TestFlush:
+    def test_flush_coalesces_into_one_update_per_post(self, db, statements, make_users):
+        users = make_users(5)
+        post = _post(db, users[0])
+        db.commit()
+
+        for user_id in users:
+            BlogService.like_post(db, post.id, user_id)
+        BlogService.unlike_post(db, post.id, users[0])
+        BlogService.save_post(db, post.id, users[1])
+        statements.clear()
+
+        assert get_counter_buffer().flush(db) == 1
+
+        counter_updates = [s for s in statements if s.lower().startswith("update posts set like_count")]
+        assert len(counter_updates) == 1
+        db.refresh(post)
+        assert (post.like_count, post.save_count) == (4, 1)
+        assert get_counter_buffer().pending(post.id) == (0, 0)
+        # Sau flush đọc vẫn đúng (không cộng delta 2 lần)
+        assert BlogService.get_post(db, post.id, users[1]).like_count == 4
+
+    def test_like_then_unlike_cancels_out(self):
+        buffer = BlogCounterBuffer()
+        buffer.add(1, likes=1)
+        buffer.add(1, likes=-1)
+        assert buffer.drain() == {}
+
+    def test_failed_flush_keeps_deltas(self, db, monkeypatch):
+        buffer = BlogCounterBuffer()
+        buffer.add(7, likes=2, saves=1)
+
+        def boom(db, deltas):
+            raise RuntimeError("db down")
+
+        monkeypatch.setattr(BlogRepository, "apply_counter_deltas", boom)
+        with pytest.raises(RuntimeError):
+            buffer.flush(db)
+
+        buffer.add(7, likes=1)
+        assert buffer.pending(7) == (3, 1)
+
+
+class TestReconcile:
+    def test_reconcile_fixes_drift_but_respects_pending(self, db, make_users):
+        alice, bob, carol = make_users(3)
+        drifted = _post(db, alice)
+        pending = _post(db, alice)
+        db.commit()
+
+        # drifted: 2 like thật nhưng counter ghi 10 (VD bị sửa tay)
+        BlogService.like_post(db, drifted.id, bob)
+        BlogService.like_post(db, drifted.id, carol)
+        get_counter_buffer().flush(db)
+        db.query(Post).filter(Post.id == drifted.id).update({"like_count": 10})
+        db.commit()
+        # pending: like đã ghi membership nhưng delta chưa flush
+        BlogService.like_post(db, pending.id, bob)
+
+        assert get_counter_buffer().reconcile(db, batch_size=1) == 1
+
+        db.refresh(drifted)
+        db.refresh(pending)
+        assert drifted.like_count == 2
+        assert pending.like_count == 0
+        get_counter_buffer().flush(db)
+        db.refresh(pending)
+        assert pending.like_count == 1
@@ -0,0 +1,134 @@
+"""
+Regression Tests: route blog không được chạy query DB trên event loop thread
+Dùng SQLite in-memory + TestClient, listener before_cursor_execute bắt query chạy trong loop
+"""
+import asyncio
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from app.api.deps import create_access_token, get_current_user, get_current_user_offloaded
+from app.api.routes import blog
+from app.core.database import get_db
+from app.core.db_executor import DBExecutor, DBExecutorBusyError
+from app.services.blog_hashtag_index import get_hashtag_index
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+@pytest.fixture
+def client_and_violations(blog_engine, make_users):
+    SessionLocal = sessionmaker(bind=blog_engine, autoflush=False)
+    (user_id,) = make_users(1)
+
+    queries, violations = [], []
+
+    def check_thread(conn, cursor, statement, *args):
+        queries.append(statement)
+        if _on_event_loop():
+            violations.append((threading.current_thread().name, statement))
+
+    event.listen(blog_engine, "before_cursor_execute", check_thread)
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.include_router(blog.router, prefix="/api/v1")
+    app.dependency_overrides[get_db] = override_get_db
+
+    get_hashtag_index().clear()
+    client = TestClient(app, headers={"Authorization": f"Bearer {create_access_token(user_id)}"})
+    yield client, queries, violations
+
+
+class TestBlogRoutesOffLoop:
+    def test_db_calls_never_run_on_event_loop(self, client_and_violations):
+        client, queries, violations = client_and_violations
+
+        created = client.post("/api/v1/blog/posts", json={
+            "title": "Bữa sáng healthy cho người bận rộn",
+            "content_text": "Yến mạch ngâm sữa chua, thêm trứng luộc và chuối. " * 3,
+            "hashtags": ["healthy", "breakfast"],
+        })
+        assert created.status_code == 201, created.text
+        post_id = created.json()["id"]
+
+        assert client.get(f"/api/v1/blog/posts/{post_id}").status_code == 200
+        assert client.post(f"/api/v1/blog/posts/{post_id}/like").status_code == 204
+        assert client.post(f"/api/v1/blog/posts/{post_id}/save").status_code == 204
+        assert client.patch(f"/api/v1/blog/posts/{post_id}", json={"title": "Bữa sáng nhanh gọn trong 5 phút"}).status_code == 200
+
+        feed = client.get("/api/v1/blog/feed")
+        assert feed.status_code == 200
+        assert feed.json()["items"][0]["is_liked"] is True
+
+        found = client.get("/api/v1/blog/posts/search", params={"q": "yến mạch", "hashtag": "healthy"})
+        assert found.status_code == 200, found.text
+        assert [p["id"] for p in found.json()["items"]] == [post_id]
+
+        hashtags = client.get("/api/v1/blog/hashtags/search", params={"q": "heal"})
+        assert [h["name"] for h in hashtags.json()["items"]] == ["healthy"]
+
+        assert client.delete(f"/api/v1/blog/posts/{post_id}").status_code == 204
+        assert client.get(f"/api/v1/blog/posts/{post_id}").status_code == 404
+
+        assert queries
+        assert violations == []
+
+    def test_detector_catches_query_on_loop(self, client_and_violations):
+        # Đảm bảo listener thật sự bắt được query chạy trực tiếp trong coroutine
+        client, _, violations = client_and_violations
+        client.app.dependency_overrides[get_current_user_offloaded] = get_current_user
+
+        assert client.get("/api/v1/blog/hashtags/search", params={"q": "x"}).status_code == 200
+        assert violations
+
+
+class TestDBExecutor:
+    def test_runs_off_loop_and_counts(self):
+        executor = DBExecutor("test-db", max_workers=2)
+
+        async def main():
+            return await asyncio.gather(*(executor.run(_on_event_loop) for _ in range(4)))
+
+        assert asyncio.run(main()) == [False] * 4
+        stats = executor.stats()
+        assert stats["counters"]["completed"] == 4
+        assert stats["in_flight"] == 0
+        executor.shutdown()
+
+    def test_full_queue_fails_fast(self):
+        executor = DBExecutor("test-db", max_workers=1, max_queue=1, queue_timeout=5)
+        release = threading.Event()
+
+        async def main():
+            running = asyncio.ensure_future(executor.run(release.wait))
+            await asyncio.sleep(0.05)
+            waiting = asyncio.ensure_future(executor.run(lambda: "queued"))
+            await asyncio.sleep(0.05)
+            with pytest.raises(DBExecutorBusyError) as error:
+                await executor.run(lambda: "rejected")
+            release.set()
+            return await running, await waiting, error.value
+
+        done, queued, error = asyncio.run(main())
+        assert (done, queued) == (True, "queued")
+        assert error.status_code == 503
+        assert error.headers["Retry-After"] == "5"
+        assert executor.stats()["counters"]["rejected_queue_full"] == 1
+        executor.shutdown()
@@ -0,0 +1,378 @@
+"""
+Unit Tests cho feed blog: cursor (keyset) mode, page mode, trending_score, cache trang đầu, search
+Dùng SQLite in-memory
+"""
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+
+from app.models.blog import Hashtag, Post, PostHashtag, PostSave
+from app.repositories.blog_repository import BlogRepository
+from app.schemas.blog import FeedResponse, PostCreateRequest, PostPatchRequest
+from app.services import blog_service
+from app.services.admin.admin_blog_service import AdminBlogService
+from app.services.blog_counters import get_counter_buffer
+from app.services.blog_feed_cache import FeedPageCache, get_feed_page_cache
+from app.services.blog_hashtag_index import get_hashtag_index
+from app.services.blog_service import BlogService
+from app.utils.trending import trending_score
+
+
+@pytest.fixture(autouse=True)
+def reset_feed_caches():
+    blog_service._feed_count_cache.clear()
+    get_counter_buffer().drain()
+    get_feed_page_cache().clear()
+    get_hashtag_index().clear()
+
+
+def _seed(db, make_users):
+    """13 bài: 2 tác giả, bài chẵn có #healthy, score lặp lại để test tie-break"""
+    alice, bob = make_users(2)
+    healthy = Hashtag(name="healthy")
+    db.add(healthy)
+    db.flush()
+
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    posts = []
+    for i in range(13):
+        # 2 bài cùng created_at → phải phân biệt bằng id
+        created_at = base + timedelta(hours=i // 2)
+        post = Post(
+            user_id=alice if i % 3 else bob,
+            content_text=f"post {i}",
+            like_count=i % 4,
+            save_count=i % 2,
+            created_at=created_at,
+            trending_score=trending_score(i % 4, i % 2, created_at),
+        )
+        db.add(post)
+        db.flush()
+        if i % 2 == 0:
+            db.add(PostHashtag(post_id=post.id, hashtag_id=healthy.id))
+        if i % 5 == 0:
+            db.add(PostSave(user_id=alice, post_id=post.id))
+        posts.append(post)
+    db.commit()
+    return alice, bob, posts
+
+
+def _walk(db, user_id, limit=4, **kwargs):
+    """Đi hết feed theo cursor, trả về list id"""
+    ids, cursor, pages = [], None, 0
+    while True:
+        response = BlogService.get_feed(db, user_id, limit=limit, cursor=cursor, **kwargs)
+        ids += [item.id for item in response.items]
+        pages += 1
+        if not response.has_next:
+            assert response.next_cursor is None
+            return ids, pages
+        cursor = response.next_cursor
+
+
+def _all_pages(db, user_id, **kwargs):
+    response = BlogService.get_feed(db, user_id, limit=100, page=1, **kwargs)
+    return [item.id for item in response.items]
+
+
+class TestCursorFeed:
+    @pytest.mark.parametrize("sort", ["recent", "trending"])
+    def test_cursor_walk_matches_page_order(self, db, sort, make_users):
+        alice, _, posts = _seed(db, make_users)
+
+        ids, pages = _walk(db, alice, sort=sort)
+
+        assert ids == _all_pages(db, alice, sort=sort)
+        assert len(ids) == len(set(ids)) == len(posts)
+        assert pages == 4
+
+    @pytest.mark.parametrize("filters", [
+        {"hashtag": "#Healthy"},
+        {"saved_only": True},
+        {"hashtag": "healthy", "saved_only": True},
+    ])
+    def test_cursor_works_with_filters(self, db, filters, make_users):
+        alice, bob, _ = _seed(db, make_users)
+
+        for sort in ("recent", "trending"):
+            ids, _ = _walk(db, alice, limit=2, sort=sort, **filters)
+            assert ids == _all_pages(db, alice, sort=sort, **filters)
+        ids, _ = _walk(db, alice, limit=2, author_id=bob, **filters)
+        assert ids == _all_pages(db, alice, author_id=bob, **filters)
+
+    def test_next_page_is_keyset_without_count(self, db, statements, make_users):
+        alice, _, _ = _seed(db, make_users)
+        first = BlogService.get_feed(db, alice, limit=4)
+        statements.clear()
+
+        second = BlogService.get_feed(db, alice, limit=4, cursor=first.next_cursor)
+
+        feed_sql = " ".join(statements).lower()
+        assert "count(" not in feed_sql
+        # Keyset: điều kiện trên (created_at, id) thay cho OFFSET
+        assert "(posts.created_at, posts.id) < (?, ?)" in feed_sql
+        assert second.total_count is None and second.page is None
+
+    def test_include_total_is_cached(self, db, statements, make_users):
+        alice, _, posts = _seed(db, make_users)
+
+        assert BlogService.get_feed(db, alice, include_total=True).total_count == len(posts)
+        statements.clear()
+        assert BlogService.get_feed(db, alice, sort="trending", include_total=True).total_count == len(posts)
+        assert not any("count(" in s.lower() for s in statements)
+
+    def test_cursor_bound_to_sort_and_filters(self, db, make_users):
+        alice, bob, _ = _seed(db, make_users)
+        cursor = BlogService.get_feed(db, alice, limit=2).next_cursor
+
+        for kwargs in ({"sort": "trending"}, {"author_id": bob}, {"hashtag": "healthy"}):
+            with pytest.raises(HTTPException) as error:
+                BlogService.get_feed(db, alice, limit=2, cursor=cursor, **kwargs)
+            assert error.value.status_code == 400
+
+        for bad in ("not-a-cursor", "e30"):
+            with pytest.raises(HTTPException):
+                BlogService.get_feed(db, alice, cursor=bad)
+
+        with pytest.raises(HTTPException):
+            BlogService.get_feed(db, alice, cursor=cursor, page=1)
+
+
+class TestPageFeed:
+    def test_page_mode_keeps_totals(self, db, make_users):
+        alice, _, posts = _seed(db, make_users)
+
+        response = BlogService.get_feed(db, alice, limit=5, page=3)
+
+        assert (response.page, response.total_count, response.total_pages) == (3, len(posts), 3)
+        assert response.has_next is False
+        assert len(response.items) == 3
+
+
+class TestTrendingScore:
+    def test_decay_favours_newer_posts(self):
+        old = datetime(2025, 3, 1, tzinfo=timezone.utc)
+        day_later = old + timedelta(hours=24)
+
+        # Mới hơn 1 chu kỳ decay = ngang bài cũ có gấp 10 lần tương tác
+        assert trending_score(0, 0, day_later, decay_hours=24) == pytest.approx(trending_score(9, 0, old, decay_hours=24))
+        assert trending_score(1, 0, day_later, decay_hours=24) > trending_score(9, 0, old, decay_hours=24)
+        # Naive datetime (SQLite) được coi là UTC
+        assert trending_score(3, 1, old.replace(tzinfo=None)) == trending_score(3, 1, old)
+
+    def test_counter_flush_updates_score(self, db, make_users):
+        alice, _, posts = _seed(db, make_users)
+        post = posts[0]
+        before = post.trending_score
+
+        BlogService.like_post(db, post.id, alice)
+        BlogService.save_post(db, post.id, alice)  # đã save từ seed → không đổi
+        get_counter_buffer().flush(db)
+        db.refresh(post)
+
+        assert post.like_count == 1
+        assert post.trending_score == pytest.approx(trending_score(1, post.save_count, post.created_at))
+        assert post.trending_score > before
+
+    def test_trending_feed_orders_by_stored_score(self, db, statements, make_users):
+        alice, _, posts = _seed(db, make_users)
+        statements.clear()
+
+        ids = [item.id for item in BlogService.get_feed(db, alice, sort="trending", limit=100).items]
+
+        expected = sorted(posts, key=lambda p: (p.trending_score, p.created_at, p.id), reverse=True)
+        assert ids == [p.id for p in expected]
+        assert "order by posts.trending_score desc, posts.created_at desc, posts.id desc" in statements[0].lower()
+
+    def test_refresh_only_touches_recent_drifted_posts(self, db, make_users):
+        alice, _, _ = _seed(db, make_users)
+        now = datetime.now(timezone.utc)
+        recent = Post(user_id=alice, content_text="recent", like_count=50, save_count=0,
+                      created_at=now - timedelta(days=1), trending_score=0.0)
+        stale = Post(user_id=alice, content_text="stale", like_count=50, save_count=0,
+                     created_at=now - timedelta(days=30), trending_score=0.0)
+        db.add_all([recent, stale])
+        db.commit()
+
+        updated = BlogRepository.refresh_trending_scores(db, created_after=now - timedelta(days=7))
+
+        db.refresh(recent)
+        db.refresh(stale)
+        assert updated == 1
+        assert recent.trending_score == pytest.approx(trending_score(50, 0, recent.created_at))
+        assert stale.trending_score == 0.0
+        # Chạy lại: không còn gì lệch
+        assert BlogRepository.refresh_trending_scores(db) == 1  # chỉ còn bài stale
+        assert BlogRepository.refresh_trending_scores(db) == 0
+
+
+class TestFeedPageCache:
+    @staticmethod
+    def _post_queries(statements):
+        return [s for s in statements if "from posts" in s.lower()]
+
+    def test_first_page_shared_across_users(self, db, statements, make_users):
+        alice, bob, _ = _seed(db, make_users)
+        first = BlogService.get_feed(db, alice, limit=5)
+        statements.clear()
+
+        second = BlogService.get_feed(db, bob, limit=5)
+
+        assert [i.id for i in second.items] == [i.id for i in first.items]
+        assert second.next_cursor == first.next_cursor
+        # Chỉ còn 1 query trạng thái like/save của bob
+        assert self._post_queries(statements) == []
+        assert len(statements) == 1
+        assert any(i.is_saved for i in first.items)
+        assert not any(i.is_saved for i in second.items)
+
+    def test_viewer_state_and_pending_counters_overlay(self, db, statements, make_users):
+        alice, bob, _ = _seed(db, make_users)
+        top = BlogService.get_feed(db, alice, limit=5).items[0]
+
+        BlogService.like_post(db, top.id, bob)
+        statements.clear()
+        item = BlogService.get_feed(db, bob, limit=5).items[0]
+
+        assert self._post_queries(statements) == []
+        assert (item.is_liked, item.like_count) == (True, top.like_count + 1)
+        # Cache giữ bản chung, không bị overlay của bob làm bẩn
+        assert BlogService.get_feed(db, alice, limit=5).items[0].is_liked is False
+
+        get_counter_buffer().flush(db)
+        statements.clear()
+        item = BlogService.get_feed(db, bob, limit=5).items[0]
+        assert self._post_queries(statements)  # flush đã xóa trang chứa bài
+        assert item.like_count == top.like_count + 1
+
+    def test_post_writes_invalidate(self, db, make_users):
+        alice, _, _ = _seed(db, make_users)
+        BlogService.get_feed(db, alice, limit=5)
+
+        created = BlogService.create_post(db, alice, PostCreateRequest(
+            title="Salad ức gà cho bữa trưa", content_text="x" * 100
+        ))
+        assert BlogService.get_feed(db, alice, limit=5).items[0].id == created.id
+
+        BlogService.update_post(db, created.id, alice, PostPatchRequest(title="Salad ức gà sốt mè rang"))
+        assert BlogService.get_feed(db, alice, limit=5).items[0].title == "Salad ức gà sốt mè rang"
+
+        BlogService.delete_post(db, created.id, alice)
+        assert created.id not in [i.id for i in BlogService.get_feed(db, alice, limit=5).items]
+
+    def test_admin_delete_invalidates(self, db, make_users):
+        alice, _, _ = _seed(db, make_users)
+        newest = BlogService.get_feed(db, alice, limit=5).items[0].id
+
+        AdminBlogService.delete_post(db, newest, reason="spam", admin_id=alice)
+        assert newest not in [i.id for i in BlogService.get_feed(db, alice, limit=5).items]
+
+    def test_filtered_and_later_pages_not_cached(self, db, statements, make_users):
+        alice, bob, _ = _seed(db, make_users)
+        cursor = BlogService.get_feed(db, alice, limit=5).next_cursor
+
+        for kwargs in ({"hashtag": "healthy"}, {"author_id": bob}, {"saved_only": True}, {"cursor": cursor}):
+            BlogService.get_feed(db, alice, limit=5, **kwargs)
+            statements.clear()
+            BlogService.get_feed(db, alice, limit=5, **kwargs)
+            assert self._post_queries(statements), kwargs
+
+    def test_invalidate_rules(self):
+        cache = FeedPageCache(ttl=60)
+        page = lambda ids: FeedResponse.model_construct(
+            items=[SimpleNamespace(id=i) for i in ids], limit=5, has_next=False
+        )
+        for sort, ids in (("recent", [1, 2]), ("trending", [3, 4])):
+            cache.set(sort, 5, page(ids), cache.generation())
+
+        # Điểm bài 9 đổi: trending có thể đổi thứ tự, recent không chứa bài 9 → giữ
+        assert cache.invalidate([9], reorder_trending=True) == 1
+        assert cache.get("recent", 5) is not None and cache.get("trending", 5) is None
+        assert cache.invalidate([2]) == 1
+
+        # Trang build trước khi invalidate không được ghi đè lên cache
+        generation = cache.generation()
+        cache.invalidate()
+        assert cache.set("recent", 5, page([1]), generation) is False
+        assert cache.get("recent", 5) is None
+
+
+class TestSearchPosts:
+    @staticmethod
+    def _seed_search(db, make_users):
+        alice, bob = make_users(2)
+        healthy = Hashtag(name="healthy")
+        db.add(healthy)
+        db.flush()
+        base = datetime(2025, 3, 1, tzinfo=timezone.utc)
+        specs = [
+            (alice, "Salad ức gà", "Món trưa nhẹ nhàng", True),
+            (bob, "Bữa sáng", "Yến mạch với salad trái cây", True),
+            (alice, "Cháo yến mạch", "Không có rau", False),
+            (bob, "Salad cá hồi", "Salad giàu omega 3", False),
+            (alice, "Sinh tố", "Chuối và sữa chua", True),
+        ]
+        posts = []
+        for i, (author, title, content, tagged) in enumerate(specs):
+            post = Post(user_id=author, title=title, content_text=content, created_at=base + timedelta(hours=i))
+            db.add(post)
+            db.flush()
+            if tagged:
+                db.add(PostHashtag(post_id=post.id, hashtag_id=healthy.id))
+            posts.append(post)
+        db.commit()
+        return alice, bob, posts
+
+    def test_ranks_title_matches_first(self, db, make_users):
+        alice, _, posts = self._seed_search(db, make_users)
+
+        ids = [i.id for i in BlogService.search_posts(db, alice, "SALAD").items]
+
+        # Title + body > title (mới hơn trước) > chỉ body
+        assert ids == [posts[3].id, posts[0].id, posts[1].id]
+        # Mọi từ khóa đều phải khớp
+        assert [i.id for i in BlogService.search_posts(db, alice, "salad yến mạch").items] == [posts[1].id]
+        assert BlogService.search_posts(db, alice, "!!!").items == []
+
+    def test_filters_combine_in_one_query(self, db, statements, make_users):
+        alice, bob, posts = self._seed_search(db, make_users)
+        statements.clear()
+
+        response = BlogService.search_posts(db, alice, "salad", hashtag="#healthy", author_id=bob)
+
+        assert [i.id for i in response.items] == [posts[1].id]
+        search_sql = [s for s in statements if "from posts" in s.lower() and "like" in s.lower()]
+        assert len(search_sql) == 1
+        assert "post_hashtags" in search_sql[0].lower() and "posts.user_id = ?" in search_sql[0].lower()
+
+    def test_cursor_walk_and_binding(self, db, make_users):
+        alice, _, _ = self._seed_search(db, make_users)
+        expected = [i.id for i in BlogService.search_posts(db, alice, "salad", limit=100).items]
+
+        ids, cursor = [], None
+        while True:
+            response = BlogService.search_posts(db, alice, "salad", limit=1, cursor=cursor)
+            ids += [i.id for i in response.items]
+            if not response.has_next:
+                break
+            cursor = response.next_cursor
+        assert ids == expected
+
+        first = BlogService.search_posts(db, alice, "salad", limit=1)
+        with pytest.raises(HTTPException):
+            BlogService.search_posts(db, alice, "yến mạch", limit=1, cursor=first.next_cursor)
+        with pytest.raises(HTTPException):
+            BlogService.get_feed(db, alice, cursor=first.next_cursor)
+
+    def test_postgresql_uses_tsvector(self):
+        pg = SimpleNamespace(get_bind=lambda: SimpleNamespace(dialect=postgresql.dialect()))
+
+        condition, rank = BlogRepository._search_match(pg, ["salad", "gà"])
+
+        assert str(condition.compile(dialect=postgresql.dialect())).startswith(
+            "posts.search_vector @@ plainto_tsquery("
+        )
+        assert "ts_rank_cd(posts.search_vector" in str(rank.compile(dialect=postgresql.dialect()))
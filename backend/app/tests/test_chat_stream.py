@@ -0,0 +1,79 @@
+"""
+Unit Tests cho ChatbotService.chat_stream: thứ tự sự kiện, hủy khi client ngắt, lỗi
+Dùng FakeLLMBackend + Chroma in-memory, không gọi Gemini
+"""
+import asyncio
+import uuid
+
+import chromadb
+import pytest
+
+from app.core.settings import settings
+from app.services.nutri_chatbot import llm_gateway
+from app.services.nutri_chatbot import rag_service as rag_module
+from app.services.nutri_chatbot.chatbot_service import ChatbotService
+from app.services.nutri_chatbot.llm_gateway import FakeLLMBackend, LLMGateway
+
+
+@pytest.fixture
+def make_chatbot(monkeypatch):
+    collection = chromadb.EphemeralClient().create_collection(f"foods-{uuid.uuid4().hex}")
+    monkeypatch.setattr(rag_module, "_get_foods_collection", lambda: collection)
+
+    def factory(**backend_kwargs):
+        monkeypatch.setattr(settings, "GEMINI_API_KEY", "test")
+        gateway = LLMGateway(FakeLLMBackend(**backend_kwargs), max_retries=0)
+        monkeypatch.setattr(llm_gateway, "_gateway", gateway)
+        return ChatbotService(db=None, user_id=1), gateway
+
+    return factory
+
+
+async def _collect(agen, limit=None):
+    events = []
+    async for event, data in agen:
+        events.append((event, data))
+        if limit and len(events) >= limit:
+            break
+    return events
+
+
+class TestChatStream:
+    def test_event_order_and_tokens_match_response(self, make_chatbot):
+        chatbot, gateway = make_chatbot(latency=0, responder=lambda prompt: "Chào bạn! Mình là NutriBot 😊")
+
+        events = asyncio.run(_collect(chatbot.chat_stream("hi")))
+        names = [name for name, _ in events]
+
+        assert names[0] == "intent"
+        assert events[0][1]["intent"] == "SOCIAL"
+        assert names[-1] == "done"
+        assert names.count("token") > 1
+        text = "".join(data["text"] for name, data in events if name == "token")
+        assert text.strip() == events[-1][1]["response"]
+        assert gateway.stats()["first_chunk_ms"]["p50"] >= 0
+
+    def test_client_disconnect_cancels_generation(self, make_chatbot):
+        chatbot, gateway = make_chatbot(latency=0, chunk_delay=0.5, responder=lambda prompt: "a b c d e f")
+
+        async def main():
+            stream = chatbot.chat_stream("hello")
+            events = await _collect(stream, limit=2)  # intent + token đầu tiên
+            await stream.aclose()
+            return events
+
+        events = asyncio.run(main())
+
+        assert [name for name, _ in events] == ["intent", "token"]
+        assert gateway.stats()["in_flight"] == 0
+        assert gateway.stats()["active_users"] == 0
+        assert chatbot._events is None
+
+    def test_timeout_becomes_error_event(self, make_chatbot, monkeypatch):
+        chatbot, _ = make_chatbot(latency=0.5)
+        monkeypatch.setattr(settings, "CHATBOT_LLM_TIMEOUT_SECONDS", 0.05)
+
+        events = asyncio.run(_collect(chatbot.chat_stream("thanks")))
+
+        assert events[-1][0] == "error"
+        assert events[-1][1]["status"] == 504
@@ -0,0 +1,96 @@
+"""
+Unit Tests cho Embedding Cache của chatbot
+Không gọi Gemini: embed_fn là fake đếm số lần gọi
+"""
+import asyncio
+
+import pytest
+
+from app.services.nutri_chatbot.embedding_cache import EmbeddingCache, normalize_query
+from app.utils.cache import TTLCache
+
+
+def _fake_embedder():
+    calls = []
+
+    async def embed(text):
+        calls.append(text)
+        return [float(len(text)), 0.5, -1.25]
+
+    return embed, calls
+
+
+class TestNormalizeQuery:
+    def test_lowercase_and_whitespace(self):
+        assert normalize_query("High  protein\tLUNCH", 50) == "high protein lunch"
+
+    def test_calorie_bucketing(self):
+        assert normalize_query("lunch around 437 calories", 50) == "lunch around 450 calories"
+        assert normalize_query("lunch around 460 kcal", 50) == "lunch around 450 calories"
+
+    def test_near_identical_queries_share_key(self):
+        a = normalize_query("high protein dinner around 612 calories", 50)
+        b = normalize_query("High protein dinner around 590 calories", 50)
+        assert a == b
+
+
+class TestTTLCache:
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.stats()["evictions"] == 1
+
+    def test_ttl_expiry(self, monkeypatch):
+        import app.utils.cache as cache_module
+
+        now = [100.0]
+        monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+
+        cache = TTLCache(maxsize=10, ttl=5)
+        cache.set("a", 1)
+        now[0] += 6
+
+        assert cache.get("a") is None
+
+
+class TestEmbeddingCache:
+    def test_memory_hit_skips_embedder(self):
+        cache = EmbeddingCache(model="test-model", maxsize=16)
+        embed, calls = _fake_embedder()
+
+        first = asyncio.run(cache.get_or_embed("Lunch around 437 calories", embed))
+        second = asyncio.run(cache.get_or_embed("lunch around 450 calories", embed))
+
+        assert first == second
+        assert len(calls) == 1
+        assert cache.stats()["memory_hits"] == 1
+
+    def test_disk_tier_survives_new_process(self, tmp_path):
+        path = str(tmp_path / "embeddings.sqlite3")
+        embed, calls = _fake_embedder()
+
+        warm = EmbeddingCache(model="test-model", maxsize=16, path=path)
+        vector = asyncio.run(warm.get_or_embed("snack around 200 calories", embed))
+
+        # Cache mới (giống restart process) → memory rỗng, đọc từ SQLite
+        cold = EmbeddingCache(model="test-model", maxsize=16, path=path)
+        again = asyncio.run(cold.get_or_embed("snack around 200 calories", embed))
+
+        assert len(calls) == 1
+        assert again == pytest.approx(vector)
+        assert cold.stats()["disk_hits"] == 1
+
+    def test_model_is_part_of_key(self, tmp_path):
+        path = str(tmp_path / "embeddings.sqlite3")
+        embed, calls = _fake_embedder()
+
+        asyncio.run(EmbeddingCache(model="model-a", path=path).get_or_embed("egg", embed))
+        asyncio.run(EmbeddingCache(model="model-b", path=path).get_or_embed("egg", embed))
+
+        assert len(calls) == 2
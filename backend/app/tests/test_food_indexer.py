@@ -0,0 +1,132 @@
+"""
+Unit Tests cho FoodIndexer (đồng bộ foods → Chroma)
+SQLite in-memory + Chroma in-memory + HashingEmbedder, không cần mạng
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import chromadb
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.base import Base
+from app.models.food import Food, FoodNutrient
+from app.services.nutri_chatbot.embedders import HashingEmbedder
+from app.services.nutri_chatbot.food_index import FoodIndexer
+
+
+class CountingEmbedder(HashingEmbedder):
+    def __init__(self):
+        super().__init__(dim=32)
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[Food.__table__, FoodNutrient.__table__])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def collection():
+    client = chromadb.EphemeralClient()
+    return client.create_collection(f"foods-{uuid.uuid4().hex}", metadata={"hnsw:space": "cosine"})
+
+
+_clock = [datetime(2025, 1, 1, tzinfo=timezone.utc)]
+
+
+def _tick():
+    _clock[0] += timedelta(minutes=5)
+    return _clock[0]
+
+
+def _add_food(db, food_id, name, calories, **kwargs):
+    now = _tick()
+    food = Food(id=food_id, name=name, food_group="Test", created_at=now, updated_at=now, **kwargs)
+    food.nutrients = [
+        FoodNutrient(nutrient_name="calories", unit="kcal", amount_per_100g=Decimal(calories)),
+        FoodNutrient(nutrient_name="protein", unit="g", amount_per_100g=Decimal("10")),
+    ]
+    db.add(food)
+    db.commit()
+    return food
+
+
+def _indexed_ids(collection):
+    return {m["food_id"] for m in collection.get(include=["metadatas"])["metadatas"]}
+
+
+class TestFoodIndexer:
+    def test_indexes_only_public_foods(self, db, collection):
+        _add_food(db, 1, "Grilled chicken", 165)
+        _add_food(db, 2, "My private stew", 200, owner_user_id=uuid.uuid4())
+        _add_food(db, 3, "Approved pho", 350, owner_user_id=uuid.uuid4(),
+                  is_contribution=True, contribution_status="approved")
+        _add_food(db, 4, "Pending soup", 90, owner_user_id=uuid.uuid4(),
+                  is_contribution=True, contribution_status="pending")
+
+        stats = FoodIndexer(db, collection, CountingEmbedder(), batch_size=2).sync()
+
+        assert _indexed_ids(collection) == {1, 3}
+        assert stats["scanned"] == 4
+        assert collection.metadata["food_metadata_version"] >= 2
+        meta = collection.get(where={"food_id": 1}, include=["metadatas"])["metadatas"][0]
+        assert meta["calories"] == 165.0
+        assert meta["category"] == "protein"
+
+    def test_second_run_embeds_nothing(self, db, collection):
+        _add_food(db, 1, "Grilled chicken", 165)
+        FoodIndexer(db, collection, CountingEmbedder()).sync()
+
+        embedder = CountingEmbedder()
+        stats = FoodIndexer(db, collection, embedder).sync(full=True)
+
+        assert embedder.embedded == []
+        assert stats["unchanged"] == 1
+
+    def test_changed_and_deleted_foods(self, db, collection):
+        chicken = _add_food(db, 1, "Grilled chicken", 165)
+        rice = _add_food(db, 2, "White rice", 130)
+        FoodIndexer(db, collection, CountingEmbedder()).sync()
+
+        chicken.name = "Grilled chicken thigh"
+        chicken.updated_at = _tick()
+        rice.deleted_at = rice.updated_at = _tick()
+        db.commit()
+
+        embedder = CountingEmbedder()
+        stats = FoodIndexer(db, collection, embedder).sync()
+
+        assert len(embedder.embedded) == 1
+        assert "thigh" in embedder.embedded[0]
+        assert stats["deleted"] == 1
+        assert _indexed_ids(collection) == {1}
+
+    def test_labels_version_change_updates_metadata_without_embedding(self, db, collection, monkeypatch):
+        from app.services.nutri_chatbot import food_index, food_labels
+
+        _add_food(db, 1, "Scrambled egg", 150)
+        FoodIndexer(db, collection, CountingEmbedder()).sync()
+        meta = collection.get(where={"food_id": 1}, include=["metadatas"])["metadatas"][0]
+        assert meta["meal_breakfast"] == food_labels.MEAL_PREFERRED
+        assert meta["labels_version"] == food_labels.FOOD_LABELS_VERSION
+
+        # Luật gán nhãn đổi → sync (không --full) vẫn quét lại, chỉ cập nhật metadata
+        monkeypatch.setattr(food_labels, "FOOD_LABELS_VERSION", 2)
+        monkeypatch.setattr(food_index, "FOOD_LABELS_VERSION", 2)
+        embedder = CountingEmbedder()
+        stats = FoodIndexer(db, collection, embedder).sync()
+
+        assert embedder.embedded == []
+        assert stats["metadata_updated"] == 1
+        assert collection.get(where={"food_id": 1}, include=["metadatas"])["metadatas"][0]["labels_version"] == 2
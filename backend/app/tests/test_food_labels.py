@@ -0,0 +1,65 @@
+"""
+Unit Tests cho food_labels: matcher Aho-Corasick + nhãn category / blacklist / độ hợp bữa
+"""
+from app.services.nutri_chatbot.food_labels import (
+    FOOD_LABELS_VERSION, MEAL_OK, MEAL_PREFERRED, MEAL_UNSUITABLE,
+    AhoCorasick, FoodLabels, food_labels,
+)
+from app.services.nutri_chatbot.rag_service import RAGService
+
+
+class TestAhoCorasick:
+    def test_finds_overlapping_and_nested_patterns(self):
+        matcher = AhoCorasick(["potato", "sweet potato", "egg", "eggplant", "he", "she", "hers"])
+        found = {matcher.patterns[i] for i in matcher.find("ushers eat sweet potato and eggplant")}
+        assert found == {"potato", "sweet potato", "egg", "eggplant", "he", "she", "hers"}
+
+    def test_no_match(self):
+        assert AhoCorasick(["abc"]).find("xyz ab bc") == set()
+
+
+class TestFoodLabels:
+    def test_category_and_flags(self):
+        assert food_labels("Chicken breast, roasted").category == "protein"
+        assert food_labels("Sweet potato, baked").category == "carbs"
+        assert food_labels("Broccoli, steamed").category == "veggie"
+        assert food_labels("Chicken fried rice").category == "mixed"
+        assert food_labels("Chocolate chip cookie").category == "snack"
+        assert food_labels("Babyfood, cereal, rice").is_blacklisted
+        assert food_labels("Salad dressing, ranch").is_false_veggie
+
+    def test_meal_fit(self):
+        egg = food_labels("Scrambled egg")
+        assert egg.fit("breakfast") == MEAL_PREFERRED
+        assert food_labels("Yogurt, plain").fit("breakfast") == MEAL_OK
+        assert food_labels("Steak and eggs").fit("breakfast") == MEAL_UNSUITABLE
+        # Bữa chính loại món ăn vặt dù có từ khóa include
+        assert food_labels("Chicken chips").fit("lunch") == MEAL_UNSUITABLE
+        assert food_labels("Chicken rice").fit("lunch") == MEAL_OK
+
+    def test_metadata_roundtrip_and_stale_version(self):
+        labels = food_labels("Grilled salmon")
+        metadata = labels.to_metadata()
+        assert FoodLabels.from_metadata(metadata) == labels
+        assert FoodLabels.from_metadata({**metadata, "labels_version": FOOD_LABELS_VERSION - 1}) is None
+        assert FoodLabels.from_metadata({"category": "protein"}) is None
+
+
+class TestFiltersUseLabels:
+    def _service(self):
+        service = RAGService.__new__(RAGService)
+        service._indexed_labels = {}
+        return service
+
+    def test_breakfast_puts_preferred_first(self):
+        foods = [{"id": 1, "name": "Yogurt"}, {"id": 2, "name": "Pizza"}, {"id": 3, "name": "Scrambled egg"}]
+        assert [f["id"] for f in self._service()._filter_by_meal_type(foods, "breakfast")] == [3, 1]
+
+    def test_indexed_labels_take_precedence_over_name(self):
+        service = self._service()
+        # Nhãn lưu trong metadata (VD được gán theo luật lúc index) được dùng thay vì tính lại từ tên
+        service._indexed_labels[1] = FoodLabels("veggie", False, False, (MEAL_OK,) * 4)
+        foods = [{"id": 1, "name": "Mystery dish"}, {"id": 2, "name": "Mystery stew"}]
+
+        assert service._filter_by_meal_type(foods, "dinner") == [foods[0]]
+        assert service._filter_by_food_category(foods, "veggie") == [foods[0]]
@@ -0,0 +1,125 @@
+"""
+Unit Tests cho autocomplete hashtag trong memory (HashtagIndex): xếp theo độ phổ biến,
+cập nhật chênh lệch khi tạo / sửa / xóa bài, nạp từ DB theo cửa sổ thời gian
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.models.blog import Hashtag, Post, PostHashtag
+from app.schemas.blog import PostCreateRequest, PostPatchRequest
+from app.services.admin.admin_blog_service import AdminBlogService
+from app.services.blog_hashtag_index import HashtagIndex, get_hashtag_index
+from app.services.blog_service import BlogService
+
+
+@pytest.fixture(autouse=True)
+def reset_hashtag_index():
+    get_hashtag_index().clear()
+    yield
+    get_hashtag_index().clear()
+
+
+def _names(response):
+    return [h.name for h in response.items]
+
+
+def _create(db, user_id, hashtags):
+    return BlogService.create_post(db, user_id, PostCreateRequest(
+        title="Thực đơn eat clean cả tuần", content_text="x" * 100, hashtags=hashtags
+    ))
+
+
+class TestHashtagIndex:
+    def test_ranks_by_weight_then_name(self):
+        index = HashtagIndex()
+        index.load([(1, "gym", 2), (2, "gymlife", 9), (3, "gymrat", 2), (4, "garden", 50), (5, "yoga", 1)])
+
+        assert index.search("gym", 10) == [(2, "gymlife"), (1, "gym"), (3, "gymrat")]
+        assert index.search("g", 2) == [(4, "garden"), (2, "gymlife")]
+        assert index.search("gymz") == []
+        assert index.search("") == []
+
+    def test_incremental_updates_refresh_cached_prefixes(self):
+        index = HashtagIndex()
+        index.load([(1, "gym", 3), (2, "gymlife", 2)])
+        assert index.search("gy") == [(1, "gym"), (2, "gymlife")]  # prefix ngắn → cache
+
+        # Bài mới dùng #gymlife và hashtag mới #gymtok
+        index.record_post_hashtags([(2, "gymlife"), (3, "gymtok")])
+        index.record_post_hashtags([(2, "gymlife"), (3, "gymtok")])
+        assert index.search("gy") == [(2, "gymlife"), (1, "gym"), (3, "gymtok")]
+
+        # Bài bỏ #gymlife, giữ #gymtok → chỉ gymlife giảm
+        index.record_post_hashtags([(3, "gymtok")], previous_ids=[2, 3])
+        assert index.search("gy") == [(1, "gym"), (2, "gymlife"), (3, "gymtok")]
+
+    def test_updates_before_first_load_are_ignored(self):
+        index = HashtagIndex()
+        index.record_post_hashtags([(1, "gym")])
+        assert not index.loaded
+
+
+class TestHashtagSearchService:
+    def test_search_serves_from_memory_after_first_load(self, db, statements, make_users):
+        (user_id,) = make_users(1)
+        _create(db, user_id, ["eatclean", "eatwell"])
+        _create(db, user_id, ["eatwell"])
+
+        assert _names(BlogService.search_hashtags(db, "#Eat")) == ["eatwell", "eatclean"]
+        statements.clear()
+        assert _names(BlogService.search_hashtags(db, "eatc")) == ["eatclean"]
+        assert statements == []
+
+    def test_post_writes_update_ranking(self, db, make_users):
+        (user_id,) = make_users(1)
+        first = _create(db, user_id, ["eatwell"])
+        assert _names(BlogService.search_hashtags(db, "eat")) == ["eatwell"]
+
+        _create(db, user_id, ["eatclean"])
+        second = _create(db, user_id, ["eatclean"])
+        assert _names(BlogService.search_hashtags(db, "eat")) == ["eatclean", "eatwell"]
+
+        BlogService.update_post(db, second.id, user_id, PostPatchRequest(hashtags=["eatwell", "eatlocal"]))
+        BlogService.delete_post(db, first.id, user_id)
+        # eatclean 1, eatwell 1 (+1 -1), eatlocal 1
+        ranked = _names(BlogService.search_hashtags(db, "eat"))
+        assert ranked == ["eatclean", "eatlocal", "eatwell"]
+
+        # Nạp lại từ DB phải ra cùng kết quả
+        get_hashtag_index().load_from_db(db)
+        assert _names(BlogService.search_hashtags(db, "eat")) == ranked
+
+    def test_admin_delete_updates_ranking(self, db, make_users):
+        (user_id,) = make_users(1)
+        _create(db, user_id, ["eatclean"])
+        removed = _create(db, user_id, ["eatwell"])
+        _create(db, user_id, ["eatwell"])
+        assert _names(BlogService.search_hashtags(db, "eat")) == ["eatwell", "eatclean"]
+
+        AdminBlogService.delete_post(db, removed.id, reason="spam", admin_id=user_id)
+        # eatwell còn 1 = eatclean → xếp theo tên
+        assert _names(BlogService.search_hashtags(db, "eat")) == ["eatclean", "eatwell"]
+
+    def test_load_counts_only_recent_live_usage(self, db, make_users):
+        (user_id,) = make_users(1)
+        old, recent = Hashtag(name="keto"), Hashtag(name="ketolife")
+        db.add_all([old, recent])
+        db.flush()
+        now = datetime.now(timezone.utc)
+        for i in range(3):
+            post = Post(user_id=user_id, content_text="x")
+            db.add(post)
+            db.flush()
+            db.add(PostHashtag(post_id=post.id, hashtag_id=old.id, created_at=now - timedelta(days=90)))
+        live = Post(user_id=user_id, content_text="x")
+        deleted = Post(user_id=user_id, content_text="x", deleted_at=now)
+        db.add_all([live, deleted])
+        db.flush()
+        db.add_all([
+            PostHashtag(post_id=live.id, hashtag_id=recent.id),
+            PostHashtag(post_id=deleted.id, hashtag_id=old.id),
+        ])
+        db.commit()
+
+        assert _names(BlogService.search_hashtags(db, "keto")) == ["ketolife", "keto"]
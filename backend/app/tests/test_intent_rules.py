@@ -0,0 +1,92 @@
+"""
+Unit Tests cho tầng phân loại intent local (rules + model n-gram)
+Không gọi Gemini
+"""
+import asyncio
+
+import pytest
+
+from app.services.nutri_chatbot import intent_classifier, llm_gateway
+from app.services.nutri_chatbot.intent_model import CharNgramNB, load_seed
+from app.services.nutri_chatbot.intent_rules import LocalIntentClassifier, extract_entities, match_rules
+
+
+@pytest.mark.parametrize("message, intent, entities", [
+    ("hi", "SOCIAL", {}),
+    ("Thank you so much!", "SOCIAL", {}),
+    ("How many calories in egg?", "FOOD_NUTRITION_INQUIRY", {"food_name": "egg", "nutrient": "calories"}),
+    ("Does fried rice have protein?", "FOOD_NUTRITION_INQUIRY", {"food_name": "fried rice", "nutrient": "protein"}),
+    ("Tell me nutrition info for beef pho", "FOOD_NUTRITION_INQUIRY", {"food_name": "beef pho"}),
+    ("Suggest foods under 300 calories", "CALORIE_BASED_RECOMMENDATION", {"target_calories": 300, "comparison": "under"}),
+    ("Find foods around 500 kcal", "CALORIE_BASED_RECOMMENDATION", {"target_calories": 500, "comparison": "around"}),
+    ("Low calorie foods", "CALORIE_BASED_RECOMMENDATION", {"target_calories": 200, "comparison": "under"}),
+    ("What should I eat for weight loss?", "GOAL_BASED_RECOMMENDATION", {"goal": "lose_weight"}),
+    ("Suggest foods for gym people", "GOAL_BASED_RECOMMENDATION", {"goal": "gain_muscle"}),
+    ("Suggest a meal plan for today", "MEAL_PLAN_REQUEST", {"duration": "daily"}),
+    ("Create a weekly meal plan for weight loss", "MEAL_PLAN_REQUEST", {"duration": "weekly", "goal": "lose_weight"}),
+    ("What should I eat for breakfast lunch and dinner?", "MEAL_PLAN_REQUEST", {"duration": "daily"}),
+    ("Plan my meals for 2000 calories today", "MEAL_PLAN_REQUEST", {"duration": "daily"}),
+    ("Suggest meals for the whole week", "MEAL_PLAN_REQUEST", {"duration": "weekly"}),
+    ("Daily meals for weight loss", "MEAL_PLAN_REQUEST", {"duration": "daily", "goal": "lose_weight"}),
+])
+def test_rules_match_prompt_examples(message, intent, entities):
+    result = match_rules(message)
+    assert result == {"intent": intent, "entities": entities}
+
+
+def test_calorie_request_mentioning_plan_falls_through():
+    # "plan" + calo nhưng không rõ là thực đơn → không tự quyết CALORIE_BASED_RECOMMENDATION
+    assert match_rules("suggest foods under 1800 calories for my plan") is None
+
+
+def test_calories_take_priority_over_goal():
+    result = match_rules("Suggest foods under 300 calories for weight loss")
+    assert result["intent"] == "CALORIE_BASED_RECOMMENDATION"
+
+
+def test_extract_entities():
+    entities = extract_entities("I want to lose some weight, dinner ideas above 600 kcal")
+    assert entities["goal"] == "lose_weight"
+    assert entities["meal_type"] == "dinner"
+    assert entities["target_calories"] == 600
+    assert entities["comparison"] == "above"
+
+
+class TestModel:
+    def test_shipped_artifact_matches_seed(self):
+        samples = load_seed()
+        model = LocalIntentClassifier().model
+
+        assert model is not None
+        correct = sum(1 for text, intent in samples if model.predict(text)[0] == intent)
+        assert correct / len(samples) >= 0.95
+
+    def test_round_trip(self, tmp_path):
+        model = CharNgramNB.train([("hello there", "SOCIAL"), ("meal plan for today", "MEAL_PLAN_REQUEST")])
+        path = tmp_path / "model.json"
+        model.save(str(path))
+
+        loaded = CharNgramNB.load(str(path))
+        assert loaded.predict("hello") == model.predict("hello")
+
+    @pytest.mark.parametrize("message", ["what is keto", "how do I log my weight", "egg"])
+    def test_ambiguous_messages_fall_through(self, message):
+        assert LocalIntentClassifier().classify(message) is None
+
+
+class TestIntentClassifierStages:
+    def test_local_stage_skips_llm(self, monkeypatch):
+        monkeypatch.setattr(llm_gateway, "_gateway", llm_gateway.LLMGateway(llm_gateway.FakeLLMBackend()))
+        classifier = intent_classifier.IntentClassifier()
+
+        def fail(*args, **kwargs):
+            raise AssertionError("LLM should not be called")
+
+        monkeypatch.setattr(classifier.llm, "generate", fail)
+        intent_classifier._stage_counts.clear()
+
+        result = asyncio.run(classifier.classify("thanks"))
+
+        assert result["intent"] == "SOCIAL"
+        assert result["stage"] == "rules"
+        assert intent_classifier.intent_stage_stats()["fast_path_ratio"] == 1.0
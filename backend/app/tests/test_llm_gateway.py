@@ -0,0 +1,162 @@
+"""
+Unit Tests cho LLMGateway: giới hạn đồng thời, hàng đợi fail-fast, retry, metrics
+Dùng FakeLLMBackend, không gọi Gemini
+"""
+import asyncio
+
+import pytest
+
+from app.core.settings import settings
+from app.services.nutri_chatbot.async_utils import StageTimeoutError
+from app.services.nutri_chatbot.llm_gateway import (
+    FakeLLMBackend,
+    GeminiBackend,
+    LLMGateway,
+    LLMQueueFullError,
+    LLMTransientError,
+    LLMUserLimitError,
+)
+
+
+class CountingBackend(FakeLLMBackend):
+    """Ghi lại số call chạy đồng thời cao nhất"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.active = 0
+        self.peak = 0
+
+    async def generate(self, prompt, model):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            return await super().generate(prompt, model)
+        finally:
+            self.active -= 1
+
+
+class FlakyBackend:
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    async def generate(self, prompt, model):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise LLMTransientError("503")
+        return "ok"
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+class TestConcurrency:
+    def test_caps_in_flight_calls(self):
+        backend = CountingBackend(latency=0.02)
+        gateway = LLMGateway(backend, max_concurrency=3, max_queue=100)
+
+        async def main():
+            return await asyncio.gather(*[gateway.generate("hi", timeout=1) for _ in range(12)])
+
+        results = _run(main())
+
+        assert len(results) == 12
+        assert backend.peak == 3
+        stats = gateway.stats()
+        assert stats["in_flight"] == 0 and stats["queue_depth"] == 0
+        assert stats["max_queue_depth"] == 9
+        assert stats["counters"]["requests"] == 12
+
+    def test_full_queue_fails_fast(self):
+        gateway = LLMGateway(FakeLLMBackend(latency=0.1), max_concurrency=1, max_queue=2)
+
+        async def main():
+            return await asyncio.gather(
+                *[gateway.generate("hi", timeout=1) for _ in range(5)],
+                return_exceptions=True
+            )
+
+        results = _run(main())
+        rejected = [r for r in results if isinstance(r, LLMQueueFullError)]
+
+        assert len(rejected) == 2
+        assert rejected[0].status_code == 503
+        assert gateway.stats()["counters"]["rejected_queue_full"] == 2
+
+    def test_queue_timeout(self):
+        gateway = LLMGateway(FakeLLMBackend(latency=0.2), max_concurrency=1, queue_timeout=0.05)
+
+        async def main():
+            return await asyncio.gather(
+                gateway.generate("a", timeout=1),
+                gateway.generate("b", timeout=1),
+                return_exceptions=True
+            )
+
+        first, second = _run(main())
+
+        assert isinstance(first, str)
+        assert isinstance(second, LLMQueueFullError)
+        assert gateway.stats()["counters"]["queue_timeouts"] == 1
+
+    def test_per_user_limit(self):
+        gateway = LLMGateway(FakeLLMBackend(latency=0.05), max_concurrency=10, per_user_concurrency=1)
+
+        async def main():
+            return await asyncio.gather(
+                gateway.generate("a", timeout=1, user_id=1),
+                gateway.generate("b", timeout=1, user_id=1),
+                gateway.generate("c", timeout=1, user_id=2),
+                return_exceptions=True
+            )
+
+        results = _run(main())
+
+        assert isinstance(results[1], LLMUserLimitError)
+        assert results[1].status_code == 429
+        assert isinstance(results[0], str) and isinstance(results[2], str)
+        assert gateway.stats()["active_users"] == 0
+
+
+class TestRetry:
+    def test_retries_transient_errors(self):
+        backend = FlakyBackend(failures=2)
+        gateway = LLMGateway(backend, max_retries=2, retry_base=0.001)
+
+        assert _run(gateway.generate("hi", timeout=1)) == "ok"
+        assert backend.calls == 3
+        assert gateway.stats()["counters"]["retries"] == 2
+
+    def test_gives_up_after_max_retries(self):
+        gateway = LLMGateway(FlakyBackend(failures=5), max_retries=1, retry_base=0.001)
+
+        with pytest.raises(LLMTransientError):
+            _run(gateway.generate("hi", timeout=1))
+        assert gateway.stats()["counters"]["errors"] == 1
+
+    def test_timeout_not_retried(self):
+        backend = FakeLLMBackend(latency=0.2)
+        gateway = LLMGateway(backend, max_retries=3)
+
+        with pytest.raises(StageTimeoutError):
+            _run(gateway.generate("hi", timeout=0.01, stage="generate"))
+        assert backend.calls == 1
+        assert gateway.stats()["counters"]["timeouts"] == 1
+
+
+def test_fake_backend_answers_classifier_prompts_with_json():
+    gateway = LLMGateway(FakeLLMBackend(latency=0))
+
+    assert _run(gateway.generate("TRẢ VỀ JSON", timeout=1)).startswith("{")
+    assert gateway.stats()["call_ms"]["p50"] >= 0
+
+
+class TestBackends:
+    def test_only_gemini_backend_requires_api_key(self, monkeypatch):
+        monkeypatch.setattr(settings, "GEMINI_API_KEY", None)
+
+        with pytest.raises(ValueError):
+            GeminiBackend()
+        gateway = LLMGateway(FakeLLMBackend(latency=0))
+        assert asyncio.run(gateway.generate("hi", timeout=1)) == FakeLLMBackend._default_response("hi")
@@ -0,0 +1,100 @@
+"""
+Unit Tests cho meal_optimizer: chọn món + khẩu phần deterministic theo MEAL_SPLIT
+"""
+import random
+
+from app.services.nutri_chatbot.meal_optimizer import (
+    BEAM_WIDTH,
+    MAX_PORTION_G,
+    MEAL_SPLIT,
+    MIN_PORTION_G,
+    PLATE_SPLIT,
+    optimize_meal,
+    plan_day,
+)
+
+
+def _food(food_id, calories, protein, carbs, fat, category="mixed"):
+    return {
+        "id": food_id, "food_id": food_id, "name": f"Food {food_id}", "category": category,
+        "calories": calories, "protein": protein, "carbs": carbs, "fat": fat,
+    }
+
+
+def _random_foods(rng, start, count, category):
+    foods = []
+    for i in range(count):
+        protein, carbs, fat = rng.uniform(0, 30), rng.uniform(0, 60), rng.uniform(0, 20)
+        foods.append(_food(start + i, round(protein * 4 + carbs * 4 + fat * 9, 1), protein, carbs, fat, category))
+    return foods
+
+
+def _candidates(per_slot, seed=7):
+    rng = random.Random(seed)
+    next_id = iter(range(0, 100000, 1000))
+    plate = lambda: {c: _random_foods(rng, next(next_id), per_slot, c) for c in PLATE_SPLIT}
+    return {
+        "breakfast": _random_foods(rng, next(next_id), per_slot, "mixed"),
+        "lunch": plate(),
+        "snack": _random_foods(rng, next(next_id), per_slot, "mixed"),
+        "dinner": plate(),
+    }
+
+
+class TestOptimizeMeal:
+    def test_hits_calorie_target(self):
+        slots = [
+            [_food(1, 165, 31, 0, 3.6, "protein"), _food(2, 250, 26, 0, 15, "protein")],
+            [_food(3, 130, 2.7, 28, 0.3, "carbs"), _food(4, 110, 2.6, 23, 0.9, "carbs")],
+            [_food(5, 35, 2.4, 7, 0.4, "veggie"), _food(6, 20, 1, 3.6, 0.2, "veggie")],
+        ]
+        result = optimize_meal(slots, 600, "maintain_weight", slot_shares=list(PLATE_SPLIT.values()))
+
+        assert len(result["items"]) == 3
+        assert abs(result["totals"]["calories"] - 600) < 60
+        assert result["combinations"] == 8
+        for item in result["items"]:
+            assert MIN_PORTION_G <= item["portion_g"] <= MAX_PORTION_G
+
+    def test_skips_empty_slots(self):
+        slots = [[_food(1, 165, 31, 0, 3.6, "protein")], [], [_food(5, 35, 2.4, 7, 0.4, "veggie")]]
+        result = optimize_meal(slots, 500, "lose_weight", slot_shares=[0.45, 0.35, 0.20])
+
+        assert [item["id"] for item in result["items"]] == [1, 5]
+
+    def test_all_slots_empty(self):
+        assert optimize_meal([[], []], 500, "lose_weight") is None
+
+    def test_excluded_ids_are_not_picked(self):
+        slot = [_food(1, 200, 10, 25, 6), _food(2, 150, 8, 20, 4)]
+        result = optimize_meal([slot], 300, "maintain_weight", exclude_ids={1})
+
+        assert result["items"][0]["id"] == 2
+
+
+class TestPlanDay:
+    def test_uses_meal_split_and_no_repeats(self):
+        plan = plan_day(_candidates(40), 2000, "gain_muscle")
+
+        assert list(plan) == list(MEAL_SPLIT)
+        for meal, share in MEAL_SPLIT.items():
+            assert plan[meal]["target"]["calories"] == round(2000 * share, 1)
+
+        ids = [item["id"] for meal in plan.values() for item in meal["items"]]
+        assert len(ids) == len(set(ids)) == 8
+
+    def test_deterministic(self):
+        candidates = _candidates(40)
+        assert plan_day(candidates, 1800, "lose_weight") == plan_day(candidates, 1800, "lose_weight")
+
+    def test_unknown_goal_uses_maintain_ratios(self):
+        candidates = _candidates(10)
+        assert plan_day(candidates, 1800, "unknown") == plan_day(candidates, 1800, "maintain_weight")
+
+    def test_beam_bounds_combinations_for_hundreds_of_candidates(self):
+        # 300 ứng viên / slot: không rút gọn thì bữa 3 món là 300³ tổ hợp
+        plan = plan_day(_candidates(300), 2000, "maintain_weight")
+
+        for meal, result in plan.items():
+            slots = len(PLATE_SPLIT) if meal in ("lunch", "dinner") else 1
+            assert result["combinations"] == BEAM_WIDTH ** slots
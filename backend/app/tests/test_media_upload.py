@@ -0,0 +1,246 @@
+"""
+Unit Tests cho MediaService upload: stream theo chunk, SDK chạy ngoài event loop,
+batch upload song song có giới hạn, khử trùng lặp theo SHA-256 + đếm tham chiếu
+Dùng ImageKit SDK thật với httpx.MockTransport (không gọi mạng)
+"""
+import asyncio
+import io
+import json
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+from fastapi import HTTPException, UploadFile
+from imagekitio import ImageKit
+from starlette.datastructures import Headers
+
+from app.core.settings import settings
+from app.models.blog import MediaBlob
+from app.schemas.blog import PostCreateRequest, PostMediaIn, PostPatchRequest
+from app.services import media_service
+from app.services.blog_service import BlogService
+from app.services.media_service import MediaService, purge_unused_media
+
+
+class FakeImageKitServer:
+    """Handler cho MockTransport: ghi lại request upload / delete"""
+
+    def __init__(self, delay: float = 0.0, fail_names=()):
+        self.delay = delay
+        self.fail_names = set(fail_names)
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.threads = []
+        self.deleted = []
+        self.bulk_deleted = []
+        self.uploaded = 0
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "DELETE":
+            self.deleted.append(request.url.path.rsplit("/", 1)[-1])
+            return httpx.Response(204)
+        if request.url.path.endswith("/batch/deleteByFileIds"):
+            file_ids = json.loads(request.read())["fileIds"]
+            self.bulk_deleted.append(file_ids)
+            return httpx.Response(200, json={"successfullyDeletedFileIds": file_ids})
+
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.threads.append(threading.current_thread().name)
+        try:
+            time.sleep(self.delay)
+            body = request.read()
+            # Tên trên ImageKit = "<uuid hex>_<tên gốc>"
+            name = re.search(rb'filename="[0-9a-f]{32}_(\w+)\.jpg"', body).group(1).decode()
+            if name in self.fail_names:
+                return httpx.Response(500, json={"message": "boom"})
+            with self.lock:
+                self.uploaded += 1
+            return httpx.Response(200, json={
+                "fileId": f"id-{name}", "name": f"{name}.jpg", "url": f"https://ik.test/{name}.jpg",
+                "width": 640, "height": 480,
+            })
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+class ChunkRecorder(io.BytesIO):
+    """File upload gốc, ghi lại kích thước mỗi lần đọc"""
+
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.reads = []
+
+    def read(self, size=-1):
+        self.reads.append(size)
+        return super().read(size)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    fake = FakeImageKitServer()
+    client = ImageKit(
+        private_key="test",
+        max_retries=0,
+        http_client=httpx.Client(transport=httpx.MockTransport(fake)),
+    )
+    monkeypatch.setattr(MediaService, "_imagekit", client)
+    return fake
+
+
+@pytest.fixture
+def blog_tables(blog_tables):
+    return (*blog_tables, MediaBlob)
+
+
+@pytest.fixture(autouse=True)
+def media_sessions(session_factory, monkeypatch):
+    # purge_unused_media mở session riêng → dùng cùng DB in-memory
+    monkeypatch.setattr(media_service, "SessionLocal", session_factory)
+
+
+def _upload(name: str, data: bytes, size="auto", content_type="image/jpeg") -> UploadFile:
+    return UploadFile(
+        file=ChunkRecorder(data),
+        size=len(data) if size == "auto" else size,
+        filename=f"{name}.jpg",
+        headers=Headers({"content-type": content_type}),
+    )
+
+
+def _refs(db):
+    db.expire_all()
+    return {blob.url: blob.ref_count for blob in db.query(MediaBlob).all()}
+
+
+class TestUploadFile:
+    def test_streams_in_chunks_off_event_loop(self, db, server):
+        data = b"\xff" * 300_000
+        upload = _upload("a", data)
+
+        result = asyncio.run(MediaService.upload_file(db, upload, user_id="u1"))
+
+        assert result["url"] == "https://ik.test/a.jpg" and result["file_id"] == "id-a"
+        assert result["size_bytes"] == len(data)
+        # Hash + httpx đọc từng chunk từ file upload gốc, không bao giờ read() toàn bộ
+        assert upload.file.reads and all(0 < n <= MediaService.HASH_CHUNK_SIZE for n in upload.file.reads)
+        assert server.threads == [server.threads[0]] and server.threads[0].startswith("media-upload")
+
+    def test_size_limit_enforced_before_upload(self, db, server, monkeypatch):
+        monkeypatch.setattr(MediaService, "MAX_IMAGE_SIZE", 1000)
+        # Không có size từ header → chỉ phát hiện được khi đọc
+        upload = _upload("a", b"x" * 5000, size=None)
+
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(MediaService.upload_file(db, upload, user_id="u1"))
+        assert error.value.status_code == 413
+        assert server.uploaded == 0
+
+
+class TestUploadMultiple:
+    def test_batch_runs_concurrently_up_to_limit(self, db, server, monkeypatch):
+        monkeypatch.setattr(settings, "MEDIA_UPLOAD_BATCH_CONCURRENCY", 2)
+        server.delay = 0.05
+        files = [_upload(n, n.encode() * 1000) for n in "abcdef"]
+
+        results = asyncio.run(MediaService.upload_multiple_files(db, files, user_id="u1"))
+
+        assert [r["file_id"] for r in results] == [f"id-{n}" for n in "abcdef"]
+        assert [r["sort_order"] for r in results] == list(range(6))
+        assert server.max_active == 2
+
+    def test_failed_batch_leaves_uploads_for_purge(self, db, server, monkeypatch):
+        server.fail_names = {"bad"}
+        files = [_upload("a", b"a" * 10), _upload("bad", b"x" * 10), _upload("b", b"b" * 10)]
+
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(MediaService.upload_multiple_files(db, files, user_id="u1"))
+
+        assert error.value.status_code == 500
+        # Không xóa ngay (file có thể đang được dùng chung), chưa bài nào gắn → job dọn
+        assert server.deleted == []
+        assert _refs(db) == {"https://ik.test/a.jpg": 0, "https://ik.test/b.jpg": 0}
+        monkeypatch.setattr(settings, "MEDIA_BLOB_UNUSED_GRACE_HOURS", 0)
+        assert purge_unused_media() == 2
+        assert sorted(sum(server.bulk_deleted, [])) == ["id-a", "id-b"]
+        assert _refs(db) == {}
+
+    def test_invalid_file_rejected_before_any_upload(self, db, server):
+        files = [_upload("a", b"x" * 10), _upload("b", b"x" * 10, content_type="text/plain")]
+
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(MediaService.upload_multiple_files(db, files, user_id="u1"))
+
+        assert error.value.status_code == 400
+        assert server.uploaded == 0
+
+
+class TestDeduplication:
+    def test_same_content_reuses_existing_file(self, db, server):
+        first = asyncio.run(MediaService.upload_file(db, _upload("a", b"same" * 1000), user_id="u1"))
+        again = asyncio.run(MediaService.upload_file(db, _upload("b", b"same" * 1000), user_id="u2"))
+        other = asyncio.run(MediaService.upload_file(db, _upload("c", b"diff" * 1000), user_id="u2"))
+
+        assert first["deduplicated"] is False and again["deduplicated"] is True
+        assert again["url"] == first["url"] and again["file_id"] == "id-a"
+        assert again["size_bytes"] == 4000 and again["width"] == 640
+        assert other["url"] == "https://ik.test/c.jpg"
+        assert server.uploaded == 2
+
+    def test_duplicates_within_batch_share_one_file(self, db, server):
+        server.delay = 0.02
+        files = [_upload("a", b"one" * 10), _upload("b", b"two" * 10), _upload("c", b"one" * 10)]
+
+        results = asyncio.run(MediaService.upload_multiple_files(db, files, user_id="u1"))
+
+        # a và c upload song song: bản ghi sau thua → bị xóa, dùng file của bản trước
+        assert results[0]["url"] == results[2]["url"]
+        assert len(_refs(db)) == 2
+        assert server.uploaded - len(server.deleted) == 2
+
+
+class TestReferenceCounting:
+    def _post(self, db, make_users, urls):
+        (user_id,) = make_users(1)
+        post = BlogService.create_post(db, user_id, PostCreateRequest(
+            title="Thực đơn eat clean cả tuần", content_text="x" * 100,
+            media=[PostMediaIn(url=url, media_type="image") for url in urls],
+        ))
+        return post, user_id
+
+    def test_refs_follow_post_media_and_purge_only_unused(self, db, server, monkeypatch, make_users):
+        a = asyncio.run(MediaService.upload_file(db, _upload("a", b"a" * 100), user_id="u1"))
+        b = asyncio.run(MediaService.upload_file(db, _upload("b", b"b" * 100), user_id="u1"))
+        first, author = self._post(db, make_users, [a["url"], b["url"], "https://elsewhere.test/x.jpg"])
+        self._post(db, make_users, [a["url"], a["url"]])
+        assert _refs(db) == {a["url"]: 3, b["url"]: 1}
+
+        # Bỏ ảnh b khỏi bài đầu
+        BlogService.update_post(db, first.id, author, PostPatchRequest(
+            media=[PostMediaIn(url=a["url"], media_type="image")]
+        ))
+        assert _refs(db) == {a["url"]: 3, b["url"]: 0}
+
+        # Còn trong thời gian ân hạn → giữ
+        assert purge_unused_media() == 0
+        monkeypatch.setattr(settings, "MEDIA_BLOB_UNUSED_GRACE_HOURS", 0)
+        assert purge_unused_media() == 1
+        assert server.bulk_deleted == [["id-b"]]
+        assert _refs(db) == {a["url"]: 3}
+
+    def test_reupload_within_grace_protects_unused_file(self, db, server):
+        asyncio.run(MediaService.upload_file(db, _upload("a", b"a" * 100), user_id="u1"))
+        db.query(MediaBlob).update({"last_used_at": datetime.now(timezone.utc) - timedelta(days=2)})
+        db.commit()
+
+        again = asyncio.run(MediaService.upload_file(db, _upload("a2", b"a" * 100), user_id="u2"))
+
+        assert again["deduplicated"] is True
+        assert purge_unused_media() == 0
+        assert server.bulk_deleted == []
@@ -0,0 +1,149 @@
+"""
+Unit Tests cho đếm người xem bài bằng HyperLogLog (PostViewBuffer): độ chính xác sketch,
+gộp nhiều worker không đếm trùng, view_count trên PostDetail / admin / trending
+Dùng SQLite in-memory
+"""
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from app.models.blog import Post, PostViewSketch
+from app.repositories.blog_repository import BlogRepository
+from app.services.admin.admin_dashboard_service import AdminDashboardService
+from app.services.blog_feed_cache import get_feed_page_cache
+from app.services.blog_service import BlogService
+from app.services.blog_views import PostViewBuffer, get_view_buffer
+from app.utils.hyperloglog import HyperLogLog, hash64
+
+
+@pytest.fixture
+def blog_tables(blog_tables):
+    return (*blog_tables, PostViewSketch)
+
+
+@pytest.fixture(autouse=True)
+def reset_view_buffer():
+    get_view_buffer().drain()
+    get_feed_page_cache().clear()
+    yield
+    get_view_buffer().drain()
+
+
+def _post(db, author):
+    post = BlogRepository.create_post(db, author, content_text="x" * 100)
+    db.commit()
+    return post
+
+
+class TestHyperLogLog:
+    @pytest.mark.parametrize("n", [10, 1000, 50_000])
+    def test_estimate_within_error_bound(self, n):
+        sketch = HyperLogLog()
+        sketch.update(hash64(uuid.UUID(int=i).bytes) for i in range(n))
+        # precision 10: sai số chuẩn ~3.3%, cho phép 3 sigma
+        assert abs(sketch.count() - n) <= max(1, 0.1 * n)
+
+    def test_merge_is_union_and_round_trips(self):
+        a, b = HyperLogLog(), HyperLogLog()
+        a.update(hash64(str(i).encode()) for i in range(0, 3000))
+        b.update(hash64(str(i).encode()) for i in range(2000, 5000))
+
+        union = HyperLogLog.from_bytes(a.to_bytes())
+        assert union.merge(b)
+        assert not union.merge(a)  # a đã nằm trong union
+        assert abs(union.count() - 5000) <= 500
+        assert HyperLogLog.from_bytes(union.to_bytes()).registers == union.registers
+        assert HyperLogLog.from_bytes(None).count() == 0
+
+
+class TestPostViewBuffer:
+    def test_sparse_entries_switch_to_dense_sketch(self):
+        buffer = PostViewBuffer()
+        viewers = [uuid.uuid4() for _ in range(PostViewBuffer.SPARSE_LIMIT + 10)]
+        for viewer in viewers[:3] * 5:
+            buffer.record(1, viewer)
+        for viewer in viewers:
+            buffer.record(2, viewer)
+
+        assert isinstance(buffer._pending[1], set) and len(buffer._pending[1]) == 3
+        assert isinstance(buffer._pending[2], HyperLogLog)
+        sketches = buffer.drain()
+        assert sketches[1].count() == 3
+        assert abs(sketches[2].count() - len(viewers)) <= 5
+
+    def test_workers_merge_without_double_counting(self, db, make_users):
+        author, *viewers = make_users(41)
+        post = _post(db, author)
+        worker_a, worker_b = PostViewBuffer(), PostViewBuffer()
+        for viewer in viewers[:30]:
+            worker_a.record(post.id, viewer)
+        for viewer in viewers[10:]:
+            worker_b.record(post.id, viewer)
+
+        assert worker_a.flush(db) == 1
+        assert worker_b.flush(db) == 1
+        db.expire_all()
+        view_count = db.get(Post, post.id).view_count
+        assert abs(view_count - 40) <= 2  # 40 người, 20 người xem ở cả 2 worker
+
+        # Người xem cũ xem lại → không đổi, không ghi posts
+        worker_a.record(post.id, viewers[0])
+        assert worker_a.flush(db) == 0
+        assert db.get(Post, post.id).view_count == view_count
+
+    def test_failed_flush_restores_viewers(self, db, monkeypatch, make_users):
+        author, viewer = make_users(2)
+        post = _post(db, author)
+        buffer = PostViewBuffer()
+        buffer.record(post.id, viewer)
+
+        def boom(*args, **kwargs):
+            raise RuntimeError("db down")
+
+        monkeypatch.setattr(BlogRepository, "merge_view_sketches", boom)
+        with pytest.raises(RuntimeError):
+            buffer.flush(db)
+        monkeypatch.undo()
+
+        assert buffer.flush(db) == 1
+        db.expire_all()
+        assert db.get(Post, post.id).view_count == 1
+
+    def test_deleted_post_is_skipped(self, db):
+        buffer = PostViewBuffer()
+        buffer.record(12345, uuid.uuid4())
+        assert buffer.flush(db) == 0
+        assert db.query(PostViewSketch).count() == 0
+
+
+class TestViewCountExposure:
+    def test_detail_counts_other_viewers_after_flush(self, db, make_users):
+        author, alice, bob = make_users(3)
+        post = _post(db, author)
+        before = db.get(Post, post.id).trending_score
+
+        BlogService.get_post(db, post.id, author)  # tác giả không tính
+        BlogService.get_post(db, post.id, alice)
+        BlogService.get_post(db, post.id, alice)
+        assert BlogService.get_post(db, post.id, bob).view_count == 0  # chưa flush
+
+        get_view_buffer().flush(db)
+        db.expire_all()
+        detail = BlogService.get_post(db, post.id, alice)
+        assert detail.view_count == 2
+        assert db.get(Post, post.id).trending_score > before
+
+    def test_admin_blog_stats_include_views(self, db, make_users):
+        author, *viewers = make_users(6)
+        popular, quiet = _post(db, author), _post(db, author)
+        buffer = get_view_buffer()
+        for viewer in viewers:
+            buffer.record(popular.id, viewer)
+        buffer.record(quiet.id, viewers[0])
+        buffer.flush(db)
+
+        stats = AdminDashboardService.get_blog_stats(db, datetime(2020, 1, 1, tzinfo=timezone.utc), top_n=2)
+
+        assert stats.total_views == 6
+        assert [(p.post_id, p.view_count) for p in stats.top_viewed_posts] == [(popular.id, 5), (quiet.id, 1)]
@@ -0,0 +1,166 @@
+"""
+Unit Tests cho RAGService: lọc calo/category/blacklist bằng metadata Chroma
+Dùng Chroma in-memory + embedding giả, không gọi Gemini/Postgres
+"""
+import asyncio
+import uuid
+from decimal import Decimal
+
+import chromadb
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.models.base import Base
+from app.models.food import Food, FoodNutrient
+from app.services.nutri_chatbot import rag_service as rag_module
+from app.services.nutri_chatbot.database_adapter import DatabaseAdapter
+from app.services.nutri_chatbot.rag_service import FOOD_METADATA_VERSION, RAGService
+
+
+FOODS = [
+    # id, name, calories
+    (1, "Grilled chicken breast", 165),
+    (2, "Baby food, chicken dinner", 70),
+    (3, "Beef steak", 270),
+    (4, "Steamed broccoli", 35),
+    (5, "Salad dressing, ranch", 430),
+    (6, "White rice, cooked", 130),
+    (7, "Fried chicken with rice", 480),
+]
+
+
+def _metadata(food_id, name, calories):
+    return {
+        "food_id": food_id,
+        "food_group": "Other",
+        "calories": float(calories),
+        "protein": 0.0,
+        "carbs": 0.0,
+        "fat": 0.0,
+        "category": RAGService._detect_food_category(name),
+        "is_blacklisted": RAGService._is_blacklisted(name),
+        "is_false_veggie": RAGService._is_false_veggie(name),
+    }
+
+
+def _make_service(monkeypatch, with_metadata=True):
+    client = chromadb.EphemeralClient()
+    collection = client.create_collection(
+        f"foods-{uuid.uuid4().hex}",
+        metadata={"food_metadata_version": FOOD_METADATA_VERSION if with_metadata else 1},
+    )
+    collection.add(
+        ids=[str(food_id) for food_id, _, _ in FOODS],
+        embeddings=[[1.0, float(food_id) / 10, 0.0] for food_id, _, _ in FOODS],
+        metadatas=[
+            _metadata(*food) if with_metadata else {"food_id": food[0]}
+            for food in FOODS
+        ],
+    )
+    monkeypatch.setattr(rag_module, "_get_foods_collection", lambda: collection)
+
+    service = RAGService(db=None)
+    rows = {food_id: {"id": food_id, "food_id": food_id, "name": name, "group": "Other",
+                      "calories": cal, "protein": 0, "fat": 0, "carbs": 0}
+            for food_id, name, cal in FOODS}
+
+    loaded = []
+
+    def load_foods(food_ids):
+        loaded.append(list(food_ids))
+        return {i: rows[i] for i in food_ids}
+
+    async def embed(text):
+        return [1.0, 0.0, 0.0]
+
+    monkeypatch.setattr(service, "_load_foods", load_foods)
+    monkeypatch.setattr(service, "_generate_query_embedding", embed)
+    return service, loaded
+
+
+class TestBuildWhere:
+    def test_around_calorie_range_and_category(self, monkeypatch):
+        service, _ = _make_service(monkeypatch)
+        where = service._build_where(400, "around", "protein")
+
+        assert {"is_blacklisted": False} in where["$and"]
+        assert {"calories": {"$lte": 500}} in where["$and"]
+        assert {"calories": {"$gte": 300}} in where["$and"]
+        assert {"category": {"$in": ["protein", "mixed"]}} in where["$and"]
+
+    def test_veggie_excludes_false_veggie(self, monkeypatch):
+        service, _ = _make_service(monkeypatch)
+        where = service._build_where(100, "under", "veggie")
+
+        assert {"category": "veggie"} in where["$and"]
+        assert {"is_false_veggie": False} in where["$and"]
+
+
+class TestPrefilteredSearch:
+    def test_filters_run_inside_chroma(self, monkeypatch):
+        service, loaded = _make_service(monkeypatch)
+
+        foods = asyncio.run(service.search_by_goal_and_calories(
+            goal="maintain_weight", target_calories=200, meal_type=None,
+            food_category="protein", comparison="around", top_k=2,
+        ))
+
+        # Chỉ hydrate các món đã qua bộ lọc metadata (không lấy dư rồi bỏ)
+        assert loaded and set(loaded[0]) <= {1, 3}
+        assert {f["id"] for f in foods} <= {1, 3}
+        assert all(f["category"] == "protein" for f in foods)
+
+    def test_blacklist_applied_by_default(self, monkeypatch):
+        service, loaded = _make_service(monkeypatch)
+
+        foods = asyncio.run(service.search_foods("chicken", top_k=10, randomize=False))
+
+        assert 2 not in loaded[0]
+        assert 2 not in {f["id"] for f in foods}
+
+    def test_legacy_collection_falls_back_to_python_filters(self, monkeypatch):
+        service, loaded = _make_service(monkeypatch, with_metadata=False)
+        assert service.has_metadata_filters is False
+
+        foods = asyncio.run(service.search_by_goal_and_calories(
+            goal="maintain_weight", target_calories=200, meal_type=None,
+            food_category="protein", comparison="around", top_k=2,
+        ))
+
+        assert len(loaded[0]) == len(FOODS)
+        assert {f["id"] for f in foods} <= {1, 3}
+
+
+class TestHydration:
+    def test_single_query_for_all_hits(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine, tables=[Food.__table__, FoodNutrient.__table__])
+        db = sessionmaker(bind=engine)()
+        for food_id, name, calories in FOODS:
+            food = Food(id=food_id, name=name, food_group="Test")
+            food.nutrients = [
+                FoodNutrient(nutrient_name="Calories", unit="kcal", amount_per_100g=Decimal(calories)),
+                FoodNutrient(nutrient_name="protein", unit="g", amount_per_100g=Decimal("12.5")),
+            ]
+            db.add(food)
+        db.commit()
+        db.expire_all()
+
+        statements = []
+        event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+        records = DatabaseAdapter(db).load_macro_records([1, 3, 4, 99])
+
+        assert len(statements) == 1
+        assert set(records) == {1, 3, 4}
+        assert records[3]["calories"] == 270.0
+        assert records[3]["protein"] == 12.5
+        assert records[3]["fat"] == 0.0
+
+    def test_results_keep_vector_distance_order(self, monkeypatch):
+        service, _ = _make_service(monkeypatch)
+
+        foods = asyncio.run(service.search_foods("food", top_k=10, randomize=False))
+        similarities = [f["similarity"] for f in foods]
+
+        assert similarities == sorted(similarities, reverse=True)
@@ -0,0 +1,108 @@
+"""
+Unit Tests cho ResponseCache: key chuẩn hóa, TTL/purge, semantic lookup và
+ChatbotService bỏ qua RAG + LLM khi hit
+"""
+import asyncio
+import uuid
+
+import chromadb
+
+from app.core.settings import settings
+from app.services.nutri_chatbot import llm_gateway
+from app.services.nutri_chatbot import rag_service as rag_module
+from app.services.nutri_chatbot import response_cache as response_cache_module
+from app.services.nutri_chatbot.chatbot_service import ChatbotService
+from app.services.nutri_chatbot.llm_gateway import FakeLLMBackend, LLMGateway
+from app.services.nutri_chatbot.response_cache import ResponseCache
+
+
+RESPONSE = {"response": "Trứng: 155 kcal", "intent": "FOOD_NUTRITION_INQUIRY", "data": [{"id": 1}]}
+
+
+def _embed_from(vectors):
+    async def embed(text):
+        return vectors[text]
+    return embed
+
+
+class TestKeys:
+    def test_equivalent_entities_share_key(self):
+        a = ResponseCache.make_key("FOOD_NUTRITION_INQUIRY", {"food_name": "an  Egg"})
+        b = ResponseCache.make_key("FOOD_NUTRITION_INQUIRY", {"food_name": "egg", "nutrient": "all"})
+        assert a == b
+
+    def test_locale_and_nutrient_split_keys(self):
+        base = ResponseCache.make_key("FOOD_NUTRITION_INQUIRY", {"food_name": "egg", "nutrient": "calories"})
+        assert base != ResponseCache.make_key("FOOD_NUTRITION_INQUIRY", {"food_name": "egg", "nutrient": "protein"})
+        assert base != ResponseCache.make_key("FOOD_NUTRITION_INQUIRY", {"food_name": "egg", "nutrient": "calories"}, locale="en")
+
+
+class TestLookup:
+    def test_exact_hit_and_purge_by_intent(self):
+        cache = ResponseCache()
+        egg = ResponseCache.make_key("FOOD_NUTRITION_INQUIRY", {"food_name": "egg"})
+        calories = ResponseCache.make_key("CALORIE_BASED_RECOMMENDATION", {"target_calories": 300, "comparison": "under"})
+        cache.store(egg, RESPONSE)
+        cache.store(calories, RESPONSE)
+
+        assert asyncio.run(cache.lookup(egg))[0] == RESPONSE
+        assert cache.purge("FOOD_NUTRITION_INQUIRY") == 1
+        assert asyncio.run(cache.lookup(egg))[0] is None
+        assert asyncio.run(cache.lookup(calories))[0] == RESPONSE
+        assert cache.purge() == 1
+
+    def test_semantic_hit_within_partition(self):
+        cache = ResponseCache(semantic_threshold=0.9)
+        embed = _embed_from({"boiled egg": [1.0, 0.1, 0.0], "boiled eggs": [1.0, 0.12, 0.0], "beef": [0.0, 0.0, 1.0]})
+
+        key = ResponseCache.make_key("FOOD_NUTRITION_INQUIRY", {"food_name": "boiled egg"})
+        response, vector = asyncio.run(cache.lookup(key, embed))
+        assert response is None
+        cache.store(key, RESPONSE, vector)
+
+        paraphrase = ResponseCache.make_key("FOOD_NUTRITION_INQUIRY", {"food_name": "boiled eggs"})
+        assert asyncio.run(cache.lookup(paraphrase, embed))[0] == RESPONSE
+        assert cache.stats()["semantic_hits"] == 1
+
+        other = ResponseCache.make_key("FOOD_NUTRITION_INQUIRY", {"food_name": "beef"})
+        assert asyncio.run(cache.lookup(other, embed))[0] is None
+
+        # Khác nutrient = khác partition → không hit semantic
+        protein = ResponseCache.make_key("FOOD_NUTRITION_INQUIRY", {"food_name": "boiled eggs", "nutrient": "protein"})
+        assert asyncio.run(cache.lookup(protein, embed))[0] is None
+
+    def test_semantic_disabled_by_default(self):
+        cache = ResponseCache()
+        key = ResponseCache.make_key("FOOD_NUTRITION_INQUIRY", {"food_name": "egg"})
+
+        async def embed(text):
+            raise AssertionError("should not embed")
+
+        assert asyncio.run(cache.lookup(key, embed)) == (None, None)
+
+
+class TestChatbotIntegration:
+    def test_cached_response_skips_rag_and_llm(self, monkeypatch):
+        collection = chromadb.EphemeralClient().create_collection(f"foods-{uuid.uuid4().hex}")
+        monkeypatch.setattr(rag_module, "_get_foods_collection", lambda: collection)
+        backend = FakeLLMBackend(latency=0, responder=lambda prompt: "Gợi ý: cơm gà")
+        monkeypatch.setattr(llm_gateway, "_gateway", LLMGateway(backend))
+        monkeypatch.setattr(response_cache_module, "_response_cache", ResponseCache())
+        monkeypatch.setattr(settings, "GEMINI_API_KEY", "test")
+
+        chatbot = ChatbotService(db=None, user_id=1)
+        searches = []
+
+        async def search_by_calories(**kwargs):
+            searches.append(kwargs)
+            return [{"id": 1, "name": "Chicken rice", "calories": 280, "protein": 20, "carbs": 30, "fat": 8}]
+
+        monkeypatch.setattr(chatbot.rag_service, "search_by_calories", search_by_calories)
+
+        first = asyncio.run(chatbot.chat("suggest foods under 300 calories"))
+        second = asyncio.run(chatbot.chat("Suggest  foods under 300 calories!"))
+
+        assert first["intent"] == second["intent"] == "CALORIE_BASED_RECOMMENDATION"
+        assert second["response"] == first["response"]
+        assert len(searches) == 1
+        assert backend.calls == 1
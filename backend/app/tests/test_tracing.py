@@ -0,0 +1,95 @@
+"""
+Unit Tests cho tracing: span/trace theo request, histogram + Prometheus text,
+timings gắn vào response của chatbot ở debug mode
+"""
+import asyncio
+import time
+import uuid
+
+import chromadb
+
+from app.core.settings import settings
+from app.services.nutri_chatbot import llm_gateway
+from app.services.nutri_chatbot import rag_service as rag_module
+from app.services.nutri_chatbot import tracing
+from app.services.nutri_chatbot.chatbot_service import ChatbotService
+from app.services.nutri_chatbot.llm_gateway import FakeLLMBackend, LLMGateway
+from app.services.nutri_chatbot.tracing import StageHistograms, span, start_trace
+
+
+class TestStageHistograms:
+    def test_buckets_and_quantiles(self):
+        histograms = StageHistograms(buckets=(1, 10, 100))
+        for ms in (0.5, 5, 5, 50, 500):
+            histograms.observe("embed", ms)
+
+        stats = histograms.stats()["embed"]
+        assert stats["count"] == 5
+        assert stats["sum_ms"] == 560.5
+        assert stats["p50_ms"] == 10
+        assert stats["p95_ms"] == float("inf")
+
+    def test_prometheus_buckets_are_cumulative(self):
+        histograms = StageHistograms(buckets=(1, 10))
+        histograms.observe("generate", 0.5)
+        histograms.observe("generate", 5)
+        histograms.observe("generate", 10)
+
+        text = histograms.render_prometheus()
+        assert 'chatbot_stage_duration_seconds_bucket{stage="generate",le="0.001"} 1' in text
+        assert 'chatbot_stage_duration_seconds_bucket{stage="generate",le="0.01"} 3' in text
+        assert 'chatbot_stage_duration_seconds_bucket{stage="generate",le="+Inf"} 3' in text
+        assert 'chatbot_stage_duration_seconds_count{stage="generate"} 3' in text
+
+
+class TestTrace:
+    def test_spans_from_worker_threads_reach_request_trace(self):
+        def blocking():
+            with span("hydrate"):
+                time.sleep(0.01)
+
+        async def request():
+            with start_trace() as trace:
+                await asyncio.gather(asyncio.to_thread(blocking), asyncio.to_thread(blocking))
+            return trace
+
+        trace = asyncio.run(request())
+        assert trace.stages["hydrate"][1] == 2
+        assert trace.stage_ms()["hydrate"] >= 20
+
+    def test_span_outside_trace_only_feeds_histogram(self, monkeypatch):
+        histograms = StageHistograms()
+        monkeypatch.setattr(tracing, "_histograms", histograms)
+
+        with span("filter"):
+            pass
+
+        assert tracing.current_trace() is None
+        assert histograms.stats()["filter"]["count"] == 1
+
+
+class TestChatbotTimings:
+    def _chatbot(self, monkeypatch):
+        collection = chromadb.EphemeralClient().create_collection(f"foods-{uuid.uuid4().hex}")
+        monkeypatch.setattr(rag_module, "_get_foods_collection", lambda: collection)
+        monkeypatch.setattr(llm_gateway, "_gateway", LLMGateway(FakeLLMBackend(latency=0, responder=lambda p: "Chào bạn!")))
+        monkeypatch.setattr(settings, "GEMINI_API_KEY", "test")
+        return ChatbotService(db=None, user_id=1)
+
+    def test_debug_mode_attaches_timings(self, monkeypatch, capsys):
+        monkeypatch.setattr(settings, "CHATBOT_DEBUG_TIMINGS", True)
+
+        result = asyncio.run(self._chatbot(monkeypatch).chat("hello"))
+
+        assert set(result["timings"]) >= {"classify", "generate", "total"}
+        assert result["timings"]["generate"]["count"] == 1
+        assert result["timings"]["total"]["ms"] >= result["timings"]["generate"]["ms"]
+        # Hot path không print gì
+        assert capsys.readouterr().out == ""
+
+    def test_timings_hidden_by_default(self, monkeypatch):
+        monkeypatch.setattr(settings, "CHATBOT_DEBUG_TIMINGS", False)
+
+        result = asyncio.run(self._chatbot(monkeypatch).chat("hello"))
+
+        assert "timings" not in result
@@ -0,0 +1,98 @@
+"""
+Unit Tests cho cache dịch / nhận diện ngôn ngữ của chatbot
+langdetect và Google Translate được thay bằng hàm giả đếm số lần gọi
+"""
+import threading
+import time
+
+import pytest
+
+from app.services.nutri_chatbot import translate_service
+from app.services.nutri_chatbot.translate_service import TranslateService, detect_language
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = {"detect": 0, "translate": 0}
+
+    def fake_detect(text):
+        calls["detect"] += 1
+        return "vi"
+
+    class FakeTranslator:
+        def translate(self, text):
+            calls["translate"] += 1
+            return f"en:{text}"
+
+    monkeypatch.setattr(translate_service, "detect", fake_detect)
+    monkeypatch.setattr(translate_service, "_translator", FakeTranslator())
+    translate_service._language_cache.clear()
+    translate_service._translation_cache.clear()
+    return calls
+
+
+class TestDetectLanguage:
+    def test_ascii_skips_langdetect(self, calls):
+        assert detect_language("how many calories in an egg") == "en"
+        assert calls["detect"] == 0
+
+    def test_vietnamese_marks_skip_langdetect(self, calls):
+        assert detect_language("bữa sáng nhiều đạm") == "vi"
+        assert detect_language("thịt bò") == "vi"
+        assert calls["detect"] == 0
+
+    def test_ambiguous_text_is_detected_once(self, calls):
+        detect_language("cà phê")
+        detect_language("Cà  phê")
+        assert calls["detect"] == 1
+
+
+class TestTranslateCache:
+    def test_shared_across_instances(self, calls):
+        first = TranslateService().translate_to_english("món ăn ít calo")
+        second = TranslateService().translate_to_english("món ăn ít calo")
+
+        assert first == second == "en:món ăn ít calo"
+        assert calls["translate"] == 1
+        assert translate_service.translation_cache_stats()["translation"]["hits"] == 1
+
+    def test_translate_cached_needs_no_network(self, calls):
+        service = TranslateService()
+        assert service.translate_cached("egg") == "egg"
+        assert service.translate_cached("trứng gà") is None
+
+        service.translate_to_english("trứng gà")
+        assert service.translate_cached("trứng gà") == "en:trứng gà"
+
+
+class TestConcurrentTranslate:
+    def test_threads_do_not_share_translator_state(self, monkeypatch):
+        # Giống deep_translator: translate() lưu text vào instance rồi mới "gửi request"
+        class StatefulTranslator:
+            def __init__(self, source, target):
+                self._text = None
+
+            def translate(self, text):
+                self._text = text
+                time.sleep(0.01)
+                return f"en:{self._text}"
+
+        monkeypatch.setattr(translate_service, "GoogleTranslator", StatefulTranslator)
+        monkeypatch.setattr(translate_service, "_thread_local", threading.local())
+        translate_service._translation_cache.clear()
+
+        texts = [f"món số {i} ít đường" for i in range(8)]
+        results = {}
+        barrier = threading.Barrier(len(texts))
+
+        def worker(text):
+            barrier.wait()
+            results[text] = TranslateService().translate_to_english(text)
+
+        threads = [threading.Thread(target=worker, args=(t,)) for t in texts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == {text: f"en:{text}" for text in texts}
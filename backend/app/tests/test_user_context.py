@@ -0,0 +1,101 @@
+"""
+Unit Tests cho UserContextService: snapshot cache + invalidate khi biometrics/goal đổi
+Dùng SQLite in-memory
+"""
+import uuid
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import BigInteger, create_engine, event
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+from app.models.auth import Goal, Profile, User
+from app.models.base import Base
+from app.models.biometric import BiometricsLog
+from app.schemas.biometric import BiometricsCreateRequest
+from app.services.biometric_service import BiometricService
+from app.services.user_context_service import UserContextService
+
+
+@compiles(BigInteger, "sqlite")
+def _bigint_as_integer(type_, compiler, **kw):
+    # SQLite chỉ tự tăng PK kiểu INTEGER
+    return "INTEGER"
+
+
+@pytest.fixture
+def db_and_statements():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(
+        engine,
+        tables=[User.__table__, Profile.__table__, Goal.__table__, BiometricsLog.__table__]
+    )
+    db = sessionmaker(bind=engine)()
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    yield db, statements
+    db.close()
+
+
+def _create_user(db, with_goal=True):
+    user_id = uuid.uuid4()
+    db.add(User(id=user_id, username=f"u{user_id.hex[:8]}", email=f"{user_id.hex[:8]}@x.com", password_hash="x"))
+    db.add(Profile(user_id=user_id, full_name="Nguyen Van A", gender="male",
+                   date_of_birth=date(2000, 1, 1), height_cm_default=Decimal("170")))
+    if with_goal:
+        db.add(Goal(user_id=user_id, goal_type="lose_weight", daily_calorie_target=Decimal("1800"),
+                    weekly_exercise_min=150))
+    db.add(BiometricsLog(user_id=user_id, logged_at=datetime(2025, 1, 1, tzinfo=timezone.utc),
+                         weight_kg=Decimal("70"), height_cm=Decimal("170")))
+    db.commit()
+    UserContextService.invalidate(user_id)
+    return user_id
+
+
+class TestUserContextSnapshot:
+    def test_second_read_does_not_query(self, db_and_statements):
+        db, statements = db_and_statements
+        user_id = _create_user(db)
+        statements.clear()
+
+        first = UserContextService.get_snapshot(db, user_id)
+        queries = len(statements)
+        second = UserContextService.get_snapshot(db, user_id)
+
+        assert queries == 2
+        assert len(statements) == queries
+        assert first == second
+        assert first["goal_type"] == "lose_weight"
+        assert first["daily_calorie_target"] == 1800.0
+        assert first["weekly_exercise_min"] == 150
+        assert first["weight_kg"] == 70.0
+        assert UserContextService.get_cached(user_id) == first
+
+    def test_snapshot_is_a_copy(self, db_and_statements):
+        db, _ = db_and_statements
+        user_id = _create_user(db)
+
+        UserContextService.get_snapshot(db, user_id)["goal_type"] = "hacked"
+
+        assert UserContextService.get_cached(user_id)["goal_type"] == "lose_weight"
+
+    def test_new_biometrics_invalidate_snapshot(self, db_and_statements):
+        db, _ = db_and_statements
+        user_id = _create_user(db, with_goal=False)
+        assert UserContextService.get_snapshot(db, user_id)["weight_kg"] == 70.0
+
+        BiometricService.create_biometrics_log(db, user_id, BiometricsCreateRequest(
+            logged_at=datetime(2025, 2, 1, tzinfo=timezone.utc), weight_kg=68.0, height_cm=170.0
+        ))
+
+        assert UserContextService.get_cached(user_id) is None
+        assert UserContextService.get_snapshot(db, user_id)["weight_kg"] == 68.0
+
+    def test_unknown_user(self, db_and_statements):
+        db, _ = db_and_statements
+        missing = uuid.uuid4()
+
+        assert UserContextService.get_snapshot(db, missing) is None
+        assert UserContextService.get_cached(missing) is None
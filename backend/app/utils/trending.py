@@ -0,0 +1,53 @@
+"""
+Điểm trending có giảm dần theo thời gian (kiểu "hot" của Reddit) cho feed blog.
+
+score = log10(1 + like_count + save_count + view_weight * view_count) + (created_at - TRENDING_EPOCH) / decay
+
+Phần thời gian tăng đều theo created_at thay vì giảm theo tuổi bài, nên điểm của 1 bài
+không đổi khi thời gian trôi: chỉ cần tính lại khi like/save/view thay đổi, và thứ tự giữa
+các bài luôn đúng. Bài mới hơn `decay_hours` giờ cần ít hơn 10 lần tương tác để đứng ngang.
+"""
+import math
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.core.settings import settings
+
+
+# Mốc thời gian của phần decay (giữ số nhỏ để float đủ chính xác)
+TRENDING_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def trending_score(
+    like_count: int,
+    save_count: int,
+    created_at: datetime,
+    decay_hours: Optional[float] = None,
+    view_count: int = 0
+) -> float:
+    """
+    Tính điểm trending của 1 bài
+
+    Args:
+        like_count, save_count: Bộ đếm hiện tại
+        created_at: Thời điểm tạo bài (naive được coi là UTC)
+        decay_hours: Mặc định BLOG_TRENDING_DECAY_HOURS
+        view_count: Số người xem khác nhau, nhân BLOG_TRENDING_VIEW_WEIGHT
+
+    Examples:
+        >>> trending_score(0, 0, TRENDING_EPOCH)
+        0.0
+        >>> trending_score(9, 0, TRENDING_EPOCH)
+        1.0
+    """
+    if decay_hours is None:
+        decay_hours = settings.BLOG_TRENDING_DECAY_HOURS
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+
+    engagement = (
+        max(0, like_count) + max(0, save_count)
+        + settings.BLOG_TRENDING_VIEW_WEIGHT * max(0, view_count)
+    )
+    age_seconds = (created_at - TRENDING_EPOCH).total_seconds()
+    return math.log10(1 + engagement) + age_seconds / (decay_hours * 3600)